@@ -1,14 +1,17 @@
 # app.py
 import os
 from dotenv import load_dotenv
-from flask import Flask, render_template, request, redirect, url_for, Response, flash, session
-from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
-from forms import LoginForm, NuevoEstudianteForm, CambiarPasswordForm, EditarEstudianteForm, NuevoSeguimientoForm, EditarSeguimientoForm, ReingresoForm
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Flask, render_template, request, redirect, url_for, Response, flash, session, stream_with_context
+from flask_login import LoginManager, login_user, logout_user, login_required, current_user
+from forms import LoginForm, NuevoEstudianteForm, CambiarPasswordForm, EditarEstudianteForm, NuevoSeguimientoForm, EditarSeguimientoForm, ReingresoForm, ImportarSeguimientosForm, RespaldoForm
 from functools import wraps
 from datetime import date, datetime, timedelta
-from flask import jsonify
+from flask import jsonify, send_from_directory, abort
+from markupsafe import Markup, escape
 from flask_talisman import Talisman
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from logging.handlers import RotatingFileHandler
@@ -16,14 +19,37 @@ import logging
 import sqlite3
 import io
 import csv
+import codecs
 import json
+import base64
+import hmac
+import tempfile
+import threading
+import database
+from cache import CacheTTL
+import importacion
+import auditoria
+import metricas
+import perfiles
+import respaldos
+import limites  # Registra el almacenamiento "sqlite://" de Flask-Limiter
+import seguridad
+from seguridad import VerificadorContrasenas, VerificacionesSaturadas
+import opciones
+from opciones import asignar_opciones, directorio_profesionales
+from migraciones import aplicar_migraciones
 from database import (
-    get_db_connection, init_db,
-    LISTA_GENERO, LISTA_CARRERAS, LISTA_TRABAJADORAS_SOCIALES,
-    LISTA_PSICOLOGOS, LISTA_CESFAM, LISTA_TENTATIVA_IDEACION, LISTA_ESTADO_PROGRAMA,
-    LISTA_ESTADO_DERIVACION_INICIAL, LISTA_ASISTENCIA_CONTROLES_CESFAM,
-    LISTA_ESTADO_ACADEMICO, LISTA_ESTADO_CIVIL, LISTA_OCUPACION_LABORAL,LISTA_TIENE_HIJOS, LISTA_NACIONALIDADES,
-    LISTA_TIPO_INTERVENCION, LISTA_RESULTADO_CITA, LISTA_FUENTE_DERIVACION, LISTA_BENEFICIO_ARANCEL, LISTA_SEXO, LISTA_FACULTADES
+    get_db, init_db, actualizar_estado_actual, actualizar_ultima_sesion,
+    registrar_correccion_seguimiento, retirar_version_seguimiento,
+    SQL_ALERTAS_INACTIVIDAD, ORDEN_ALERTAS_INACTIVIDAD, modificador_alertas, expresion_busqueda_fts,
+    CONDICION_PROFESIONAL, SQL_CONTEO_ACTIVOS_POR_ANIO, COLUMNAS_LISTA_ESTUDIANTES, DESDE_LISTA_ESTUDIANTES,
+    DESDE_BUSQUEDA_ESTUDIANTES, COLUMNAS_ORDEN_ESTUDIANTES, CONDICION_ESTADO_PERIODO, CONDICION_SIN_ESTADO_PERIODO,
+    SQL_BUSCAR_SEGUIMIENTOS, PAGINA_BUSCAR_SEGUIMIENTOS, ORDEN_BUSCAR_SEGUIMIENTOS,
+    SQL_HISTORIAL_ESTUDIANTE, SQL_AUDITORIA_SEGUIMIENTOS, CONDICION_AUDITORIA_SEGUIMIENTO, CONDICION_AUDITORIA_USUARIO,
+    PAGINA_HISTORIAL, ORDEN_HISTORIAL, SQL_CAMPOS_MODIFICADOS, SQL_HISTORIAL_CAMPO, PAGINA_HISTORIAL_CAMPO,
+    ORDEN_HISTORIAL_CAMPO, SQL_REPORTE_PERIODOS,
+    versiones_tablas, limite_de_tiempo, TiempoConsultaAgotado, registrar_cambios, valor_historial,
+    LISTA_ESTADO_PROGRAMA, NOMBRES_CAMPOS_ESTUDIANTE, NOMBRES_CAMPOS_SEGUIMIENTO
 )
 
 load_dotenv()
@@ -31,12 +57,92 @@ load_dotenv()
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY')
 
+# --- CONFIGURACIÓN DE LA BASE DE DATOS ---
+# Una conexión por petición (flask.g), reutilizada desde un pool acotado por proceso.
+app.config['DATABASE'] = database.DATABASE_NAME
+app.config['SQLITE_POOL_SIZE'] = int(os.environ.get('SQLITE_POOL_SIZE', database.TAMANO_POOL_POR_DEFECTO))
+app.config['SQLITE_CACHED_STATEMENTS'] = int(os.environ.get('SQLITE_CACHED_STATEMENTS', database.SENTENCIAS_EN_CACHE_POR_DEFECTO))
+app.config['SQLITE_PRAGMAS'] = database.pragmas_desde_entorno()
+# Métricas de SQL por petición en /admin/metrics (ver metricas.py); false las desactiva sin costo.
+app.config['SQL_METRICAS'] = os.environ.get('SQL_METRICAS', 'True').lower() == 'true'
+# Token opcional para que Prometheus lea /admin/metrics/prometheus sin sesión de administrador.
+app.config['METRICAS_TOKEN'] = os.environ.get('METRICAS_TOKEN')
+# Sentencias de más de SQL_LENTA_MS milisegundos (0 desactiva) van, con su plan, al log SQL_LENTAS_LOG.
+app.config['SQL_LENTA_MS'] = float(os.environ.get('SQL_LENTA_MS', metricas.SQL_LENTA_MS))
+app.config['SQL_LENTAS_LOG'] = os.environ.get('SQL_LENTAS_LOG', metricas.SQL_LENTAS_LOG)
+database.init_app(app)
+metricas.init_app(app)
+
+# Las migraciones se aplican normalmente con 'python migraciones.py'; en despliegues
+# de un solo proceso se pueden aplicar al iniciar con MIGRAR_AL_INICIAR=true.
+if os.environ.get('MIGRAR_AL_INICIAR', 'False').lower() == 'true':
+    aplicar_migraciones(registrar=app.logger.info)
+
+# Días sin seguimiento para que un estudiante activo aparezca en las alertas de '/'.
+app.config['DIAS_ALERTA_INACTIVIDAD'] = int(os.environ.get('DIAS_ALERTA_INACTIVIDAD', 30))
+# Lista de estudiantes de '/': filas por página y segundos que se reutiliza el total.
+app.config['ESTUDIANTES_POR_PAGINA'] = int(os.environ.get('ESTUDIANTES_POR_PAGINA', 50))
+app.config['TTL_CONTEO_ESTUDIANTES'] = int(os.environ.get('TTL_CONTEO_ESTUDIANTES', 60))
+# Resultados por página en la búsqueda de bitácoras de sesión.
+app.config['RESULTADOS_BUSQUEDA_BITACORAS'] = int(os.environ.get('RESULTADOS_BUSQUEDA_BITACORAS', 20))
+# Cambios por página en el historial de la ficha y en la consulta por campo.
+app.config['HISTORIAL_POR_PAGINA'] = int(os.environ.get('HISTORIAL_POR_PAGINA', 20))
+# Auditoría de seguimientos: registros por transacción y segundos máximos en cola (ver auditoria.py).
+app.config['AUDITORIA_MAX_POR_LOTE'] = int(os.environ.get('AUDITORIA_MAX_POR_LOTE', auditoria.MAX_POR_LOTE))
+app.config['AUDITORIA_ESPERA_MAXIMA'] = float(os.environ.get('AUDITORIA_ESPERA_MAXIMA', auditoria.ESPERA_MAXIMA))
+# /api/reporte_periodos: segundos que se guarda un resultado (además se invalida con
+# cualquier cambio en Estudiantes o PeriodosAtencion) y tiempo máximo de la consulta.
+app.config['TTL_REPORTES'] = int(os.environ.get('TTL_REPORTES', 300))
+app.config['TIEMPO_MAXIMO_REPORTE'] = float(os.environ.get('TIEMPO_MAXIMO_REPORTE', 2))
+# Segundos que se reutiliza el usuario cargado para la sesión (0 desactiva la caché).
+app.config['TTL_USUARIOS'] = int(os.environ.get('TTL_USUARIOS', 15))
+# Carga de seguimientos desde CSV: tamaño máximo de cualquier petición (MB) y filas
+# rechazadas que se muestran en la página (el total siempre se informa).
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_CARGA_MB', 64)) * 1024 * 1024
+app.config['ERRORES_CARGA_MOSTRADOS'] = int(os.environ.get('ERRORES_CARGA_MOSTRADOS', 200))
+# Respaldos (respaldos.py): directorio, cuántos se conservan y si se comprimen por defecto.
+app.config['RESPALDOS_DIR'] = respaldos.directorio_por_defecto(app.config['DATABASE'])
+app.config['RESPALDOS_RETENER'] = int(os.environ.get('RESPALDOS_RETENER', respaldos.RETENER_POR_DEFECTO))
+app.config['RESPALDOS_COMPRIMIR'] = os.environ.get('RESPALDOS_COMPRIMIR', 'true').lower() in ('true', '1', 'yes')
+# Perfiles de peticiones a pedido (perfiles.py): directorio, cuántos se conservan y minutos de validez del token.
+app.config['PERFILES_DIR'] = os.environ.get('PERFILES_DIR') or os.path.join(os.path.dirname(os.path.abspath(app.config['DATABASE'])), 'perfiles')
+app.config['PERFILES_RETENER'] = int(os.environ.get('PERFILES_RETENER', perfiles.RETENER_POR_DEFECTO))
+app.config['PERFILES_TOKEN_MINUTOS'] = int(os.environ.get('PERFILES_TOKEN_MINUTOS', perfiles.TOKEN_MINUTOS_POR_DEFECTO))
+perfiles.init_app(app)
+# Hash de contraseñas: método y costo (formato de werkzeug) para hashes nuevos; los
+# guardados con otros parámetros se rehacen en el siguiente inicio de sesión exitoso.
+# Los cálculos usan a lo más HILOS_HASH_CONTRASENAS hilos (por defecto, uno por núcleo)
+# y admiten hasta HASH_CONTRASENAS_PENDIENTES en espera antes de rechazar logins.
+app.config['METODO_HASH_CONTRASENAS'] = os.environ.get('METODO_HASH_CONTRASENAS', seguridad.METODO_HASH_POR_DEFECTO)
+app.config['HILOS_HASH_CONTRASENAS'] = int(os.environ.get('HILOS_HASH_CONTRASENAS', 0)) or os.cpu_count() or 1
+app.config['HASH_CONTRASENAS_PENDIENTES'] = int(os.environ.get('HASH_CONTRASENAS_PENDIENTES', seguridad.PENDIENTES_MAX_POR_DEFECTO))
+# Límites de peticiones: los contadores se guardan en un archivo SQLite compartido por
+# todos los procesos del servidor (ver limites.py). Los límites generales dependen del
+# rol del usuario; sin sesión se usan los de LIMITES_POR_DEFECTO. Varios límites se
+# separan con ';'.
+app.config['LIMITES_STORAGE_URI'] = os.environ.get(
+    'LIMITES_STORAGE_URI', 'sqlite:///' + os.path.join(os.path.dirname(os.path.abspath(database.DATABASE_NAME)), 'limites.db'))
+app.config['LIMITES_POR_DEFECTO'] = os.environ.get('LIMITES_POR_DEFECTO', '200 per day;50 per hour')
+app.config['LIMITES_POR_ROL'] = {
+    'admin': os.environ.get('LIMITES_ROL_ADMIN', '2000 per day;500 per hour'),
+    'profesional': os.environ.get('LIMITES_ROL_PROFESIONAL', app.config['LIMITES_POR_DEFECTO']),
+    'ingreso': os.environ.get('LIMITES_ROL_INGRESO', app.config['LIMITES_POR_DEFECTO']),
+}
+# --- FIN DE LA CONFIGURACIÓN ---
+
 # --- CONFIGURACIÓN DEL LIMITADOR ---
+def limites_segun_rol():
+    """Límites generales para el usuario de la petición, según su rol."""
+    if current_user.is_authenticated:
+        return app.config['LIMITES_POR_ROL'].get(current_user.rol, app.config['LIMITES_POR_DEFECTO'])
+    return app.config['LIMITES_POR_DEFECTO']
+
 limiter = Limiter(
     get_remote_address,
     app=app,
-    default_limits=["200 per day", "50 per hour"], # Límites generales para toda la app
-    storage_uri="memory://" # Para guardar los conteos en memoria
+    default_limits=[limites_segun_rol], # Límites generales para toda la app
+    strategy="sliding-window-counter",
+    storage_uri=app.config['LIMITES_STORAGE_URI'] # Contadores compartidos entre procesos
 )
 # --- FIN DE LA CONFIGURACIÓN DEL LIMITADOR ---
 
@@ -115,7 +221,21 @@ def roles_required(*roles_permitidos):
         return decorated_function
     return decorator
 
-class User(UserMixin):
+verificador_contrasenas = VerificadorContrasenas(metodo=app.config['METODO_HASH_CONTRASENAS'],
+                                                 hilos=app.config['HILOS_HASH_CONTRASENAS'],
+                                                 max_pendientes=app.config['HASH_CONTRASENAS_PENDIENTES'])
+
+escritor_auditoria = auditoria.EscritorAuditoria(app.config['DATABASE'],
+                                                 max_por_lote=app.config['AUDITORIA_MAX_POR_LOTE'],
+                                                 espera_maxima=app.config['AUDITORIA_ESPERA_MAXIMA'])
+
+class User:
+    """
+    Usuario de la sesión (interfaz de Flask-Login). Con __slots__ y sin __dict__: los
+    objetos se guardan en la caché `usuarios_en_cache`, que puede tener miles.
+    """
+    __slots__ = ('id', 'username', 'password_hash', 'rol', 'nombre_completo', 'activo')
+
     def __init__(self, id, username, password_hash, rol, nombre_completo=None, activo=1):
         self.id = id
         self.username = username
@@ -123,27 +243,86 @@ class User(UserMixin):
         self.rol = rol
         self.nombre_completo = nombre_completo
         self.activo = activo
-    def set_password(self, password): self.password_hash = generate_password_hash(password)
-    def check_password(self, password): return check_password_hash(self.password_hash, password)
+    def set_password(self, password): self.password_hash = verificador_contrasenas.generar_hash(password)
+    def check_password(self, password): return verificador_contrasenas.verificar(self.password_hash, password)
+
+    # Lo que Flask-Login espera de un usuario (equivale a UserMixin, que no usa __slots__).
+    @property
+    def is_active(self): return bool(self.activo)
+    @property
+    def is_authenticated(self): return self.is_active
+    @property
+    def is_anonymous(self): return False
+    def get_id(self): return str(self.id)
+    def __eq__(self, other):
+        return self.get_id() == other.get_id() if isinstance(other, User) else NotImplemented
+    def __hash__(self): return hash(self.get_id())
+
+# Usuarios de las sesiones activas, por (id, versión de Usuarios en VersionTablas).
+# Cualquier cambio en Usuarios, de cualquier proceso (editar, desactivar, eliminar,
+# cambiar la contraseña, create_admin.py), sube la versión con un trigger: la siguiente
+# petición de cada proceso ya no encuentra la entrada y vuelve a leer el usuario, así
+# que un cambio de rol o una desactivación rige de inmediato en todos los procesos.
+usuarios_en_cache = CacheTTL(ttl=app.config['TTL_USUARIOS'], max_entradas=4096)
+
+def _cargar_usuario(user_id):
+    user_data = get_db().execute("SELECT * FROM Usuarios WHERE id = ?", (user_id,)).fetchone()
+    if user_data:
+        return User(id=user_data['id'], username=user_data['username'],
+                    password_hash=user_data['password_hash'], rol=user_data['rol'],
+                    nombre_completo=user_data['nombre_completo'], activo=user_data['activo'])
+    return None
 
 @login_manager.user_loader
 def load_user(user_id):
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM Usuarios WHERE id = ?", (int(user_id),))
-        user_data = cursor.fetchone()
-        if user_data:
-            return User(id=user_data['id'], username=user_data['username'],
-                        password_hash=user_data['password_hash'], rol=user_data['rol'],
-                        nombre_completo=user_data['nombre_completo'], activo=user_data['activo'])
-        return None
+        version = versiones_tablas(get_db(), ('Usuarios',))[0]
+        usuario = usuarios_en_cache.obtener((int(user_id), version), lambda: _cargar_usuario(int(user_id)))
+        # Un usuario desactivado pierde la sesión en su siguiente petición.
+        return usuario if usuario and usuario.is_active else None
     except Exception as e:
         app.logger.error(f"Error en load_user: {e}", exc_info=True)
         return None
-    finally:
-        if conn: conn.close()
+
+# --- PAGINACIÓN DE LA LISTA DE ESTUDIANTES ---
+# Paginación por clave ("keyset"): cada página continúa desde la última fila de la
+# anterior según (apellido_paterno, apellido_materno, nombre, rut), con un índice en
+# ese orden (COLUMNAS_ORDEN_ESTUDIANTES, en database.py). Así una página profunda
+# cuesta lo mismo que la primera (no hay OFFSET).
+# Con búsqueda de texto el orden es por relevancia (bm25, menor es mejor) y luego rut.
+COLUMNAS_ORDEN_BUSQUEDA = ('puntaje', 'rut')
+
+# Total de estudiantes por combinación de filtros; es sólo informativo, por eso se
+# acepta que esté desactualizado hasta TTL_CONTEO_ESTUDIANTES segundos.
+conteo_estudiantes = CacheTTL(ttl=app.config['TTL_CONTEO_ESTUDIANTES'])
+
+def codificar_cursor_pagina(fila, columnas_orden=COLUMNAS_ORDEN_ESTUDIANTES):
+    """Cursor opaco (base64 de JSON) con los valores de orden de `fila`."""
+    valores = [fila[columna] for columna in columnas_orden]
+    return base64.urlsafe_b64encode(json.dumps(valores).encode('utf-8')).decode('ascii')
+
+def decodificar_cursor_pagina(cursor_pagina, columnas_orden=COLUMNAS_ORDEN_ESTUDIANTES):
+    """Valores de orden de un cursor, o None si falta o no es válido."""
+    if not cursor_pagina:
+        return None
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(cursor_pagina.encode('ascii')))
+    except (ValueError, UnicodeError):
+        return None
+    if not isinstance(valores, list) or len(valores) != len(columnas_orden) \
+            or not all(isinstance(v, (str, int, float)) and not isinstance(v, bool) for v in valores):
+        return None
+    return valores
+
+# --- BÚSQUEDA EN BITÁCORAS DE SESIÓN ---
+# snippet() de FTS5 marca las coincidencias con estos caracteres de control; el
+# fragmento se escapa completo y recién después las marcas se convierten en <mark>.
+MARCA_INICIO_COINCIDENCIA, MARCA_FIN_COINCIDENCIA = '\x02', '\x03'
+
+def resaltar_fragmento(fragmento):
+    """HTML seguro de un fragmento de snippet(), con las coincidencias en <mark>."""
+    html = str(escape(fragmento or ''))
+    return Markup(html.replace(MARCA_INICIO_COINCIDENCIA, '<mark>').replace(MARCA_FIN_COINCIDENCIA, '</mark>'))
 
 # Función se asegura de que todas las sesiones usen el tiempo de expiración
 @app.before_request
@@ -156,52 +335,31 @@ def make_session_permanent():
 def index():
     conn = None
     try:
-        conn = get_db_connection()
+        conn = get_db()
         cursor = conn.cursor()
 
         # --- PASO 1 y 2: Lógica de Alertas y Conteos ---
-        # Ambas consultas ahora deben obtener el estado MÁS RECIENTE desde PeriodosAtencion
-
-        # Consulta para conteo anual (ahora usa la nueva tabla)
-        query_conteo = """
-            SELECT
-                strftime('%Y', pa.fecha_ingreso) as anio_ingreso,
-                COUNT(pa.rut_estudiante) as cantidad_activos
-            FROM PeriodosAtencion pa
-            WHERE pa.estado_periodo IN ('Activo', 'Activo (Reingreso)')
-            AND pa.id = (SELECT MAX(id) FROM PeriodosAtencion WHERE rut_estudiante = pa.rut_estudiante)
-            GROUP BY anio_ingreso
-            ORDER BY anio_ingreso DESC;
-        """
-        cursor.execute(query_conteo)
+        # Ambas consultas obtienen el estado MÁS RECIENTE desde EstadoActualEstudiante,
+        # que guarda el último período de cada estudiante.
+
+        # Consulta para conteo anual
+        cursor.execute(SQL_CONTEO_ACTIVOS_POR_ANIO)
         conteo_activos_por_ano = cursor.fetchall()
 
-        # Consulta para alertas 
-        query_base_alertas = """
-            SELECT
-                e.rut, e.nombre, e.apellido_paterno, e.apellido_materno,
-                MAX(s.fecha_sesion) as ultima_sesion,
-                CAST(julianday('now') - julianday(MAX(s.fecha_sesion)) AS INTEGER) as dias_sin_seguimiento
-            FROM Estudiantes e
-            JOIN PeriodosAtencion pa ON e.rut = pa.rut_estudiante
-            LEFT JOIN Seguimientos s ON e.rut = s.rut_estudiante
-            WHERE pa.id = (SELECT MAX(id) FROM PeriodosAtencion WHERE rut_estudiante = e.rut)
-            AND pa.estado_periodo LIKE 'Activo%'
-        """
-        params_alertas = []
+        # Consulta para alertas: la fecha del último seguimiento se mantiene en
+        # EstadoActualEstudiante al crear, editar o eliminar seguimientos.
+        dias_alerta = app.config['DIAS_ALERTA_INACTIVIDAD']
+        query_base_alertas = SQL_ALERTAS_INACTIVIDAD
+        params_alertas = [modificador_alertas(dias_alerta)]
 
         if current_user.rol == 'profesional':
             if current_user.nombre_completo:
-                query_base_alertas += " AND (e.trabajadora_social_asignada = ? OR e.psicologo_asignado = ?)"
+                query_base_alertas += " AND " + CONDICION_PROFESIONAL
                 params_alertas.extend([current_user.nombre_completo, current_user.nombre_completo])
             else:
                 query_base_alertas += " AND 1 = 0"
 
-        query_final_alertas = query_base_alertas + """
-            GROUP BY e.rut
-            HAVING dias_sin_seguimiento > 30 OR ultima_sesion IS NULL
-            ORDER BY dias_sin_seguimiento DESC;
-        """
+        query_final_alertas = query_base_alertas + ORDEN_ALERTAS_INACTIVIDAD
         cursor.execute(query_final_alertas, tuple(params_alertas))
         estudiantes_con_alerta = cursor.fetchall()
 
@@ -210,55 +368,88 @@ def index():
         search_term = request.args.get('search_term', '').strip()
         filter_estado = request.args.get('filter_estado', '').strip()
         show_archived = request.args.get('show_archived') == 'true'
+        por_pagina = app.config['ESTUDIANTES_POR_PAGINA']
+
+        # Con término de búsqueda se usa el índice de texto completo (EstudiantesFTS) y
+        # los resultados se ordenan por relevancia; sin él, por apellidos y nombre.
+        expresion_busqueda = expresion_busqueda_fts(search_term) if search_term else None
+        params = []
+        if expresion_busqueda:
+            columnas_orden = COLUMNAS_ORDEN_BUSQUEDA
+            desde = DESDE_BUSQUEDA_ESTUDIANTES
+            params.append(expresion_busqueda)
+            expresiones_orden = ['c.puntaje', 'e.rut']
+        else:
+            columnas_orden = COLUMNAS_ORDEN_ESTUDIANTES
+            desde = DESDE_LISTA_ESTUDIANTES
+            expresiones_orden = [f"e.{columna}" for columna in COLUMNAS_ORDEN_ESTUDIANTES]
+        despues = decodificar_cursor_pagina(request.args.get('despues'), columnas_orden)
+        antes = None if despues else decodificar_cursor_pagina(request.args.get('antes'), columnas_orden)
 
         # Esta es la consulta base correcta que une las tablas
-        base_query = """
-            SELECT 
-                e.rut, e.nombre, e.apellido_paterno, e.apellido_materno, e.carrera_programa, pa.estado_periodo
-            FROM 
-                Estudiantes e
-            JOIN 
-                PeriodosAtencion pa ON e.rut = pa.rut_estudiante
-            WHERE 
-                pa.id = (SELECT MAX(id) FROM PeriodosAtencion WHERE rut_estudiante = e.rut)
-        """
+        base_query = COLUMNAS_LISTA_ESTUDIANTES + (", c.puntaje" if expresion_busqueda else "") + desde
         
         conditions = []
-        params = []
 
         if current_user.rol == 'profesional':
             if current_user.nombre_completo:
-                conditions.append("(e.trabajadora_social_asignada = ? OR e.psicologo_asignado = ?)")
+                conditions.append(CONDICION_PROFESIONAL)
                 params.extend([current_user.nombre_completo, current_user.nombre_completo])
             else:
                 conditions.append("1 = 0")
-
-        if search_term:
-            conditions.append("(lower(e.rut) LIKE ? OR lower(e.nombre) LIKE ? OR lower(e.apellido_paterno) LIKE ? OR lower(e.apellido_materno) LIKE ?)")
-            params.extend([f"%{search_term.lower()}%"] * 4)
         
         # Tu lógica de filtro de estado está perfecta
         if filter_estado:
-            conditions.append("LOWER(TRIM(pa.estado_periodo)) = ?")
+            conditions.append(CONDICION_ESTADO_PERIODO)
             params.append(filter_estado.lower())
         elif not show_archived:
-            conditions.append("LOWER(TRIM(pa.estado_periodo)) != ?")
+            conditions.append(CONDICION_SIN_ESTADO_PERIODO)
             params.append("archivado")
 
+        # Total aproximado (en caché) con los mismos filtros, sin la posición de la página
+        def contar_estudiantes():
+            query_conteo_lista = "SELECT COUNT(*) " + desde
+            if conditions:
+                query_conteo_lista += " WHERE " + " AND ".join(conditions)
+            return conn.execute(query_conteo_lista, tuple(params)).fetchone()[0]
+        clave_conteo = (current_user.rol, current_user.nombre_completo, expresion_busqueda, filter_estado.lower(), show_archived)
+        total_estudiantes = conteo_estudiantes.obtener(clave_conteo, contar_estudiantes)
+
+        # Posición de la página: filas después (o antes) del cursor recibido
+        marcadores = ", ".join("?" * len(expresiones_orden))
+        if despues:
+            conditions.append(f"({', '.join(expresiones_orden)}) > ({marcadores})")
+            params.extend(despues)
+        elif antes:
+            conditions.append(f"({', '.join(expresiones_orden)}) < ({marcadores})")
+            params.extend(antes)
+
         final_query = base_query
         if conditions:
-            # Se usa AND porque la consulta base ya tiene un WHERE
-            final_query += " AND " + " AND ".join(conditions)
+            final_query += " WHERE " + " AND ".join(conditions)
+
+        direccion = "DESC" if antes else "ASC"
+        final_query += " ORDER BY " + ", ".join(f"{expresion} {direccion}" for expresion in expresiones_orden)
+        final_query += " LIMIT ?"
+        params.append(por_pagina + 1)  # una fila extra indica si hay más páginas
 
-        final_query += " ORDER BY e.apellido_paterno, e.apellido_materno, e.nombre ASC"
-        
         cursor.execute(final_query, tuple(params))
         estudiantes = cursor.fetchall()
+        hay_mas = len(estudiantes) > por_pagina
+        estudiantes = estudiantes[:por_pagina]
+        if antes:
+            estudiantes.reverse()
+        paginacion = {
+            'total': total_estudiantes,
+            'anterior': codificar_cursor_pagina(estudiantes[0], columnas_orden) if estudiantes and (despues or (antes and hay_mas)) else None,
+            'siguiente': codificar_cursor_pagina(estudiantes[-1], columnas_orden) if estudiantes and (antes or hay_mas) else None,
+        }
         
         return render_template('index.html',
                                estudiantes=estudiantes,
                                conteo_anual=conteo_activos_por_ano,
                                estudiantes_con_alerta=estudiantes_con_alerta,
+                               dias_alerta=dias_alerta, paginacion=paginacion,
                                search_term_active=search_term,
                                filter_estado_active=filter_estado, show_archived_active=show_archived,
                                lista_estado_programa_template=LISTA_ESTADO_PROGRAMA)
@@ -266,11 +457,10 @@ def index():
         app.logger.error(f"EXCEPCIÓN en la función index: {e}", exc_info=True)
         flash("Ocurrió un error al cargar la lista de estudiantes.", "danger")
         return render_template('index.html', estudiantes=[], conteo_anual=[],
-                               estudiantes_con_alerta=[], search_term_active="",
+                               estudiantes_con_alerta=[], dias_alerta=app.config['DIAS_ALERTA_INACTIVIDAD'], paginacion=None,
+                               search_term_active="",
                                filter_estado_active="", show_archived_active=False,
                                lista_estado_programa_template=LISTA_ESTADO_PROGRAMA)
-    finally:
-        if conn: conn.close()
 
 @app.route('/estudiante/nuevo', methods=['GET', 'POST'])
 @login_required
@@ -278,37 +468,16 @@ def index():
 def nuevo_estudiante():
     form = NuevoEstudianteForm()
 
-    # Obtener la lista de trabajadoras sociales y psicólogos
-    conn = get_db_connection()
-    trabajadoras_sociales = conn.execute("SELECT nombre_completo FROM Profesionales WHERE tipo = 'Trabajadora Social' ORDER BY nombre_completo").fetchall()
-    psicologos = conn.execute("SELECT nombre_completo FROM Profesionales WHERE tipo = 'Psicólogo/a' ORDER BY nombre_completo").fetchall()
-    conn.close()
-
-    # Llenar los menús desplegables
-    form.trabajadora_social.choices = [('', 'Seleccione...')] + [(ts['nombre_completo'], ts['nombre_completo']) for ts in trabajadoras_sociales]
-    form.psicologo.choices = [('', 'Seleccione...')] + [(p['nombre_completo'], p['nombre_completo']) for p in psicologos]
-
-    # --- Toda tu lógica para llenar los menús desplegables ---
-    form.sexo.choices = [('', 'Seleccione...')] + [(s, s) for s in LISTA_SEXO]
-    form.genero.choices = [('', 'Seleccione...')] + [(g, g) for g in LISTA_GENERO]
-    form.carrera_programa.choices = [('', 'Seleccione...')] + [(c, c) for c in LISTA_CARRERAS]
-    form.facultad.choices = [('', 'Seleccione...')] + [(f, f) for f in LISTA_FACULTADES]
-    form.nacionalidad.choices = [('', 'Seleccione...')] + [(n, n) for n in LISTA_NACIONALIDADES]
-    opciones_estado_inicial = [e for e in LISTA_ESTADO_PROGRAMA if e in ["Activo", "No acepta ingresar", "En evaluación inicial"]]
-    form.estado_programa.choices = [(e, e) for e in opciones_estado_inicial]
-    lista_cesfam_para_formulario = [c for c in LISTA_CESFAM if c.upper() != "NINGUNO"]
-    form.cesfam.choices = [('', 'Seleccione CESFAM...')] + [(c, c) for c in lista_cesfam_para_formulario]
-    form.tentativa_ideacion.choices = [('', 'Seleccione...')] + [(ti, ti) for ti in LISTA_TENTATIVA_IDEACION]
-    form.estado_academico.choices = [('', 'Seleccione...')] + [(e, e) for e in LISTA_ESTADO_ACADEMICO]
-    form.estado_civil.choices = [('', 'Seleccione...')] + [(ec, ec) for ec in LISTA_ESTADO_CIVIL]
-    form.tiene_hijos.choices = [('', 'Seleccione...')] + [(h, h) for h in LISTA_TIENE_HIJOS]
-    form.ocupacion_laboral.choices = [('', 'Seleccione...')] + [(ol, ol) for ol in LISTA_OCUPACION_LABORAL]
-    form.fuente_derivacion.choices = [('', 'Seleccione...')] + [(f, f) for f in LISTA_FUENTE_DERIVACION]
+    # Llenar los menús desplegables (opciones precalculadas en opciones.py)
+    asignar_opciones(form, opciones.NUEVO_ESTUDIANTE)
+    profesionales = directorio_profesionales.obtener(get_db())
+    form.trabajadora_social.choices = profesionales.opciones_trabajadora_social
+    form.psicologo.choices = profesionales.opciones_psicologo
 
     if form.validate_on_submit():
         conn = None
         try:
-            conn = get_db_connection()
+            conn = get_db()
             cursor = conn.cursor()
 
             fecha_autorizacion_investigacion = date.today() if form.autoriza_investigacion.data else None
@@ -341,14 +510,19 @@ def nuevo_estudiante():
                 # --- PASO 2: Crear el primer Período de Atención ---
                 # Después de guardar al estudiante, creamos su primer registro en la nueva tabla.
                 cursor.execute('''
-                    INSERT INTO PeriodosAtencion (rut_estudiante, fecha_ingreso, motivo_ingreso, estado_periodo)
-                    VALUES (?, ?, ?, ?)
+                    INSERT INTO PeriodosAtencion (rut_estudiante, fecha_ingreso, motivo_ingreso, estado_periodo,
+                                                  carrera_periodo, facultad_periodo, estado_academico_periodo)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
                 ''', (
                     form.rut.data,
                     form.fecha_ingreso.data.strftime('%Y-%m-%d'), # Usamos la fecha de ingreso del formulario
                     form.tentativa_ideacion.data,                 # Usamos el motivo de ingreso del formulario
-                    form.estado_programa.data                     # Usamos el estado inicial del formulario
+                    form.estado_programa.data,                    # Usamos el estado inicial del formulario
+                    form.carrera_programa.data,                   # "Fotografía" académica del primer período
+                    form.facultad.data,
+                    form.estado_academico.data
                 ))
+                actualizar_estado_actual(cursor, form.rut.data)
 
                 conn.commit()
                 flash(f'Estudiante {form.nombre.data} {form.apellido_paterno.data} registrado exitosamente.', 'success')
@@ -357,8 +531,6 @@ def nuevo_estudiante():
         except sqlite3.Error as e:
             if conn: conn.rollback()
             flash(f"Error de base de datos al crear estudiante: {e}", "danger")
-        finally:
-            if conn: conn.close()
 
     return render_template('nuevo_estudiante.html', form=form)
 
@@ -370,7 +542,7 @@ def detalle_estudiante(rut_estudiante):
     seguimiento_alta = None
 
     try:
-        conn = get_db_connection()
+        conn = get_db()
         cursor = conn.cursor()
         
         # 1. Mantenemos la consulta original para 'estudiante'.
@@ -417,22 +589,21 @@ def detalle_estudiante(rut_estudiante):
              seguimiento_alta = cursor.fetchone()
 
         query_seguimientos = """
-            SELECT s.*, (EXISTS (SELECT 1 FROM Seguimientos s2 WHERE s2.corrige_id_seguimiento = s.id_seguimiento) OR (s.es_correccion = 1 AND EXISTS (SELECT 1 FROM Seguimientos s2 WHERE s2.es_correccion = 1 AND s2.corrige_id_seguimiento = s.corrige_id_seguimiento AND s2.id_seguimiento > s.id_seguimiento))) as fue_corregido
+            SELECT s.*, NOT s.es_vigente as fue_corregido
             FROM Seguimientos s
             WHERE s.rut_estudiante = ?
             ORDER BY s.fecha_sesion DESC, s.id_seguimiento DESC
         """
         seguimientos = conn.execute(query_seguimientos, (rut_estudiante,)).fetchall()
 
-        historial = conn.execute("SELECT * FROM HistorialCambios WHERE id_registro_afectado = ? AND modelo_afectado = 'Estudiante' ORDER BY fecha_cambio DESC", (rut_estudiante,)).fetchall()
-        
+        # El historial de cambios de la ficha se pide aparte y por páginas (historial_estudiante).
+
         ultima_extension = conn.execute("SELECT MAX(extension_programa_otorgada) as fecha_extension FROM Seguimientos WHERE rut_estudiante = ?", (rut_estudiante,)).fetchone()
 
         return render_template('detalle_estudiante.html',
                                estudiante=estudiante,
                                ultimo_periodo=ultimo_periodo, # <-- Pasamos la nueva variable a la plantilla
                                seguimientos=seguimientos,
-                               historial=historial,
                                edad=edad_estudiante,
                                fecha_ultima_extension=ultima_extension['fecha_extension'],
                                seguimiento_alta=seguimiento_alta,
@@ -442,9 +613,105 @@ def detalle_estudiante(rut_estudiante):
         app.logger.error(f"EXCEPCIÓN en detalle_estudiante: {e}", exc_info=True)
         flash('Ocurrió un error al cargar los detalles del estudiante.', 'danger')
         return redirect(url_for('index'))
-    finally:
-        if conn:
-            conn.close()
+
+
+# --- HISTORIAL DE CAMBIOS DE LA FICHA ---
+# Paginación por clave, del cambio más reciente al más antiguo; idx_historial_registro
+# (id_registro_afectado, modelo_afectado, fecha_cambio) entrega las filas en ese orden.
+COLUMNAS_ORDEN_HISTORIAL = ('fecha_cambio', 'id_cambio')
+
+def agregar_campos_modificados(conn, filas, nombres=NOMBRES_CAMPOS_ESTUDIANTE):
+    """
+    Cada fila de HistorialCambios como dict, con la lista 'campos' de sus campos
+    modificados en el orden de `nombres` (que da también el nombre que se muestra).
+    """
+    cambios = {fila['id_cambio']: dict(fila, campos=[]) for fila in filas}
+    if cambios:
+        orden = {campo: i for i, campo in enumerate(nombres)}
+        marcadores = ', '.join('?' * len(cambios))
+        for detalle in conn.execute(SQL_CAMPOS_MODIFICADOS.format(marcadores=marcadores), tuple(cambios)):
+            cambios[detalle['id_cambio']]['campos'].append(dict(detalle, nombre_campo=nombres.get(detalle['campo'], detalle['campo'])))
+        for cambio in cambios.values():
+            cambio['campos'].sort(key=lambda c: orden.get(c['campo'], len(orden)))
+    return list(cambios.values())
+
+@app.route('/estudiante/<rut_estudiante>/historial')
+@login_required
+def historial_estudiante(rut_estudiante):
+    """
+    Una página del historial de cambios de la ficha, como fragmento HTML. La ficha la
+    pide después de cargar, y el botón "Cambios anteriores" agrega la siguiente.
+    """
+    conn = get_db()
+    estudiante = conn.execute("SELECT trabajadora_social_asignada, psicologo_asignado FROM Estudiantes WHERE rut = ?", (rut_estudiante,)).fetchone()
+    if not estudiante:
+        abort(404)
+    # Mismos permisos que detalle_estudiante.
+    if current_user.rol == 'profesional' and current_user.nombre_completo not in (estudiante['trabajadora_social_asignada'], estudiante['psicologo_asignado']):
+        abort(403)
+
+    despues = decodificar_cursor_pagina(request.args.get('despues'), COLUMNAS_ORDEN_HISTORIAL)
+    por_pagina = app.config['HISTORIAL_POR_PAGINA']
+    query = SQL_HISTORIAL_ESTUDIANTE
+    params = [rut_estudiante]
+    if despues:
+        query += PAGINA_HISTORIAL
+        params.extend(despues)
+    query += ORDEN_HISTORIAL
+    params.append(por_pagina + 1)
+
+    filas = conn.execute(query, tuple(params)).fetchall()
+    siguiente = None
+    if len(filas) > por_pagina:
+        filas = filas[:por_pagina]
+        siguiente = codificar_cursor_pagina(filas[-1], COLUMNAS_ORDEN_HISTORIAL)
+    return render_template('historial_cambios.html', historial=agregar_campos_modificados(conn, filas),
+                           rut=rut_estudiante, siguiente=siguiente, es_primera_pagina=not despues)
+
+
+@app.route('/seguimientos/buscar')
+@login_required
+def buscar_seguimientos():
+    """
+    Busca en las bitácoras de sesión con el índice SeguimientosFTS. Los resultados van
+    del registro más reciente al más antiguo (por id_seguimiento), así FTS5 recorre sus
+    coincidencias en ese orden y se detiene al completar la página, sin ordenar todas.
+    """
+    texto = request.args.get('q', '').strip()
+    expresion = expresion_busqueda_fts(texto) if texto else None
+    despues = decodificar_cursor_pagina(request.args.get('despues'), ('id_seguimiento',))
+    por_pagina = app.config['RESULTADOS_BUSQUEDA_BITACORAS']
+    resultados, siguiente = [], None
+
+    if expresion:
+        try:
+            conn = get_db()
+            query = SQL_BUSCAR_SEGUIMIENTOS
+            params = [MARCA_INICIO_COINCIDENCIA, MARCA_FIN_COINCIDENCIA, expresion]
+            # Mismos permisos que detalle_estudiante: un profesional sólo ve a sus estudiantes.
+            if current_user.rol == 'profesional':
+                if current_user.nombre_completo:
+                    query += " AND " + CONDICION_PROFESIONAL
+                    params.extend([current_user.nombre_completo, current_user.nombre_completo])
+                else:
+                    query += " AND 1 = 0"
+            if despues:
+                query += PAGINA_BUSCAR_SEGUIMIENTOS
+                params.extend(despues)
+            query += ORDEN_BUSCAR_SEGUIMIENTOS
+            params.append(por_pagina + 1)
+
+            filas = conn.execute(query, tuple(params)).fetchall()
+            if len(filas) > por_pagina:
+                filas = filas[:por_pagina]
+                siguiente = codificar_cursor_pagina(filas[-1], ('id_seguimiento',))
+            resultados = [dict(fila, fragmento=resaltar_fragmento(fila['fragmento'])) for fila in filas]
+        except Exception as e:
+            app.logger.error(f"EXCEPCIÓN en buscar_seguimientos: {e}", exc_info=True)
+            flash('Ocurrió un error al buscar en las bitácoras.', 'danger')
+
+    return render_template('buscar_seguimientos.html', q=texto, resultados=resultados,
+                           siguiente=siguiente, es_primera_pagina=not despues)
 
 
 @app.route('/estudiante/<rut_estudiante>/seguimiento/nuevo', methods=['GET', 'POST'])
@@ -452,7 +719,7 @@ def detalle_estudiante(rut_estudiante):
 def nuevo_seguimiento(rut_estudiante):
     conn = None
     try:
-        conn = get_db_connection()
+        conn = get_db()
         estudiante = conn.execute("SELECT * FROM Estudiantes WHERE rut = ?", (rut_estudiante,)).fetchone()
 
         if not estudiante:
@@ -484,12 +751,7 @@ def nuevo_seguimiento(rut_estudiante):
 
         form = NuevoSeguimientoForm()
 
-        form.tipo_intervencion.choices = [('', 'Seleccione...')] + [(item, item) for item in LISTA_TIPO_INTERVENCION]
-        form.resultado_cita.choices = [('', 'Seleccione...')] + [(item, item) for item in LISTA_RESULTADO_CITA]
-        form.estado_derivacion_cesfam_actual.choices = [('', 'Seleccione...')] + [(item, item) for item in LISTA_ESTADO_DERIVACION_INICIAL]
-        form.confirmacion_gestion_hora_cesfam.choices = [('', 'Seleccione...')] + [(item, item) for item in LISTA_ASISTENCIA_CONTROLES_CESFAM]
-        form.nuevo_estado_programa.choices = [('', 'Mantener estado actual')] + [(estado, estado) for estado in LISTA_ESTADO_PROGRAMA]
-        form.nuevo_estado_academico.choices = [('', 'Mantener estado actual')] + [(e, e) for e in LISTA_ESTADO_ACADEMICO]
+        asignar_opciones(form, opciones.NUEVO_SEGUIMIENTO)
 
         seguimientos_anteriores = conn.execute("SELECT id_seguimiento, fecha_sesion, tipo_intervencion FROM Seguimientos WHERE rut_estudiante = ? AND (es_correccion = 0 OR es_correccion IS NULL) ORDER BY fecha_sesion DESC", (rut_estudiante,)).fetchall()
         form.corrige_id_seguimiento.choices = [('', 'Seleccione si es una corrección...')] + [(s['id_seguimiento'], f"ID: {s['id_seguimiento']} ({s['fecha_sesion']}) - {s['tipo_intervencion']}") for s in seguimientos_anteriores]
@@ -521,6 +783,9 @@ def nuevo_seguimiento(rut_estudiante):
                     form.alta_disminucion_riesgo.data, form.alta_redes_apoyo.data, form.alta_adherencia_tratamiento.data,
                     form.alta_no_registrado.data, fecha_ext, form.es_correccion.data, corrige_id
                 ))
+                if corrige_id:
+                    registrar_correccion_seguimiento(cursor, cursor.lastrowid, int(corrige_id))
+                actualizar_ultima_sesion(cursor, rut_estudiante)
 
                 nueva_nota = form.nota_importante.data
                 # Comparamos la nota del formulario con la de la base de datos
@@ -530,7 +795,8 @@ def nuevo_seguimiento(rut_estudiante):
                                    (nueva_nota, rut_estudiante))
 
                 if valor_cambio_programa:
-                    cursor.execute('UPDATE PeriodosAtencion SET estado_periodo = ? WHERE id = (SELECT MAX(id) FROM PeriodosAtencion WHERE rut_estudiante = ?)', (valor_cambio_programa, rut_estudiante))
+                    cursor.execute('UPDATE PeriodosAtencion SET estado_periodo = ? WHERE id = (SELECT id_periodo_actual FROM EstadoActualEstudiante WHERE rut_estudiante = ?)', (valor_cambio_programa, rut_estudiante))
+                    actualizar_estado_actual(cursor, rut_estudiante)
                 if valor_cambio_academico:
                     cursor.execute('UPDATE Estudiantes SET estado_academico = ? WHERE rut = ?', (valor_cambio_academico, rut_estudiante))
                 if form.beneficio_arancel.data:
@@ -562,9 +828,6 @@ def nuevo_seguimiento(rut_estudiante):
         print(f"Error general en nuevo_seguimiento para RUT {rut_estudiante}: {e_main}")
         flash("Ocurrió un error inesperado al procesar la solicitud de nuevo seguimiento.", 'danger')
         return redirect(url_for('index'))
-    finally:
-        if conn:
-            conn.close()
 
 @app.route('/estudiante/<rut_estudiante>/reingreso', methods=['GET', 'POST'])
 @login_required
@@ -572,14 +835,11 @@ def nuevo_seguimiento(rut_estudiante):
 def reingreso_estudiante(rut_estudiante):
     form = ReingresoForm()
     # Rellenamos los menús desplegables
-    form.carrera.choices = [('', 'Seleccione...')] + [(c, c) for c in LISTA_CARRERAS]
-    form.facultad.choices = [('', 'Seleccione...')] + [(f, f) for f in LISTA_FACULTADES]
-    form.estado_academico.choices = [('', 'Seleccione...')] + [(e, e) for e in LISTA_ESTADO_ACADEMICO]
+    asignar_opciones(form, opciones.REINGRESO)
 
-    conn = get_db_connection()
+    conn = get_db()
     # Obtenemos los datos actuales para pre-rellenar el formulario
     estudiante_actual = conn.execute('SELECT * FROM Estudiantes WHERE rut = ?', (rut_estudiante,)).fetchone()
-    conn.close()
 
     if not estudiante_actual:
         flash("Estudiante no encontrado.", "danger")
@@ -588,7 +848,7 @@ def reingreso_estudiante(rut_estudiante):
     if form.validate_on_submit():
         conn = None
         try:
-            conn = get_db_connection()
+            conn = get_db()
             cursor = conn.cursor()
             
             # Creamos el nuevo período de atención con la "fotografía" académica
@@ -607,6 +867,7 @@ def reingreso_estudiante(rut_estudiante):
                 form.facultad.data,
                 form.estado_academico.data
             ))
+            actualizar_estado_actual(cursor, rut_estudiante)
             
             conn.commit()
             flash('¡Reingreso registrado exitosamente!', 'success')
@@ -614,8 +875,6 @@ def reingreso_estudiante(rut_estudiante):
         except sqlite3.Error as e:
             if conn: conn.rollback()
             flash(f"Error de base de datos al registrar el reingreso: {e}", "danger")
-        finally:
-            if conn: conn.close()
     
     # Si es la primera vez que se carga la página, pre-rellenamos con los datos actuales
     elif request.method == 'GET':
@@ -628,9 +887,8 @@ def reingreso_estudiante(rut_estudiante):
 @app.route('/estudiante/<rut_estudiante>/editar', methods=['GET', 'POST'])
 @login_required
 def editar_estudiante(rut_estudiante):
-    conn_inicial = get_db_connection()
+    conn_inicial = get_db()
     estudiante_obj = conn_inicial.execute("SELECT * FROM Estudiantes WHERE rut = ?", (rut_estudiante,)).fetchone()
-    conn_inicial.close()
 
     if not estudiante_obj:
         flash('Estudiante no encontrado.', 'danger')
@@ -648,51 +906,27 @@ def editar_estudiante(rut_estudiante):
 
     form = EditarEstudianteForm()
 
-    # Obtener la lista de trabajadoras sociales y psicólogos
-    conn = get_db_connection()
-    trabajadoras_sociales = conn.execute("SELECT nombre_completo FROM Profesionales WHERE tipo = 'Trabajadora Social' ORDER BY nombre_completo").fetchall()
-    psicologos = conn.execute("SELECT nombre_completo FROM Profesionales WHERE tipo = 'Psicólogo/a' ORDER BY nombre_completo").fetchall()
-    conn.close()
-
-    # Llenar los menús desplegables
-    form.trabajadora_social.choices = [('', 'Seleccione...')] + [(ts['nombre_completo'], ts['nombre_completo']) for ts in trabajadoras_sociales]
-    form.psicologo.choices = [('', 'Seleccione...')] + [(p['nombre_completo'], p['nombre_completo']) for p in psicologos]
-
-    form.sexo.choices = [(s, s) for s in LISTA_SEXO]
-    form.genero.choices = [(g, g) for g in LISTA_GENERO]
-    form.carrera_programa.choices = [(c, c) for c in LISTA_CARRERAS]
-    form.facultad.choices = [(f, f) for f in LISTA_FACULTADES]
-    form.trabajadora_social.choices = [(ts, ts) for ts in LISTA_TRABAJADORAS_SOCIALES]
-    form.psicologo.choices = [(p, p) for p in LISTA_PSICOLOGOS]
-    form.estado_programa.choices = [(e, e) for e in LISTA_ESTADO_PROGRAMA]
-    form.cesfam.choices = [("NINGUNO", "NINGUNO")] + [(c, c) for c in LISTA_CESFAM if c.upper() != "NINGUNO"]
-    form.tentativa_ideacion.choices = [(ti, ti) for ti in LISTA_TENTATIVA_IDEACION]
-    form.estado_academico.choices = [('', 'Seleccione...')] + [(e, e) for e in LISTA_ESTADO_ACADEMICO]
-    form.estado_civil.choices = [(ec, ec) for ec in LISTA_ESTADO_CIVIL]
-    form.tiene_hijos.choices = [(h, h) for h in LISTA_TIENE_HIJOS]
-    form.ocupacion_laboral.choices = [(ol, ol) for ol in LISTA_OCUPACION_LABORAL]
-    form.nacionalidad.choices = [('', 'Seleccione...')] + [(n, n) for n in LISTA_NACIONALIDADES]
-    form.fuente_derivacion.choices = [('', 'Seleccione...')] + [(f, f) for f in LISTA_FUENTE_DERIVACION]
+    # Las opciones de trabajadora social y psicólogo/a de este formulario son las
+    # listas fijas LISTA_TRABAJADORAS_SOCIALES y LISTA_PSICOLOGOS (ver opciones.py).
+    asignar_opciones(form, opciones.EDITAR_ESTUDIANTE)
 
     if form.validate_on_submit():
         conn_post = None
         try:
-            nombres_amigables = { 'nombre': 'Nombre', 'apellido_paterno': 'Apellido Paterno', 'apellido_materno': 'Apellido Materno', 'sexo': 'Sexo', 'genero': 'Género', 'fecha_nacimiento': 'Fecha de Nacimiento', 'nacionalidad': 'Nacionalidad', 'estado_civil': 'Estado Civil', 'tiene_hijos': 'Tiene Hijos/as', 'ocupacion_laboral': 'Ocupación Laboral', 'residencia_academica': 'Residencia Académica', 'residencia_familiar': 'Residencia Familiar', 'celular': 'Celular', 'carrera_programa': 'Carrera/Programa', 'facultad': 'Facultad', 'estado_academico': 'Estado Académico', 'fecha_ingreso_programa': 'Fecha de Ingreso al Programa', 'fuente_derivacion': 'Fuente de Derivación', 'estado_en_programa': 'Estado en Programa', 'trabajadora_social_asignada': 'Trabajadora Social', 'psicologo_asignado': 'Psicólogo/a', 'fecha_derivacion_cesfam': 'Fecha Derivación CESFAM', 'cesfam_derivacion': 'CESFAM de Derivación', 'tentativa_ideacion': 'Tentativa o Ideación (al ingreso)', 'fecha_autorizacion_investigacion': 'Autorización para Investigación', 'beneficio_arancel': 'Beneficio de Arancel', 'estado_derivacion_maestro': 'Estado de Derivación', 'nota_importante': 'Nota Importante' }
             campos_a_mapear = { 'nombre': 'nombre', 'apellido_paterno': 'apellido_paterno', 'apellido_materno': 'apellido_materno', 'sexo': 'sexo', 'genero': 'genero', 'fecha_nacimiento': 'fecha_nacimiento', 'nacionalidad': 'nacionalidad', 'estado_civil': 'estado_civil', 'tiene_hijos': 'tiene_hijos', 'ocupacion_laboral': 'ocupacion_laboral', 'residencia_academica': 'residencia_academica', 'residencia_familiar': 'residencia_familiar', 'celular': 'celular', 'carrera_programa': 'carrera_programa', 'facultad': 'facultad', 'estado_academico': 'estado_academico', 'fecha_ingreso_programa': 'fecha_ingreso', 'fuente_derivacion': 'fuente_derivacion', 'estado_en_programa': 'estado_programa', 'trabajadora_social_asignada': 'trabajadora_social', 'psicologo_asignado': 'psicologo', 'fecha_derivacion_cesfam': 'fecha_derivacion', 'cesfam_derivacion': 'cesfam', 'tentativa_ideacion': 'tentativa_ideacion', 'beneficio_arancel': 'beneficio_arancel', 'estado_derivacion_maestro': 'estado_derivacion_maestro', 'nota_importante': 'nota_importante' }
-            detalles_cambios = []
+            # Un cambio por campo modificado (campo, valor anterior, valor nuevo); vacío y None cuentan igual.
+            cambios = []
             for columna_db, campo_form in campos_a_mapear.items():
                 valor_anterior = estudiante_obj[columna_db]
                 valor_nuevo = getattr(form, campo_form).data
-                if str(valor_anterior) != str(valor_nuevo):
-                    nombre_campo_bonito = nombres_amigables.get(columna_db, columna_db.replace("_", " ").title())
-                    detalles_cambios.append(f"Cambió {nombre_campo_bonito} de '{valor_anterior or 'N/A'}' a '{valor_nuevo or 'N/A'}'.")
+                if valor_historial(valor_anterior) != valor_historial(valor_nuevo):
+                    cambios.append((columna_db, valor_anterior, valor_nuevo))
 
-            conn_post = get_db_connection()
+            conn_post = get_db()
             cursor = conn_post.cursor()
 
-            if detalles_cambios:
-                texto_detalles = " | ".join(detalles_cambios)
-                cursor.execute("INSERT INTO HistorialCambios (nombre_usuario, accion, modelo_afectado, id_registro_afectado, detalles) VALUES (?, ?, ?, ?, ?)", (current_user.nombre_completo, 'Edición de Estudiante', 'Estudiante', rut_estudiante, texto_detalles))
+            if cambios:
+                registrar_cambios(cursor, current_user.nombre_completo, 'Edición de Estudiante', 'Estudiante', rut_estudiante, cambios)
 
             fecha_autorizacion_investigacion = date.today() if form.autoriza_investigacion.data else None
 
@@ -712,8 +946,6 @@ def editar_estudiante(rut_estudiante):
             if conn_post: conn_post.rollback()
             app.logger.error(f"Error al actualizar estudiante: {e}", exc_info=True)
             flash('Ocurrió un error al guardar los cambios.', 'danger')
-        finally:
-            if conn_post: conn_post.close()
 
     if request.method == 'GET':
         form.nombre.data = estudiante_obj['nombre']
@@ -760,15 +992,22 @@ def eliminar_estudiante(rut_estudiante):
     """
     conn = None
     try:
-        conn = get_db_connection()
+        conn = get_db()
         cursor = conn.cursor()
 
         # Iniciamos una transacción. Si algo falla, se deshacen todos los cambios.
         conn.execute('BEGIN')
 
         # 1. Eliminar registros asociados para evitar errores de clave foránea
-        cursor.execute("DELETE FROM HistorialCambios WHERE id_registro_afectado = ?", (rut_estudiante,))
+        cursor.execute("""
+            DELETE FROM HistorialCambiosDetalle WHERE id_cambio IN (
+                SELECT id_cambio FROM HistorialCambios WHERE id_registro_afectado = ? AND modelo_afectado = 'Estudiante')
+        """, (rut_estudiante,))
+        cursor.execute("DELETE FROM HistorialCambios WHERE id_registro_afectado = ? AND modelo_afectado = 'Estudiante'", (rut_estudiante,))
+        # Los seguimientos borrados quedan auditados, uno por uno, como en eliminar_seguimiento.
+        seguimientos_eliminados = cursor.execute("SELECT * FROM Seguimientos WHERE rut_estudiante = ?", (rut_estudiante,)).fetchall()
         cursor.execute("DELETE FROM Seguimientos WHERE rut_estudiante = ?", (rut_estudiante,))
+        cursor.execute("DELETE FROM EstadoActualEstudiante WHERE rut_estudiante = ?", (rut_estudiante,))
         cursor.execute("DELETE FROM PeriodosAtencion WHERE rut_estudiante = ?", (rut_estudiante,))
 
         # 2. Finalmente, eliminar al estudiante de la tabla principal
@@ -776,6 +1015,9 @@ def eliminar_estudiante(rut_estudiante):
 
         # Si todo salió bien, confirmamos los cambios
         conn.commit()
+        for seguimiento in seguimientos_eliminados:
+            escritor_auditoria.registrar(current_user.nombre_completo or current_user.username, auditoria.ACCION_ELIMINACION,
+                                         'Seguimiento', seguimiento['id_seguimiento'], auditoria.cambios_de_eliminacion(seguimiento))
         flash(f'El estudiante con RUT {rut_estudiante} y todos sus registros asociados han sido eliminados permanentemente.', 'success')
 
     except sqlite3.Error as e:
@@ -785,9 +1027,6 @@ def eliminar_estudiante(rut_estudiante):
         print(f"Error al eliminar estudiante (RUT: {rut_estudiante}): {e}")
         flash('Ocurrió un error de base de datos al intentar eliminar el estudiante.', 'danger')
 
-    finally:
-        if conn:
-            conn.close()
             
     # Redirigimos al listado principal de estudiantes
     return redirect(url_for('index'))
@@ -798,7 +1037,7 @@ def eliminar_estudiante(rut_estudiante):
 def admin_listar_usuarios():
     conn = None
     try:
-        conn = get_db_connection()
+        conn = get_db()
         cursor = conn.cursor()
         cursor.execute("SELECT id, username, nombre_completo, rol, activo FROM Usuarios ORDER BY username")
         usuarios = cursor.fetchall()
@@ -807,8 +1046,6 @@ def admin_listar_usuarios():
         app.logger.error(f"Error en admin_listar_usuarios: {e}", exc_info=True)
         flash('Ocurrió un error al cargar la lista de usuarios.', 'danger')
         return redirect(url_for('index'))
-    finally:
-        if conn: conn.close()
 
 @app.route('/admin/usuarios/crear', methods=['GET', 'POST'])
 @login_required
@@ -822,15 +1059,11 @@ def crear_usuario():
     conn_prof = None
     profesionales_lista = []
     try:
-        conn_prof = get_db_connection()
-        profesionales_db = conn_prof.execute("SELECT nombre_completo FROM Profesionales ORDER BY nombre_completo").fetchall()
-        profesionales_lista = [p['nombre_completo'] for p in profesionales_db]
+        conn_prof = get_db()
+        profesionales_lista = directorio_profesionales.obtener(conn_prof).nombres
     except Exception as e:
         app.logger.error(f"Error al obtener lista de profesionales para crear usuario: {e}", exc_info=True)
         flash("Error crítico: no se pudo cargar la lista de profesionales.", "danger")
-    finally:
-        if conn_prof:
-            conn_prof.close()
 
     if request.method == 'POST':
         username = request.form.get('username')
@@ -847,13 +1080,13 @@ def crear_usuario():
             return render_template('crear_usuario.html', username=username, nombre_completo=nombre_completo, rol_seleccionado=rol, activo_check=(activo == 1), lista_roles=lista_de_roles_posibles, profesionales=profesionales_lista)
         conn = None
         try:
-            conn = get_db_connection()
+            conn = get_db()
             cursor = conn.cursor()
             cursor.execute("SELECT id FROM Usuarios WHERE username = ?", (username,))
             if cursor.fetchone():
                 flash('Ese nombre de usuario ya está en uso. Por favor, elige otro.', 'danger')
                 return render_template('crear_usuario.html', username=username, nombre_completo=nombre_completo, rol_seleccionado=rol, activo_check=(activo == 1), lista_roles=lista_de_roles_posibles, profesionales=profesionales_lista)
-            hashed_password = generate_password_hash(password, method='pbkdf2:sha256')
+            hashed_password = verificador_contrasenas.generar_hash(password)
             cursor.execute("INSERT INTO Usuarios (username, password_hash, rol, nombre_completo, activo) VALUES (?, ?, ?, ?, ?)", (username, hashed_password, rol, nombre_completo, activo))
             conn.commit()
             flash(f'Usuario "{username}" creado exitosamente.', 'success')
@@ -866,8 +1099,6 @@ def crear_usuario():
             if conn: conn.rollback()
             app.logger.error(f"Error de BD al crear usuario '{username}': {e}", exc_info=True)
             flash(f'Error de base de datos al crear usuario: {e}', 'danger')
-        finally:
-            if conn: conn.close()
         return render_template('crear_usuario.html', username=username, nombre_completo=nombre_completo, rol_seleccionado=rol, activo_check=(activo == 1), lista_roles=lista_de_roles_posibles, profesionales=profesionales_lista)
     return render_template('crear_usuario.html', lista_roles=lista_de_roles_posibles, profesionales=profesionales_lista)
 
@@ -882,7 +1113,7 @@ def eliminar_usuario(id_usuario):
 
     conn = None
     try:
-        conn = get_db_connection()
+        conn = get_db()
         cursor = conn.cursor()
         
         # Verificar que el usuario exista antes de intentar eliminarlo
@@ -899,8 +1130,6 @@ def eliminar_usuario(id_usuario):
     except sqlite3.Error as e:
         if conn: conn.rollback()
         flash(f'Ocurrió un error de base de datos al intentar eliminar el usuario: {e}', 'danger')
-    finally:
-        if conn: conn.close()
             
     return redirect(url_for('admin_listar_usuarios'))
 
@@ -913,7 +1142,7 @@ def editar_usuario(id_usuario):
         return redirect(url_for('index'))
     conn = None
     try:
-        conn = get_db_connection()
+        conn = get_db()
         cursor = conn.cursor()
         cursor.execute("SELECT * FROM Usuarios WHERE id = ?", (id_usuario,))
         usuario_a_editar_obj = cursor.fetchone()
@@ -935,7 +1164,7 @@ def editar_usuario(id_usuario):
                 if new_password != confirm_new_password:
                     flash('Las nuevas contraseñas no coinciden. La contraseña no ha sido cambiada.', 'danger')
                     return render_template('editar_usuario.html', usuario=usuario_a_editar_obj, lista_roles=lista_de_roles_posibles, nombre_completo_form_val=nombre_completo_form, rol_form_val=rol_form, activo_form_val=activo_form)
-                password_hash_to_update = generate_password_hash(new_password, method='pbkdf2:sha256')
+                password_hash_to_update = verificador_contrasenas.generar_hash(new_password)
             if password_hash_to_update:
                 cursor.execute("UPDATE Usuarios SET nombre_completo = ?, rol = ?, activo = ?, password_hash = ? WHERE id = ?", (nombre_completo_form, rol_form, activo_form, password_hash_to_update, id_usuario))
             else:
@@ -956,14 +1185,12 @@ def editar_usuario(id_usuario):
         app.logger.error(f"Error general en editar_usuario (ID: {id_usuario}): {e}", exc_info=True)
         flash('Ocurrió un error al intentar procesar la solicitud.', 'danger')
         return redirect(url_for('admin_listar_usuarios'))
-    finally:
-        if conn: conn.close()
 
 @app.route('/admin/profesionales', methods=['GET', 'POST'])
 @login_required
 @admin_required
 def admin_gestionar_profesionales():
-    conn = get_db_connection()
+    conn = get_db()
 
     if request.method == 'POST':
         nombre = request.form.get('nombre_completo')
@@ -975,38 +1202,257 @@ def admin_gestionar_profesionales():
                     (nombre, tipo)
                 )
                 conn.commit()
+                directorio_profesionales.invalidar()
                 flash('Profesional agregado exitosamente.', 'success')
             except sqlite3.IntegrityError:
                 flash('Error: El nombre de este profesional ya existe.', 'danger')
         return redirect(url_for('admin_gestionar_profesionales'))
 
     profesionales = conn.execute("SELECT * FROM Profesionales ORDER BY tipo, nombre_completo").fetchall()
-    conn.close()
     return render_template('admin_profesionales.html', profesionales=profesionales)
 
 @app.route('/admin/profesionales/<int:id>/eliminar', methods=['POST'])
 @login_required
 @admin_required
 def eliminar_profesional(id):
-    conn = get_db_connection()
+    conn = get_db()
     conn.execute("DELETE FROM Profesionales WHERE id = ?", (id,))
     conn.commit()
-    conn.close()
+    directorio_profesionales.invalidar()
     flash('Profesional eliminado exitosamente.', 'success')
     return redirect(url_for('admin_gestionar_profesionales'))
 
+@app.route('/admin/seguimientos/importar', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def importar_seguimientos():
+    """Carga de seguimientos históricos desde un CSV, con opción de sólo validar."""
+    form = ImportarSeguimientosForm()
+    resumen, rechazos, avisos = None, None, []
+
+    if form.validate_on_submit():
+        simular = form.simular.data
+        rechazos = importacion.ListaRechazos(maximo=app.config['ERRORES_CARGA_MOSTRADOS'])
+        creador = current_user.nombre_completo or current_user.username
+        conn = get_db()
+        try:
+            archivo = importacion.abrir_csv(form.archivo.data.stream)
+            resumen = importacion.importar_seguimientos_csv(conn, archivo, creador, rechazos, simular=simular,
+                                                            registrar=avisos.append)
+            app.logger.info(f"Carga de seguimientos por '{current_user.username}' ({form.archivo.data.filename}, "
+                            f"simulación={simular}): {resumen}")
+            if simular:
+                flash(f'Validación terminada: {resumen.escritas} seguimientos se pueden cargar. No se guardó nada.', 'info')
+            else:
+                flash(f'Carga terminada: {resumen.escritas} seguimientos nuevos guardados.', 'success')
+        except ValueError as e:
+            # Encabezados incompletos o repetidos: no se procesó ninguna fila.
+            flash(str(e), 'danger')
+        except (sqlite3.Error, csv.Error) as e:
+            app.logger.error(f"Error en la carga de seguimientos: {e}", exc_info=True)
+            flash(f'Error al procesar el archivo: {e}. Los lotes anteriores al error quedaron guardados; '
+                  'repetir la carga no los duplica.', 'danger')
+
+    return render_template('importar_seguimientos.html', form=form, resumen=resumen, rechazos=rechazos,
+                           avisos=avisos, columnas=[c.nombre for c in importacion.HOJA_SEGUIMIENTOS_CSV.columnas])
+
+# Un respaldo a la vez por proceso: dos copias simultáneas sólo duplicarían el trabajo.
+respaldo_en_curso = threading.Lock()
+
+@app.route('/admin/respaldos', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def admin_respaldos():
+    form = RespaldoForm()
+    if request.method == 'GET':
+        form.comprimir.data = app.config['RESPALDOS_COMPRIMIR']
+
+    if form.validate_on_submit():
+        if not respaldo_en_curso.acquire(blocking=False):
+            flash('Ya se está creando un respaldo. Espere a que termine.', 'warning')
+            return redirect(url_for('admin_respaldos'))
+        try:
+            respaldo = respaldos.crear_respaldo(app.config['DATABASE'], app.config['RESPALDOS_DIR'],
+                                                comprimir=form.comprimir.data, retener=app.config['RESPALDOS_RETENER'])
+            app.logger.info(f"Respaldo creado por '{current_user.username}': {respaldo.archivo} "
+                            f"({respaldo.bytes} bytes, {respaldo.segundos} s)")
+            flash(f'Respaldo "{respaldo.archivo}" creado en {respaldo.segundos:.1f} s.', 'success')
+        except (respaldos.RespaldoInvalido, sqlite3.Error, OSError) as e:
+            app.logger.error(f"Error al crear respaldo: {e}", exc_info=True)
+            flash(f'No se pudo crear el respaldo: {e}', 'danger')
+        finally:
+            respaldo_en_curso.release()
+        return redirect(url_for('admin_respaldos'))
+
+    lista = respaldos.listar_respaldos(app.config['DATABASE'], app.config['RESPALDOS_DIR'])
+    return render_template('admin_respaldos.html', form=form, respaldos=lista,
+                           directorio=app.config['RESPALDOS_DIR'], retener=app.config['RESPALDOS_RETENER'])
+
+@app.route('/admin/respaldos/<nombre>')
+@login_required
+@admin_required
+def descargar_respaldo(nombre):
+    # Sólo se entregan archivos que listar_respaldos reconoce como respaldos.
+    nombres = {r.archivo for r in respaldos.listar_respaldos(app.config['DATABASE'], app.config['RESPALDOS_DIR'])}
+    if nombre not in nombres:
+        abort(404)
+    app.logger.info(f"Respaldo '{nombre}' descargado por '{current_user.username}'")
+    return send_from_directory(app.config['RESPALDOS_DIR'], nombre, as_attachment=True)
+
+
+@app.route('/admin/perfiles')
+@login_required
+@admin_required
+def admin_perfiles():
+    """
+    Perfiles guardados y el token para perfilar una petición (ver perfiles.py). Con
+    ?url=/ruta redirige a esa ruta con el token, para perfilarla en un clic.
+    """
+    token = perfiles.generar_token(app.config['SECRET_KEY'], current_user.id)
+    url = request.args.get('url', '').strip()
+    if url:
+        # Sólo rutas de esta misma aplicación.
+        if not url.startswith('/') or url.startswith('//') or '\\' in url:
+            flash('Indica una ruta de la aplicación, por ejemplo /dashboard.', 'warning')
+        else:
+            return redirect(url + ('&' if '?' in url else '?') + f"{perfiles.PARAMETRO}={token}")
+    return render_template('admin_perfiles.html', perfiles=perfiles.listar_perfiles(app.config['PERFILES_DIR']),
+                           token=token, parametro=perfiles.PARAMETRO, encabezado=perfiles.ENCABEZADO,
+                           minutos=app.config['PERFILES_TOKEN_MINUTOS'], directorio=app.config['PERFILES_DIR'],
+                           retener=app.config['PERFILES_RETENER'])
+
+@app.route('/admin/perfiles/<archivo>')
+@login_required
+@admin_required
+def descargar_perfil(archivo):
+    # Sólo se entregan los .pstats y .collapsed de perfiles listados.
+    nombre, extension = os.path.splitext(archivo)
+    nombres = {p.nombre for p in perfiles.listar_perfiles(app.config['PERFILES_DIR'])}
+    if nombre not in nombres or extension not in ('.pstats', '.collapsed'):
+        abort(404)
+    return send_from_directory(app.config['PERFILES_DIR'], archivo, as_attachment=True)
+
+
+@app.route('/admin/historial')
+@login_required
+@admin_required
+def admin_historial():
+    """
+    Qué cambió en un campo de la ficha, en todos los estudiantes, entre dos fechas
+    (inclusive). Es un rango de idx_historial_detalle_campo_fecha, del más reciente al
+    más antiguo, paginado por clave como el historial de la ficha.
+    """
+    campo = request.args.get('campo', '')
+    desde, hasta = request.args.get('desde', ''), request.args.get('hasta', '')
+    despues = decodificar_cursor_pagina(request.args.get('despues'), COLUMNAS_ORDEN_HISTORIAL)
+    por_pagina = app.config['HISTORIAL_POR_PAGINA']
+    resultados, siguiente = [], None
+
+    if campo:
+        try:
+            fecha_desde = date.fromisoformat(desde) if desde else date.min
+            fecha_hasta = date.fromisoformat(hasta) if hasta else date.max - timedelta(days=1)
+        except ValueError:
+            fecha_desde = None
+            flash('Las fechas deben tener el formato AAAA-MM-DD.', 'warning')
+        if campo not in NOMBRES_CAMPOS_ESTUDIANTE:
+            flash('Campo no válido.', 'warning')
+        elif fecha_desde:
+            query = SQL_HISTORIAL_CAMPO
+            # fecha_cambio es 'AAAA-MM-DD HH:MM:SS': el límite superior es el día siguiente a `hasta`.
+            params = [campo, fecha_desde.isoformat(), (fecha_hasta + timedelta(days=1)).isoformat()]
+            if despues:
+                query += PAGINA_HISTORIAL_CAMPO
+                params.extend(despues)
+            query += ORDEN_HISTORIAL_CAMPO
+            params.append(por_pagina + 1)
+            try:
+                resultados = get_db().execute(query, tuple(params)).fetchall()
+            except sqlite3.Error as e:
+                app.logger.error(f"EXCEPCIÓN en admin_historial: {e}", exc_info=True)
+                flash('Ocurrió un error al consultar el historial.', 'danger')
+            if len(resultados) > por_pagina:
+                resultados = resultados[:por_pagina]
+                siguiente = codificar_cursor_pagina(resultados[-1], COLUMNAS_ORDEN_HISTORIAL)
+
+    return render_template('admin_historial.html', campos=NOMBRES_CAMPOS_ESTUDIANTE, campo=campo, desde=desde, hasta=hasta,
+                           resultados=resultados, siguiente=siguiente, es_primera_pagina=not despues)
+
+
+@app.route('/admin/auditoria')
+@login_required
+@admin_required
+def admin_auditoria():
+    """
+    Ediciones y eliminaciones de seguimientos (ver auditoria.py), de un seguimiento o
+    de un usuario, de la más reciente a la más antigua y paginadas por clave.
+    """
+    usuario = request.args.get('usuario', '').strip()
+    id_seguimiento = request.args.get('id_seguimiento', '').strip()
+    despues = decodificar_cursor_pagina(request.args.get('despues'), COLUMNAS_ORDEN_HISTORIAL)
+    por_pagina = app.config['HISTORIAL_POR_PAGINA']
+    conn = get_db()
+    registros, siguiente = [], None
+
+    query = SQL_AUDITORIA_SEGUIMIENTOS
+    params = []
+    if id_seguimiento and not id_seguimiento.isdigit():
+        flash('El ID de seguimiento debe ser un número.', 'warning')
+    elif id_seguimiento or usuario:
+        if id_seguimiento:
+            query += CONDICION_AUDITORIA_SEGUIMIENTO
+            params.append(id_seguimiento)
+        if usuario:
+            query += CONDICION_AUDITORIA_USUARIO
+            params.append(usuario)
+        if despues:
+            query += PAGINA_HISTORIAL
+            params.extend(despues)
+        query += ORDEN_HISTORIAL
+        params.append(por_pagina + 1)
+        filas = conn.execute(query, tuple(params)).fetchall()
+        if len(filas) > por_pagina:
+            filas = filas[:por_pagina]
+            siguiente = codificar_cursor_pagina(filas[-1], COLUMNAS_ORDEN_HISTORIAL)
+        registros = agregar_campos_modificados(conn, filas, NOMBRES_CAMPOS_SEGUIMIENTO)
+
+    usuarios = [fila[0] for fila in conn.execute("SELECT COALESCE(nombre_completo, username) FROM Usuarios ORDER BY 1")]
+    return render_template('admin_auditoria.html', usuarios=usuarios, usuario=usuario, id_seguimiento=id_seguimiento,
+                           registros=registros, siguiente=siguiente, es_primera_pagina=not despues)
+
+
+@app.route('/admin/metrics')
+@login_required
+@admin_required
+def admin_metricas():
+    """SQL por petición de cada endpoint y las sentencias con más tiempo acumulado (ver metricas.py)."""
+    endpoints, consultas = metricas.registro.resumen()
+    return render_template('admin_metricas.html', endpoints=endpoints, consultas=consultas,
+                           activas=app.config['SQL_METRICAS'], desde=datetime.fromtimestamp(metricas.registro.desde),
+                           pid=os.getpid())
+
+
+@app.route('/admin/metrics/prometheus')
+@limiter.exempt
+def metricas_prometheus():
+    """Histogramas de SQL por endpoint en formato Prometheus, para un administrador o con METRICAS_TOKEN."""
+    token = app.config.get('METRICAS_TOKEN')
+    autorizacion = request.headers.get('Authorization', '')
+    con_token = bool(token) and hmac.compare_digest(autorizacion.encode(), f"Bearer {token}".encode())
+    if not con_token and not (current_user.is_authenticated and current_user.rol == 'admin'):
+        abort(403)
+    return Response(metricas.registro.prometheus(), mimetype='text/plain; version=0.0.4')
+
 
 @app.route('/seguimiento/<int:id_seguimiento>/editar', methods=['GET', 'POST'])
 @login_required
 def editar_seguimiento(id_seguimiento):
-    conn = get_db_connection()
+    conn = get_db()
     seguimiento = conn.execute("SELECT * FROM Seguimientos WHERE id_seguimiento = ?", (id_seguimiento,)).fetchone()
     if not seguimiento:
-        conn.close()
         flash('Seguimiento no encontrado.', 'danger')
         return redirect(url_for('index'))
     estudiante = conn.execute("SELECT * FROM Estudiantes WHERE rut = ?", (seguimiento['rut_estudiante'],)).fetchone()
-    conn.close()
     if not estudiante:
         flash('Estudiante asociado a este seguimiento no encontrado.', 'danger')
         return redirect(url_for('index'))
@@ -1022,36 +1468,50 @@ def editar_seguimiento(id_seguimiento):
     estados_finalizados = ["Concretó la Derivación", "Gestiona apoyo privado", "Se rehúsa a gestionar"]
     mostrar_seccion_derivacion = estudiante['estado_derivacion_maestro'] not in estados_finalizados
     form = EditarSeguimientoForm()
-    form.tipo_intervencion.choices = [(item, item) for item in LISTA_TIPO_INTERVENCION]
-    form.resultado_cita.choices = [(item, item) for item in LISTA_RESULTADO_CITA]
-    form.estado_derivacion_cesfam_actual.choices = [('', 'Seleccione...')] + [(item, item) for item in LISTA_ESTADO_DERIVACION_INICIAL]
-    form.confirmacion_gestion_hora_cesfam.choices = [('', 'Seleccione...')] + [(item, item) for item in LISTA_ASISTENCIA_CONTROLES_CESFAM]
+    asignar_opciones(form, opciones.EDITAR_SEGUIMIENTO)
 
     if form.validate_on_submit():
         conn_post = None
         try:
-            conn_post = get_db_connection()
+            conn_post = get_db()
+            # Los valores anteriores para la auditoría se leen dentro de la transacción que
+            # escribe: los de arriba pueden ser de antes de otra edición simultánea.
+            conn_post.execute('BEGIN IMMEDIATE')
             cursor = conn_post.cursor()
+            seguimiento = cursor.execute("SELECT * FROM Seguimientos WHERE id_seguimiento = ?", (id_seguimiento,)).fetchone()
+            if not seguimiento:
+                conn_post.rollback()
+                flash('Seguimiento no encontrado.', 'danger')
+                return redirect(url_for('detalle_estudiante', rut_estudiante=estudiante['rut']))
             nuevo_estado_derivacion = form.estado_derivacion_cesfam_actual.data
             if nuevo_estado_derivacion:
                 cursor.execute('UPDATE Estudiantes SET estado_derivacion_maestro = ? WHERE rut = ?', (nuevo_estado_derivacion, estudiante['rut']))
+            valores_nuevos = {
+                'fecha_sesion': form.fecha_sesion.data, 'trabajadora_social_sesion': form.trabajadora_social_sesion.data,
+                'psicologo_sesion': form.psicologo_sesion.data, 'tipo_intervencion': form.tipo_intervencion.data,
+                'resultado_cita': form.resultado_cita.data, 'estado_derivacion_cesfam_actual': form.estado_derivacion_cesfam_actual.data,
+                'confirmacion_gestion_hora_cesfam': form.confirmacion_gestion_hora_cesfam.data,
+                'fechas_sesiones_cesfam': form.fechas_sesiones_cesfam.data, 'bitacora_sesion': form.bitacora_sesion.data,
+            }
             cursor.execute('''
                 UPDATE Seguimientos SET
-                    fecha_sesion = ?, trabajadora_social_sesion = ?, psicologo_sesion = ?,
-                    tipo_intervencion = ?, resultado_cita = ?, estado_derivacion_cesfam_actual = ?,
-                    confirmacion_gestion_hora_cesfam = ?, fechas_sesiones_cesfam = ?,
-                    bitacora_sesion = ?
-                WHERE id_seguimiento = ?
-            ''', (form.fecha_sesion.data, form.trabajadora_social_sesion.data, form.psicologo_sesion.data, form.tipo_intervencion.data, form.resultado_cita.data, form.estado_derivacion_cesfam_actual.data, form.confirmacion_gestion_hora_cesfam.data, form.fechas_sesiones_cesfam.data, form.bitacora_sesion.data, id_seguimiento))
+                    fecha_sesion = :fecha_sesion, trabajadora_social_sesion = :trabajadora_social_sesion, psicologo_sesion = :psicologo_sesion,
+                    tipo_intervencion = :tipo_intervencion, resultado_cita = :resultado_cita, estado_derivacion_cesfam_actual = :estado_derivacion_cesfam_actual,
+                    confirmacion_gestion_hora_cesfam = :confirmacion_gestion_hora_cesfam, fechas_sesiones_cesfam = :fechas_sesiones_cesfam,
+                    bitacora_sesion = :bitacora_sesion
+                WHERE id_seguimiento = :id_seguimiento
+            ''', dict(valores_nuevos, id_seguimiento=id_seguimiento))
+            actualizar_ultima_sesion(cursor, seguimiento['rut_estudiante'])
             conn_post.commit()
+            # Auditoría: se escribe después, fuera de la petición (ver auditoria.py).
+            escritor_auditoria.registrar(current_user.nombre_completo or current_user.username, auditoria.ACCION_EDICION,
+                                         'Seguimiento', id_seguimiento, auditoria.cambios_de_edicion(seguimiento, valores_nuevos))
             flash('Seguimiento actualizado exitosamente.', 'success')
             return redirect(url_for('detalle_estudiante', rut_estudiante=seguimiento['rut_estudiante']))
         except Exception as e:
             if conn_post: conn_post.rollback()
             app.logger.error(f"Error al actualizar seguimiento (ID: {id_seguimiento}): {e}", exc_info=True)
             flash(f"Error al guardar los cambios del seguimiento: {e}", 'danger')
-        finally:
-            if conn_post: conn_post.close()
 
     if request.method == 'GET':
         form.fecha_sesion.data = datetime.strptime(seguimiento['fecha_sesion'], '%Y-%m-%d').date() if seguimiento['fecha_sesion'] else None
@@ -1066,6 +1526,149 @@ def editar_seguimiento(id_seguimiento):
 
     return render_template('editar_seguimiento.html', form=form, seguimiento=seguimiento, estudiante=estudiante, mostrar_seccion_derivacion=mostrar_seccion_derivacion)
 
+FILAS_POR_BLOQUE_CSV = 500
+
+def respuesta_csv_en_bloques(cursor, nombre_archivo, mensaje_sin_datos):
+    """
+    Respuesta CSV que se genera mientras se envía: lee el cursor (ya ejecutado) con
+    fetchmany y emite un bloque por cada FILAS_POR_BLOQUE_CSV filas, con el BOM de
+    UTF-8 sólo al inicio (para que Excel reconozca los acentos). La memoria usada no
+    depende del número de filas.
+    """
+    column_names = [description[0] for description in cursor.description]
+
+    def generar():
+        output = io.StringIO()
+        writer = csv.writer(output, quoting=csv.QUOTE_ALL)
+        filas = cursor.fetchmany(FILAS_POR_BLOQUE_CSV)
+        if filas:
+            writer.writerow(column_names)
+        else:
+            writer.writerow([mensaje_sin_datos])
+        prefijo = codecs.BOM_UTF8
+        try:
+            while filas:
+                writer.writerows(filas)
+                yield prefijo + output.getvalue().encode('utf-8')
+                prefijo = b''
+                output.seek(0)
+                output.truncate(0)
+                filas = cursor.fetchmany(FILAS_POR_BLOQUE_CSV)
+            if prefijo:
+                yield prefijo + output.getvalue().encode('utf-8')
+        except Exception as e:
+            # La respuesta ya comenzó: se registra el error y se vuelve a lanzar para que el
+            # servidor corte la conexión sin cerrar la respuesta. Así el navegador marca la
+            # descarga como fallida en vez de guardar un CSV truncado como si estuviera completo.
+            app.logger.error(f"Error al generar {nombre_archivo}: {e}", exc_info=True)
+            raise
+        finally:
+            cursor.close()
+
+    return Response(stream_with_context(generar()), mimetype="text/csv; charset=utf-8-sig",
+                    headers={"Content-Disposition": f"attachment;filename={nombre_archivo}"})
+
+# Consultas de las descargas; las usan las versiones CSV y XLSX.
+SQL_EXPORTAR_ESTUDIANTES = "SELECT * FROM Estudiantes ORDER BY apellido_paterno, apellido_materno, nombre"
+
+SQL_EXPORTAR_SEGUIMIENTOS = """
+    SELECT s.*, e.fecha_ingreso_programa, NOT s.es_vigente as fue_corregido
+    FROM Seguimientos s
+    INNER JOIN Estudiantes e ON s.rut_estudiante = e.rut
+    ORDER BY s.rut_estudiante, s.fecha_sesion
+"""
+
+# Une la tabla de Periodos con la de Estudiantes para tener toda la información en un
+# solo lugar: el informe ideal para análisis históricos y de cohortes.
+SQL_EXPORTAR_PERIODOS = """
+    SELECT
+        pa.id as id_periodo,
+        pa.rut_estudiante,
+        e.nombre,
+        e.apellido_paterno,
+        e.apellido_materno,
+        pa.fecha_ingreso,
+        pa.motivo_ingreso,
+        pa.estado_periodo,
+        pa.fecha_alta
+    FROM PeriodosAtencion pa
+    JOIN Estudiantes e ON pa.rut_estudiante = e.rut
+    ORDER BY pa.rut_estudiante, pa.fecha_ingreso
+"""
+
+FILAS_POR_BLOQUE_XLSX = 1000
+TAMANO_BLOQUE_ENVIO = 1 << 16
+
+def es_columna_fecha(nombre):
+    """Columnas guardadas como texto 'AAAA-MM-DD' (fecha_*, no fechas_sesiones_cesfam, que es texto libre)."""
+    return nombre.startswith('fecha_') or nombre == 'extension_programa_otorgada'
+
+def _valor_xlsx(hoja, valor, es_fecha):
+    if isinstance(valor, str):
+        if es_fecha:
+            try:
+                return date.fromisoformat(valor) if len(valor) == 10 else datetime.fromisoformat(valor)
+            except ValueError:
+                pass  # Se deja como texto, tal como está guardado.
+        valor = ILLEGAL_CHARACTERS_RE.sub('', valor)
+        if valor.startswith('='):
+            # Sin esto openpyxl lo guardaría como fórmula.
+            celda = WriteOnlyCell(hoja, valor)
+            celda.data_type = 's'
+            return celda
+    return valor
+
+def escribir_xlsx(cursor, archivo, nombre_hoja, mensaje_sin_datos):
+    """
+    Escribe en `archivo` un libro .xlsx con una hoja `nombre_hoja` con las filas del
+    cursor (ya ejecutado). Usa el modo de sólo escritura de openpyxl, que va volcando
+    las filas a disco, y lee el cursor con fetchmany: la memoria usada no depende del
+    número de filas. Las fechas y los números quedan como celdas de fecha y numéricas.
+    """
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet(nombre_hoja)
+    columnas = [description[0] for description in cursor.description]
+    fechas = [es_columna_fecha(nombre) for nombre in columnas]
+    filas = cursor.fetchmany(FILAS_POR_BLOQUE_XLSX)
+    if filas:
+        hoja.freeze_panes = 'A2'
+        hoja.append(columnas)
+    else:
+        hoja.append([mensaje_sin_datos])
+    while filas:
+        for fila in filas:
+            hoja.append([_valor_xlsx(hoja, valor, es_fecha) for valor, es_fecha in zip(fila, fechas)])
+        filas = cursor.fetchmany(FILAS_POR_BLOQUE_XLSX)
+    libro.save(archivo)
+
+def respuesta_xlsx(cursor, nombre_archivo, nombre_hoja, mensaje_sin_datos):
+    """
+    Respuesta .xlsx generada con escribir_xlsx. Un .xlsx es un zip que se cierra al
+    final, así que el libro se arma primero en un archivo temporal (que se borra al
+    terminar de enviarlo) y después se envía por bloques.
+    """
+    archivo = tempfile.TemporaryFile()
+    try:
+        escribir_xlsx(cursor, archivo, nombre_hoja, mensaje_sin_datos)
+    except BaseException:
+        archivo.close()
+        raise
+    finally:
+        cursor.close()
+    tamano = archivo.tell()
+    archivo.seek(0)
+
+    def enviar():
+        try:
+            for bloque in iter(lambda: archivo.read(TAMANO_BLOQUE_ENVIO), b''):
+                yield bloque
+        finally:
+            archivo.close()
+
+    return Response(enviar(), mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    headers={"Content-Disposition": f"attachment;filename={nombre_archivo}",
+                             "Content-Length": str(tamano)})
+
 @app.route('/descargar/estudiantes_csv')
 @login_required
 def descargar_estudiantes_csv():
@@ -1074,24 +1677,13 @@ def descargar_estudiantes_csv():
         return redirect(url_for('index'))
     conn = None
     try:
-        conn = get_db_connection()
+        conn = get_db()
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM Estudiantes ORDER BY apellido_paterno, apellido_materno, nombre")
-        lista_estudiantes = cursor.fetchall()
-        output = io.StringIO()
-        writer = csv.writer(output, quoting=csv.QUOTE_ALL)
-        if lista_estudiantes:
-            column_names = [description[0] for description in cursor.description]
-            writer.writerow(column_names)
-            for estudiante_row in lista_estudiantes: writer.writerow(estudiante_row)
-        else: writer.writerow(["No hay datos de estudiantes para descargar."])
-        csv_data = output.getvalue().encode('utf-8-sig')
-        return Response(csv_data, mimetype="text/csv; charset=utf-8-sig", headers={"Content-Disposition": "attachment;filename=estudiantes_seguimiento.csv"})
+        cursor.execute(SQL_EXPORTAR_ESTUDIANTES)
+        return respuesta_csv_en_bloques(cursor, "estudiantes_seguimiento.csv", "No hay datos de estudiantes para descargar.")
     except Exception as e:
         app.logger.error(f"Error al generar CSV de estudiantes: {e}", exc_info=True)
         return "Error al generar el archivo CSV de estudiantes.", 500
-    finally:
-        if conn: conn.close()
 
 @app.route('/descargar/seguimientos_csv')
 @login_required
@@ -1102,37 +1694,13 @@ def descargar_seguimientos_csv():
 
     conn = None
     try:
-        conn = get_db_connection()
+        conn = get_db()
         cursor = conn.cursor()
-        query_avanzada = """
-            SELECT s.*, e.fecha_ingreso_programa,
-                (EXISTS (SELECT 1 FROM Seguimientos s2 WHERE s2.corrige_id_seguimiento = s.id_seguimiento) OR
-                    (s.es_correccion = 1 AND EXISTS (
-                        SELECT 1 FROM Seguimientos s2 WHERE s2.es_correccion = 1 AND
-                        s2.corrige_id_seguimiento = s.corrige_id_seguimiento AND s2.id_seguimiento > s.id_seguimiento
-                    ))) as fue_corregido
-            FROM Seguimientos s
-            INNER JOIN Estudiantes e ON s.rut_estudiante = e.rut
-            ORDER BY s.rut_estudiante, s.fecha_sesion
-        """
-        cursor.execute(query_avanzada)
-        lista_seguimientos = cursor.fetchall()
-        output = io.StringIO()
-        writer = csv.writer(output, quoting=csv.QUOTE_ALL)
-        if lista_seguimientos:
-            column_names = [description[0] for description in cursor.description]
-            writer.writerow(column_names)
-            for seguimiento_row in lista_seguimientos: writer.writerow(seguimiento_row)
-        else: writer.writerow(["No hay datos de seguimientos para descargar."])
-        csv_data = output.getvalue().encode('utf-8-sig')
-        return Response(csv_data, mimetype="text/csv; charset=utf-8-sig", headers={"Content-Disposition": "attachment;filename=seguimientos_programa.csv"})
+        cursor.execute(SQL_EXPORTAR_SEGUIMIENTOS)
+        return respuesta_csv_en_bloques(cursor, "seguimientos_programa.csv", "No hay datos de seguimientos para descargar.")
     except Exception as e:
         app.logger.error(f"Error al generar CSV de seguimientos: {e}", exc_info=True)
         return "Error al generar el archivo CSV de seguimientos.", 500
-    finally:
-        if conn: conn.close()
-
-# En app.py
 
 @app.route('/descargar/periodos_csv')
 @login_required
@@ -1144,57 +1712,53 @@ def descargar_periodos_csv():
     """
     conn = None
     try:
-        conn = get_db_connection()
+        conn = get_db()
         cursor = conn.cursor()
+        cursor.execute(SQL_EXPORTAR_PERIODOS)
 
-        # Esta consulta SQL une la tabla de Periodos con la de Estudiantes
-        # para tener toda la información en un solo lugar.
-        query = """
-            SELECT
-                pa.id as id_periodo,
-                pa.rut_estudiante,
-                e.nombre,
-                e.apellido_paterno,
-                e.apellido_materno,
-                pa.fecha_ingreso,
-                pa.motivo_ingreso,
-                pa.estado_periodo,
-                pa.fecha_alta
-            FROM PeriodosAtencion pa
-            JOIN Estudiantes e ON pa.rut_estudiante = e.rut
-            ORDER BY pa.rut_estudiante, pa.fecha_ingreso
-        """
-        cursor.execute(query)
-        lista_periodos = cursor.fetchall()
-        
-        output = io.StringIO()
-        writer = csv.writer(output, quoting=csv.QUOTE_ALL)
-
-        if lista_periodos:
-            # Escribimos los nombres de las columnas en el CSV
-            column_names = [description[0] for description in cursor.description]
-            writer.writerow(column_names)
-            # Escribimos cada fila de datos
-            for periodo_row in lista_periodos:
-                writer.writerow(periodo_row)
-        else:
-            writer.writerow(["No hay datos de periodos de atencion para descargar."])
-        
-        # Preparamos el archivo para la descarga
-        csv_data = output.getvalue().encode('utf-8-sig')
-        return Response(
-            csv_data,
-            mimetype="text/csv; charset=utf-8-sig",
-            headers={"Content-Disposition": "attachment;filename=informe_periodos_atencion.csv"}
-        )
+        # El archivo se envía por bloques a medida que se leen las filas
+        return respuesta_csv_en_bloques(cursor, "informe_periodos_atencion.csv",
+                                        "No hay datos de periodos de atencion para descargar.")
 
     except Exception as e:
         app.logger.error(f"Error al generar CSV de periodos de atencion: {e}", exc_info=True)
         flash("Ocurrió un error al generar el informe de periodos de atención.", "danger")
         return redirect(url_for('index'))
-    finally:
-        if conn:
-            conn.close()
+
+@app.route('/descargar/estudiantes_xlsx')
+@login_required
+@admin_required
+def descargar_estudiantes_xlsx():
+    try:
+        cursor = get_db().execute(SQL_EXPORTAR_ESTUDIANTES)
+        return respuesta_xlsx(cursor, "estudiantes_seguimiento.xlsx", "Estudiantes", "No hay datos de estudiantes para descargar.")
+    except Exception as e:
+        app.logger.error(f"Error al generar XLSX de estudiantes: {e}", exc_info=True)
+        return "Error al generar el archivo XLSX de estudiantes.", 500
+
+@app.route('/descargar/seguimientos_xlsx')
+@login_required
+@admin_required
+def descargar_seguimientos_xlsx():
+    try:
+        cursor = get_db().execute(SQL_EXPORTAR_SEGUIMIENTOS)
+        return respuesta_xlsx(cursor, "seguimientos_programa.xlsx", "Seguimientos", "No hay datos de seguimientos para descargar.")
+    except Exception as e:
+        app.logger.error(f"Error al generar XLSX de seguimientos: {e}", exc_info=True)
+        return "Error al generar el archivo XLSX de seguimientos.", 500
+
+@app.route('/descargar/periodos_xlsx')
+@login_required
+@admin_required
+def descargar_periodos_xlsx():
+    try:
+        cursor = get_db().execute(SQL_EXPORTAR_PERIODOS)
+        return respuesta_xlsx(cursor, "informe_periodos_atencion.xlsx", "Periodos de Atención",
+                              "No hay datos de periodos de atencion para descargar.")
+    except Exception as e:
+        app.logger.error(f"Error al generar XLSX de periodos de atencion: {e}", exc_info=True)
+        flash("Ocurrió un error al generar el informe de periodos de atención.", "danger")
+        return redirect(url_for('index'))
 
 @app.route('/seguimiento/<int:id_seguimiento>/eliminar', methods=['POST'])
 @login_required
@@ -1205,16 +1769,20 @@ def eliminar_seguimiento(id_seguimiento):
     conn = None
     rut_estudiante_para_redirigir = None
     try:
-        conn = get_db_connection()
+        conn = get_db()
         cursor = conn.cursor()
-        cursor.execute("SELECT rut_estudiante FROM Seguimientos WHERE id_seguimiento = ?", (id_seguimiento,))
+        cursor.execute("SELECT * FROM Seguimientos WHERE id_seguimiento = ?", (id_seguimiento,))
         seguimiento_a_eliminar = cursor.fetchone()
         if not seguimiento_a_eliminar:
             flash('Seguimiento no encontrado.', 'danger')
             return redirect(request.referrer or url_for('index'))
         rut_estudiante_para_redirigir = seguimiento_a_eliminar['rut_estudiante']
+        retirar_version_seguimiento(cursor, id_seguimiento)
         cursor.execute("DELETE FROM Seguimientos WHERE id_seguimiento = ?", (id_seguimiento,))
+        actualizar_ultima_sesion(cursor, rut_estudiante_para_redirigir)
         conn.commit()
+        escritor_auditoria.registrar(current_user.nombre_completo or current_user.username, auditoria.ACCION_ELIMINACION,
+                                     'Seguimiento', id_seguimiento, auditoria.cambios_de_eliminacion(seguimiento_a_eliminar))
         flash('El seguimiento ha sido eliminado exitosamente.', 'success')
     except Exception as e:
         if conn: conn.rollback()
@@ -1223,8 +1791,6 @@ def eliminar_seguimiento(id_seguimiento):
         if rut_estudiante_para_redirigir:
             return redirect(url_for('detalle_estudiante', rut_estudiante=rut_estudiante_para_redirigir))
         return redirect(url_for('index'))
-    finally:
-        if conn: conn.close()
     if rut_estudiante_para_redirigir:
         return redirect(url_for('detalle_estudiante', rut_estudiante=rut_estudiante_para_redirigir))
     return redirect(url_for('index'))
@@ -1239,9 +1805,9 @@ def cambiar_password():
             return redirect(url_for('cambiar_password'))
         conn = None
         try:
-            conn = get_db_connection()
+            conn = get_db()
             cursor = conn.cursor()
-            new_password_hash = generate_password_hash(form.new_password.data, method='pbkdf2:sha256')
+            new_password_hash = verificador_contrasenas.generar_hash(form.new_password.data)
             cursor.execute("UPDATE Usuarios SET password_hash = ? WHERE id = ?", (new_password_hash, current_user.id))
             conn.commit()
             flash('Tu contraseña ha sido actualizada exitosamente. Por favor, inicia sesión de nuevo.', 'success')
@@ -1252,8 +1818,6 @@ def cambiar_password():
             app.logger.error(f"Error al cambiar contraseña para usuario ID {current_user.id}: {e}", exc_info=True)
             flash('Ocurrió un error al intentar cambiar tu contraseña.', 'danger')
             return redirect(url_for('cambiar_password'))
-        finally:
-            if conn: conn.close()
     return render_template('cambiar_password.html', form=form)
 
 @app.route('/dashboard')
@@ -1262,51 +1826,41 @@ def cambiar_password():
 def dashboard():
     conn = None
     try:
-        conn = get_db_connection()
+        conn = get_db()
         cursor = conn.cursor()
 
-        cursor.execute("SELECT estado_en_programa, COUNT(*) as total FROM Estudiantes GROUP BY estado_en_programa")
+        # Los conteos vienen de las tablas Resumen*, que mantienen los triggers
+        # (ver crear_resumenes_dashboard en database.py).
+        cursor.execute("SELECT estado as estado_en_programa, total FROM ResumenEstados ORDER BY estado")
         datos_estados = cursor.fetchall()
         labels_estados = [row['estado_en_programa'] for row in datos_estados]
         data_estados = [row['total'] for row in datos_estados]
 
         cursor.execute("""
-            SELECT 
-                TRIM(carrera_programa) as carrera_limpia, 
-                COUNT(*) as total 
-            FROM Estudiantes 
-            GROUP BY carrera_limpia 
-            ORDER BY total DESC 
+            SELECT carrera as carrera_limpia, total
+            FROM ResumenCarreras
+            ORDER BY total DESC, carrera
             LIMIT 10
         """)
         datos_carreras = cursor.fetchall()
         labels_carreras = [row['carrera_limpia'] for row in datos_carreras]
         data_carreras = [row['total'] for row in datos_carreras]
 
-        cursor.execute("""
-            SELECT strftime('%Y-%m', s.fecha_sesion) as mes, COUNT(s.id_seguimiento) as total
-            FROM Seguimientos s
-            WHERE s.fecha_sesion IS NOT NULL AND NOT EXISTS (SELECT 1 FROM Seguimientos s2 WHERE s2.corrige_id_seguimiento = s.id_seguimiento)
-            GROUP BY mes ORDER BY mes
-        """)
+        cursor.execute("SELECT mes, total FROM ResumenSeguimientosMes ORDER BY mes")
         datos_seguimientos = cursor.fetchall()
         labels_seguimientos = [row['mes'] for row in datos_seguimientos]
         data_seguimientos = [row['total'] for row in datos_seguimientos]
 
-        cursor.execute("""
-            SELECT strftime('%Y', fecha_ingreso_programa) as anio, tentativa_ideacion
-            FROM Estudiantes
-            WHERE tentativa_ideacion IN ('Ideación', 'Tentativa')
-        """)
-        datos_ideacion_raw = cursor.fetchall()
+        cursor.execute("SELECT anio, tipo as tentativa_ideacion, total FROM ResumenIdeacionAnio")
+        datos_ideacion = cursor.fetchall()
         datos_pivot = {}
-        for row in datos_ideacion_raw:
+        for row in datos_ideacion:
             anio = row['anio']
             tipo = row['tentativa_ideacion']
             if anio not in datos_pivot:
                 datos_pivot[anio] = {'Ideación': 0, 'Tentativa': 0}
             if tipo in datos_pivot[anio]:
-                datos_pivot[anio][tipo] += 1
+                datos_pivot[anio][tipo] += row['total']
         labels_ideacion_anio = sorted(datos_pivot.keys())
         data_ideacion = [datos_pivot.get(anio, {}).get('Ideación', 0) for anio in labels_ideacion_anio]
         data_tentativa = [datos_pivot.get(anio, {}).get('Tentativa', 0) for anio in labels_ideacion_anio]
@@ -1324,9 +1878,6 @@ def dashboard():
         traceback.print_exc()
         flash('Ocurrió un error muy grave al generar los datos del dashboard. Revisa los logs.', 'danger')
         return redirect(url_for('index'))
-    finally:
-        if conn:
-            conn.close()
 
 
 @app.route('/reportes')
@@ -1350,29 +1901,49 @@ def login():
         password_form = form.password.data
         conn = None
         try:
-            conn = get_db_connection()
+            conn = get_db()
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM Usuarios WHERE username = ?", (username_form,))
             user_data = cursor.fetchone()
             if user_data:
                 user_obj = User(id=user_data['id'], username=user_data['username'], password_hash=user_data['password_hash'], rol=user_data['rol'], nombre_completo=user_data['nombre_completo'], activo=user_data['activo'])
                 if user_obj.activo and user_obj.check_password(password_form):
+                    if verificador_contrasenas.necesita_rehash(user_obj.password_hash):
+                        actualizar_hash_contrasena(conn, user_obj, password_form)
                     login_user(user_obj, remember=form.remember_me.data)
                     app.logger.info(f"Inicio de sesión exitoso para el usuario '{username_form}'")
                     next_page = request.args.get('next')
                     if not next_page or not next_page.startswith('/'):
                         next_page = url_for('index')
                     return redirect(next_page)
+        except VerificacionesSaturadas:
+            app.logger.warning(f"Inicio de sesión rechazado por exceso de verificaciones en curso: '{username_form}'")
+            flash("Hay muchos inicios de sesión en curso. Intenta nuevamente en unos segundos.", "warning")
+            return render_template('login.html', form=form), 503
         except Exception as e:
             app.logger.error(f"Error durante el login: {e}", exc_info=True)
             flash("Ocurrió un error durante el inicio de sesión.", "danger")
-        finally:
-            if conn:
-                conn.close()
         flash('Nombre de usuario o contraseña incorrectos, o la cuenta está inactiva.', 'danger')
         app.logger.warning(f"Intento de inicio de sesión fallido para el usuario: '{username_form}'")
     return render_template('login.html', form=form)
 
+def actualizar_hash_contrasena(conn, user_obj, password):
+    """
+    Rehace el hash de `user_obj` con el método configurado. Sólo se llama tras verificar
+    la contraseña; si falla, el inicio de sesión sigue con el hash anterior.
+    """
+    try:
+        nuevo_hash = verificador_contrasenas.generar_hash(password)
+        # La condición sobre el hash anterior evita pisar un cambio de contraseña simultáneo.
+        conn.execute("UPDATE Usuarios SET password_hash = ? WHERE id = ? AND password_hash = ?",
+                     (nuevo_hash, user_obj.id, user_obj.password_hash))
+        conn.commit()
+        user_obj.password_hash = nuevo_hash
+        app.logger.info(f"Hash de contraseña actualizado a '{verificador_contrasenas.metodo}' para el usuario '{user_obj.username}'")
+    except (VerificacionesSaturadas, sqlite3.Error) as e:
+        if conn.in_transaction: conn.rollback()
+        app.logger.warning(f"No se pudo actualizar el hash de contraseña de '{user_obj.username}': {e}")
+
 @app.route('/logout')
 @login_required
 def logout():
@@ -1380,6 +1951,9 @@ def logout():
     flash('Has cerrado sesión exitosamente.', 'info')
     return redirect(url_for('login'))
 
+# Resultados de /api/reporte_periodos por (inicio, fin, agrupar_por, versiones de tablas).
+resultados_reportes = CacheTTL(ttl=app.config['TTL_REPORTES'], max_entradas=128)
+
 @app.route('/api/reporte_periodos')
 @login_required
 @roles_required('admin', 'profesional', 'ingreso')
@@ -1405,42 +1979,42 @@ def api_reporte_periodos():
     if agrupar_por not in columnas_permitidas:
         return jsonify({'error': 'Parámetro para agrupar no válido'}), 400
 
+    # Fechas normalizadas (AAAA-MM-DD): así "2024-3-1" y "2024-03-01" comparten la
+    # misma entrada de la caché y la comparación de texto con fecha_ingreso es correcta.
+    try:
+        fecha_inicio = date.fromisoformat(fecha_inicio.strip()).isoformat()
+        fecha_fin = date.fromisoformat(fecha_fin.strip()).isoformat()
+    except ValueError:
+        return jsonify({'error': 'Las fechas deben tener el formato AAAA-MM-DD'}), 400
+
     columna_sql = columnas_permitidas[agrupar_por]
     
     conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # La consulta ahora es dinámica. Usamos f-string de forma SEGURA 
-        # porque hemos validado 'columna_sql' contra nuestra lista blanca.
-        query = f"""
-            SELECT
-                {columna_sql} as dimension,
-                COUNT(pa.id) as total
-            FROM PeriodosAtencion pa
-            JOIN Estudiantes e ON pa.rut_estudiante = e.rut
-            WHERE pa.fecha_ingreso BETWEEN ? AND ?
-            GROUP BY dimension
-            ORDER BY total DESC
-        """
-        
-        cursor.execute(query, (fecha_inicio, fecha_fin))
-        datos_db = cursor.fetchall()
-
-        reporte_data = {
-            'labels': [row['dimension'] if row['dimension'] else 'No registrado' for row in datos_db],
-            'data': [row['total'] for row in datos_db]
-        }
-
-        return jsonify(reporte_data)
-
+        conn = get_db()
+
+        def calcular_reporte():
+            # La consulta ahora es dinámica. Se completa de forma SEGURA
+            # porque hemos validado 'columna_sql' contra nuestra lista blanca.
+            query = SQL_REPORTE_PERIODOS.format(dimension=columna_sql)
+            with limite_de_tiempo(conn, app.config['TIEMPO_MAXIMO_REPORTE']):
+                datos_db = conn.execute(query, (fecha_inicio, fecha_fin)).fetchall()
+            return {
+                'labels': [row['dimension'] if row['dimension'] else 'No registrado' for row in datos_db],
+                'data': [row['total'] for row in datos_db]
+            }
+
+        # La versión de las tablas en la clave hace que cualquier escritura (de cualquier
+        # proceso) deje obsoletos los resultados anteriores sin tener que borrarlos.
+        clave = (fecha_inicio, fecha_fin, agrupar_por, versiones_tablas(conn, ('Estudiantes', 'PeriodosAtencion')))
+        return jsonify(resultados_reportes.obtener(clave, calcular_reporte))
+
+    except TiempoConsultaAgotado:
+        app.logger.warning(f"Reporte interrumpido por tiempo: {fecha_inicio} a {fecha_fin}, agrupado por {agrupar_por}")
+        return jsonify({'error': 'El reporte tardó demasiado. Pruebe con un rango de fechas más corto.'}), 503
     except Exception as e:
         app.logger.error(f"Error en la API de reportes: {e}", exc_info=True)
         return jsonify({'error': 'Ocurrió un error al procesar la solicitud'}), 500
-    finally:
-        if conn:
-            conn.close()
 
 if __name__ == '__main__':
     is_debug_mode = os.environ.get('FLASK_DEBUG', 'False').lower() == 'true'
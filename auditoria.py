@@ -0,0 +1,276 @@
+# auditoria.py
+"""
+Auditoría de las ediciones y eliminaciones de seguimientos, escrita fuera de la petición.
+
+Cada edición o eliminación de un seguimiento deja un registro en HistorialCambios
+(modelo_afectado = 'Seguimiento', id_registro_afectado = id_seguimiento) con sus campos
+en HistorialCambiosDetalle: en una edición, el valor anterior y el nuevo de cada campo
+modificado; en una eliminación, todos los valores que tenía (el nuevo queda vacío).
+
+La petición no escribe estos registros: después de su commit los deja en la cola de
+EscritorAuditoria y responde. Un hilo del proceso los toma de a grupos (hasta
+MAX_POR_LOTE, o los que llegaron en ESPERA_MAXIMA segundos) y escribe cada grupo en una
+sola transacción, así diez ediciones simultáneas cuestan un commit y no diez. La fecha
+de cada registro es la del cambio, no la de la escritura.
+
+Si la cola está llena (la base no da abasto) o el hilo murió (no pudo abrir la base o
+el archivo de pendientes), el registro se escribe en el momento, en el hilo de la
+petición. Un lote que no se puede escribir porque la base sigue bloqueada se reintenta
+REINTENTOS veces. Ningún registro se descarta: lo que no se pudo escribir (tras los
+reintentos, por otro error o en la escritura en el momento) se agrega al archivo de
+pendientes ('<ruta_bd>' + SUFIJO_PENDIENTES, una línea JSON por registro), y el hilo lo
+vuelve a intentar al arrancar y después de cada lote escrito; si en la petición tampoco
+se puede escribir ese archivo, el registro completo queda en el log. Al terminar el proceso se
+vacía la cola (atexit), o se pasa al archivo de pendientes si el hilo murió; un registro
+puede perderse si el proceso muere de golpe dentro de esos ESPERA_MAXIMA segundos.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from database import get_db_connection, registrar_cambios, valor_historial
+
+MAX_POR_LOTE = 200
+ESPERA_MAXIMA = 0.5  # segundos
+MAX_PENDIENTES = 10000
+REINTENTOS = 5
+PAUSA_REINTENTO = 1.0  # segundos, si la base está bloqueada
+SUFIJO_PENDIENTES = '.auditoria-pendiente.jsonl'
+
+ACCION_EDICION = 'Edición de Seguimiento'
+ACCION_ELIMINACION = 'Eliminación de Seguimiento'
+
+RegistroAuditoria = namedtuple('RegistroAuditoria', ['fecha_cambio', 'nombre_usuario', 'accion', 'modelo', 'id_registro', 'cambios'])
+
+registro_log = logging.getLogger(__name__)
+
+
+def cambios_de_edicion(anterior, nuevo):
+    """[(campo, anterior, nuevo), ...] de los campos de `nuevo` cuyo valor difiere en `anterior`."""
+    return [(campo, anterior[campo], valor) for campo, valor in nuevo.items()
+            if valor_historial(anterior[campo]) != valor_historial(valor)]
+
+
+def cambios_de_eliminacion(fila):
+    """[(campo, valor, None), ...] con los valores no vacíos de la fila eliminada."""
+    return [(campo, fila[campo], None) for campo in fila.keys() if valor_historial(fila[campo]) is not None]
+
+
+def escribir_lote(conn, registros):
+    """Escribe `registros` en una sola transacción. Devuelve cuántos escribió."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        cursor = conn.cursor()
+        for r in registros:
+            registrar_cambios(cursor, r.nombre_usuario, r.accion, r.modelo, r.id_registro, r.cambios, r.fecha_cambio)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return len(registros)
+
+
+class EscritorAuditoria:
+    """
+    Cola de registros de auditoría y el hilo que los escribe por grupos.
+
+    Uso:
+        escritor = EscritorAuditoria(ruta_bd)
+        escritor.registrar('Ana Pérez', ACCION_EDICION, 'Seguimiento', 123, cambios)
+
+    El hilo y su conexión se crean con el primer registro de cada proceso, de modo que
+    la instancia se puede crear al importar la aplicación, antes del fork de gunicorn.
+    """
+
+    def __init__(self, ruta_bd, max_por_lote=MAX_POR_LOTE, espera_maxima=ESPERA_MAXIMA, max_pendientes=MAX_PENDIENTES):
+        self.ruta_bd = ruta_bd
+        self.ruta_pendientes = ruta_bd + SUFIJO_PENDIENTES
+        self.max_por_lote = max_por_lote
+        self.espera_maxima = espera_maxima
+        self.max_pendientes = max_pendientes
+        self._lock = threading.Lock()
+        self._lock_pendientes = threading.Lock()
+        self._pid = None
+        self.escritos = self.lotes = self.sincronos = self.pendientes = 0
+
+    def _iniciar(self):
+        # Tras un fork la cola y el hilo del padre no sirven: cada proceso tiene los suyos.
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._cola = queue.Queue(maxsize=self.max_pendientes)
+            self._hilo = threading.Thread(target=self._trabajar, name='escritor-auditoria', daemon=True)
+            self._pid = os.getpid()
+            self._hilo.start()
+            atexit.register(self.cerrar)
+
+    def registrar(self, nombre_usuario, accion, modelo, id_registro, cambios):
+        """Deja en la cola el registro de un cambio ya confirmado. No escribe nada si `cambios` está vacío."""
+        if not cambios:
+            return
+        registro = RegistroAuditoria(datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
+                                     nombre_usuario, accion, modelo, str(id_registro), cambios)
+        if self._pid != os.getpid():
+            self._iniciar()
+        if not self._hilo.is_alive():
+            self._escribir_en_el_momento(registro)
+            return
+        try:
+            self._cola.put_nowait(registro)
+        except queue.Full:
+            self._escribir_en_el_momento(registro)
+
+    def _escribir_en_el_momento(self, registro):
+        """
+        Escribe un registro en el hilo de la petición; si no se puede, va a pendientes.
+        Nunca lanza: el cambio auditado ya está confirmado y la petición no debe fallar.
+        """
+        try:
+            conn = get_db_connection(self.ruta_bd)
+            try:
+                escribir_lote(conn, [registro])
+            finally:
+                conn.close()
+        except (sqlite3.Error, OSError) as e:
+            registro_log.error(f"Auditoría: no se pudo escribir un registro en el momento ({e}).")
+            try:
+                self._guardar_pendientes([registro])
+            except OSError as e:
+                # Ni la base ni el archivo: el registro queda completo en el log de errores.
+                registro_log.error(f"Auditoría: no se pudo guardar en '{self.ruta_pendientes}' ({e}); "
+                                   f"registro: {json.dumps(registro._asdict(), ensure_ascii=False, default=str)}")
+            return
+        self.sincronos += 1
+
+    def _siguiente_lote(self):
+        """Espera el primer registro y junta los que lleguen hasta `espera_maxima` después."""
+        lote = [self._cola.get()]
+        limite = time.monotonic() + self.espera_maxima
+        while lote[-1] is not None and len(lote) < self.max_por_lote:
+            restante = limite - time.monotonic()
+            try:
+                lote.append(self._cola.get(timeout=restante) if restante > 0 else self._cola.get_nowait())
+            except queue.Empty:
+                break
+        return lote
+
+    def _guardar_pendientes(self, registros):
+        """Agrega `registros` al archivo de pendientes (una línea JSON cada uno)."""
+        lineas = ''.join(json.dumps(r._asdict(), ensure_ascii=False, default=str) + '\n' for r in registros)
+        with self._lock_pendientes, open(self.ruta_pendientes, 'a', encoding='utf-8') as archivo:
+            archivo.write(lineas)
+            archivo.flush()
+            os.fsync(archivo.fileno())
+        self.pendientes += len(registros)
+        registro_log.error(f"Auditoría: {len(registros)} registros quedaron en '{self.ruta_pendientes}'.")
+
+    def recuperar_pendientes(self, conn):
+        """Escribe los registros del archivo de pendientes y lo borra. Devuelve cuántos escribió."""
+        if not os.path.exists(self.ruta_pendientes):
+            return 0
+        # Renombrarlo lo reserva para este proceso: otro que llegue después ya no lo encuentra.
+        reservado = f"{self.ruta_pendientes}.{os.getpid()}"
+        try:
+            os.replace(self.ruta_pendientes, reservado)
+        except FileNotFoundError:
+            return 0
+        registros = []
+        with open(reservado, encoding='utf-8') as archivo:
+            for linea in archivo:
+                try:
+                    registros.append(RegistroAuditoria(**json.loads(linea)))
+                except (ValueError, TypeError):
+                    # Una línea a medio escribir (el proceso murió escribiéndola): queda en el log.
+                    if linea.strip():
+                        registro_log.error(f"Auditoría: línea pendiente ilegible: {linea.strip()}")
+        try:
+            escritos = escribir_lote(conn, registros) if registros else 0
+        except Exception as e:
+            registro_log.error(f"Auditoría: no se pudieron escribir los registros pendientes ({e}).")
+            self._guardar_pendientes(registros)
+            escritos = 0
+        os.remove(reservado)
+        if escritos:
+            registro_log.warning(f"Auditoría: se escribieron {escritos} registros pendientes.")
+        return escritos
+
+    def _escribir(self, conn, registros):
+        """Escribe un lote, con reintentos si la base está bloqueada; si no se puede, va a pendientes."""
+        for intento in range(1, REINTENTOS + 1):
+            try:
+                self.escritos += escribir_lote(conn, registros)
+                self.lotes += 1
+                return True
+            except sqlite3.OperationalError as e:
+                # Base bloqueada más allá de busy_timeout: se reintenta antes de rendirse.
+                if intento == REINTENTOS:
+                    registro_log.error(f"Auditoría: no se pudo escribir un lote de {len(registros)} registros ({e}).")
+                else:
+                    time.sleep(PAUSA_REINTENTO)
+            except Exception:
+                registro_log.error(f"Auditoría: no se pudo escribir un lote de {len(registros)} registros.", exc_info=True)
+                break
+        self._guardar_pendientes(registros)
+        return False
+
+    def _trabajar(self):
+        conn = None
+        try:
+            conn = get_db_connection(self.ruta_bd)
+            self.escritos += self.recuperar_pendientes(conn)
+            while True:
+                lote = self._siguiente_lote()
+                registros = [r for r in lote if r is not None]
+                if registros and self._escribir(conn, registros):
+                    self.escritos += self.recuperar_pendientes(conn)
+                for _ in lote:
+                    self._cola.task_done()
+                if lote[-1] is None:
+                    return
+        except Exception:
+            # Desde aquí registrar() escribe en el momento; lo que ya estaba en la cola va a pendientes.
+            registro_log.error("Auditoría: el hilo escritor se detuvo.", exc_info=True)
+            self._descargar_cola()
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def _descargar_cola(self):
+        """Pasa al archivo de pendientes lo que quedó en la cola de un hilo que ya no la atiende."""
+        registros = []
+        while True:
+            try:
+                registro = self._cola.get_nowait()
+            except queue.Empty:
+                break
+            if registro is not None:
+                registros.append(registro)
+            self._cola.task_done()
+        if registros:
+            self._guardar_pendientes(registros)
+
+    def vaciar(self):
+        """Espera a que se escriba todo lo que está en la cola de este proceso."""
+        if self._pid == os.getpid():
+            if not self._hilo.is_alive():
+                self._descargar_cola()
+            self._cola.join()
+
+    def cerrar(self):
+        """Escribe lo pendiente y detiene el hilo."""
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            if self._hilo.is_alive():
+                self._cola.put(None)
+                self._hilo.join()
+            # Si el hilo murió, lo encolado después no lo escribió nadie.
+            self._descargar_cola()
+            self._pid = None
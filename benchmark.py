@@ -0,0 +1,988 @@
+# benchmark.py
+"""
+Benchmarks de rendimiento del sistema.
+
+Cada benchmark trabaja sobre una base de datos sintética creada en un directorio
+temporal; nunca se toca 'seguimiento.db'.
+
+Uso:
+    python benchmark.py conexiones [--estudiantes N] [--peticiones N]
+    python benchmark.py csv [--seguimientos N]
+    python benchmark.py xlsx [--filas N]
+    python benchmark.py paginacion [--estudiantes N] [--peticiones N]
+    python benchmark.py busqueda [--estudiantes N] [--repeticiones N]
+    python benchmark.py bitacoras [--estudiantes N] [--seguimientos N] [--repeticiones N]
+    python benchmark.py historial [--estudiantes N] [--cambios N] [--repeticiones N]
+    python benchmark.py auditoria [--ediciones N] [--hilos N]
+    python benchmark.py metricas [--estudiantes N] [--peticiones N]
+    python benchmark.py reportes [--estudiantes N] [--peticiones N]
+    python benchmark.py formularios [--repeticiones N]
+    python benchmark.py contrasenas [--verificaciones N] [--metodos M ...]
+    python benchmark.py importacion [--estudiantes N]
+    python benchmark.py carga-seguimientos [--estudiantes N] [--filas N] [--muestra N]
+    python benchmark.py respaldos [--estudiantes N]
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+NOMBRES = ["Camila", "Benjamín", "Valentina", "Matías", "Javiera", "Tomás", "Sofía", "Agustín", "Isidora", "Vicente"]
+APELLIDOS = ["González", "Muñoz", "Rojas", "Díaz", "Pérez", "Soto", "Contreras", "Silva", "Martínez", "Sepúlveda",
+             "Morales", "Rodríguez", "López", "Fuentes", "Hernández", "Torres", "Araya", "Flores", "Espinoza", "Valenzuela"]
+# Vocabulario de las bitácoras sintéticas variadas: palabras frecuentes primero y luego
+# miles de términos raros, con frecuencias de tipo Zipf (la palabra k-ésima aparece ~1/k).
+PALABRAS_BITACORA = ["estudiante", "sesión", "refiere", "ansiedad", "semana", "familia", "clases", "exámenes",
+                     "sueño", "apoyo", "madre", "pareja", "CESFAM", "tratamiento", "ánimo", "duelo", "crisis",
+                     "ideación", "red", "compañeros", "beca", "trabajo", "consumo", "alcohol", "autocuidado"]
+VOCABULARIO_BITACORA = PALABRAS_BITACORA + [f"termino{k}" for k in range(5000)]
+PESOS_BITACORA = [1 / (k + 1) for k in range(len(VOCABULARIO_BITACORA))]
+
+
+def _preparar_entorno(directorio):
+    """Apunta la aplicación a una BD temporal. Debe llamarse antes de importar app."""
+    ruta = os.path.join(directorio, 'benchmark.db')
+    os.environ['DATABASE_PATH'] = ruta
+    os.environ.setdefault('SECRET_KEY', 'clave-solo-para-benchmark')
+    return ruta
+
+
+def _bitacora_variada(rnd):
+    return ' '.join(rnd.choices(VOCABULARIO_BITACORA, PESOS_BITACORA, k=rnd.randint(10, 60)))
+
+
+def _poblar(ruta, estudiantes, seguimientos_por_estudiante, semilla=42, bitacora=None):
+    """
+    Crea el esquema y lo llena con datos sintéticos. Devuelve la lista de RUTs.
+    `bitacora(rnd)` genera el texto de cada seguimiento (por defecto, uno repetido).
+    """
+    from database import LISTA_CARRERAS, LISTA_ESTADO_PROGRAMA, LISTA_TIPO_INTERVENCION
+    from database import verificar_estado_actual
+    from migraciones import aplicar_migraciones
+
+    rnd = random.Random(semilla)
+    conn = sqlite3.connect(ruta)
+    aplicar_migraciones(conn, registrar=lambda mensaje: None)
+    conn.execute("INSERT INTO Usuarios (username, password_hash, rol, nombre_completo, activo) VALUES (?, ?, ?, ?, 1)",
+                 ('admin_bench', 'x', 'admin', 'Administrador Benchmark'))
+    ruts = []
+    hoy = date.today()
+    for i in range(estudiantes):
+        rut = f"{10000000 + i}-{i % 10}"
+        ruts.append(rut)
+        ingreso = hoy - timedelta(days=rnd.randint(0, 1500))
+        conn.execute("""
+            INSERT INTO Estudiantes (rut, nombre, apellido_paterno, apellido_materno, carrera_programa,
+                                     estado_en_programa, fecha_ingreso_programa, tentativa_ideacion,
+                                     trabajadora_social_asignada, psicologo_asignado, fecha_nacimiento)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (rut, rnd.choice(NOMBRES), rnd.choice(APELLIDOS), rnd.choice(APELLIDOS), rnd.choice(LISTA_CARRERAS),
+              rnd.choice(LISTA_ESTADO_PROGRAMA), ingreso.isoformat(), rnd.choice(["Ideación", "Tentativa"]),
+              "Paula Araya", "Daniela Rojas", "2000-01-01"))
+        conn.execute("INSERT INTO PeriodosAtencion (rut_estudiante, fecha_ingreso, motivo_ingreso, estado_periodo) VALUES (?, ?, ?, ?)",
+                     (rut, ingreso.isoformat(), rnd.choice(["Ideación", "Tentativa"]), rnd.choice(LISTA_ESTADO_PROGRAMA)))
+        conn.executemany("""
+            INSERT INTO Seguimientos (rut_estudiante, fecha_sesion, tipo_intervencion, bitacora_sesion, creado_por_usuario)
+            VALUES (?, ?, ?, ?, ?)
+        """, [(rut, (ingreso + timedelta(days=rnd.randint(0, 400))).isoformat(), rnd.choice(LISTA_TIPO_INTERVENCION),
+               bitacora(rnd) if bitacora else "Sesión de seguimiento sintética. " * rnd.randint(1, 20), "bench")
+              for _ in range(seguimientos_por_estudiante)])
+    conn.commit()
+    verificar_estado_actual(conn, reparar=True)
+    conn.close()
+    return ruts
+
+
+def _cliente_autenticado(app, id_usuario=1):
+    """Cliente de pruebas de Flask con la sesión de un usuario ya iniciada (vía HTTPS por Talisman)."""
+    cliente = app.test_client()
+    cliente.environ_base['wsgi.url_scheme'] = 'https'
+    with cliente.session_transaction(base_url='https://localhost') as sesion:
+        sesion['_user_id'] = str(id_usuario)
+        sesion['_fresh'] = True
+    return cliente
+
+
+def _medir_peticiones(cliente, urls, peticiones):
+    """Ejecuta `peticiones` GET repartidos entre `urls` y devuelve peticiones/segundo."""
+    for url in urls:  # Calentamiento
+        respuesta = cliente.get(url, base_url='https://localhost')
+        assert respuesta.status_code == 200, f"{url} respondió {respuesta.status_code}"
+    inicio = time.perf_counter()
+    for i in range(peticiones):
+        cliente.get(urls[i % len(urls)], base_url='https://localhost')
+    return peticiones / (time.perf_counter() - inicio)
+
+
+def bench_conexiones(args):
+    """
+    Compara peticiones/segundo en '/' y '/estudiante/<rut>' con el manejo de conexiones
+    anterior (una conexión nueva por petición, PRAGMAs por defecto de SQLite) y con el pool
+    por proceso más el perfil de PRAGMAs. El modo "antes" es una cota optimista: el código
+    original abría incluso más de una conexión por petición.
+    """
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = _preparar_entorno(directorio)
+        ruts = _poblar(ruta, args.estudiantes, 5)
+
+        import database
+        from app import app, limiter
+        limiter.enabled = False
+
+        configuraciones = [
+            ("antes (sin pool, PRAGMAs por defecto)", {'SQLITE_POOL_SIZE': 0, 'SQLITE_PRAGMAS': {}, 'SQLITE_CACHED_STATEMENTS': 128}),
+            ("después (pool + perfil de PRAGMAs)", {'SQLITE_POOL_SIZE': database.TAMANO_POOL_POR_DEFECTO,
+                                                   'SQLITE_PRAGMAS': database.PRAGMAS_POR_DEFECTO,
+                                                   'SQLITE_CACHED_STATEMENTS': database.SENTENCIAS_EN_CACHE_POR_DEFECTO}),
+        ]
+        rnd = random.Random(7)
+        urls_detalle = [f"/estudiante/{rnd.choice(ruts)}" for _ in range(20)]
+
+        print(f"Base sintética: {args.estudiantes} estudiantes, {args.estudiantes * 5} seguimientos, {args.peticiones} peticiones por caso")
+        for nombre, config in configuraciones:
+            app.config.update(config)
+            database.init_app(app)
+            cliente = _cliente_autenticado(app)
+            rps_index = _medir_peticiones(cliente, ["/"], args.peticiones)
+            rps_detalle = _medir_peticiones(cliente, urls_detalle, args.peticiones)
+            print(f"  {nombre:42s}  /: {rps_index:8.1f} req/s   /estudiante/<rut>: {rps_detalle:8.1f} req/s")
+
+
+def _respuesta_csv_anterior(cursor, nombre_archivo, mensaje_sin_datos):
+    """Reproduce la exportación original: fetchall, StringIO completo y una copia codificada."""
+    import csv
+    import io
+    from flask import Response
+    filas = cursor.fetchall()
+    output = io.StringIO()
+    writer = csv.writer(output, quoting=csv.QUOTE_ALL)
+    if filas:
+        writer.writerow([description[0] for description in cursor.description])
+        for fila in filas: writer.writerow(fila)
+    else: writer.writerow([mensaje_sin_datos])
+    csv_data = output.getvalue().encode('utf-8-sig')
+    return Response(csv_data, mimetype="text/csv; charset=utf-8-sig", headers={"Content-Disposition": f"attachment;filename={nombre_archivo}"})
+
+
+def medir_csv(args):
+    """
+    (Uso interno de 'csv') Descarga `args.url` en este proceso y escribe en stdout, como
+    JSON, el tiempo al primer byte, el tiempo total, los bytes y el pico de RSS.
+    """
+    import app as aplicacion
+    aplicacion.limiter.enabled = False
+    if args.modo == 'antes':
+        aplicacion.respuesta_csv_en_bloques = _respuesta_csv_anterior
+    cliente = _cliente_autenticado(aplicacion.app)
+    rss_inicial = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    inicio = time.perf_counter()
+    respuesta = cliente.get(args.url, base_url='https://localhost', buffered=False)
+    bloques = iter(respuesta.response)
+    primero = next(bloques)
+    primer_byte = time.perf_counter() - inicio
+    total_bytes = len(primero)
+    for bloque in bloques:
+        total_bytes += len(bloque)
+    respuesta.close()
+    total = time.perf_counter() - inicio
+
+    print(json.dumps({
+        'primer_byte': primer_byte, 'total': total, 'bytes': total_bytes,
+        # ru_maxrss está en KiB en Linux
+        'rss_pico_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'rss_antes_mb': rss_inicial / 1024,
+    }))
+
+
+def bench_csv(args):
+    """
+    Compara la exportación CSV original (todo en memoria) con la exportación por bloques.
+    Cada caso corre en un proceso nuevo para que el pico de RSS sea sólo suyo.
+    """
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = _preparar_entorno(directorio)
+        por_estudiante = 50
+        estudiantes = max(args.seguimientos // por_estudiante, 1)
+        print(f"Creando base sintética: {estudiantes} estudiantes, {estudiantes * por_estudiante} seguimientos...")
+        _poblar(ruta, estudiantes, por_estudiante)
+        print(f"Tamaño de la base: {os.path.getsize(ruta) / 2**20:.0f} MB")
+
+        entorno = dict(os.environ, DATABASE_PATH=ruta)
+        for url in ['/descargar/seguimientos_csv', '/descargar/estudiantes_csv', '/descargar/periodos_csv']:
+            print(url)
+            for modo in ['antes', 'despues']:
+                salida = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), 'medir-csv', '--modo', modo, '--url', url],
+                    env=entorno, cwd=directorio, capture_output=True, text=True, check=True)
+                m = json.loads(salida.stdout.strip().splitlines()[-1])
+                print(f"  {modo:8s} primer byte: {m['primer_byte'] * 1000:8.1f} ms   total: {m['total']:6.2f} s   "
+                      f"{m['bytes'] / 2**20:7.1f} MB   RSS pico: {m['rss_pico_mb']:7.1f} MB "
+                      f"(+{m['rss_pico_mb'] - m['rss_antes_mb']:.1f} MB por la descarga)")
+
+
+def bench_xlsx(args):
+    """
+    Descargas .xlsx (openpyxl en modo de sólo escritura) contra las CSV, con `--filas`
+    estudiantes, seguimientos y períodos. Cada descarga corre en un proceso nuevo
+    (medir-csv) para que el pico de RSS sea sólo suyo.
+    """
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = _preparar_entorno(directorio)
+        print(f"Creando base sintética: {args.filas} estudiantes, seguimientos y períodos...")
+        _poblar(ruta, args.filas, 1, bitacora=_bitacora_variada)
+        entorno = dict(os.environ, DATABASE_PATH=ruta)
+        for entidad in ['estudiantes', 'seguimientos', 'periodos']:
+            print(entidad)
+            for formato in ['csv', 'xlsx']:
+                salida = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), 'medir-csv', '--modo', 'despues',
+                     '--url', f'/descargar/{entidad}_{formato}'],
+                    env=entorno, cwd=directorio, capture_output=True, text=True, check=True)
+                m = json.loads(salida.stdout.strip().splitlines()[-1])
+                print(f"  {formato:5s} primer byte: {m['primer_byte']:6.2f} s   total: {m['total']:6.2f} s   "
+                      f"{m['bytes'] / 2**20:7.1f} MB   RSS pico: {m['rss_pico_mb']:7.1f} MB "
+                      f"(+{m['rss_pico_mb'] - m['rss_antes_mb']:.1f} MB por la descarga)")
+
+
+def bench_paginacion(args):
+    """
+    Mide '/' con la lista completa (como antes de paginar), con la primera página y
+    con una página profunda (cursor al 90% de la lista).
+    """
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = _preparar_entorno(directorio)
+        _poblar(ruta, args.estudiantes, 1)
+
+        import app as aplicacion
+        aplicacion.limiter.enabled = False
+        # Sin alertas de inactividad, para medir sólo la lista (los datos sintéticos
+        # dejarían miles de estudiantes en el bloque de alertas).
+        aplicacion.app.config['DIAS_ALERTA_INACTIVIDAD'] = 100000
+        cliente = _cliente_autenticado(aplicacion.app)
+
+        conn = sqlite3.connect(ruta)
+        conn.row_factory = sqlite3.Row
+        fila = conn.execute("""
+            SELECT apellido_paterno, apellido_materno, nombre, rut FROM Estudiantes
+            ORDER BY apellido_paterno, apellido_materno, nombre, rut LIMIT 1 OFFSET ?
+        """, (int(args.estudiantes * 0.9),)).fetchone()
+        conn.close()
+        cursor_profundo = aplicacion.codificar_cursor_pagina(fila)
+
+        print(f"Base sintética: {args.estudiantes} estudiantes, {args.peticiones} peticiones por caso")
+        por_pagina = aplicacion.app.config['ESTUDIANTES_POR_PAGINA']
+        casos = [
+            ("antes (lista completa)", 10 ** 9, "/?show_archived=true"),
+            (f"primera página ({por_pagina} filas)", por_pagina, "/?show_archived=true"),
+            (f"página al 90% ({por_pagina} filas)", por_pagina, f"/?show_archived=true&despues={cursor_profundo}"),
+        ]
+        for nombre, filas, url in casos:
+            aplicacion.app.config['ESTUDIANTES_POR_PAGINA'] = filas
+            peticiones = max(args.peticiones // 20, 3) if filas > por_pagina else args.peticiones
+            rps = _medir_peticiones(cliente, [url], peticiones)
+            print(f"  {nombre:32s} {rps:8.1f} req/s  ({1000 / rps:7.1f} ms por petición)")
+
+
+def bench_reportes(args):
+    """
+    Mide /api/reporte_periodos sin caché (cada petición calcula el reporte) y con la
+    caché de resultados (misma combinación de parámetros y tablas sin cambios).
+    """
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = _preparar_entorno(directorio)
+        _poblar(ruta, args.estudiantes, 1)
+
+        import app as aplicacion
+        aplicacion.limiter.enabled = False
+        cliente = _cliente_autenticado(aplicacion.app)
+        urls = [f"/api/reporte_periodos?inicio=2000-01-01&fin=2030-12-31&agrupar_por={columna}"
+                for columna in ('motivo_ingreso', 'genero', 'carrera_programa')]
+
+        print(f"Base sintética: {args.estudiantes} estudiantes, {args.peticiones} peticiones por caso")
+        ttl = aplicacion.resultados_reportes.ttl
+        for nombre, ttl_caso in (("sin caché", 0), ("con caché", ttl)):
+            aplicacion.resultados_reportes.ttl = ttl_caso  # con TTL 0 toda entrada nace expirada
+            rps = _medir_peticiones(cliente, urls, args.peticiones)
+            print(f"  {nombre:12s} {rps:8.1f} req/s  ({1000 / rps:7.2f} ms por petición)")
+
+
+def _opciones_nuevo_estudiante_anterior(form, conn):
+    """Reproduce el llenado original de NuevoEstudianteForm: dos consultas y ~15 listas por petición."""
+    from database import (LISTA_SEXO, LISTA_GENERO, LISTA_CARRERAS, LISTA_FACULTADES, LISTA_NACIONALIDADES,
+                          LISTA_ESTADO_PROGRAMA, LISTA_CESFAM, LISTA_TENTATIVA_IDEACION, LISTA_ESTADO_ACADEMICO,
+                          LISTA_ESTADO_CIVIL, LISTA_TIENE_HIJOS, LISTA_OCUPACION_LABORAL, LISTA_FUENTE_DERIVACION)
+    trabajadoras_sociales = conn.execute("SELECT nombre_completo FROM Profesionales WHERE tipo = 'Trabajadora Social' ORDER BY nombre_completo").fetchall()
+    psicologos = conn.execute("SELECT nombre_completo FROM Profesionales WHERE tipo = 'Psicólogo/a' ORDER BY nombre_completo").fetchall()
+    form.trabajadora_social.choices = [('', 'Seleccione...')] + [(ts['nombre_completo'], ts['nombre_completo']) for ts in trabajadoras_sociales]
+    form.psicologo.choices = [('', 'Seleccione...')] + [(p['nombre_completo'], p['nombre_completo']) for p in psicologos]
+    form.sexo.choices = [('', 'Seleccione...')] + [(s, s) for s in LISTA_SEXO]
+    form.genero.choices = [('', 'Seleccione...')] + [(g, g) for g in LISTA_GENERO]
+    form.carrera_programa.choices = [('', 'Seleccione...')] + [(c, c) for c in LISTA_CARRERAS]
+    form.facultad.choices = [('', 'Seleccione...')] + [(f, f) for f in LISTA_FACULTADES]
+    form.nacionalidad.choices = [('', 'Seleccione...')] + [(n, n) for n in LISTA_NACIONALIDADES]
+    opciones_estado_inicial = [e for e in LISTA_ESTADO_PROGRAMA if e in ["Activo", "No acepta ingresar", "En evaluación inicial"]]
+    form.estado_programa.choices = [(e, e) for e in opciones_estado_inicial]
+    lista_cesfam_para_formulario = [c for c in LISTA_CESFAM if c.upper() != "NINGUNO"]
+    form.cesfam.choices = [('', 'Seleccione CESFAM...')] + [(c, c) for c in lista_cesfam_para_formulario]
+    form.tentativa_ideacion.choices = [('', 'Seleccione...')] + [(ti, ti) for ti in LISTA_TENTATIVA_IDEACION]
+    form.estado_academico.choices = [('', 'Seleccione...')] + [(e, e) for e in LISTA_ESTADO_ACADEMICO]
+    form.estado_civil.choices = [('', 'Seleccione...')] + [(ec, ec) for ec in LISTA_ESTADO_CIVIL]
+    form.tiene_hijos.choices = [('', 'Seleccione...')] + [(h, h) for h in LISTA_TIENE_HIJOS]
+    form.ocupacion_laboral.choices = [('', 'Seleccione...')] + [(ol, ol) for ol in LISTA_OCUPACION_LABORAL]
+    form.fuente_derivacion.choices = [('', 'Seleccione...')] + [(f, f) for f in LISTA_FUENTE_DERIVACION]
+
+
+def _opciones_nuevo_estudiante_actual(form, conn):
+    """El llenado actual de nuevo_estudiante (opciones precalculadas y directorio de profesionales)."""
+    import opciones
+    opciones.asignar_opciones(form, opciones.NUEVO_ESTUDIANTE)
+    profesionales = opciones.directorio_profesionales.obtener(conn)
+    form.trabajadora_social.choices = profesionales.opciones_trabajadora_social
+    form.psicologo.choices = profesionales.opciones_psicologo
+
+
+def bench_formularios(args):
+    """
+    Micro-benchmark: construir NuevoEstudianteForm y llenar sus menús desplegables, con
+    el llenado original y con el actual. Se mide por separado sólo el llenado.
+    """
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = _preparar_entorno(directorio)
+        _poblar(ruta, 10, 1)
+        conn = sqlite3.connect(ruta)
+        conn.executemany("INSERT INTO Profesionales (nombre_completo, tipo) VALUES (?, ?)",
+                         [(f"Profesional {i}", 'Trabajadora Social' if i % 2 else 'Psicólogo/a') for i in range(30)])
+        conn.commit()
+        conn.close()
+
+        import app as aplicacion
+        from database import get_db
+        from forms import NuevoEstudianteForm
+
+        print(f"NuevoEstudianteForm, {args.repeticiones} repeticiones; µs por formulario")
+        with aplicacion.app.test_request_context('/estudiante/nuevo', base_url='https://localhost'):
+            conn = get_db()
+            for nombre, llenar in (("antes", _opciones_nuevo_estudiante_anterior), ("ahora", _opciones_nuevo_estudiante_actual)):
+                form = NuevoEstudianteForm()
+                llenar(form, conn)  # Calentamiento
+                inicio = time.perf_counter()
+                for _ in range(args.repeticiones):
+                    llenar(form, conn)
+                solo_llenado = (time.perf_counter() - inicio) / args.repeticiones * 1e6
+                inicio = time.perf_counter()
+                for _ in range(args.repeticiones):
+                    llenar(NuevoEstudianteForm(), conn)
+                total = (time.perf_counter() - inicio) / args.repeticiones * 1e6
+                print(f"  {nombre:6s}  llenado de opciones: {solo_llenado:8.1f}   construcción + llenado: {total:8.1f}")
+
+
+def _libro_sintetico(ruta, estudiantes, semilla=42):
+    """
+    Libro .xlsx con `estudiantes` filas en 'Estudiantes' y un seguimiento por estudiante
+    en 'Seguimientos'. Cerca del 1% de las filas de cada hoja tiene un error.
+    """
+    from openpyxl import Workbook
+    from database import LISTA_CARRERAS, LISTA_GENERO, LISTA_TIPO_INTERVENCION
+    rnd = random.Random(semilla)
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet('Estudiantes')
+    hoja.append(['RUT', 'Nombre', 'Apellido Paterno', 'Apellido Materno', 'Género', 'Fecha Nacimiento',
+                 'Carrera Programa', 'Celular', 'Fecha Ingreso Programa', 'Estado en Programa'])
+    for i in range(estudiantes):
+        fecha_nacimiento = date(1995, 1, 1) + timedelta(days=rnd.randrange(3650))
+        hoja.append([f"{10000000 + i}-{i % 10}", rnd.choice(NOMBRES), rnd.choice(APELLIDOS), rnd.choice(APELLIDOS),
+                     'Marciano' if rnd.random() < 0.01 else rnd.choice(LISTA_GENERO),
+                     fecha_nacimiento.strftime('%d/%m/%Y') if i % 2 else datetime.combine(fecha_nacimiento, datetime.min.time()),
+                     rnd.choice(LISTA_CARRERAS).upper(), 900000000 + i,
+                     (date(2020, 1, 1) + timedelta(days=rnd.randrange(1800))).isoformat(), 'Activo'])
+    hoja = libro.create_sheet('Seguimientos')
+    hoja.append(['rut_estudiante', 'fecha_sesion', 'tipo_intervencion', 'bitacora_sesion', 'alta_mejora_animo'])
+    for i in range(estudiantes):
+        hoja.append([f"{10000000 + i}-{i % 10}", None if rnd.random() < 0.01 else f"2024-{rnd.randint(1, 12):02d}-15",
+                     rnd.choice(LISTA_TIPO_INTERVENCION), _bitacora_variada(rnd), rnd.choice(['Sí', 'No', 0, 1])])
+    libro.save(ruta)
+
+
+def bench_importacion(args):
+    """
+    importacion.py sobre un libro sintético, dos veces seguidas (la segunda no debe
+    cambiar nada). Cada importación corre en un proceso nuevo para medir su pico de RSS,
+    sin mmap de SQLite (las páginas mapeadas de la base contarían como RSS del proceso).
+    """
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = _preparar_entorno(directorio)
+        from migraciones import aplicar_migraciones
+        conn = sqlite3.connect(ruta)
+        aplicar_migraciones(conn, registrar=lambda mensaje: None)
+        conn.close()
+        ruta_libro = os.path.join(directorio, 'libro.xlsx')
+        print(f"Creando libro sintético: {args.estudiantes} estudiantes y {args.estudiantes} seguimientos...")
+        _libro_sintetico(ruta_libro, args.estudiantes)
+        print(f"Tamaño del libro: {os.path.getsize(ruta_libro) / 2**20:.1f} MB")
+
+        for corrida in ("primera", "repetida"):
+            inicio = time.perf_counter()
+            proceso = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'importacion.py'),
+                                        ruta_libro], cwd=directorio, stdout=subprocess.PIPE, text=True,
+                                       env=dict(os.environ, SQLITE_PRAGMA_MMAP_SIZE='0'))
+            salida = proceso.stdout.read()
+            _, estado, uso = os.wait4(proceso.pid, 0)
+            assert estado == 0, salida
+            resumen = [linea.strip() for linea in salida.splitlines() if 'filas leídas,' in linea]
+            # ru_maxrss está en KiB en Linux
+            print(f"  {corrida:9s} {time.perf_counter() - inicio:6.1f} s   RSS pico: {uso.ru_maxrss / 1024:6.1f} MB")
+            for linea in resumen:
+                print(f"            {linea}")
+
+
+def _csv_seguimientos(ruta, ruts, filas, semilla=42):
+    """CSV sintético para la carga de seguimientos, separado por punto y coma como los de Excel."""
+    from database import LISTA_TIPO_INTERVENCION, LISTA_RESULTADO_CITA, LISTA_ESTADO_DERIVACION_INICIAL
+    from database import LISTA_ESTADO_PROGRAMA, LISTA_ESTADO_ACADEMICO
+
+    rnd = random.Random(semilla)
+    hoy = date.today()
+    with open(ruta, 'w', newline='', encoding='utf-8') as archivo:
+        escritor = csv.writer(archivo, delimiter=';')
+        escritor.writerow(['RUT Estudiante', 'Fecha Sesión', 'Tipo Intervención', 'Resultado Cita',
+                           'Estado Derivación CESFAM Actual', 'Bitácora Sesión', 'Cambio Estado Programa a',
+                           'Cambio Estado Académico a', 'Alta Mejora Ánimo'])
+        for i in range(filas):
+            escritor.writerow([
+                rnd.choice(ruts), (hoy - timedelta(days=rnd.randint(0, 2000))).strftime('%d-%m-%Y'),
+                rnd.choice(LISTA_TIPO_INTERVENCION), rnd.choice(LISTA_RESULTADO_CITA),
+                rnd.choice(LISTA_ESTADO_DERIVACION_INICIAL), f"Sesión en papel {i}: " + _bitacora_variada(rnd),
+                rnd.choice(LISTA_ESTADO_PROGRAMA) if rnd.random() < 0.05 else '',
+                rnd.choice(LISTA_ESTADO_ACADEMICO) if rnd.random() < 0.05 else '',
+                rnd.choice(['Sí', 'No', '']),
+            ])
+
+
+def _guardar_como_nuevo_seguimiento(conn, registro):
+    """Lo que hace nuevo_seguimiento al guardar: un seguimiento por transacción."""
+    from database import actualizar_estado_actual, actualizar_ultima_sesion
+    from importacion import COLUMNAS_SEGUIMIENTO_CSV, SQL_INSERTAR_SEGUIMIENTO_CSV
+
+    rut = registro['rut_estudiante']
+    cursor = conn.cursor()
+    cursor.execute(SQL_INSERTAR_SEGUIMIENTO_CSV, tuple(registro[c] for c in COLUMNAS_SEGUIMIENTO_CSV))
+    actualizar_ultima_sesion(cursor, rut)
+    if registro['cambio_estado_programa_a']:
+        cursor.execute('UPDATE PeriodosAtencion SET estado_periodo = ? WHERE id = (SELECT id_periodo_actual FROM EstadoActualEstudiante WHERE rut_estudiante = ?)',
+                       (registro['cambio_estado_programa_a'], rut))
+        actualizar_estado_actual(cursor, rut)
+    if registro['cambio_estado_academico_a']:
+        cursor.execute('UPDATE Estudiantes SET estado_academico = ? WHERE rut = ?', (registro['cambio_estado_academico_a'], rut))
+    if registro['estado_derivacion_cesfam_actual']:
+        cursor.execute('UPDATE Estudiantes SET estado_derivacion_maestro = ? WHERE rut = ?', (registro['estado_derivacion_cesfam_actual'], rut))
+    conn.commit()
+
+
+def bench_carga_seguimientos(args):
+    """
+    Carga de un CSV de seguimientos (importar_seguimientos_csv): validación sin escribir,
+    carga real y carga repetida (no debe agregar nada). Como referencia, el costo de
+    ingresar las mismas filas una por una con las sentencias de nuevo_seguimiento (un
+    commit por seguimiento), medido en las primeras `--muestra` filas y extrapolado.
+    """
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = _preparar_entorno(directorio)
+        from database import get_db_connection, verificar_estado_actual, verificar_versiones_seguimiento
+        import importacion
+
+        ruts = _poblar(ruta, args.estudiantes, 3)
+        ruta_csv = os.path.join(directorio, 'seguimientos.csv')
+        _csv_seguimientos(ruta_csv, ruts, args.filas)
+        print(f"{args.estudiantes} estudiantes, CSV de {args.filas} filas ({os.path.getsize(ruta_csv) / 2**20:.1f} MB)")
+
+        def cargar(conn, simular):
+            rechazos = importacion.ListaRechazos(maximo=10)
+            inicio = time.perf_counter()
+            with importacion.abrir_csv(open(ruta_csv, 'rb')) as archivo:
+                resumen = importacion.importar_seguimientos_csv(conn, archivo, 'bench', rechazos, simular=simular,
+                                                                registrar=lambda mensaje: None)
+            return time.perf_counter() - inicio, resumen
+
+        # Referencia: una por una. Después se restaura la base desde una copia previa.
+        ruta_copia = os.path.join(directorio, 'copia.db')
+        with sqlite3.connect(ruta) as origen, sqlite3.connect(ruta_copia) as destino:
+            origen.backup(destino)
+        conn = get_db_connection()
+        with importacion.abrir_csv(open(ruta_csv, 'rb')) as archivo:
+            encabezados, filas = importacion.filas_de_csv(archivo)
+            indices = importacion.mapear_encabezados(encabezados, importacion.HOJA_SEGUIMIENTOS_CSV, lambda m: None)
+            inicio = time.perf_counter()
+            for _, (_, valores) in zip(range(args.muestra), filas):
+                registro, _ = importacion.validar_fila(valores, indices)
+                registro = {**dict.fromkeys(importacion.COLUMNAS_SEGUIMIENTO_CSV), **registro, 'creado_por_usuario': 'bench'}
+                _guardar_como_nuevo_seguimiento(conn, registro)
+            por_fila = (time.perf_counter() - inicio) / args.muestra
+        with sqlite3.connect(ruta_copia) as copia:
+            copia.backup(conn)
+        conn.close()
+        print(f"  {'una por una':12s} {por_fila * args.filas:7.1f} s  (estimado: {por_fila * 1000:.2f} ms por fila, "
+              f"medido en {args.muestra} filas)")
+
+        conn = get_db_connection()
+        for nombre, simular in (('simulación', True), ('carga', False), ('repetida', False)):
+            segundos, resumen = cargar(conn, simular)
+            print(f"  {nombre:12s} {segundos:7.1f} s  ({resumen.leidas} leídas, {resumen.escritas} "
+                  f"{'válidas' if simular else 'nuevas'}, {resumen.sin_cambios} ya registradas, {resumen.rechazadas} rechazadas)")
+        print(f"  Diferencias en EstadoActualEstudiante: {len(verificar_estado_actual(conn))}, "
+              f"en versiones de seguimientos: {len(verificar_versiones_seguimiento(conn))}")
+        conn.close()
+
+
+def bench_respaldos(args):
+    """
+    respaldos.crear_respaldo mientras otro hilo escribe seguimientos sin parar: duración
+    del respaldo y latencia de los commits del escritor, comparada con la del escritor
+    solo. Se mide en modo WAL (el de la app) y en modo DELETE (copia por pasos).
+    """
+    import threading
+    import respaldos
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = _preparar_entorno(directorio)
+        _poblar(ruta, args.estudiantes, 5, bitacora=_bitacora_variada)
+        print(f"{args.estudiantes} estudiantes, base de {os.path.getsize(ruta) / 2**20:.1f} MB")
+
+        def escribir(latencias, detener):
+            conn = sqlite3.connect(ruta, timeout=30)
+            while not detener.is_set():
+                inicio = time.perf_counter()
+                conn.execute("INSERT INTO Seguimientos (rut_estudiante, fecha_sesion, bitacora_sesion) VALUES ('10000000-0', date('now'), 'x')")
+                conn.commit()
+                latencias.append(time.perf_counter() - inicio)
+                time.sleep(0.002)
+            conn.close()
+
+        def medir(durante):
+            latencias, detener = [], threading.Event()
+            hilo = threading.Thread(target=escribir, args=(latencias, detener))
+            hilo.start()
+            resultado = durante()
+            detener.set()
+            hilo.join()
+            latencias.sort()
+            return resultado, len(latencias), latencias[len(latencias) // 2] * 1000, latencias[-1] * 1000
+
+        print(f"  {'modo':16s} {'respaldo':>9s} {'commits':>8s} {'p50 ms':>8s} {'máx ms':>8s}")
+        for modo in ('WAL', 'DELETE'):
+            conn = sqlite3.connect(ruta)
+            conn.execute(f"PRAGMA journal_mode = {modo}")
+            conn.close()
+            _, commits, p50, maximo = medir(lambda: time.sleep(2))
+            print(f"  {modo + ' sin respaldo':16s} {'-':>9s} {commits:8d} {p50:8.2f} {maximo:8.1f}")
+            for comprimir in (False, True):
+                respaldo, commits, p50, maximo = medir(lambda: respaldos.crear_respaldo(
+                    ruta, os.path.join(directorio, 'respaldos'), comprimir=comprimir))
+                nombre = f"{modo} {'gzip' if comprimir else 'sin gzip'}"
+                print(f"  {nombre:16s} {respaldo.segundos:8.2f}s {commits:8d} {p50:8.2f} {maximo:8.1f}   "
+                      f"({respaldo.bytes / 2**20:.1f} MB)")
+
+
+# pbkdf2 con los costos por defecto de werkzeug 2.x (260.000), el de este sistema y el de
+# werkzeug 3.1 (1.000.000), y scrypt con los parámetros por defecto de werkzeug.
+METODOS_HASH_BENCHMARK = ['pbkdf2:sha256:260000', 'pbkdf2:sha256:600000', 'pbkdf2:sha256:1000000', 'scrypt:32768:8:1']
+
+
+def bench_contrasenas(args):
+    """
+    Verificaciones de contraseña por segundo para cada método de hash: en un hilo (un
+    núcleo) y a través de VerificadorContrasenas con un hilo por núcleo, atendiendo
+    inicios de sesión simultáneos desde el doble de hilos.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from werkzeug.security import check_password_hash, generate_password_hash
+    from seguridad import VerificadorContrasenas
+
+    nucleos = os.cpu_count() or 1
+    print(f"{args.verificaciones} verificaciones por método, {nucleos} núcleos")
+    print(f"  {'método':24s} {'ms/login':>9s} {'logins/s/núcleo':>16s} {'logins/s grupo':>15s} {'por núcleo':>11s}")
+    for metodo in args.metodos:
+        password_hash = generate_password_hash('clave-de-prueba', method=metodo)
+        check_password_hash(password_hash, 'clave-de-prueba')  # Calentamiento
+        inicio = time.perf_counter()
+        for _ in range(args.verificaciones):
+            check_password_hash(password_hash, 'clave-de-prueba')
+        un_hilo = args.verificaciones / (time.perf_counter() - inicio)
+
+        verificador = VerificadorContrasenas(metodo=metodo, hilos=nucleos, max_pendientes=args.verificaciones)
+        with ThreadPoolExecutor(max_workers=2 * nucleos) as peticiones:
+            inicio = time.perf_counter()
+            resultados = list(peticiones.map(lambda _: verificador.verificar(password_hash, 'clave-de-prueba'),
+                                             range(args.verificaciones)))
+            en_grupo = args.verificaciones / (time.perf_counter() - inicio)
+        verificador.cerrar()
+        assert all(resultados)
+        print(f"  {metodo:24s} {1000 / un_hilo:9.1f} {un_hilo:16.1f} {en_grupo:15.1f} {en_grupo / nucleos:11.1f}")
+
+
+def bench_busqueda(args):
+    """
+    Compara la búsqueda de la lista de '/' con LIKE '%...%' sobre cuatro columnas (como
+    antes) con la búsqueda en EstudiantesFTS, a nivel de SQL y con la primera página.
+    """
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = _preparar_entorno(directorio)
+        _poblar(ruta, args.estudiantes, 1)
+        from database import get_db_connection, expresion_busqueda_fts
+        conn = get_db_connection()
+
+        desde = " FROM Estudiantes e JOIN EstadoActualEstudiante ea ON e.rut = ea.rut_estudiante "
+        columnas = "SELECT e.rut, e.nombre, e.apellido_paterno, e.apellido_materno, e.carrera_programa, ea.estado_periodo_actual"
+        sql_like = (columnas + desde + "WHERE (lower(e.rut) LIKE ? OR lower(e.nombre) LIKE ? OR lower(e.apellido_paterno) LIKE ? "
+                    "OR lower(e.apellido_materno) LIKE ?) AND LOWER(TRIM(ea.estado_periodo_actual)) != 'archivado' "
+                    "ORDER BY e.apellido_paterno, e.apellido_materno, e.nombre, e.rut")
+        sql_fts = (columnas + ", c.puntaje FROM (SELECT rut, bm25(EstudiantesFTS) AS puntaje FROM EstudiantesFTS "
+                   "WHERE EstudiantesFTS MATCH ?) c JOIN Estudiantes e ON e.rut = c.rut "
+                   "JOIN EstadoActualEstudiante ea ON e.rut = ea.rut_estudiante "
+                   "WHERE LOWER(TRIM(ea.estado_periodo_actual)) != 'archivado' ORDER BY c.puntaje, e.rut LIMIT 51")
+
+        def medir(sql, params):
+            conn.execute(sql, params).fetchall()  # Calentamiento
+            inicio = time.perf_counter()
+            for _ in range(args.repeticiones):
+                filas = conn.execute(sql, params).fetchall()
+            return (time.perf_counter() - inicio) / args.repeticiones * 1000, len(filas)
+
+        print(f"Base sintética: {args.estudiantes} estudiantes; ms por consulta (promedio de {args.repeticiones})")
+        print(f"  {'término':16s} {'LIKE (todas)':>18s} {'LIKE (51 filas)':>18s} {'FTS5 (51 filas)':>18s}")
+        for termino in ["muñoz", "Echeverría", "sepúlveda camila", "mu", "1000", "zzz"]:
+            patron = f"%{termino.lower()}%"
+            ms_like, n_like = medir(sql_like, (patron,) * 4)
+            ms_like_pagina, _ = medir(sql_like + " LIMIT 51", (patron,) * 4)
+            ms_fts, n_fts = medir(sql_fts, (expresion_busqueda_fts(termino),))
+            print(f"  {termino:16s} {ms_like:9.2f} ({n_like:6d}) {ms_like_pagina:17.2f} {ms_fts:9.2f} ({n_fts:6d})")
+        conn.close()
+
+
+def bench_bitacoras(args):
+    """
+    Búsqueda en las bitácoras de sesión: LIKE '%...%' sobre bitacora_sesion (recorre
+    todos los seguimientos) contra la primera página de /seguimientos/buscar con
+    SeguimientosFTS, a nivel de SQL.
+    """
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = _preparar_entorno(directorio)
+        _poblar(ruta, args.estudiantes, args.seguimientos, bitacora=_bitacora_variada)
+        from database import get_db_connection, expresion_busqueda_fts
+        conn = get_db_connection()
+        total = conn.execute("SELECT COUNT(*) FROM Seguimientos").fetchone()[0]
+
+        sql_like = ("SELECT s.id_seguimiento, s.rut_estudiante, s.fecha_sesion FROM Seguimientos s "
+                    "WHERE lower(s.bitacora_sesion) LIKE ? ORDER BY s.id_seguimiento DESC LIMIT 21")
+        sql_fts = ("SELECT s.id_seguimiento, s.rut_estudiante, s.fecha_sesion, e.nombre, "
+                   "snippet(SeguimientosFTS, 0, '[', ']', '…', 24) FROM SeguimientosFTS f "
+                   "JOIN Seguimientos s ON s.id_seguimiento = f.rowid JOIN Estudiantes e ON e.rut = s.rut_estudiante "
+                   "WHERE SeguimientosFTS MATCH ? ORDER BY f.rowid DESC LIMIT 21")
+
+        def medir(sql, params):
+            conn.execute(sql, params).fetchall()  # Calentamiento
+            inicio = time.perf_counter()
+            for _ in range(args.repeticiones):
+                conn.execute(sql, params).fetchall()
+            return (time.perf_counter() - inicio) / args.repeticiones * 1000
+
+        print(f"Base sintética: {total} seguimientos; ms por consulta (primera página, promedio de {args.repeticiones})")
+        print(f"  {'término':22s} {'coincidencias':>13s} {'LIKE':>10s} {'FTS5':>10s}")
+        for termino in ["ansiedad", "duelo", "termino40", "termino4321", "ansiedad duelo", "ansi", "sin_coincidencias"]:
+            expresion = expresion_busqueda_fts(termino)
+            coincidencias = conn.execute("SELECT COUNT(*) FROM SeguimientosFTS WHERE SeguimientosFTS MATCH ?", (expresion,)).fetchone()[0]
+            ms_like = medir(sql_like, (f"%{termino.split()[0]}%",))
+            ms_fts = medir(sql_fts, (expresion,))
+            print(f"  {termino:22s} {coincidencias:13d} {ms_like:10.2f} {ms_fts:10.2f}")
+        conn.close()
+
+
+def bench_historial(args):
+    """
+    Historial de cambios con el texto de `detalles` (como antes) contra
+    HistorialCambiosDetalle: la ficha de un estudiante con mucho historial (todo el
+    historial contra la primera página) y "qué cambió en un campo en un rango de fechas"
+    (recorrer y separar los textos contra el índice (campo, fecha_cambio)).
+    """
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = _preparar_entorno(directorio)
+        ruts = _poblar(ruta, args.estudiantes, 1)
+        from database import get_db_connection, NOMBRES_CAMPOS_ESTUDIANTE
+        from migraciones import _m017_rellenar_historial_detalle, detalles_desde_texto
+        conn = get_db_connection()
+
+        # Cambios con el formato de texto anterior; el primer estudiante tiene 50 veces más.
+        rnd = random.Random(42)
+        campos = list(NOMBRES_CAMPOS_ESTUDIANTE.values())
+        inicio_fechas = datetime(2020, 1, 1)
+        filas = []
+        for i, rut in enumerate(ruts):
+            for _ in range(args.cambios * (50 if i == 0 else 1)):
+                detalles = " | ".join(f"Cambió {nombre} de 'valor {rnd.randint(1, 9)}' a 'valor {rnd.randint(1, 9)}'."
+                                      for nombre in rnd.sample(campos, rnd.randint(1, 3)))
+                fecha = inicio_fechas + timedelta(seconds=rnd.randint(0, 5 * 365 * 86400))
+                filas.append(('benchmark', 'Edición de Estudiante', 'Estudiante', rut, detalles, fecha.strftime('%Y-%m-%d %H:%M:%S')))
+        conn.executemany("""INSERT INTO HistorialCambios (nombre_usuario, accion, modelo_afectado, id_registro_afectado, detalles, fecha_cambio)
+                            VALUES (?, ?, ?, ?, ?, ?)""", filas)
+        conn.commit()
+        print(f"Base sintética: {len(filas)} cambios de {args.estudiantes} estudiantes ({args.cambios * 50} del primero)")
+
+        inicio = time.perf_counter()
+        _m017_rellenar_historial_detalle(conn, {'tamano_lote': 500, 'pausa': 0, 'registrar': lambda texto: None})
+        detalles_totales = conn.execute("SELECT COUNT(*) FROM HistorialCambiosDetalle").fetchone()[0]
+        print(f"Migración 018 (relleno): {time.perf_counter() - inicio:.2f} s, {detalles_totales} campos modificados")
+
+        def medir(funcion):
+            funcion()  # Calentamiento
+            inicio = time.perf_counter()
+            for _ in range(args.repeticiones):
+                resultado = funcion()
+            return (time.perf_counter() - inicio) / args.repeticiones * 1000, resultado
+
+        rut = ruts[0]
+        ms_antes, n_antes = medir(lambda: len(conn.execute(
+            "SELECT * FROM HistorialCambios WHERE id_registro_afectado = ? AND modelo_afectado = 'Estudiante' ORDER BY fecha_cambio DESC",
+            (rut,)).fetchall()))
+
+        def primera_pagina():
+            filas = conn.execute("""SELECT id_cambio, fecha_cambio, nombre_usuario, accion, detalles FROM HistorialCambios
+                                    WHERE id_registro_afectado = ? AND modelo_afectado = 'Estudiante'
+                                    ORDER BY fecha_cambio DESC, id_cambio DESC LIMIT 21""", (rut,)).fetchall()
+            ids = tuple(f['id_cambio'] for f in filas[:20])
+            conn.execute(f"SELECT id_cambio, campo, valor_anterior, valor_nuevo FROM HistorialCambiosDetalle "
+                         f"WHERE id_cambio IN ({', '.join('?' * len(ids))})", ids).fetchall()
+            return len(ids)
+        ms_ahora, n_ahora = medir(primera_pagina)
+        print(f"ms por consulta (promedio de {args.repeticiones})")
+        print(f"  Ficha del estudiante con más historial: todo ({n_antes} filas) {ms_antes:8.2f}   primera página ({n_ahora}) {ms_ahora:8.2f}")
+
+        campos_por_nombre = {nombre: campo for campo, nombre in NOMBRES_CAMPOS_ESTUDIANTE.items()}
+        for campo, desde, hasta in [('estado_academico', '2024-01-01', '2024-02-01'), ('celular', '2020-01-01', '2025-01-01')]:
+            def separando_textos():
+                return sum(1 for fila in conn.execute(
+                    "SELECT detalles FROM HistorialCambios WHERE modelo_afectado = 'Estudiante' AND fecha_cambio >= ? AND fecha_cambio < ?",
+                    (desde, hasta)) if any(c[0] == campo for c in detalles_desde_texto(fila[0], campos_por_nombre) or ()))
+
+            def con_indice(limite):
+                return len(conn.execute("""SELECT d.id_cambio, d.fecha_cambio, d.valor_anterior, d.valor_nuevo, h.id_registro_afectado
+                                           FROM HistorialCambiosDetalle d JOIN HistorialCambios h ON h.id_cambio = d.id_cambio
+                                           WHERE d.campo = ? AND d.fecha_cambio >= ? AND d.fecha_cambio < ?
+                                           ORDER BY d.fecha_cambio DESC, d.id_cambio DESC LIMIT ?""",
+                                        (campo, desde, hasta, limite)).fetchall())
+            ms_texto, n_texto = medir(separando_textos)
+            ms_todo, _ = medir(lambda: con_indice(-1))
+            ms_pagina, _ = medir(lambda: con_indice(21))
+            print(f"  {campo} entre {desde} y {hasta} ({n_texto} cambios): separando textos {ms_texto:8.2f}   "
+                  f"índice, todos {ms_todo:8.2f}   índice, primera página {ms_pagina:8.2f}")
+        conn.close()
+
+
+def bench_auditoria(args):
+    """
+    Ediciones de seguimientos desde `--hilos` hilos: sin auditoría, con el registro de
+    auditoría escrito en la misma transacción de la edición, y con EscritorAuditoria
+    (en cola, escrito por grupos). Mide la duración de cada edición vista por quien la
+    hace y cuántas transacciones de auditoría hubo.
+    """
+    import threading
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = _preparar_entorno(directorio)
+        _poblar(ruta, max(args.ediciones // 10, 1), 10)
+        import auditoria
+        from database import get_db_connection, registrar_cambios
+        ids = [fila[0] for fila in get_db_connection().execute("SELECT id_seguimiento FROM Seguimientos LIMIT ?", (args.ediciones,))]
+
+        def editar(conn, id_seguimiento, n, modo, escritor):
+            anterior = conn.execute("SELECT * FROM Seguimientos WHERE id_seguimiento = ?", (id_seguimiento,)).fetchone()
+            nuevo = {'bitacora_sesion': f"Bitácora editada {modo} {n}", 'resultado_cita': 'Realizada'}
+            cambios = auditoria.cambios_de_edicion(anterior, nuevo)
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("UPDATE Seguimientos SET bitacora_sesion = :bitacora_sesion, resultado_cita = :resultado_cita WHERE id_seguimiento = :id",
+                         dict(nuevo, id=id_seguimiento))
+            if modo == 'en la transacción':
+                registrar_cambios(conn.cursor(), 'benchmark', auditoria.ACCION_EDICION, 'Seguimiento', id_seguimiento, cambios)
+            conn.commit()
+            if modo == 'en cola':
+                escritor.registrar('benchmark', auditoria.ACCION_EDICION, 'Seguimiento', id_seguimiento, cambios)
+
+        print(f"{len(ids)} ediciones de seguimientos desde {args.hilos} hilos")
+        print(f"  {'auditoría':20s} {'total':>8s} {'ms/edición p50':>15s} {'p99':>8s} {'máx':>8s} {'transacciones de auditoría':>28s}")
+        for modo in ['ninguna', 'en la transacción', 'en cola']:
+            escritor = auditoria.EscritorAuditoria(ruta)
+            duraciones = []
+            barrera = threading.Barrier(args.hilos)
+
+            def trabajar(parte):
+                conn = get_db_connection()
+                barrera.wait()
+                for n, id_seguimiento in enumerate(parte):
+                    inicio = time.perf_counter()
+                    editar(conn, id_seguimiento, n, modo, escritor)
+                    duraciones.append(time.perf_counter() - inicio)
+                conn.close()
+
+            hilos = [threading.Thread(target=trabajar, args=(ids[i::args.hilos],)) for i in range(args.hilos)]
+            inicio = time.perf_counter()
+            for hilo in hilos:
+                hilo.start()
+            for hilo in hilos:
+                hilo.join()
+            escritor.cerrar()
+            total = time.perf_counter() - inicio
+            duraciones.sort()
+            transacciones = {'ninguna': 0, 'en la transacción': len(ids), 'en cola': escritor.lotes + escritor.sincronos}[modo]
+            print(f"  {modo:20s} {total:7.2f}s {duraciones[len(duraciones) // 2] * 1000:15.3f} "
+                  f"{duraciones[int(len(duraciones) * 0.99)] * 1000:8.3f} {duraciones[-1] * 1000:8.2f} {transacciones:28d}")
+
+
+def medir_peticiones(args):
+    """
+    (Uso interno de 'metricas') Mide peticiones/segundo sobre `args.urls` en este proceso,
+    con SQL_METRICAS tomado del entorno, y escribe el resultado en stdout como JSON.
+    """
+    import app as aplicacion
+    aplicacion.limiter.enabled = False
+    cliente = _cliente_autenticado(aplicacion.app)
+    resultados = {url: _medir_peticiones(cliente, [url], args.peticiones) for url in args.urls}
+    print(json.dumps(resultados))
+
+
+def bench_metricas(args):
+    """
+    Costo de las métricas de SQL por petición (metricas.py): peticiones/segundo en '/',
+    la ficha de un estudiante y '/dashboard' con SQL_METRICAS=false y =true (cada caso en
+    un proceso nuevo), y el costo por sentencia de ConexionMedida contra una conexión común.
+    """
+    import metricas
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = _preparar_entorno(directorio)
+        ruts = _poblar(ruta, args.estudiantes, 5)
+        urls = ['/', f'/estudiante/{ruts[len(ruts) // 2]}', '/dashboard']
+        print(f"Base sintética: {args.estudiantes} estudiantes, {args.peticiones} peticiones por página")
+        resultados = {}
+        for activas in ['false', 'true']:
+            salida = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), 'medir-peticiones', '--peticiones', str(args.peticiones), '--urls', *urls],
+                env=dict(os.environ, DATABASE_PATH=ruta, SQL_METRICAS=activas), cwd=directorio,
+                capture_output=True, text=True, check=True)
+            resultados[activas] = json.loads(salida.stdout.strip().splitlines()[-1])
+        print(f"  {'página':32s} {'sin métricas':>14s} {'con métricas':>14s} {'costo':>8s}")
+        for url in urls:
+            sin, con = resultados['false'][url], resultados['true'][url]
+            print(f"  {url:32s} {1000 / sin:11.2f} ms {1000 / con:11.2f} ms {(sin / con - 1) * 100:7.1f}%")
+
+        # Costo por sentencia, sin Flask de por medio: una lectura por clave primaria.
+        sentencias = args.peticiones * 100
+        for nombre, clase in (("conexión común", sqlite3.Connection), ("ConexionMedida", metricas.ConexionMedida)):
+            conn = sqlite3.connect(ruta, factory=clase)
+            token = metricas._medicion_actual.set(metricas.MedicionPeticion())
+            inicio = time.perf_counter()
+            for i in range(sentencias):
+                conn.execute("SELECT rut, nombre FROM Estudiantes WHERE rut = ?", (ruts[i % len(ruts)],)).fetchone()
+            segundos = time.perf_counter() - inicio
+            metricas._medicion_actual.reset(token)
+            conn.close()
+            print(f"  {nombre:16s} {segundos / sentencias * 1e6:7.2f} µs por sentencia")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks del sistema de seguimiento.")
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    p = subparsers.add_parser('conexiones', help="Pool de conexiones y perfil de PRAGMAs.")
+    p.add_argument('--estudiantes', type=int, default=2000)
+    p.add_argument('--peticiones', type=int, default=300)
+    p.set_defaults(funcion=bench_conexiones)
+
+    p = subparsers.add_parser('csv', help="Exportaciones CSV: memoria y tiempo al primer byte.")
+    p.add_argument('--seguimientos', type=int, default=500000)
+    p.set_defaults(funcion=bench_csv)
+
+    p = subparsers.add_parser('xlsx', help="Exportaciones XLSX contra CSV: tiempo y memoria.")
+    p.add_argument('--filas', type=int, default=100000)
+    p.set_defaults(funcion=bench_xlsx)
+
+    p = subparsers.add_parser('paginacion', help="Lista de estudiantes paginada por clave.")
+    p.add_argument('--estudiantes', type=int, default=20000)
+    p.add_argument('--peticiones', type=int, default=200)
+    p.set_defaults(funcion=bench_paginacion)
+
+    p = subparsers.add_parser('busqueda', help="Búsqueda de estudiantes: LIKE contra FTS5.")
+    p.add_argument('--estudiantes', type=int, default=100000)
+    p.add_argument('--repeticiones', type=int, default=20)
+    p.set_defaults(funcion=bench_busqueda)
+
+    p = subparsers.add_parser('bitacoras', help="Búsqueda en bitácoras: LIKE contra FTS5.")
+    p.add_argument('--estudiantes', type=int, default=20000)
+    p.add_argument('--seguimientos', type=int, default=15, help="Seguimientos por estudiante.")
+    p.add_argument('--repeticiones', type=int, default=20)
+    p.set_defaults(funcion=bench_bitacoras)
+
+    p = subparsers.add_parser('historial', help="Historial de cambios: texto contra detalle por campo.")
+    p.add_argument('--estudiantes', type=int, default=5000)
+    p.add_argument('--cambios', type=int, default=40, help="Cambios por estudiante.")
+    p.add_argument('--repeticiones', type=int, default=5)
+    p.set_defaults(funcion=bench_historial)
+
+    p = subparsers.add_parser('auditoria', help="Ediciones de seguimientos con auditoría en la transacción o en cola.")
+    p.add_argument('--ediciones', type=int, default=5000)
+    p.add_argument('--hilos', type=int, default=4)
+    p.set_defaults(funcion=bench_auditoria)
+
+    p = subparsers.add_parser('metricas', help="Costo de las métricas de SQL por petición.")
+    p.add_argument('--estudiantes', type=int, default=5000)
+    p.add_argument('--peticiones', type=int, default=300)
+    p.set_defaults(funcion=bench_metricas)
+
+    p = subparsers.add_parser('reportes', help="/api/reporte_periodos con y sin caché de resultados.")
+    p.add_argument('--estudiantes', type=int, default=100000)
+    p.add_argument('--peticiones', type=int, default=60)
+    p.set_defaults(funcion=bench_reportes)
+
+    p = subparsers.add_parser('formularios', help="Construcción de NuevoEstudianteForm con sus opciones.")
+    p.add_argument('--repeticiones', type=int, default=5000)
+    p.set_defaults(funcion=bench_formularios)
+
+    p = subparsers.add_parser('contrasenas', help="Verificaciones de contraseña por segundo y por núcleo.")
+    p.add_argument('--verificaciones', type=int, default=40)
+    p.add_argument('--metodos', nargs='+', default=METODOS_HASH_BENCHMARK)
+    p.set_defaults(funcion=bench_contrasenas)
+
+    p = subparsers.add_parser('importacion', help="Importación desde Excel: tiempo y memoria.")
+    p.add_argument('--estudiantes', type=int, default=200000)
+    p.set_defaults(funcion=bench_importacion)
+
+    p = subparsers.add_parser('carga-seguimientos', help="Carga de seguimientos desde CSV contra uno por uno.")
+    p.add_argument('--estudiantes', type=int, default=10000)
+    p.add_argument('--filas', type=int, default=50000)
+    p.add_argument('--muestra', type=int, default=2000, help="Filas medidas una por una.")
+    p.set_defaults(funcion=bench_carga_seguimientos)
+
+    p = subparsers.add_parser('respaldos', help="Respaldos en línea: duración y latencia de los escritores.")
+    p.add_argument('--estudiantes', type=int, default=50000)
+    p.set_defaults(funcion=bench_respaldos)
+
+    p = subparsers.add_parser('medir-csv', help="(interno) mide una descarga CSV o XLSX en este proceso.")
+    p.add_argument('--modo', choices=['antes', 'despues'], required=True)
+    p.add_argument('--url', required=True)
+    p.set_defaults(funcion=medir_csv)
+
+    p = subparsers.add_parser('medir-peticiones', help="(interno) mide peticiones/segundo en este proceso.")
+    p.add_argument('--peticiones', type=int, required=True)
+    p.add_argument('--urls', nargs='+', required=True)
+    p.set_defaults(funcion=medir_peticiones)
+
+    args = parser.parse_args()
+    args.funcion(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+# cache.py
+"""
+Caché en memoria con tiempo de vida (TTL), por proceso.
+
+Pensada para valores baratos de recalcular pero que no vale la pena calcular en cada
+petición (conteos, listas de opciones, datos de reportes). Cada proceso de gunicorn
+tiene su propia copia: un valor puede quedar desactualizado a lo más `ttl` segundos
+en los procesos que no lo invalidaron.
+"""
+import threading
+import time
+
+
+class CacheTTL:
+    """
+    Diccionario acotado cuyas entradas expiran `ttl` segundos después de guardarse.
+
+    Uso:
+        conteos = CacheTTL(ttl=60, max_entradas=256)
+        total = conteos.obtener(clave, lambda: calcular_total(...))
+    """
+
+    def __init__(self, ttl, max_entradas=256):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self._datos = {}
+        self._lock = threading.Lock()
+
+    def obtener(self, clave, calcular):
+        """Devuelve el valor vigente de `clave`; si no hay, lo calcula con `calcular()` y lo guarda."""
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada and entrada[0] > ahora:
+                return entrada[1]
+        # Se calcula fuera del lock: dos peticiones simultáneas pueden calcularlo ambas,
+        # lo que es preferible a que una espere a la otra.
+        valor = calcular()
+        self.guardar(clave, valor)
+        return valor
+
+    def guardar(self, clave, valor):
+        ahora = time.monotonic()
+        with self._lock:
+            if len(self._datos) >= self.max_entradas and clave not in self._datos:
+                self._descartar_expiradas(ahora)
+                if len(self._datos) >= self.max_entradas:
+                    # Se descarta la que expira primero (la más antigua).
+                    del self._datos[min(self._datos, key=lambda c: self._datos[c][0])]
+            self._datos[clave] = (ahora + self.ttl, valor)
+
+    def invalidar(self, clave=None):
+        """Descarta `clave`, o todas las entradas si no se indica ninguna."""
+        with self._lock:
+            if clave is None:
+                self._datos.clear()
+            else:
+                self._datos.pop(clave, None)
+
+    def _descartar_expiradas(self, ahora):
+        for clave in [c for c, (expira, _) in self._datos.items() if expira <= ahora]:
+            del self._datos[clave]
@@ -2,11 +2,14 @@ import sqlite3
 import os
 from getpass import getpass
 from werkzeug.security import generate_password_hash
+from seguridad import METODO_HASH_POR_DEFECTO
 
 # --- Configuración ---
 # Nos aseguramos de que la ruta a la base de datos sea la misma que en la app.
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATABASE_NAME = os.path.join(BASE_DIR, 'seguimiento.db')
+# Mismo método de hash que usa la app (ver METODO_HASH_CONTRASENAS en el README).
+METODO_HASH_CONTRASENAS = os.environ.get('METODO_HASH_CONTRASENAS', METODO_HASH_POR_DEFECTO)
 
 def create_admin():
     """
@@ -56,7 +59,7 @@ def create_admin():
                 break
         
         # 4. Hashear la contraseña e insertar el usuario
-        password_hash = generate_password_hash(password, method='pbkdf2:sha256')
+        password_hash = generate_password_hash(password, method=METODO_HASH_CONTRASENAS)
         
         cursor.execute(
             "INSERT INTO Usuarios (username, password_hash, rol, nombre_completo, activo) VALUES (?, ?, ?, ?, ?)",
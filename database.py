@@ -1,9 +1,17 @@
 # database.py
 import sqlite3
 import os
+import queue
+import re
+import time
+from collections import namedtuple
+from contextlib import contextmanager
 from datetime import date
+from flask import g
 from werkzeug.security import generate_password_hash
 
+from metricas import ConexionMedida
+
 # --- Constantes para las Listas Desplegables ---
 # (Las listas de constantes permanecen sin cambios)
 LISTA_GENERO = ["Femenino", "Masculino", "No binario", "Otro", "Prefiero no indicar", "No registrado"]
@@ -101,102 +109,173 @@ LISTA_BENEFICIO_ARANCEL = [
 LISTA_PARENTESCO = ["Madre", "Padre", "Abuela/o", "Tía/o", "Hermano/a", "Amigo/a", "Pareja", "Otro", "No registrado"]
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DATABASE_NAME = os.path.join(BASE_DIR, 'seguimiento.db')
+DATABASE_NAME = os.environ.get('DATABASE_PATH') or os.path.join(BASE_DIR, 'seguimiento.db')
+
+# --- Perfil de PRAGMAs y pool de conexiones ---
+# Perfil que se aplica a cada conexión al momento de crearla. Cada valor puede
+# sobrescribirse por despliegue con variables de entorno SQLITE_PRAGMA_<NOMBRE>
+# (ej. SQLITE_PRAGMA_SYNCHRONOUS=FULL).
+PRAGMAS_POR_DEFECTO = {
+    'journal_mode': 'WAL',     # Lectores y escritor concurrentes
+    'synchronous': 'NORMAL',   # Seguro en modo WAL y mucho más rápido que FULL
+    'cache_size': -16000,      # Negativo = KiB (~16 MB de caché de páginas por conexión)
+    'mmap_size': 134217728,    # 128 MB de lectura vía mmap
+    'temp_store': 'MEMORY',    # Tablas temporales de ORDER BY / GROUP BY en memoria
+    'busy_timeout': 5000,      # ms de espera ante un bloqueo antes de fallar
+}
+PRAGMAS_PERMITIDOS = set(PRAGMAS_POR_DEFECTO) | {'foreign_keys', 'wal_autocheckpoint'}
+TAMANO_POOL_POR_DEFECTO = 8
+SENTENCIAS_EN_CACHE_POR_DEFECTO = 256
+
+
+def pragmas_desde_entorno(base=None):
+    """Devuelve el perfil de PRAGMAs combinando `base` con las variables SQLITE_PRAGMA_*."""
+    pragmas = dict(PRAGMAS_POR_DEFECTO if base is None else base)
+    for nombre in PRAGMAS_PERMITIDOS:
+        valor = os.environ.get(f'SQLITE_PRAGMA_{nombre.upper()}')
+        if valor is not None:
+            pragmas[nombre] = valor
+    return pragmas
+
+
+def _aplicar_pragmas(conn, pragmas):
+    for nombre, valor in pragmas.items():
+        if nombre not in PRAGMAS_PERMITIDOS:
+            raise ValueError(f"PRAGMA no permitido en el perfil: {nombre}")
+        valor = str(valor)
+        # Los PRAGMA no aceptan parámetros enlazados; validamos el valor antes de interpolarlo.
+        if not valor.lstrip('-').isalnum():
+            raise ValueError(f"Valor inválido para PRAGMA {nombre}: {valor!r}")
+        conn.execute(f"PRAGMA {nombre} = {valor}")
 
-def get_db_connection():
-    conn = sqlite3.connect(DATABASE_NAME)
+
+def _crear_conexion(ruta, pragmas, sentencias_en_cache=SENTENCIAS_EN_CACHE_POR_DEFECTO, clase=sqlite3.Connection):
+    # check_same_thread=False: una conexión del pool puede ser atendida por distintos
+    # hilos a lo largo de su vida, pero nunca por dos peticiones al mismo tiempo.
+    conn = sqlite3.connect(ruta, check_same_thread=False, cached_statements=sentencias_en_cache, factory=clase)
     conn.row_factory = sqlite3.Row
+    _aplicar_pragmas(conn, pragmas)
     return conn
 
+
+class PoolConexiones:
+    """
+    Pool acotado de conexiones SQLite, propio de cada proceso.
+
+    Las conexiones se crean a demanda con el perfil de PRAGMAs y se guardan hasta
+    `tamano` conexiones libres; las que sobran al devolverse se cierran. Con
+    `tamano=0` el pool no reutiliza nada (una conexión nueva por petición). `clase` es
+    la clase de las conexiones (ConexionMedida para las métricas de SQL, ver metricas.py).
+    """
+
+    def __init__(self, ruta, tamano=TAMANO_POOL_POR_DEFECTO, pragmas=None,
+                 sentencias_en_cache=SENTENCIAS_EN_CACHE_POR_DEFECTO, clase=sqlite3.Connection):
+        self.ruta = ruta
+        self.tamano = tamano
+        self.pragmas = PRAGMAS_POR_DEFECTO if pragmas is None else pragmas
+        self.sentencias_en_cache = sentencias_en_cache
+        self.clase = clase
+        self._reiniciar()
+
+    def _reiniciar(self):
+        self._pid = os.getpid()
+        self._libres = queue.LifoQueue(maxsize=max(self.tamano, 1))
+
+    def obtener(self):
+        # Tras un fork (ej. gunicorn --preload) no se deben usar las conexiones del padre.
+        if self._pid != os.getpid():
+            self._reiniciar()
+        try:
+            return self._libres.get_nowait()
+        except queue.Empty:
+            return _crear_conexion(self.ruta, self.pragmas, self.sentencias_en_cache, self.clase)
+
+    def devolver(self, conn):
+        if self.tamano <= 0 or self._pid != os.getpid():
+            conn.close()
+            return
+        try:
+            # Nunca se devuelve al pool una transacción a medio terminar.
+            if conn.in_transaction:
+                conn.rollback()
+            self._libres.put_nowait(conn)
+        except (queue.Full, sqlite3.Error):
+            conn.close()
+
+    def cerrar_todas(self):
+        while True:
+            try:
+                self._libres.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pool = None
+
+
+def init_app(app):
+    """Configura el pool de conexiones del proceso y registra el cierre por petición."""
+    global _pool
+    if _pool is not None:
+        _pool.cerrar_todas()
+    _pool = PoolConexiones(
+        ruta=app.config.get('DATABASE', DATABASE_NAME),
+        tamano=app.config.get('SQLITE_POOL_SIZE', TAMANO_POOL_POR_DEFECTO),
+        pragmas=app.config.get('SQLITE_PRAGMAS', PRAGMAS_POR_DEFECTO),
+        sentencias_en_cache=app.config.get('SQLITE_CACHED_STATEMENTS', SENTENCIAS_EN_CACHE_POR_DEFECTO),
+        clase=ConexionMedida if app.config.get('SQL_METRICAS', True) else sqlite3.Connection,
+    )
+    if close_db not in app.teardown_appcontext_funcs:
+        app.teardown_appcontext(close_db)
+
+
+def get_db():
+    """Devuelve la conexión de la petición actual, tomándola del pool la primera vez."""
+    if 'db' not in g:
+        g.db = _pool.obtener()
+    return g.db
+
+
+def close_db(exception=None):
+    """Devuelve al pool la conexión de la petición (se registra como teardown)."""
+    conn = g.pop('db', None)
+    if conn is not None:
+        _pool.devolver(conn)
+
+
+def get_db_connection(ruta=None):
+    """Conexión independiente (fuera del ciclo de peticiones), para scripts y tareas."""
+    return _crear_conexion(ruta or DATABASE_NAME, pragmas_desde_entorno())
+
 def seed_data():
-    import pandas as pd
-    """Inserta datos desde Excel, manejando correctamente los valores nulos (NaN)."""
+    """
+    Importa 'datos_iniciales.xlsx' en una base recién creada (sin usuarios), con
+    importacion.py. Para cargar datos en una base en uso: python importacion.py <archivo>.
+    """
+    from importacion import importar_libro
     print("Intentando sembrar datos...")
     conn = get_db_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("SELECT COUNT(id) FROM Usuarios")
-    if cursor.fetchone()[0] > 0:
-        conn.close()
-        print("La base de datos ya tiene datos. No se necesita sembrar.")
-        return
-    
-    print("Base de datos vacía. Sembrando datos nuevos...")
     try:
+        if conn.execute("SELECT COUNT(id) FROM Usuarios").fetchone()[0] > 0:
+            print("La base de datos ya tiene datos. No se necesita sembrar.")
+            return
         # La creación de usuarios por defecto ha sido eliminada por seguridad.
         # El primer usuario 'admin' debe ser creado manualmente.
-        print("La siembra de usuarios ha sido omitida por seguridad.")
-
         excel_path = os.path.join(BASE_DIR, 'datos_iniciales.xlsx')
         if not os.path.exists(excel_path):
             print("ADVERTENCIA: No se encontró el archivo 'datos_iniciales.xlsx'.")
-        else:
-            # --- Procesar Hoja 'Estudiantes' ---
-            print("\n--- Procesando hoja 'Estudiantes' ---")
-            df_estudiantes = pd.read_excel(excel_path, sheet_name='Estudiantes')
-            
-            # Convertir columnas de fecha, manejando errores
-            columnas_fecha_est = ['fecha_nacimiento', 'fecha_ingreso_programa', 'fecha_derivacion_cesfam', 'fecha_autorizacion_investigacion']
-            for col in columnas_fecha_est:
-                df_estudiantes[col] = pd.to_datetime(df_estudiantes[col], errors='coerce', dayfirst=True).dt.strftime('%Y-%m-%d')
-            
-            # *** CAMBIO CLAVE AQUÍ ***
-            # Reemplazar todos los tipos de nulos de Pandas (NaN, NaT) por None de Python.
-            # El truco de .astype(object) asegura que la conversión se pueda hacer sin conflictos de tipo.
-            df_estudiantes = df_estudiantes.astype(object).where(pd.notnull(df_estudiantes), None)
-            
-            estudiantes_para_insertar = list(df_estudiantes.to_records(index=False))
-            cursor.executemany("INSERT INTO Estudiantes VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)", estudiantes_para_insertar)
-            print(f"{len(estudiantes_para_insertar)} estudiantes insertados desde Excel.")
-
-            # --- Procesar Hoja 'Seguimientos' ---
-            print("\n--- Procesando hoja 'Seguimientos' ---")
-            df_seguimientos = pd.read_excel(excel_path, sheet_name='Seguimientos')
-            
-            # Convertir columnas numéricas a un tipo que soporta nulos (Int64)
-            columnas_numericas = ['alta_mejora_animo', 'alta_disminucion_riesgo', 'alta_redes_apoyo', 'alta_adherencia_tratamiento', 'alta_no_registrado', 'es_correccion', 'corrige_id_seguimiento']
-            for col in columnas_numericas:
-                df_seguimientos[col] = pd.to_numeric(df_seguimientos[col], errors='coerce').astype('Int64')
-            
-            # Convertir columnas de fecha
-            columnas_fecha_seg = ['fecha_sesion', 'extension_programa_otorgada']
-            for col in columnas_fecha_seg:
-                df_seguimientos[col] = pd.to_datetime(df_seguimientos[col], errors='coerce', dayfirst=True).dt.strftime('%Y-%m-%d')
-            
-            # *** CAMBIO CLAVE AQUÍ (misma lógica que antes) ***
-            # Esto convierte NaN, NaT, y pd.NA a None, que es lo que SQL entiende como NULL.
-            df_seguimientos = df_seguimientos.astype(object).where(pd.notnull(df_seguimientos), None)
-
-            seguimientos_para_insertar = list(df_seguimientos.to_records(index=False))
-            
-            # Consulta SQL para insertar en la tabla Seguimientos
-            cursor.executemany("""
-                INSERT INTO Seguimientos (
-                    rut_estudiante, trabajadora_social_sesion, psicologo_sesion, fecha_sesion, 
-                    estado_derivacion_cesfam_actual, tipo_intervencion, resultado_cita, 
-                    confirmacion_gestion_hora_cesfam, fechas_sesiones_cesfam, bitacora_sesion, 
-                    cambio_estado_programa_a, cambio_estado_academico_a, creado_por_usuario, 
-                    alta_mejora_animo, alta_disminucion_riesgo, alta_redes_apoyo, 
-                    alta_adherencia_tratamiento, alta_no_registrado, extension_programa_otorgada, 
-                    es_correccion, corrige_id_seguimiento
-                ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
-            """, seguimientos_para_insertar)
-            print(f"{len(seguimientos_para_insertar)} seguimientos insertados desde Excel.")
-        
-        conn.commit()
+            return
+        importar_libro(conn, excel_path, os.path.join(BASE_DIR, 'datos_iniciales_rechazos.csv'))
         print("\nDatos sembrados exitosamente.")
     except Exception as e:
         import traceback
         print(f"Error al sembrar datos: {e}")
         traceback.print_exc()
-        conn.rollback()
     finally:
-        if conn:
-            conn.close()
+        conn.close()
 
-def init_db():
-    """Inicializa la base de datos y crea las tablas si no existen (Sintaxis SQLite)."""
-    conn = get_db_connection()
+def crear_esquema(conn):
+    """Crea las tablas si no existen (Sintaxis SQLite) usando la conexión indicada."""
     cursor = conn.cursor()
 
     # Definiciones de las tablas (sin cambios)
@@ -263,8 +342,691 @@ def init_db():
     )''')
     print("Tabla HistorialCambios (SQLite) verificada/creada.")
 
-    conn.commit()
-    conn.close()
+def crear_tabla_estado_actual(conn):
+    """
+    Una fila por estudiante con su período de atención vigente (el de mayor id).
+    Se mantiene en la misma transacción que cada escritura sobre PeriodosAtencion
+    (ver actualizar_estado_actual); así la lista y las alertas usan un JOIN simple.
+    """
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS EstadoActualEstudiante (
+        rut_estudiante TEXT PRIMARY KEY,
+        id_periodo_actual INTEGER NOT NULL,
+        estado_periodo_actual TEXT NOT NULL,
+        fecha_ingreso_periodo TEXT NOT NULL,
+        FOREIGN KEY (rut_estudiante) REFERENCES Estudiantes (rut),
+        FOREIGN KEY (id_periodo_actual) REFERENCES PeriodosAtencion (id)
+    )''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_estado_actual_estado ON EstadoActualEstudiante (estado_periodo_actual, fecha_ingreso_periodo)")
+
+# Período vigente de cada estudiante calculado directamente desde PeriodosAtencion,
+# junto con la fecha de su último seguimiento.
+SQL_ESTADO_ACTUAL_DERIVADO = """
+    SELECT pa.rut_estudiante, pa.id AS id_periodo_actual, pa.estado_periodo AS estado_periodo_actual,
+           pa.fecha_ingreso AS fecha_ingreso_periodo,
+           (SELECT MAX(fecha_sesion) FROM Seguimientos WHERE rut_estudiante = pa.rut_estudiante) AS fecha_ultima_sesion
+    FROM PeriodosAtencion pa
+    WHERE pa.id = (SELECT MAX(id) FROM PeriodosAtencion WHERE rut_estudiante = pa.rut_estudiante)
+"""
+
+def actualizar_estado_actual(cursor, rut_estudiante):
+    """Recalcula la fila de EstadoActualEstudiante del estudiante. No hace commit."""
+    cursor.execute("""
+        INSERT INTO EstadoActualEstudiante (rut_estudiante, id_periodo_actual, estado_periodo_actual, fecha_ingreso_periodo,
+                                            fecha_ultima_sesion)
+        SELECT rut_estudiante, id, estado_periodo, fecha_ingreso,
+               (SELECT MAX(fecha_sesion) FROM Seguimientos WHERE rut_estudiante = ?)
+        FROM PeriodosAtencion
+        WHERE rut_estudiante = ? ORDER BY id DESC LIMIT 1
+        ON CONFLICT (rut_estudiante) DO UPDATE SET
+            id_periodo_actual = excluded.id_periodo_actual,
+            estado_periodo_actual = excluded.estado_periodo_actual,
+            fecha_ingreso_periodo = excluded.fecha_ingreso_periodo,
+            fecha_ultima_sesion = excluded.fecha_ultima_sesion
+    """, (rut_estudiante, rut_estudiante))
+
+def actualizar_ultima_sesion(cursor, rut_estudiante):
+    """
+    Recalcula la fecha del último seguimiento del estudiante en EstadoActualEstudiante.
+    Se llama después de crear, editar o eliminar un seguimiento. No hace commit.
+    """
+    cursor.execute("""
+        UPDATE EstadoActualEstudiante
+        SET fecha_ultima_sesion = (SELECT MAX(fecha_sesion) FROM Seguimientos WHERE rut_estudiante = ?)
+        WHERE rut_estudiante = ?
+    """, (rut_estudiante, rut_estudiante))
+
+# Primer período de atención de los estudiantes que no tienen ninguno (datos anteriores a
+# PeriodosAtencion o importados sin período), desde sus datos de ingreso al programa. Los
+# que no tienen fecha de ingreso al programa se omiten: no se inventa la fecha del período.
+SQL_CREAR_PERIODOS_FALTANTES = """
+    INSERT INTO PeriodosAtencion (rut_estudiante, fecha_ingreso, motivo_ingreso, estado_periodo,
+                                  carrera_periodo, facultad_periodo, estado_academico_periodo)
+    SELECT e.rut, e.fecha_ingreso_programa,
+           COALESCE(NULLIF(TRIM(e.tentativa_ideacion), ''), 'No registrado'),
+           COALESCE(NULLIF(TRIM(e.estado_en_programa), ''), 'No registrado'),
+           e.carrera_programa, e.facultad, e.estado_academico
+    FROM Estudiantes e
+    WHERE NOT EXISTS (SELECT 1 FROM PeriodosAtencion pa WHERE pa.rut_estudiante = e.rut)
+    AND NULLIF(TRIM(e.fecha_ingreso_programa), '') IS NOT NULL
+"""
+
+SQL_ESTUDIANTES_SIN_PERIODO = """
+    SELECT e.rut, e.fecha_ingreso_programa FROM Estudiantes e
+    WHERE NOT EXISTS (SELECT 1 FROM PeriodosAtencion pa WHERE pa.rut_estudiante = e.rut)
+    ORDER BY e.rut
+"""
+
+# Estudiantes activos sin seguimientos en los últimos N días (o sin ninguno). Recibe el
+# modificador de fecha de SQLite ('-30 days', ver modificador_alertas); el que llama
+# agrega sus condiciones con AND y luego ORDEN_ALERTAS_INACTIVIDAD. Columnas y orden son
+# los de la consulta original (MAX(fecha_sesion) por estudiante ... HAVING).
+SQL_ALERTAS_INACTIVIDAD = """
+    SELECT
+        e.rut, e.nombre, e.apellido_paterno, e.apellido_materno,
+        ea.fecha_ultima_sesion as ultima_sesion,
+        CAST(julianday('now') - julianday(ea.fecha_ultima_sesion) AS INTEGER) as dias_sin_seguimiento
+    FROM EstadoActualEstudiante ea
+    JOIN Estudiantes e ON e.rut = ea.rut_estudiante
+    WHERE (ea.fecha_ultima_sesion < date('now', ?) OR ea.fecha_ultima_sesion IS NULL)
+    AND ea.estado_periodo_actual LIKE 'Activo%'
+"""
+ORDEN_ALERTAS_INACTIVIDAD = " ORDER BY dias_sin_seguimiento DESC, e.rut"
+
+def modificador_alertas(dias_alerta):
+    """
+    Modificador de fecha para SQL_ALERTAS_INACTIVIDAD. 'Más de N días' en la consulta
+    original (CAST(julianday('now') - julianday(fecha)) > N) equivale a una fecha de
+    sesión anterior a date('now', '-N days').
+    """
+    return f"-{int(dias_alerta)} days"
+
+# --- Consultas de las páginas frecuentes ---
+# Las ejecuta app.py y verificar_planes.py revisa sus planes: viven aquí para que sean
+# las mismas. Como SQL_ALERTAS_INACTIVIDAD, cada SQL_* termina en un WHERE al que el
+# que llama agrega condiciones (CONDICION_*, con AND), la de la página (PAGINA_*) y
+# luego el ORDEN_* con el LIMIT.
+
+# Un profesional sólo ve a los estudiantes que tiene asignados.
+CONDICION_PROFESIONAL = "(e.trabajadora_social_asignada = ? OR e.psicologo_asignado = ?)"
+
+SQL_CONTEO_ACTIVOS_POR_ANIO = """
+    SELECT
+        strftime('%Y', ea.fecha_ingreso_periodo) as anio_ingreso,
+        COUNT(ea.rut_estudiante) as cantidad_activos
+    FROM EstadoActualEstudiante ea
+    WHERE ea.estado_periodo_actual IN ('Activo', 'Activo (Reingreso)')
+    GROUP BY anio_ingreso
+    ORDER BY anio_ingreso DESC
+"""
+
+# Lista de estudiantes de '/': COLUMNAS_LISTA_ESTUDIANTES + (', c.puntaje' con búsqueda)
+# + DESDE_LISTA_ESTUDIANTES o DESDE_BUSQUEDA_ESTUDIANTES (ésta recibe la expresión MATCH).
+# Sus condiciones se unen con AND tras un WHERE que agrega el que llama.
+COLUMNAS_LISTA_ESTUDIANTES = """
+    SELECT e.rut, e.nombre, e.apellido_paterno, e.apellido_materno, e.carrera_programa,
+           ea.estado_periodo_actual as estado_periodo"""
+DESDE_LISTA_ESTUDIANTES = """
+    FROM Estudiantes e
+    JOIN EstadoActualEstudiante ea ON e.rut = ea.rut_estudiante
+"""
+DESDE_BUSQUEDA_ESTUDIANTES = """
+    FROM (SELECT rut, bm25(EstudiantesFTS) AS puntaje FROM EstudiantesFTS WHERE EstudiantesFTS MATCH ?) c
+    JOIN Estudiantes e ON e.rut = c.rut
+    JOIN EstadoActualEstudiante ea ON e.rut = ea.rut_estudiante
+"""
+# Orden de la lista sin búsqueda, por el que se pagina (idx_estudiantes_orden_lista).
+COLUMNAS_ORDEN_ESTUDIANTES = ('apellido_paterno', 'apellido_materno', 'nombre', 'rut')
+CONDICION_ESTADO_PERIODO = "LOWER(TRIM(ea.estado_periodo_actual)) = ?"
+CONDICION_SIN_ESTADO_PERIODO = "LOWER(TRIM(ea.estado_periodo_actual)) != ?"
+
+# Bitácoras que coinciden con una expresión MATCH, de la más reciente a la más antigua.
+# Recibe las dos marcas del fragmento y la expresión.
+SQL_BUSCAR_SEGUIMIENTOS = """
+    SELECT s.id_seguimiento, s.rut_estudiante, s.fecha_sesion, s.tipo_intervencion,
+           NOT s.es_vigente as fue_corregido,
+           e.nombre, e.apellido_paterno, e.apellido_materno,
+           snippet(SeguimientosFTS, 0, ?, ?, '…', 24) as fragmento
+    FROM SeguimientosFTS f
+    JOIN Seguimientos s ON s.id_seguimiento = f.rowid
+    JOIN Estudiantes e ON e.rut = s.rut_estudiante
+    WHERE SeguimientosFTS MATCH ?
+"""
+PAGINA_BUSCAR_SEGUIMIENTOS = " AND f.rowid < ?"
+ORDEN_BUSCAR_SEGUIMIENTOS = " ORDER BY f.rowid DESC LIMIT ?"
+
+# Historial de cambios de la ficha de un estudiante (recibe el rut) y de las ediciones
+# de seguimientos; ambos paginados por (fecha_cambio, id_cambio).
+SQL_HISTORIAL_ESTUDIANTE = """
+    SELECT id_cambio, fecha_cambio, nombre_usuario, accion, detalles FROM HistorialCambios
+    WHERE id_registro_afectado = ? AND modelo_afectado = 'Estudiante'
+"""
+SQL_AUDITORIA_SEGUIMIENTOS = """
+    SELECT id_cambio, fecha_cambio, nombre_usuario, accion, id_registro_afectado FROM HistorialCambios
+    WHERE modelo_afectado = 'Seguimiento'
+"""
+CONDICION_AUDITORIA_SEGUIMIENTO = " AND id_registro_afectado = ?"
+CONDICION_AUDITORIA_USUARIO = " AND nombre_usuario = ?"
+PAGINA_HISTORIAL = " AND (fecha_cambio, id_cambio) < (?, ?)"
+ORDEN_HISTORIAL = " ORDER BY fecha_cambio DESC, id_cambio DESC LIMIT ?"
+
+# Campos modificados de una página del historial: se completa con los marcadores del IN.
+SQL_CAMPOS_MODIFICADOS = "SELECT id_cambio, campo, valor_anterior, valor_nuevo FROM HistorialCambiosDetalle WHERE id_cambio IN ({marcadores})"
+
+# Cambios de un campo de la ficha entre dos fechas (recibe campo, desde y hasta exclusivo).
+SQL_HISTORIAL_CAMPO = """
+    SELECT d.id_cambio, d.fecha_cambio, d.valor_anterior, d.valor_nuevo,
+           h.id_registro_afectado as rut, h.nombre_usuario,
+           e.nombre, e.apellido_paterno, e.apellido_materno
+    FROM HistorialCambiosDetalle d
+    JOIN HistorialCambios h ON h.id_cambio = d.id_cambio
+    LEFT JOIN Estudiantes e ON e.rut = h.id_registro_afectado
+    WHERE d.campo = ? AND d.fecha_cambio >= ? AND d.fecha_cambio < ?
+"""
+PAGINA_HISTORIAL_CAMPO = " AND (d.fecha_cambio, d.id_cambio) < (?, ?)"
+ORDEN_HISTORIAL_CAMPO = " ORDER BY d.fecha_cambio DESC, d.id_cambio DESC LIMIT ?"
+
+# Reporte de períodos por una dimensión (una expresión de una lista blanca, nunca un
+# valor del usuario) entre dos fechas de ingreso.
+SQL_REPORTE_PERIODOS = """
+    SELECT
+        {dimension} as dimension,
+        COUNT(pa.id) as total
+    FROM PeriodosAtencion pa
+    JOIN Estudiantes e ON pa.rut_estudiante = e.rut
+    WHERE pa.fecha_ingreso BETWEEN ? AND ?
+    GROUP BY dimension
+    ORDER BY total DESC
+"""
+
+def verificar_estado_actual(conn, reparar=False):
+    """
+    Compara EstadoActualEstudiante con lo que se deriva de PeriodosAtencion.
+    Devuelve la lista de RUTs con diferencias; con `reparar=True` reconstruye la tabla
+    completa en una sola transacción.
+    """
+    diferencias = [fila[0] for fila in conn.execute(f"""
+        WITH derivado AS ({SQL_ESTADO_ACTUAL_DERIVADO})
+        SELECT d.rut_estudiante FROM derivado d
+        LEFT JOIN EstadoActualEstudiante ea ON ea.rut_estudiante = d.rut_estudiante
+        WHERE ea.rut_estudiante IS NULL OR ea.id_periodo_actual != d.id_periodo_actual
+           OR ea.estado_periodo_actual IS NOT d.estado_periodo_actual
+           OR ea.fecha_ingreso_periodo IS NOT d.fecha_ingreso_periodo
+           OR ea.fecha_ultima_sesion IS NOT d.fecha_ultima_sesion
+        UNION
+        SELECT ea.rut_estudiante FROM EstadoActualEstudiante ea
+        WHERE NOT EXISTS (SELECT 1 FROM PeriodosAtencion pa WHERE pa.rut_estudiante = ea.rut_estudiante)
+    """)]
+    if reparar and diferencias:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM EstadoActualEstudiante")
+            conn.execute(f"""
+                INSERT INTO EstadoActualEstudiante (rut_estudiante, id_periodo_actual, estado_periodo_actual, fecha_ingreso_periodo,
+                                                    fecha_ultima_sesion)
+                {SQL_ESTADO_ACTUAL_DERIVADO}
+            """)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return diferencias
+
+# Versión vigente de cada seguimiento resuelta desde las cadenas de corrección: cada
+# seguimiento queda reemplazado por el siguiente (por id) de su misma cadena. La raíz
+# de una cadena es el seguimiento original; si fue eliminado, sus correcciones forman
+# la cadena del id que corregían.
+SQL_VERSIONES_SEGUIMIENTO_DERIVADAS = """
+    WITH RECURSIVE cadena (id_seguimiento, id_raiz) AS (
+        SELECT s.id_seguimiento, COALESCE(s.corrige_id_seguimiento, s.id_seguimiento)
+        FROM Seguimientos s
+        WHERE s.corrige_id_seguimiento IS NULL
+           OR NOT EXISTS (SELECT 1 FROM Seguimientos o WHERE o.id_seguimiento = s.corrige_id_seguimiento)
+        UNION ALL
+        SELECT s.id_seguimiento, c.id_raiz
+        FROM Seguimientos s JOIN cadena c ON s.corrige_id_seguimiento = c.id_seguimiento
+    )
+    SELECT id_seguimiento,
+           LEAD(id_seguimiento) OVER (PARTITION BY id_raiz ORDER BY id_seguimiento) AS reemplazado_por_id
+    FROM cadena
+"""
+
+def registrar_correccion_seguimiento(cursor, id_nuevo, corrige_id):
+    """
+    Marca como reemplazada la versión vigente de la cadena a la que pertenece
+    `corrige_id` (se sigue reemplazado_por_id hasta la vigente) y la apunta al
+    seguimiento `id_nuevo`. No hace commit.
+    """
+    cursor.execute("""
+        WITH RECURSIVE siguientes (id_seguimiento, reemplazado_por_id) AS (
+            SELECT id_seguimiento, reemplazado_por_id FROM Seguimientos WHERE id_seguimiento = ?
+            UNION ALL
+            SELECT s.id_seguimiento, s.reemplazado_por_id
+            FROM Seguimientos s JOIN siguientes sg ON s.id_seguimiento = sg.reemplazado_por_id
+        )
+        UPDATE Seguimientos SET reemplazado_por_id = ?, es_vigente = 0
+        WHERE id_seguimiento = (SELECT id_seguimiento FROM siguientes WHERE reemplazado_por_id IS NULL)
+          AND id_seguimiento != ?
+    """, (corrige_id, id_nuevo, id_nuevo))
+
+def retirar_version_seguimiento(cursor, id_seguimiento):
+    """
+    Saca un seguimiento de su cadena antes de eliminarlo: la versión anterior pasa a
+    apuntar a la siguiente o, si se elimina la vigente, vuelve a ser la vigente.
+    Si era una corrección, las que lo corregían pasan a corregir al que él corregía,
+    así siguen en la misma cadena (SQL_VERSIONES_SEGUIMIENTO_DERIVADAS). No hace commit.
+    """
+    cursor.execute("""
+        UPDATE Seguimientos
+        SET corrige_id_seguimiento = (SELECT corrige_id_seguimiento FROM Seguimientos WHERE id_seguimiento = ?)
+        WHERE corrige_id_seguimiento = ?
+          AND (SELECT corrige_id_seguimiento FROM Seguimientos WHERE id_seguimiento = ?) IS NOT NULL
+    """, (id_seguimiento, id_seguimiento, id_seguimiento))
+    cursor.execute("""
+        UPDATE Seguimientos SET
+            reemplazado_por_id = (SELECT reemplazado_por_id FROM Seguimientos WHERE id_seguimiento = ?),
+            es_vigente = (SELECT reemplazado_por_id IS NULL FROM Seguimientos WHERE id_seguimiento = ?)
+        WHERE reemplazado_por_id = ?
+    """, (id_seguimiento, id_seguimiento, id_seguimiento))
+
+def verificar_versiones_seguimiento(conn, reparar=False):
+    """
+    Compara reemplazado_por_id/es_vigente con lo que se deriva de las cadenas de
+    corrección. Devuelve los ids con diferencias; con `reparar=True` los corrige en
+    una sola transacción.
+    """
+    diferencias = [fila[0] for fila in conn.execute(f"""
+        WITH derivado AS ({SQL_VERSIONES_SEGUIMIENTO_DERIVADAS})
+        SELECT s.id_seguimiento FROM Seguimientos s
+        JOIN derivado d ON d.id_seguimiento = s.id_seguimiento
+        WHERE s.reemplazado_por_id IS NOT d.reemplazado_por_id
+           OR s.es_vigente IS NOT (d.reemplazado_por_id IS NULL)
+    """)]
+    if reparar and diferencias:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            actualizar_versiones_seguimiento(conn)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return diferencias
+
+def actualizar_versiones_seguimiento(conn):
+    """Recalcula reemplazado_por_id/es_vigente de todos los seguimientos. No hace commit."""
+    conn.execute(f"""
+        WITH derivado AS ({SQL_VERSIONES_SEGUIMIENTO_DERIVADAS})
+        UPDATE Seguimientos SET
+            reemplazado_por_id = derivado.reemplazado_por_id,
+            es_vigente = derivado.reemplazado_por_id IS NULL
+        FROM derivado
+        WHERE derivado.id_seguimiento = Seguimientos.id_seguimiento
+          AND (Seguimientos.reemplazado_por_id IS NOT derivado.reemplazado_por_id
+               OR Seguimientos.es_vigente IS NOT (derivado.reemplazado_por_id IS NULL))
+    """)
+
+# --- Tablas de resumen del dashboard ---
+# Cada resumen guarda el conteo de filas de `tabla_origen` que cumplen `condicion`,
+# agrupadas por `claves` ({columna del resumen: expresión}). En las expresiones, {f}
+# se reemplaza por "NEW." u "OLD." dentro de los triggers y por "" en la consulta
+# derivada. Los triggers sólo dependen de `columnas_origen`.
+Resumen = namedtuple('Resumen', ['tabla_origen', 'claves', 'condicion', 'columnas_origen'])
+
+RESUMENES_DASHBOARD = {
+    'ResumenEstados': Resumen(
+        'Estudiantes', {'estado': '{f}estado_en_programa'}, '1', ['estado_en_programa']),
+    'ResumenCarreras': Resumen(
+        'Estudiantes', {'carrera': 'TRIM({f}carrera_programa)'}, '1', ['carrera_programa']),
+    'ResumenSeguimientosMes': Resumen(
+        'Seguimientos', {'mes': "strftime('%Y-%m', {f}fecha_sesion)"},
+        '{f}fecha_sesion IS NOT NULL AND {f}es_vigente = 1', ['fecha_sesion', 'es_vigente']),
+    'ResumenIdeacionAnio': Resumen(
+        'Estudiantes', {'anio': "strftime('%Y', {f}fecha_ingreso_programa)", 'tipo': '{f}tentativa_ideacion'},
+        "{f}tentativa_ideacion IN ('Ideación', 'Tentativa')", ['fecha_ingreso_programa', 'tentativa_ideacion']),
+}
+
+def sql_resumen_derivado(nombre):
+    """Consulta que calcula el resumen `nombre` directamente desde su tabla de origen."""
+    r = RESUMENES_DASHBOARD[nombre]
+    expresiones = [expresion.format(f='') for expresion in r.claves.values()]
+    columnas = ', '.join(f"{expresion} AS {columna}" for columna, expresion in zip(r.claves, expresiones))
+    return (f"SELECT {columnas}, COUNT(*) AS total FROM {r.tabla_origen} "
+            f"WHERE {r.condicion.format(f='')} GROUP BY {', '.join(expresiones)}")
+
+def _sentencias_trigger_resumen(nombre, fila, delta):
+    """Sentencias que suman `delta` (+1/-1) al grupo de la fila NEW/OLD en el resumen."""
+    r = RESUMENES_DASHBOARD[nombre]
+    valores = {columna: expresion.format(f=f'{fila}.') for columna, expresion in r.claves.items()}
+    # IS en vez de = : los grupos con clave NULL también se cuentan (como en GROUP BY).
+    mismo_grupo = ' AND '.join(f"{columna} IS {valor}" for columna, valor in valores.items())
+    condicion = r.condicion.format(f=f'{fila}.')
+    sentencias = [f"UPDATE {nombre} SET total = total + ({delta}) WHERE {mismo_grupo} AND ({condicion});"]
+    if delta > 0:
+        sentencias.append(
+            f"INSERT INTO {nombre} ({', '.join(valores)}, total) SELECT {', '.join(valores.values())}, 1 "
+            f"WHERE ({condicion}) AND NOT EXISTS (SELECT 1 FROM {nombre} WHERE {mismo_grupo});")
+    else:
+        sentencias.append(f"DELETE FROM {nombre} WHERE {mismo_grupo} AND total <= 0;")
+    return sentencias
+
+def crear_resumenes_dashboard(conn):
+    """
+    Crea las tablas Resumen* y los triggers que las mantienen al día con cada INSERT,
+    UPDATE y DELETE sobre su tabla de origen (incluidas las cargas masivas y los
+    scripts). No las llena: ver reconstruir_resumenes.
+    """
+    for nombre, r in RESUMENES_DASHBOARD.items():
+        columnas = ', '.join(f"{columna} TEXT" for columna in r.claves)
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {nombre} ({columnas}, total INTEGER NOT NULL)")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{nombre.lower()}_clave ON {nombre} ({', '.join(r.claves)})")
+        cuerpos = {
+            'insert': (f"AFTER INSERT ON {r.tabla_origen}", _sentencias_trigger_resumen(nombre, 'NEW', 1)),
+            'delete': (f"AFTER DELETE ON {r.tabla_origen}", _sentencias_trigger_resumen(nombre, 'OLD', -1)),
+            'update': (f"AFTER UPDATE OF {', '.join(r.columnas_origen)} ON {r.tabla_origen}",
+                       _sentencias_trigger_resumen(nombre, 'OLD', -1) + _sentencias_trigger_resumen(nombre, 'NEW', 1)),
+        }
+        for evento, (cuando, sentencias) in cuerpos.items():
+            cuerpo = '\n    '.join(sentencias)
+            conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{nombre.lower()}_{evento} {cuando}\nBEGIN\n    {cuerpo}\nEND")
+
+def reconstruir_resumenes(conn):
+    """Recalcula todas las tablas Resumen* desde sus tablas de origen. No hace commit."""
+    for nombre, r in RESUMENES_DASHBOARD.items():
+        conn.execute(f"DELETE FROM {nombre}")
+        conn.execute(f"INSERT INTO {nombre} ({', '.join(r.claves)}, total) {sql_resumen_derivado(nombre)}")
+
+def verificar_resumenes(conn, reparar=False):
+    """
+    Compara cada tabla Resumen* con su consulta derivada. Devuelve los nombres de los
+    resúmenes con diferencias; con `reparar=True` los reconstruye todos en una sola
+    transacción.
+    """
+    diferencias = []
+    for nombre, r in RESUMENES_DASHBOARD.items():
+        guardado = f"SELECT {', '.join(r.claves)}, total FROM {nombre}"
+        derivado = sql_resumen_derivado(nombre)
+        distinto = conn.execute(f"SELECT 1 FROM (SELECT * FROM ({guardado} EXCEPT {derivado}) "
+                                f"UNION ALL SELECT * FROM ({derivado} EXCEPT {guardado})) LIMIT 1").fetchone()
+        if distinto:
+            diferencias.append(nombre)
+    if reparar and diferencias:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            reconstruir_resumenes(conn)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return diferencias
+
+# --- Búsqueda de texto completo de estudiantes ---
+# EstudiantesFTS indexa rut y nombres con un tokenizador que ignora mayúsculas y
+# tildes ("Muñoz" = "munoz", "Echeverría" = "echeverria") e índices de prefijos para
+# la búsqueda mientras se escribe. Guarda su propia copia del texto (no usa el rowid de
+# Estudiantes, que puede cambiar con VACUUM porque su clave primaria es TEXT); la fila
+# de un estudiante se ubica por su rut con una consulta MATCH sobre la columna rut.
+COLUMNAS_BUSQUEDA_ESTUDIANTES = ('rut', 'nombre', 'apellido_paterno', 'apellido_materno')
+
+# Mientras una migración llena un índice de búsqueda en lotes (migraciones.rellenar_busqueda),
+# el índice sólo contiene las filas de rowid <= RellenoBusqueda.hasta, y sus triggers
+# sólo mantienen esas filas: las demás las copia el lote que les toca, ya con su texto actual.
+def _cuando_relleno(indice, fila, en_relleno):
+    if not en_relleno:
+        return ''
+    return f" WHEN {fila}.rowid <= (SELECT hasta FROM RellenoBusqueda WHERE indice = '{indice}')"
+
+def crear_busqueda_estudiantes(conn, en_relleno=False):
+    """
+    Crea EstudiantesFTS y los triggers que la sincronizan con Estudiantes. No la llena.
+    Con `en_relleno=True` los triggers sólo mantienen las filas ya copiadas por el relleno.
+    """
+    columnas = ', '.join(COLUMNAS_BUSQUEDA_ESTUDIANTES)
+    conn.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS EstudiantesFTS USING fts5(
+            {columnas},
+            tokenize = "unicode61 remove_diacritics 2",
+            prefix = '2 3 4'
+        )""")
+    nuevos = ', '.join(f"NEW.{c}" for c in COLUMNAS_BUSQUEDA_ESTUDIANTES)
+    borrar_viejo = """
+        DELETE FROM EstudiantesFTS
+        WHERE EstudiantesFTS MATCH 'rut : "' || replace(OLD.rut, '"', '""') || '"' AND rut = OLD.rut;"""
+    insertar_nuevo = f"INSERT INTO EstudiantesFTS ({columnas}) VALUES ({nuevos});"
+    cuando_nuevo = _cuando_relleno('EstudiantesFTS', 'NEW', en_relleno)
+    cuando_viejo = _cuando_relleno('EstudiantesFTS', 'OLD', en_relleno)
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_estudiantesfts_insert AFTER INSERT ON Estudiantes{cuando_nuevo} BEGIN {insertar_nuevo} END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_estudiantesfts_delete AFTER DELETE ON Estudiantes{cuando_viejo} BEGIN {borrar_viejo} END")
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_estudiantesfts_update AFTER UPDATE OF {columnas} ON Estudiantes{cuando_viejo}
+        BEGIN {borrar_viejo} {insertar_nuevo} END""")
+
+def reconstruir_busqueda_estudiantes(conn):
+    """Vuelve a llenar EstudiantesFTS desde Estudiantes y compacta el índice. No hace commit."""
+    columnas = ', '.join(COLUMNAS_BUSQUEDA_ESTUDIANTES)
+    conn.execute("DELETE FROM EstudiantesFTS")
+    conn.execute(f"INSERT INTO EstudiantesFTS ({columnas}) SELECT {columnas} FROM Estudiantes")
+    conn.execute("INSERT INTO EstudiantesFTS (EstudiantesFTS) VALUES ('optimize')")
+
+def verificar_busqueda_estudiantes(conn, reparar=False):
+    """
+    Compara el contenido de EstudiantesFTS con Estudiantes. Devuelve los ruts con
+    diferencias; con `reparar=True` reconstruye el índice en una sola transacción.
+    """
+    columnas = ', '.join(COLUMNAS_BUSQUEDA_ESTUDIANTES)
+    diferencias = sorted({fila[0] for fila in conn.execute(f"""
+        SELECT rut FROM (SELECT {columnas} FROM Estudiantes EXCEPT SELECT {columnas} FROM EstudiantesFTS)
+        UNION ALL
+        SELECT rut FROM (SELECT {columnas} FROM EstudiantesFTS EXCEPT SELECT {columnas} FROM Estudiantes)
+        UNION ALL
+        SELECT rut FROM EstudiantesFTS GROUP BY rut HAVING COUNT(*) > 1
+    """)})
+    if reparar and diferencias:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            reconstruir_busqueda_estudiantes(conn)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return diferencias
+
+def expresion_busqueda_fts(texto):
+    """
+    Convierte lo que escribió el usuario en una consulta FTS5: cada palabra como
+    prefijo ("mu*" encuentra "Muñoz") y todas deben aparecer, en cualquier columna.
+    Devuelve None si el texto no tiene palabras buscables.
+    """
+    palabras = re.findall(r"\w+", texto)
+    if not palabras:
+        return None
+    return ' AND '.join(f'"{palabra}"*' for palabra in palabras)
+
+def crear_busqueda_seguimientos(conn, en_relleno=False):
+    """
+    Crea SeguimientosFTS sobre la bitácora de Seguimientos y sus triggers. No la llena.
+    Con `en_relleno=True` los triggers sólo mantienen las filas ya copiadas por el relleno.
+
+    Es un índice de contenido externo: el texto no se copia, se lee de Seguimientos
+    (rowid = id_seguimiento, que no cambia con VACUUM). Los triggers deben entregarle el
+    texto anterior exacto al borrar, por eso la edición se hace con 'delete' + insert.
+    """
+    conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS SeguimientosFTS USING fts5(
+            bitacora_sesion,
+            content = 'Seguimientos', content_rowid = 'id_seguimiento',
+            tokenize = "unicode61 remove_diacritics 2"
+        )""")
+    insertar_nuevo = "INSERT INTO SeguimientosFTS (rowid, bitacora_sesion) VALUES (NEW.id_seguimiento, NEW.bitacora_sesion);"
+    borrar_viejo = """
+        INSERT INTO SeguimientosFTS (SeguimientosFTS, rowid, bitacora_sesion)
+        VALUES ('delete', OLD.id_seguimiento, OLD.bitacora_sesion);"""
+    cuando_nuevo = _cuando_relleno('SeguimientosFTS', 'NEW', en_relleno)
+    cuando_viejo = _cuando_relleno('SeguimientosFTS', 'OLD', en_relleno)
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_seguimientosfts_insert AFTER INSERT ON Seguimientos{cuando_nuevo} BEGIN {insertar_nuevo} END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_seguimientosfts_delete AFTER DELETE ON Seguimientos{cuando_viejo} BEGIN {borrar_viejo} END")
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_seguimientosfts_update AFTER UPDATE OF bitacora_sesion ON Seguimientos{cuando_viejo}
+        BEGIN {borrar_viejo} {insertar_nuevo} END""")
+
+def reconstruir_busqueda_seguimientos(conn):
+    """Vuelve a generar SeguimientosFTS desde Seguimientos y compacta el índice. No hace commit."""
+    conn.execute("INSERT INTO SeguimientosFTS (SeguimientosFTS) VALUES ('rebuild')")
+    conn.execute("INSERT INTO SeguimientosFTS (SeguimientosFTS) VALUES ('optimize')")
+
+def verificar_busqueda_seguimientos(conn, reparar=False):
+    """
+    Comprueba que SeguimientosFTS corresponda al texto actual de Seguimientos
+    ('integrity-check' de FTS5 contra la tabla de contenido). Devuelve la lista de
+    problemas (vacía si está bien); con `reparar=True` reconstruye el índice.
+    """
+    try:
+        conn.execute("INSERT INTO SeguimientosFTS (SeguimientosFTS, rank) VALUES ('integrity-check', 1)")
+        problemas = []
+    except sqlite3.DatabaseError as e:
+        problemas = [f"SeguimientosFTS no coincide con Seguimientos: {e}"]
+    if conn.in_transaction:
+        conn.rollback()  # el INSERT de 'integrity-check' abre una transacción implícita
+    if reparar and problemas:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            reconstruir_busqueda_seguimientos(conn)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return problemas
+
+# --- Versiones de tablas y límite de tiempo de consultas ---
+# Contador de cambios por tabla, incrementado por triggers en cada INSERT/UPDATE/DELETE.
+# Las cachés (ej. /api/reporte_periodos, opciones.directorio_profesionales, los usuarios de
+# la sesión) lo incluyen en su clave: leerlo
+# es una búsqueda por clave primaria, y cualquier escritura de cualquier proceso deja
+# obsoletas las entradas anteriores. (PRAGMA data_version no ve las escrituras de la
+# misma conexión y en modo WAL el contador del encabezado del archivo no se actualiza.)
+TABLAS_VERSIONADAS = ('Estudiantes', 'PeriodosAtencion', 'Profesionales', 'Usuarios')
+
+def crear_versiones_tablas(conn, tablas=TABLAS_VERSIONADAS):
+    """Crea VersionTablas y los triggers que cuentan los cambios de `tablas`."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS VersionTablas (
+            tabla TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID""")
+    for tabla in tablas:
+        conn.execute("INSERT OR IGNORE INTO VersionTablas (tabla, version) VALUES (?, 0)", (tabla,))
+        for evento in ('INSERT', 'UPDATE', 'DELETE'):
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_version_{tabla.lower()}_{evento.lower()} AFTER {evento} ON {tabla}
+                BEGIN UPDATE VersionTablas SET version = version + 1 WHERE tabla = '{tabla}'; END""")
+
+def versiones_tablas(conn, tablas=TABLAS_VERSIONADAS):
+    """Tupla con la versión actual de cada tabla de `tablas`, en ese orden."""
+    versiones = dict(conn.execute(
+        f"SELECT tabla, version FROM VersionTablas WHERE tabla IN ({', '.join('?' * len(tablas))})", tuple(tablas)).fetchall())
+    return tuple(versiones.get(tabla) for tabla in tablas)
+
+
+# --- HISTORIAL DE CAMBIOS POR CAMPO ---
+# Nombre con que se muestra cada columna de Estudiantes en el historial de cambios.
+NOMBRES_CAMPOS_ESTUDIANTE = {
+    'nombre': 'Nombre', 'apellido_paterno': 'Apellido Paterno', 'apellido_materno': 'Apellido Materno',
+    'sexo': 'Sexo', 'genero': 'Género', 'fecha_nacimiento': 'Fecha de Nacimiento', 'nacionalidad': 'Nacionalidad',
+    'estado_civil': 'Estado Civil', 'tiene_hijos': 'Tiene Hijos/as', 'ocupacion_laboral': 'Ocupación Laboral',
+    'residencia_academica': 'Residencia Académica', 'residencia_familiar': 'Residencia Familiar', 'celular': 'Celular',
+    'carrera_programa': 'Carrera/Programa', 'facultad': 'Facultad', 'estado_academico': 'Estado Académico',
+    'fecha_ingreso_programa': 'Fecha de Ingreso al Programa', 'fuente_derivacion': 'Fuente de Derivación',
+    'estado_en_programa': 'Estado en Programa', 'trabajadora_social_asignada': 'Trabajadora Social',
+    'psicologo_asignado': 'Psicólogo/a', 'fecha_derivacion_cesfam': 'Fecha Derivación CESFAM',
+    'cesfam_derivacion': 'CESFAM de Derivación', 'tentativa_ideacion': 'Tentativa o Ideación (al ingreso)',
+    'fecha_autorizacion_investigacion': 'Autorización para Investigación', 'beneficio_arancel': 'Beneficio de Arancel',
+    'estado_derivacion_maestro': 'Estado de Derivación', 'nota_importante': 'Nota Importante',
+}
+# Ídem para las columnas de Seguimientos (auditoría de ediciones y eliminaciones).
+NOMBRES_CAMPOS_SEGUIMIENTO = {
+    'rut_estudiante': 'RUT Estudiante', 'fecha_sesion': 'Fecha de Sesión',
+    'trabajadora_social_sesion': 'Trabajadora Social', 'psicologo_sesion': 'Psicólogo/a',
+    'tipo_intervencion': 'Tipo de Intervención', 'resultado_cita': 'Resultado de la Cita',
+    'estado_derivacion_cesfam_actual': 'Estado Derivación CESFAM',
+    'confirmacion_gestion_hora_cesfam': 'Confirmación Hora CESFAM', 'fechas_sesiones_cesfam': 'Fechas Sesiones CESFAM',
+    'bitacora_sesion': 'Bitácora', 'cambio_estado_programa_a': 'Cambio de Estado del Programa',
+    'cambio_estado_academico_a': 'Cambio de Estado Académico', 'creado_por_usuario': 'Registrado por',
+    'alta_mejora_animo': 'Alta: Mejora del Ánimo', 'alta_disminucion_riesgo': 'Alta: Disminución del Riesgo',
+    'alta_redes_apoyo': 'Alta: Redes de Apoyo', 'alta_adherencia_tratamiento': 'Alta: Adherencia al Tratamiento',
+    'alta_no_registrado': 'Alta: No Registrado', 'extension_programa_otorgada': 'Extensión del Programa',
+    'es_correccion': 'Es Corrección', 'corrige_id_seguimiento': 'Corrige al Seguimiento',
+    'es_vigente': 'Vigente', 'reemplazado_por_id': 'Reemplazado por', 'id_seguimiento': 'ID Seguimiento',
+}
+
+def crear_historial_detalle(conn):
+    """
+    Crea HistorialCambiosDetalle: una fila por campo modificado en cada cambio de
+    HistorialCambios, con el valor anterior y el nuevo. La fecha del cambio se repite
+    aquí para que "qué cambió en el campo X entre dos fechas" sea un rango del índice
+    (campo, fecha_cambio), sin unir con HistorialCambios ni leer el texto de `detalles`.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS HistorialCambiosDetalle (
+            id_cambio INTEGER NOT NULL REFERENCES HistorialCambios (id_cambio),
+            campo TEXT NOT NULL,
+            valor_anterior TEXT,
+            valor_nuevo TEXT,
+            fecha_cambio TIMESTAMP NOT NULL,
+            PRIMARY KEY (id_cambio, campo)
+        ) WITHOUT ROWID""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_historial_detalle_campo_fecha ON HistorialCambiosDetalle (campo, fecha_cambio)")
+
+def valor_historial(valor):
+    """Texto con que se guarda un valor en el historial; vacío o None quedan como NULL."""
+    if valor is None or valor == '':
+        return None
+    if isinstance(valor, date):
+        return valor.isoformat()
+    return str(valor)
+
+def registrar_cambios(cursor, nombre_usuario, accion, modelo, id_registro, cambios, fecha_cambio=None):
+    """
+    Registra un cambio de `modelo` en HistorialCambios y sus campos modificados,
+    `cambios` = [(campo, valor_anterior, valor_nuevo), ...], en HistorialCambiosDetalle.
+    `fecha_cambio` ('AAAA-MM-DD HH:MM:SS', UTC) por defecto es la actual. Devuelve el
+    id_cambio. No hace commit: va en la transacción de la edición.
+    """
+    id_cambio, fecha_cambio = cursor.execute("""
+        INSERT INTO HistorialCambios (nombre_usuario, accion, modelo_afectado, id_registro_afectado, fecha_cambio)
+        VALUES (?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP)) RETURNING id_cambio, fecha_cambio
+    """, (nombre_usuario, accion, modelo, id_registro, fecha_cambio)).fetchone()
+    cursor.executemany(
+        "INSERT INTO HistorialCambiosDetalle (id_cambio, campo, valor_anterior, valor_nuevo, fecha_cambio) VALUES (?, ?, ?, ?, ?)",
+        [(id_cambio, campo, valor_historial(anterior), valor_historial(nuevo), fecha_cambio) for campo, anterior, nuevo in cambios])
+    return id_cambio
+
+
+class TiempoConsultaAgotado(Exception):
+    """Una consulta ejecutada con limite_de_tiempo() superó su presupuesto y fue interrumpida."""
+
+
+@contextmanager
+def limite_de_tiempo(conn, segundos, cada_instrucciones=1000):
+    """
+    Interrumpe las consultas de `conn` que se ejecuten dentro del bloque si tardan más
+    de `segundos` en total (handler de progreso de SQLite, revisado cada
+    `cada_instrucciones` instrucciones de la máquina virtual). En ese caso lanza
+    TiempoConsultaAgotado. Al salir quita el handler: la conexión vuelve al pool limpia.
+    """
+    limite = time.monotonic() + segundos
+    conn.set_progress_handler(lambda: time.monotonic() > limite, cada_instrucciones)
+    try:
+        yield
+    except sqlite3.OperationalError as e:
+        if time.monotonic() > limite and 'interrupted' in str(e):
+            raise TiempoConsultaAgotado(f"La consulta superó {segundos} s y fue interrumpida.") from e
+        raise
+    finally:
+        conn.set_progress_handler(None, 0)
+
+def init_db():
+    """Inicializa la base de datos aplicando las migraciones pendientes (ver migraciones.py)."""
+    from migraciones import aplicar_migraciones
+    aplicar_migraciones()
     print("Tablas SQLite inicializadas/verificadas.")
 
     # Llama a la función para sembrar los datos si la BD está vacía
@@ -1,6 +1,7 @@
 # forms.py
 
 from flask_wtf import FlaskForm
+from flask_wtf.file import FileField, FileRequired, FileAllowed
 from wtforms import StringField, PasswordField, SubmitField, SelectField, DateField, TextAreaField, BooleanField
 from wtforms.validators import DataRequired, Optional, Length, EqualTo
 from database import LISTA_BENEFICIO_ARANCEL, LISTA_PARENTESCO, LISTA_ESTADO_DERIVACION_INICIAL, LISTA_ASISTENCIA_CONTROLES_CESFAM, LISTA_CARRERAS, LISTA_FACULTADES, LISTA_ESTADO_ACADEMICO
@@ -265,4 +266,17 @@ class ReingresoForm(FlaskForm):
     carrera = SelectField('Carrera/Programa (al momento del reingreso)', validators=[DataRequired()])
     facultad = SelectField('Facultad (al momento del reingreso)', validators=[DataRequired()])
     estado_academico = SelectField('Estado Académico (al momento del reingreso)', validators=[DataRequired()])
-    submit = SubmitField('Registrar Reingreso')
\ No newline at end of file
+    submit = SubmitField('Registrar Reingreso')
+
+class ImportarSeguimientosForm(FlaskForm):
+    """Carga masiva de seguimientos desde un CSV (sólo administradores)."""
+    archivo = FileField('Archivo CSV de seguimientos',
+                        validators=[FileRequired(message="Debe seleccionar un archivo."),
+                                    FileAllowed(['csv'], message="El archivo debe ser .csv")])
+    simular = BooleanField('Sólo validar (no guarda nada)', default=True)
+    submit = SubmitField('Procesar Archivo')
+
+class RespaldoForm(FlaskForm):
+    """Creación de un respaldo de la base de datos (sólo administradores)."""
+    comprimir = BooleanField('Comprimir (gzip)', default=True)
+    submit = SubmitField('Crear Respaldo Ahora')
@@ -0,0 +1,712 @@
+# importacion.py
+"""
+Importación masiva de estudiantes y seguimientos desde un libro Excel (.xlsx).
+
+El libro se lee con openpyxl en modo de sólo lectura, fila por fila, así que la memoria
+usada no depende del tamaño del archivo. Las columnas se reconocen por el nombre del
+encabezado (sin distinguir mayúsculas, tildes ni espacios: "Fecha Nacimiento" es
+`fecha_nacimiento`), no por su posición; las desconocidas se ignoran con un aviso.
+
+Cada fila se valida y normaliza antes de escribirse:
+  - RUT sin puntos, con guión y 'K' mayúscula (12.345.678-k -> 12345678-K);
+  - fechas de Excel o de texto (AAAA-MM-DD, DD-MM-AAAA, DD/MM/AAAA) a AAAA-MM-DD;
+  - valores de las listas LISTA_* de database.py a su forma exacta (sin distinguir
+    mayúsculas ni tildes); un valor que no está en la lista rechaza la fila;
+  - marcas 0/1 (también "Sí"/"No", "VERDADERO"/"FALSO").
+Las filas con errores se escriben en el archivo de rechazos (CSV) con el número de fila
+de Excel y el motivo, y el resto se importa igual.
+
+Las filas válidas se escriben en transacciones cortas de `tamano_lote` filas
+(executemany). La importación se puede repetir con el mismo archivo:
+  - Estudiantes se actualiza por RUT, y sólo en las columnas presentes en la hoja;
+  - Seguimientos se actualiza por id_seguimiento si la hoja trae esa columna (cada
+    seguimiento modificado queda en HistorialCambios, en la misma transacción, a nombre de
+    USUARIO_IMPORTACION); si no, se omite un seguimiento idéntico (mismo estudiante, fecha, tipo y bitácora) a uno
+    ya registrado.
+Al final se crean los períodos de atención de los estudiantes nuevos que traen
+fecha_ingreso_programa (los demás se listan con mantenimiento.py periodos-faltantes) y se reparan
+EstadoActualEstudiante y las versiones de los seguimientos (ver mantenimiento.py).
+
+Los seguimientos también se pueden cargar desde un CSV (importar_seguimientos_csv, la
+carga del administrador en /admin/seguimientos/importar): sesiones registradas en papel
+o en planillas, con los mismos efectos que guardarlas una por una en nuevo_seguimiento.
+
+Uso:
+    python importacion.py datos.xlsx                       # importa ambas hojas
+    python importacion.py datos.xlsx --rechazos malos.csv  # (por defecto, datos_rechazos.csv)
+    python importacion.py sesiones.csv --simular           # valida un CSV de seguimientos
+"""
+import argparse
+import codecs
+import csv
+import io
+import itertools
+import json
+import os
+import re
+import time
+import unicodedata
+from collections import namedtuple
+from datetime import date, datetime
+from functools import lru_cache
+
+from openpyxl import load_workbook
+
+from auditoria import ACCION_EDICION, cambios_de_edicion
+from database import (
+    get_db_connection, registrar_cambios, SQL_CREAR_PERIODOS_FALTANTES, SQL_ESTUDIANTES_SIN_PERIODO, verificar_estado_actual, verificar_versiones_seguimiento,
+    actualizar_estado_actual, actualizar_ultima_sesion, registrar_correccion_seguimiento,
+    LISTA_GENERO, LISTA_SEXO, LISTA_FACULTADES, LISTA_CARRERAS, LISTA_CESFAM, LISTA_TENTATIVA_IDEACION,
+    LISTA_ESTADO_PROGRAMA, LISTA_ESTADO_DERIVACION_INICIAL, LISTA_TIPO_INTERVENCION, LISTA_RESULTADO_CITA,
+    LISTA_ASISTENCIA_CONTROLES_CESFAM, LISTA_ESTADO_ACADEMICO, LISTA_ESTADO_CIVIL, LISTA_OCUPACION_LABORAL,
+    LISTA_TIENE_HIJOS, LISTA_NACIONALIDADES, LISTA_FUENTE_DERIVACION, LISTA_BENEFICIO_ARANCEL, LISTA_PARENTESCO
+)
+
+TAMANO_LOTE_POR_DEFECTO = 1000
+USUARIO_IMPORTACION = 'Importación Excel'  # nombre_usuario de HistorialCambios
+FORMATOS_FECHA = ('%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y', '%Y/%m/%d')
+VALORES_SI = {'1', 'si', 'verdadero', 'true', 'x'}
+VALORES_NO = {'0', 'no', 'falso', 'false'}
+
+# tipo: 'texto', 'rut', 'fecha', 'lista' (con `opciones`), 'marca' (0/1) o 'entero'.
+Columna = namedtuple('Columna', ['nombre', 'tipo', 'requerida', 'opciones'], defaults=('texto', False, None))
+Hoja = namedtuple('Hoja', ['nombre', 'columnas'])
+ResumenHoja = namedtuple('ResumenHoja', ['hoja', 'leidas', 'escritas', 'sin_cambios', 'rechazadas'])
+
+
+class ValorInvalido(ValueError):
+    """Un valor de una celda que no se puede normalizar."""
+
+
+HOJA_ESTUDIANTES = Hoja('Estudiantes', (
+    Columna('rut', 'rut', requerida=True),
+    Columna('nombre', requerida=True),
+    Columna('apellido_paterno', requerida=True),
+    Columna('apellido_materno', requerida=True),
+    Columna('genero', 'lista', opciones=LISTA_GENERO),
+    Columna('sexo', 'lista', opciones=LISTA_SEXO),
+    Columna('fecha_nacimiento', 'fecha'),
+    Columna('nacionalidad', 'lista', opciones=LISTA_NACIONALIDADES),
+    Columna('estado_civil', 'lista', opciones=LISTA_ESTADO_CIVIL),
+    Columna('tiene_hijos', 'lista', opciones=LISTA_TIENE_HIJOS),
+    Columna('carrera_programa', 'lista', opciones=LISTA_CARRERAS),
+    Columna('facultad', 'lista', opciones=LISTA_FACULTADES),
+    Columna('estado_academico', 'lista', opciones=LISTA_ESTADO_ACADEMICO),
+    Columna('ocupacion_laboral', 'lista', opciones=LISTA_OCUPACION_LABORAL),
+    Columna('residencia_academica'),
+    Columna('residencia_familiar'),
+    Columna('celular'),
+    Columna('trabajadora_social_asignada'),
+    Columna('psicologo_asignado'),
+    Columna('fecha_ingreso_programa', 'fecha'),
+    Columna('fuente_derivacion', 'lista', opciones=LISTA_FUENTE_DERIVACION),
+    Columna('estado_en_programa', 'lista', opciones=LISTA_ESTADO_PROGRAMA),
+    Columna('fecha_derivacion_cesfam', 'fecha'),
+    Columna('cesfam_derivacion', 'lista', opciones=LISTA_CESFAM),
+    Columna('tentativa_ideacion', 'lista', opciones=LISTA_TENTATIVA_IDEACION),
+    Columna('fecha_autorizacion_investigacion', 'fecha'),
+    Columna('nombre_contacto_emergencia'),
+    Columna('parentesco_contacto_emergencia', 'lista', opciones=LISTA_PARENTESCO),
+    Columna('telefono_contacto_emergencia'),
+    Columna('beneficio_arancel', 'lista', opciones=LISTA_BENEFICIO_ARANCEL),
+    Columna('estado_derivacion_maestro', 'lista', opciones=LISTA_ESTADO_DERIVACION_INICIAL),
+    Columna('nota_importante'),
+))
+
+HOJA_SEGUIMIENTOS = Hoja('Seguimientos', (
+    Columna('id_seguimiento', 'entero'),
+    Columna('rut_estudiante', 'rut', requerida=True),
+    Columna('trabajadora_social_sesion'),
+    Columna('psicologo_sesion'),
+    Columna('fecha_sesion', 'fecha', requerida=True),
+    Columna('estado_derivacion_cesfam_actual', 'lista', opciones=LISTA_ESTADO_DERIVACION_INICIAL),
+    Columna('tipo_intervencion', 'lista', opciones=LISTA_TIPO_INTERVENCION),
+    Columna('resultado_cita', 'lista', opciones=LISTA_RESULTADO_CITA),
+    Columna('confirmacion_gestion_hora_cesfam', 'lista', opciones=LISTA_ASISTENCIA_CONTROLES_CESFAM),
+    Columna('fechas_sesiones_cesfam'),
+    Columna('bitacora_sesion'),
+    Columna('cambio_estado_programa_a', 'lista', opciones=LISTA_ESTADO_PROGRAMA),
+    Columna('cambio_estado_academico_a', 'lista', opciones=LISTA_ESTADO_ACADEMICO),
+    Columna('creado_por_usuario'),
+    Columna('alta_mejora_animo', 'marca'),
+    Columna('alta_disminucion_riesgo', 'marca'),
+    Columna('alta_redes_apoyo', 'marca'),
+    Columna('alta_adherencia_tratamiento', 'marca'),
+    Columna('alta_no_registrado', 'marca'),
+    Columna('extension_programa_otorgada', 'fecha'),
+    Columna('es_correccion', 'marca'),
+    Columna('corrige_id_seguimiento', 'entero'),
+))
+
+HOJAS = (HOJA_ESTUDIANTES, HOJA_SEGUIMIENTOS)
+
+
+# --- Normalización de valores ---
+
+def _sin_tildes(texto):
+    return ''.join(c for c in unicodedata.normalize('NFKD', texto) if not unicodedata.combining(c))
+
+
+def clave_encabezado(texto):
+    """'Fecha Nacimiento ' -> 'fecha_nacimiento'."""
+    return re.sub(r'[^a-z0-9]+', '_', _sin_tildes(str(texto)).lower()).strip('_')
+
+
+@lru_cache(maxsize=4096)  # Los valores de las listas se repiten mucho entre filas.
+def _clave_opcion(texto):
+    return ' '.join(_sin_tildes(texto).casefold().split())
+
+
+# Por lista: {forma simplificada: valor exacto}. Se construye una vez por lista.
+_OPCIONES_NORMALIZADAS = {}
+
+
+def _opciones_normalizadas(opciones):
+    clave = id(opciones)
+    if clave not in _OPCIONES_NORMALIZADAS:
+        _OPCIONES_NORMALIZADAS[clave] = {_clave_opcion(valor): valor for valor in opciones}
+    return _OPCIONES_NORMALIZADAS[clave]
+
+
+def _como_texto(valor):
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    texto = str(valor).strip()
+    return texto or None
+
+
+def normalizar_rut(valor):
+    """RUT sin puntos ni espacios, con guión y dígito verificador en mayúscula."""
+    rut = re.sub(r'[.\s]', '', str(valor)).upper()
+    if '-' not in rut and len(rut) > 1:
+        rut = f"{rut[:-1]}-{rut[-1]}"
+    if not re.fullmatch(r'\d{1,8}-[\dK]', rut):
+        raise ValorInvalido(f"RUT no válido: '{valor}'")
+    return rut
+
+
+def normalizar_fecha(valor):
+    if isinstance(valor, datetime):
+        return valor.date().isoformat()
+    if isinstance(valor, date):
+        return valor.isoformat()
+    texto = str(valor).strip().split(' ')[0]
+    for formato in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(texto, formato).date().isoformat()
+        except ValueError:
+            pass
+    raise ValorInvalido(f"fecha no válida: '{valor}'")
+
+
+def normalizar_valor(columna, valor):
+    """Valor de la celda listo para la base de datos (None si está vacía)."""
+    if valor is None or (isinstance(valor, str) and not valor.strip()):
+        if columna.requerida:
+            raise ValorInvalido("es obligatorio")
+        return None
+    if columna.tipo == 'rut':
+        return normalizar_rut(valor)
+    if columna.tipo == 'fecha':
+        return normalizar_fecha(valor)
+    if columna.tipo == 'lista':
+        exacto = _opciones_normalizadas(columna.opciones).get(_clave_opcion(str(valor)))
+        if exacto is None:
+            raise ValorInvalido(f"valor no permitido: '{valor}'")
+        return exacto
+    if columna.tipo == 'marca':
+        texto = _clave_opcion(str(_como_texto(valor)))
+        if texto in VALORES_SI:
+            return 1
+        if texto in VALORES_NO:
+            return 0
+        raise ValorInvalido(f"se esperaba 0/1 o Sí/No: '{valor}'")
+    if columna.tipo == 'entero':
+        try:
+            return int(_como_texto(valor))
+        except ValueError:
+            raise ValorInvalido(f"se esperaba un número entero: '{valor}'") from None
+    return _como_texto(valor)
+
+
+# --- Lectura ---
+
+def mapear_encabezados(encabezados, hoja, registrar=print):
+    """
+    Lista de (Columna, índice en la fila) según los encabezados. Lanza ValueError si
+    falta una columna obligatoria o hay encabezados repetidos.
+    """
+    por_nombre = {columna.nombre: columna for columna in hoja.columnas}
+    indices = {}
+    for indice, encabezado in enumerate(encabezados or ()):
+        if encabezado is None or not str(encabezado).strip():
+            continue
+        columna = por_nombre.get(clave_encabezado(encabezado))
+        if columna is None:
+            registrar(f"  Aviso: columna '{encabezado}' de la hoja '{hoja.nombre}' no se reconoce; se ignora.")
+        elif columna.nombre in indices:
+            raise ValueError(f"La hoja '{hoja.nombre}' tiene la columna '{columna.nombre}' repetida.")
+        else:
+            indices[columna.nombre] = indice
+    faltantes = [c.nombre for c in hoja.columnas if c.requerida and c.nombre not in indices]
+    if faltantes:
+        raise ValueError(f"A la hoja '{hoja.nombre}' le faltan las columnas obligatorias: {', '.join(faltantes)}.")
+    return [(por_nombre[nombre], indice) for nombre, indice in indices.items()]
+
+
+def validar_fila(valores, indices):
+    """Devuelve (registro, errores): {nombre de columna: valor normalizado} y lista de errores."""
+    registro, errores = {}, []
+    for columna, indice in indices:
+        try:
+            registro[columna.nombre] = normalizar_valor(columna, valores[indice] if indice < len(valores) else None)
+        except ValorInvalido as e:
+            errores.append(f"{columna.nombre}: {e}")
+    return registro, errores
+
+
+def filas_de_hoja(hoja_excel):
+    """(número de fila de Excel, valores) de cada fila no vacía después del encabezado."""
+    for numero, valores in enumerate(hoja_excel.iter_rows(min_row=2, values_only=True), start=2):
+        if any(v is not None and str(v).strip() for v in valores):
+            yield numero, valores
+
+
+# --- Escritura ---
+
+def _sql_estudiantes(columnas):
+    """Upsert por RUT que sólo toca las columnas de la hoja y sólo si algo cambió."""
+    otras = [c for c in columnas if c != 'rut']
+    return f"""
+        INSERT INTO Estudiantes ({', '.join(columnas)}) VALUES ({', '.join('?' * len(columnas))})
+        ON CONFLICT (rut) DO UPDATE SET {', '.join(f'{c} = excluded.{c}' for c in otras)}
+        WHERE {' OR '.join(f'Estudiantes.{c} IS NOT excluded.{c}' for c in otras) or '0'}
+    """
+
+
+def _sql_seguimientos(columnas):
+    if 'id_seguimiento' in columnas:
+        otras = [c for c in columnas if c != 'id_seguimiento']
+        return f"""
+            INSERT INTO Seguimientos ({', '.join(columnas)}) VALUES ({', '.join('?' * len(columnas))})
+            ON CONFLICT (id_seguimiento) DO UPDATE SET {', '.join(f'{c} = excluded.{c}' for c in otras)}
+            WHERE {' OR '.join(f'Seguimientos.{c} IS NOT excluded.{c}' for c in otras)}
+        """
+    # Sin id no hay clave: se omite el seguimiento si ya existe uno idéntico.
+    marcadores = ', '.join(f':{c}' for c in columnas)
+    return f"""
+        INSERT INTO Seguimientos ({', '.join(columnas)}) SELECT {marcadores}
+        WHERE NOT EXISTS (
+            SELECT 1 FROM Seguimientos WHERE rut_estudiante = :rut_estudiante AND fecha_sesion = :fecha_sesion
+              AND tipo_intervencion IS :tipo_intervencion AND bitacora_sesion IS :bitacora_sesion)
+    """
+
+
+class EscritorRechazos:
+    """CSV (UTF-8 con BOM, como las descargas de la app) con las filas rechazadas."""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.total = 0
+        self._archivo = None
+
+    def escribir(self, hoja, fila, errores, valores):
+        if self._archivo is None:
+            self._archivo = open(self.ruta, 'w', newline='', encoding='utf-8')
+            self._archivo.write(codecs.BOM_UTF8.decode('utf-8'))
+            self._csv = csv.writer(self._archivo, quoting=csv.QUOTE_ALL)
+            self._csv.writerow(['hoja', 'fila', 'errores', 'valores'])
+        self._csv.writerow([hoja, fila, '; '.join(errores), json.dumps(valores, ensure_ascii=False, default=str)])
+        self.total += 1
+
+    def cerrar(self):
+        if self._archivo is not None:
+            self._archivo.close()
+
+
+def importar_hoja(conn, hoja_excel, hoja, rechazos, tamano_lote=TAMANO_LOTE_POR_DEFECTO, registrar=print):
+    """Importa una hoja en lotes de `tamano_lote` filas. Devuelve un ResumenHoja."""
+    encabezados = next(hoja_excel.iter_rows(max_row=1, values_only=True), None)
+    indices = mapear_encabezados(encabezados, hoja, registrar)
+    nombres_encabezados = [str(e) for e in encabezados]
+    columnas = [c.nombre for c, _ in indices]
+    es_estudiantes = hoja is HOJA_ESTUDIANTES
+    sql = _sql_estudiantes(columnas) if es_estudiantes else _sql_seguimientos(columnas)
+    # Sin id_seguimiento, la consulta usa parámetros con nombre y compara estas columnas
+    # aunque la hoja no las traiga.
+    con_nombres = not es_estudiantes and 'id_seguimiento' not in columnas
+    # Con id_seguimiento la hoja puede sobrescribir sesiones ya registradas: se auditan.
+    auditar = not es_estudiantes and not con_nombres
+    vacios = {'tipo_intervencion': None, 'bitacora_sesion': None}
+
+    leidas = escritas = rechazadas = 0
+    lote = []
+
+    def escribir_lote():
+        nonlocal escritas, rechazadas
+        if not es_estudiantes:
+            # Los seguimientos deben ser de un estudiante existente (en la BD o importado antes).
+            ruts = {registro['rut_estudiante'] for _, _, registro in lote}
+            existentes = {fila[0] for fila in conn.execute(
+                "SELECT rut FROM Estudiantes WHERE rut IN (SELECT value FROM json_each(?))", (json.dumps(list(ruts)),))}
+            for numero, valores, registro in [f for f in lote if f[2]['rut_estudiante'] not in existentes]:
+                rechazos.escribir(hoja.nombre, numero, [f"rut_estudiante: no existe el estudiante '{registro['rut_estudiante']}'"],
+                                  dict(zip(nombres_encabezados, valores)))
+                rechazadas += 1
+            lote[:] = [f for f in lote if f[2]['rut_estudiante'] in existentes]
+        if not lote:
+            return
+        parametros = [{**vacios, **registro} if con_nombres else tuple(registro[c] for c in columnas) for _, _, registro in lote]
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            anteriores = {}
+            if auditar:
+                ids = [registro['id_seguimiento'] for _, _, registro in lote]
+                anteriores = {fila['id_seguimiento']: fila for fila in conn.execute(
+                    "SELECT * FROM Seguimientos WHERE id_seguimiento IN (SELECT value FROM json_each(?))", (json.dumps(ids),))}
+            cursor = conn.executemany(sql, parametros)
+            escritas += max(cursor.rowcount, 0)
+            cursor = conn.cursor()
+            for _, _, registro in lote:
+                anterior = anteriores.get(registro['id_seguimiento'])
+                if anterior is None:
+                    continue
+                nuevo = {c: registro[c] for c in columnas if c != 'id_seguimiento'}
+                cambios = cambios_de_edicion(anterior, nuevo)
+                if cambios:
+                    registrar_cambios(cursor, USUARIO_IMPORTACION, ACCION_EDICION, 'Seguimiento', str(registro['id_seguimiento']), cambios)
+                # Si el mismo id se repite en el lote, la fila siguiente se compara con ésta.
+                anteriores[registro['id_seguimiento']] = {**dict(anterior), **nuevo}
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        lote.clear()
+
+    for numero, valores in filas_de_hoja(hoja_excel):
+        leidas += 1
+        registro, errores = validar_fila(valores, indices)
+        if errores:
+            rechazos.escribir(hoja.nombre, numero, errores, dict(zip(nombres_encabezados, valores)))
+            rechazadas += 1
+            continue
+        lote.append((numero, valores, registro))
+        if len(lote) >= tamano_lote:
+            escribir_lote()
+        if leidas % (tamano_lote * 50) == 0:
+            registrar(f"  {hoja.nombre}: {leidas} filas leídas...")
+    if lote:
+        escribir_lote()
+    resumen = ResumenHoja(hoja.nombre, leidas, escritas, leidas - escritas - rechazadas, rechazadas)
+    registrar(f"  {hoja.nombre}: {resumen.leidas} filas leídas, {resumen.escritas} nuevas o modificadas, "
+              f"{resumen.sin_cambios} sin cambios, {resumen.rechazadas} rechazadas.")
+    return resumen
+
+
+def completar_datos_derivados(conn, registrar=print):
+    """
+    Primer período de atención para los estudiantes que no tienen (los recién
+    importados con fecha_ingreso_programa) y reparación de EstadoActualEstudiante y de las versiones de seguimientos.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        cursor = conn.execute(SQL_CREAR_PERIODOS_FALTANTES)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    registrar(f"  Períodos de atención creados: {cursor.rowcount}.")
+    sin_periodo = conn.execute(SQL_ESTUDIANTES_SIN_PERIODO).fetchall()
+    if sin_periodo:
+        registrar(f"  Aviso: {len(sin_periodo)} estudiantes sin fecha de ingreso al programa quedaron sin período de "
+                  f"atención; ver 'python mantenimiento.py periodos-faltantes'.")
+    registrar(f"  EstadoActualEstudiante: {len(verificar_estado_actual(conn, reparar=True))} estudiantes actualizados.")
+    registrar(f"  Versiones de seguimientos: {len(verificar_versiones_seguimiento(conn, reparar=True))} seguimientos actualizados.")
+
+
+def importar_libro(conn, ruta_excel, ruta_rechazos, tamano_lote=TAMANO_LOTE_POR_DEFECTO, registrar=print):
+    """
+    Importa las hojas 'Estudiantes' y 'Seguimientos' (las que existan) de `ruta_excel`.
+    Devuelve la lista de ResumenHoja; las filas rechazadas quedan en `ruta_rechazos`.
+    """
+    libro = load_workbook(ruta_excel, read_only=True, data_only=True)
+    rechazos = EscritorRechazos(ruta_rechazos)
+    resumenes = []
+    try:
+        for hoja in HOJAS:
+            if hoja.nombre not in libro.sheetnames:
+                registrar(f"  Aviso: el libro no tiene la hoja '{hoja.nombre}'.")
+                continue
+            registrar(f"--- Hoja '{hoja.nombre}' ---")
+            resumenes.append(importar_hoja(conn, libro[hoja.nombre], hoja, rechazos, tamano_lote, registrar))
+        completar_datos_derivados(conn, registrar)
+    finally:
+        libro.close()
+        rechazos.cerrar()
+    if rechazos.total:
+        registrar(f"{rechazos.total} filas rechazadas; detalle en '{ruta_rechazos}'.")
+    return resumenes
+
+
+# --- Seguimientos desde CSV (carga del administrador) ---
+
+# Las columnas de la hoja Seguimientos salvo id_seguimiento (siempre son sesiones nuevas) y
+# creado_por_usuario (es quien hace la carga), más dos datos del estudiante que el
+# formulario de nuevo seguimiento también actualiza.
+HOJA_SEGUIMIENTOS_CSV = Hoja('Seguimientos', tuple(
+    c for c in HOJA_SEGUIMIENTOS.columnas if c.nombre not in ('id_seguimiento', 'creado_por_usuario')
+) + (
+    Columna('beneficio_arancel', 'lista', opciones=LISTA_BENEFICIO_ARANCEL),
+    Columna('nota_importante'),
+))
+
+# Columna de la carga -> columna de Estudiantes que actualiza (como en nuevo_seguimiento).
+EFECTOS_EN_ESTUDIANTES = {
+    'cambio_estado_academico_a': 'estado_academico',
+    'beneficio_arancel': 'beneficio_arancel',
+    'estado_derivacion_cesfam_actual': 'estado_derivacion_maestro',
+    'nota_importante': 'nota_importante',
+}
+
+COLUMNAS_SEGUIMIENTO_CSV = [c.nombre for c in HOJA_SEGUIMIENTOS_CSV.columnas
+                            if c.nombre not in ('beneficio_arancel', 'nota_importante')] + ['creado_por_usuario']
+MARCAS_SEGUIMIENTO_CSV = {c.nombre for c in HOJA_SEGUIMIENTOS_CSV.columnas if c.tipo == 'marca'}
+
+SQL_INSERTAR_SEGUIMIENTO_CSV = f"""
+    INSERT INTO Seguimientos ({', '.join(COLUMNAS_SEGUIMIENTO_CSV)})
+    VALUES ({', '.join('?' * len(COLUMNAS_SEGUIMIENTO_CSV))})
+"""
+
+ErrorFila = namedtuple('ErrorFila', ['fila', 'errores', 'valores'])
+
+
+class ListaRechazos:
+    """Las primeras `maximo` filas rechazadas, en memoria (misma interfaz que EscritorRechazos)."""
+
+    def __init__(self, maximo=None):
+        self.maximo = maximo
+        self.total = 0
+        self.filas = []
+
+    def escribir(self, hoja, fila, errores, valores):
+        if self.maximo is None or len(self.filas) < self.maximo:
+            self.filas.append(ErrorFila(fila, errores, valores))
+        self.total += 1
+
+    def cerrar(self):
+        pass
+
+
+def abrir_csv(flujo):
+    """
+    Texto de un CSV a partir de su flujo binario (con seek). Se lee como UTF-8 (con o sin
+    BOM) si todo el archivo lo es; si no, como Windows-1252, que es como lo guarda Excel
+    en Windows con "CSV (delimitado por comas)".
+    """
+    decodificador = codecs.getincrementaldecoder('utf-8')()
+    codificacion = 'utf-8-sig'
+    try:
+        for bloque in iter(lambda: flujo.read(1 << 20), b''):
+            decodificador.decode(bloque)
+        decodificador.decode(b'', final=True)
+    except UnicodeDecodeError:
+        codificacion = 'cp1252'
+    flujo.seek(0)
+    return io.TextIOWrapper(flujo, encoding=codificacion, newline='')
+
+
+def filas_de_csv(archivo):
+    """
+    (encabezados, filas) de un CSV abierto en modo texto; `filas` entrega (número de
+    fila, valores) de cada fila no vacía. El separador (coma, punto y coma o tabulación)
+    se deduce del encabezado: Excel en español guarda los CSV con punto y coma.
+    """
+    primera = archivo.readline()
+    separador = max(',;\t', key=primera.count)
+    lector = csv.reader(itertools.chain([primera], archivo), delimiter=separador)
+    encabezados = next(lector, None)
+
+    def filas():
+        for numero, valores in enumerate(lector, start=2):
+            if any(v.strip() for v in valores):
+                yield numero, valores
+    return encabezados, filas()
+
+
+def _consultar_por_json(conn, sql, valores):
+    return conn.execute(sql, (json.dumps(list(valores)),)).fetchall()
+
+
+def importar_seguimientos_csv(conn, archivo, creado_por, rechazos, simular=False,
+                              tamano_lote=TAMANO_LOTE_POR_DEFECTO, registrar=print):
+    """
+    Carga los seguimientos de un CSV (`archivo`, abierto en modo texto) a nombre de
+    `creado_por`. Devuelve un ResumenHoja; las filas rechazadas van a `rechazos`
+    (EscritorRechazos o ListaRechazos).
+
+    Cada lote de filas válidas se escribe en una transacción junto con los efectos que
+    tiene guardar el seguimiento en nuevo_seguimiento:
+      - estado_academico, beneficio_arancel, estado_derivacion_maestro y nota_importante
+        del estudiante (EFECTOS_EN_ESTUDIANTES), y el estado del período de atención
+        actual (cambio_estado_programa_a);
+      - la cadena de versiones, si la fila corrige un seguimiento (corrige_id_seguimiento
+        de un seguimiento del mismo estudiante);
+      - la fecha del último seguimiento en EstadoActualEstudiante.
+    Los efectos se aplican en orden de fecha_sesion y sólo para sesiones no anteriores a
+    la última ya registrada del estudiante, como si se hubieran ingresado el día en que
+    ocurrieron: una sesión antigua que se carga tarde no pisa el estado actual.
+
+    Un seguimiento idéntico (estudiante, fecha, tipo y bitácora) a uno ya registrado o a
+    otro del mismo archivo se omite, así que repetir la carga no duplica nada. Con
+    `simular=True` se hacen las mismas validaciones (también de RUT y correcciones) sin
+    escribir nada.
+    """
+    hoja = HOJA_SEGUIMIENTOS_CSV
+    encabezados, filas = filas_de_csv(archivo)
+    indices = mapear_encabezados(encabezados, hoja, registrar)
+    leidas = escritas = sin_cambios = rechazadas = 0
+    vistos = set()
+    lote = []
+
+    def rechazar(numero, errores, valores):
+        nonlocal rechazadas
+        rechazos.escribir(hoja.nombre, numero, errores, dict(zip(encabezados, valores)))
+        rechazadas += 1
+
+    def procesar_lote():
+        nonlocal escritas, sin_cambios
+        ruts = {registro['rut_estudiante'] for _, _, registro in lote}
+        existentes = {f[0] for f in _consultar_por_json(
+            conn, "SELECT rut FROM Estudiantes WHERE rut IN (SELECT value FROM json_each(?))", ruts)}
+        ultimas = dict(_consultar_por_json(conn, """
+            SELECT rut_estudiante, fecha_ultima_sesion FROM EstadoActualEstudiante
+            WHERE rut_estudiante IN (SELECT value FROM json_each(?))""", ruts))
+        registrados = {tuple(f) for f in _consultar_por_json(conn, """
+            SELECT s.rut_estudiante, s.fecha_sesion, s.tipo_intervencion, s.bitacora_sesion
+            FROM json_each(?) j
+            JOIN Seguimientos s ON s.rut_estudiante = json_extract(j.value, '$[0]')
+                               AND s.fecha_sesion = json_extract(j.value, '$[1]')""",
+            {(r['rut_estudiante'], r['fecha_sesion']) for _, _, r in lote})}
+        corregibles = dict(_consultar_por_json(conn, """
+            SELECT id_seguimiento, rut_estudiante FROM Seguimientos
+            WHERE id_seguimiento IN (SELECT value FROM json_each(?))""",
+            {r['corrige_id_seguimiento'] for _, _, r in lote} - {None}))
+
+        validas = []
+        for numero, valores, registro in lote:
+            rut, corrige = registro['rut_estudiante'], registro['corrige_id_seguimiento']
+            if rut not in existentes:
+                rechazar(numero, [f"rut_estudiante: no existe el estudiante '{rut}'"], valores)
+                continue
+            if corrige is not None and corregibles.get(corrige) != rut:
+                rechazar(numero, [f"corrige_id_seguimiento: el estudiante no tiene el seguimiento {corrige}"], valores)
+                continue
+            clave = (rut, registro['fecha_sesion'], registro['tipo_intervencion'], registro['bitacora_sesion'])
+            if clave in registrados or clave in vistos:
+                sin_cambios += 1
+                continue
+            vistos.add(clave)
+            validas.append(registro)
+        lote.clear()
+        validas.sort(key=lambda r: r['fecha_sesion'])  # estable: a igual fecha, el orden del archivo
+        if simular or not validas:
+            escritas += len(validas)
+            return
+
+        efectos, estados_programa = {}, {}
+        for registro in validas:
+            rut = registro['rut_estudiante']
+            if ultimas.get(rut) and registro['fecha_sesion'] < ultimas[rut]:
+                continue
+            for origen, destino in EFECTOS_EN_ESTUDIANTES.items():
+                if registro[origen]:
+                    efectos.setdefault(destino, {})[rut] = registro[origen]
+            if registro['cambio_estado_programa_a']:
+                estados_programa[rut] = registro['cambio_estado_programa_a']
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = conn.cursor()
+            sin_correccion = []
+            for registro in validas:
+                parametros = tuple(registro[c] for c in COLUMNAS_SEGUIMIENTO_CSV)
+                if registro['corrige_id_seguimiento'] is None:
+                    sin_correccion.append(parametros)
+                else:
+                    cursor.execute(SQL_INSERTAR_SEGUIMIENTO_CSV, parametros)
+                    registrar_correccion_seguimiento(cursor, cursor.lastrowid, registro['corrige_id_seguimiento'])
+            cursor.executemany(SQL_INSERTAR_SEGUIMIENTO_CSV, sin_correccion)
+            for destino, valores in efectos.items():
+                cursor.executemany(f"UPDATE Estudiantes SET {destino} = ? WHERE rut = ? AND {destino} IS NOT ?",
+                                   [(valor, rut, valor) for rut, valor in valores.items()])
+            cursor.executemany("""
+                UPDATE PeriodosAtencion SET estado_periodo = ?
+                WHERE id = (SELECT id_periodo_actual FROM EstadoActualEstudiante WHERE rut_estudiante = ?)
+            """, [(estado, rut) for rut, estado in estados_programa.items()])
+            for rut in estados_programa:
+                actualizar_estado_actual(cursor, rut)
+            for rut in {r['rut_estudiante'] for r in validas} - estados_programa.keys():
+                actualizar_ultima_sesion(cursor, rut)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        escritas += len(validas)
+
+    for numero, valores in filas:
+        leidas += 1
+        registro, errores = validar_fila(valores, indices)
+        registro = {**dict.fromkeys(c.nombre for c in hoja.columnas), **registro, 'creado_por_usuario': creado_por}
+        if registro['corrige_id_seguimiento'] is not None:
+            registro['es_correccion'] = 1
+        elif registro['es_correccion']:
+            errores.append("corrige_id_seguimiento: es obligatorio si es_correccion es 1")
+        for marca in MARCAS_SEGUIMIENTO_CSV:
+            registro[marca] = registro[marca] or 0
+        if errores:
+            rechazar(numero, errores, valores)
+            continue
+        lote.append((numero, valores, registro))
+        if len(lote) >= tamano_lote:
+            procesar_lote()
+    if lote:
+        procesar_lote()
+
+    resumen = ResumenHoja(hoja.nombre, leidas, escritas, sin_cambios, rechazadas)
+    registrar(f"  {hoja.nombre} ({'simulación' if simular else 'CSV'}): {resumen.leidas} filas leídas, "
+              f"{resumen.escritas} {'válidas' if simular else 'nuevas'}, {resumen.sin_cambios} ya registradas, "
+              f"{resumen.rechazadas} rechazadas.")
+    return resumen
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importa estudiantes y seguimientos desde un libro Excel o seguimientos desde un CSV.")
+    parser.add_argument('archivo', help="Libro .xlsx con las hojas 'Estudiantes' y/o 'Seguimientos', o CSV de seguimientos.")
+    parser.add_argument('--rechazos', help="CSV para las filas rechazadas (por defecto, <archivo>_rechazos.csv).")
+    parser.add_argument('--lote', type=int, default=TAMANO_LOTE_POR_DEFECTO, help="Filas por transacción.")
+    parser.add_argument('--simular', action='store_true', help="(CSV) Sólo valida, sin escribir.")
+    parser.add_argument('--creado-por', default='Carga CSV', help="(CSV) Valor de creado_por_usuario.")
+    args = parser.parse_args()
+
+    ruta_rechazos = args.rechazos or os.path.splitext(args.archivo)[0] + '_rechazos.csv'
+    conn = get_db_connection()
+    inicio = time.perf_counter()
+    try:
+        if args.archivo.lower().endswith('.csv'):
+            rechazos = EscritorRechazos(ruta_rechazos)
+            try:
+                with abrir_csv(open(args.archivo, 'rb')) as archivo:
+                    importar_seguimientos_csv(conn, archivo, args.creado_por, rechazos, args.simular, args.lote)
+            finally:
+                rechazos.cerrar()
+            if rechazos.total:
+                print(f"{rechazos.total} filas rechazadas; detalle en '{ruta_rechazos}'.")
+        else:
+            importar_libro(conn, args.archivo, ruta_rechazos, args.lote)
+    finally:
+        conn.close()
+    print(f"Importación terminada en {time.perf_counter() - inicio:.1f} s.")
+
+
+if __name__ == '__main__':
+    main()
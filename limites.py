@@ -0,0 +1,160 @@
+# limites.py
+"""
+Almacenamiento de los contadores de Flask-Limiter en un archivo SQLite local.
+
+Con storage_uri="memory://" cada proceso de gunicorn llevaba sus propios contadores:
+con N procesos el límite efectivo era N veces el configurado, y se reiniciaban con
+cada proceso nuevo. Este almacenamiento guarda los contadores en un archivo (por
+defecto 'limites.db', junto a la base de datos principal) que comparten todos los
+procesos del servidor, sin depender de otro servicio.
+
+Se registra en la librería `limits` con el esquema "sqlite": basta importar este
+módulo y usar storage_uri="sqlite:///ruta/absoluta/limites.db". Soporta las
+estrategias "fixed-window" y "sliding-window-counter" (la que usa la app).
+
+Cada incremento es una sola sentencia (INSERT ... ON CONFLICT ... RETURNING) y el
+"leer y decidir" de la ventana deslizante corre dentro de BEGIN IMMEDIATE, así que
+dos procesos nunca aceptan la misma petición de más. Los contadores vencidos se
+borran cada INTERVALO_LIMPIEZA segundos.
+"""
+import os
+import sqlite3
+import threading
+import time
+from math import floor
+
+from limits.storage import Storage
+from limits.storage.base import SlidingWindowCounterSupport, TimestampedSlidingWindow
+
+INTERVALO_LIMPIEZA = 60
+
+ESQUEMA = """
+    CREATE TABLE IF NOT EXISTS ContadoresLimite (
+        clave TEXT PRIMARY KEY,
+        valor INTEGER NOT NULL,
+        expira REAL NOT NULL
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_contadoreslimite_expira ON ContadoresLimite (expira);
+"""
+
+# Suma `cantidad` al contador; si venció, lo reinicia con `cantidad` y un nuevo vencimiento.
+SQL_INCREMENTAR = """
+    INSERT INTO ContadoresLimite (clave, valor, expira) VALUES (:clave, :cantidad, :expira)
+    ON CONFLICT (clave) DO UPDATE SET
+        valor = CASE WHEN expira <= :ahora THEN excluded.valor ELSE valor + excluded.valor END,
+        expira = CASE WHEN expira <= :ahora THEN excluded.expira ELSE expira END
+    RETURNING valor
+"""
+
+
+class AlmacenLimitesSQLite(Storage, SlidingWindowCounterSupport, TimestampedSlidingWindow):
+    """
+    Contadores de límites de peticiones en SQLite, compartidos entre procesos.
+
+    Cada hilo usa su propia conexión, y se abre una nueva si el proceso cambió (fork de
+    gunicorn después de importar la app).
+    """
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri, wrap_exceptions=False, busy_timeout=5000, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self.ruta = uri.split('://', 1)[1]
+        self.busy_timeout = int(busy_timeout)
+        self._local = threading.local()
+        self._proxima_limpieza = 0.0
+        self._conexion().executescript(ESQUEMA)
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _conexion(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            # Modo autocommit: cada sentencia es su propia transacción, salvo BEGIN explícito.
+            conn = sqlite3.connect(self.ruta, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute(f"PRAGMA busy_timeout = {self.busy_timeout}")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _limpiar_vencidos(self, conn, ahora):
+        if ahora >= self._proxima_limpieza:
+            self._proxima_limpieza = ahora + INTERVALO_LIMPIEZA
+            conn.execute("DELETE FROM ContadoresLimite WHERE expira <= ?", (ahora,))
+
+    def _incrementar(self, conn, clave, expiry, cantidad, ahora):
+        return conn.execute(SQL_INCREMENTAR, {'clave': clave, 'cantidad': cantidad,
+                                              'expira': ahora + expiry, 'ahora': ahora}).fetchone()[0]
+
+    def _valor(self, conn, clave, ahora):
+        fila = conn.execute("SELECT valor FROM ContadoresLimite WHERE clave = ? AND expira > ?", (clave, ahora)).fetchone()
+        return fila[0] if fila else 0
+
+    # --- Ventana fija ---
+    def incr(self, key, expiry, amount=1):
+        conn = self._conexion()
+        ahora = time.time()
+        self._limpiar_vencidos(conn, ahora)
+        return self._incrementar(conn, key, expiry, amount, ahora)
+
+    def get(self, key):
+        return self._valor(self._conexion(), key, time.time())
+
+    def get_expiry(self, key):
+        fila = self._conexion().execute("SELECT expira FROM ContadoresLimite WHERE clave = ?", (key,)).fetchone()
+        return fila[0] if fila else time.time()
+
+    def clear(self, key):
+        self._conexion().execute("DELETE FROM ContadoresLimite WHERE clave = ?", (key,))
+
+    def check(self):
+        try:
+            self._conexion().execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self):
+        return self._conexion().execute("DELETE FROM ContadoresLimite").rowcount
+
+    # --- Ventana deslizante (contador ponderado de la ventana anterior y la actual) ---
+    def _ventana(self, conn, key, expiry, ahora):
+        clave_anterior, clave_actual = self.sliding_window_keys(key, expiry, ahora)
+        cuenta_anterior = self._valor(conn, clave_anterior, ahora)
+        cuenta_actual = self._valor(conn, clave_actual, ahora)
+        # Fracción de la ventana anterior que todavía cae dentro de la ventana deslizante.
+        ttl_anterior = (1 - (((ahora - expiry) / expiry) % 1)) * expiry if cuenta_anterior else 0.0
+        ttl_actual = (1 - ((ahora / expiry) % 1)) * expiry + expiry
+        return clave_actual, cuenta_anterior, ttl_anterior, cuenta_actual, ttl_actual
+
+    def acquire_sliding_window_entry(self, key, limit, expiry, amount=1):
+        if amount > limit:
+            return False
+        conn = self._conexion()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            ahora = time.time()
+            clave_actual, cuenta_anterior, ttl_anterior, cuenta_actual, _ = self._ventana(conn, key, expiry, ahora)
+            if floor(cuenta_anterior * ttl_anterior / expiry + cuenta_actual) + amount > limit:
+                conn.execute("COMMIT")
+                return False
+            # El contador de la ventana actual sigue sirviendo como "anterior" en la siguiente.
+            self._incrementar(conn, clave_actual, 2 * expiry, amount, ahora)
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        self._limpiar_vencidos(conn, ahora)
+        return True
+
+    def get_sliding_window(self, key, expiry):
+        _, *ventana = self._ventana(self._conexion(), key, expiry, time.time())
+        return tuple(ventana)
+
+    def clear_sliding_window(self, key, expiry):
+        clave_anterior, clave_actual = self.sliding_window_keys(key, expiry, time.time())
+        self._conexion().execute("DELETE FROM ContadoresLimite WHERE clave IN (?, ?)", (clave_anterior, clave_actual))
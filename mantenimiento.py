@@ -0,0 +1,484 @@
+# mantenimiento.py
+"""
+Tareas de mantenimiento de la base de datos.
+
+Uso:
+    python mantenimiento.py estado-actual [--reparar]
+        Verifica que EstadoActualEstudiante coincida con el último período de cada
+        estudiante en PeriodosAtencion; con --reparar la reconstruye.
+
+    python mantenimiento.py versiones-seguimiento [--reparar] [--aleatorio RONDAS] [--semilla S]
+        Verifica reemplazado_por_id/es_vigente de Seguimientos contra las cadenas de
+        corrección (corrige_id_seguimiento); con --reparar los recalcula. Con
+        --aleatorio, sobre una base en memoria, elimina primero la versión intermedia
+        de una cadena y luego verifica tras cada ronda de escrituras al azar.
+
+    python mantenimiento.py periodos-faltantes [--reparar]
+        Lista los estudiantes sin ningún período de atención (no aparecen en la lista
+        de estudiantes). Con --reparar crea el primero de los que tienen fecha de
+        ingreso al programa, con sus datos de ingreso; los que no la tienen se dejan
+        como están, para completar esa fecha a mano en su ficha y volver a ejecutar.
+
+    python mantenimiento.py alertas [--dias N] [--aleatorio RONDAS] [--semilla S]
+        Comprueba que la lista de alertas de inactividad de '/' (fecha del último
+        seguimiento mantenida en EstadoActualEstudiante) devuelva las mismas filas que
+        la consulta original con MAX(fecha_sesion) ... HAVING. Sin --aleatorio compara
+        sobre la base configurada; con --aleatorio genera una base en memoria y aplica
+        RONDAS de altas, ediciones y eliminaciones al azar, comparando tras cada una.
+
+    python mantenimiento.py resumenes [--reparar] [--aleatorio RONDAS] [--semilla S]
+        Verifica que las tablas de resumen del dashboard (Resumen*, mantenidas por
+        triggers) coincidan con las agregaciones directas; con --reparar las
+        reconstruye. Con --aleatorio hace la comprobación sobre una base en memoria
+        tras cada ronda de escrituras al azar.
+
+    python mantenimiento.py busqueda [--reparar] [--aleatorio RONDAS] [--semilla S]
+        Verifica que los índices de texto completo EstudiantesFTS (lista de
+        estudiantes) y SeguimientosFTS (bitácoras de sesión) coincidan con sus
+        tablas; con --reparar los reconstruye y compacta. Con --aleatorio, tras cada
+        ronda de escrituras al azar sobre una base en memoria, además compara los
+        resultados de buscar en las bitácoras con una búsqueda hecha en Python.
+"""
+import argparse
+import random
+import re
+import sqlite3
+import sys
+import unicodedata
+from datetime import date, timedelta
+
+from database import (get_db_connection, verificar_estado_actual, verificar_versiones_seguimiento,
+                      actualizar_estado_actual, actualizar_ultima_sesion, registrar_correccion_seguimiento,
+                      SQL_CREAR_PERIODOS_FALTANTES, SQL_ESTUDIANTES_SIN_PERIODO,
+                      retirar_version_seguimiento, SQL_ALERTAS_INACTIVIDAD, ORDEN_ALERTAS_INACTIVIDAD,
+                      modificador_alertas, verificar_resumenes, verificar_busqueda_estudiantes,
+                      verificar_busqueda_seguimientos, expresion_busqueda_fts)
+
+
+def tarea_estado_actual(conn, args):
+    diferencias = verificar_estado_actual(conn, reparar=args.reparar)
+    if not diferencias:
+        print("EstadoActualEstudiante está consistente con PeriodosAtencion.")
+        return 0
+    print(f"{len(diferencias)} estudiantes con el período vigente desactualizado:")
+    for rut in diferencias[:20]:
+        print(f"  {rut}")
+    if len(diferencias) > 20:
+        print(f"  ... y {len(diferencias) - 20} más.")
+    if args.reparar:
+        print("Tabla reconstruida desde PeriodosAtencion.")
+        return 0
+    print("Ejecuta con --reparar para reconstruirla.")
+    return 1
+
+
+def _eliminar_version_intermedia(conn):
+    """
+    A, B que corrige a A y C que corrige a B; se elimina B como eliminar_seguimiento.
+    Devuelve las diferencias con la cadena derivada y las versiones vigentes (sólo C).
+    """
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO Estudiantes (rut, nombre, apellido_paterno, apellido_materno) VALUES ('1-9', 'Nombre', 'Paterno', 'Materno')")
+    ids = []
+    for _ in range(3):
+        corrige_id = ids[-1] if ids else None
+        cursor.execute("INSERT INTO Seguimientos (rut_estudiante, fecha_sesion, es_correccion, corrige_id_seguimiento) VALUES ('1-9', '2024-03-01', ?, ?)",
+                       (corrige_id is not None, corrige_id))
+        ids.append(cursor.lastrowid)
+        if corrige_id:
+            registrar_correccion_seguimiento(cursor, cursor.lastrowid, corrige_id)
+    retirar_version_seguimiento(cursor, ids[1])
+    cursor.execute("DELETE FROM Seguimientos WHERE id_seguimiento = ?", (ids[1],))
+    conn.commit()
+    vigentes = [f[0] for f in conn.execute("SELECT id_seguimiento FROM Seguimientos WHERE rut_estudiante = '1-9' AND es_vigente = 1")]
+    diferencias = verificar_versiones_seguimiento(conn)
+    for tabla in ('Seguimientos', 'Estudiantes'):
+        conn.execute(f"DELETE FROM {tabla}")
+    conn.commit()
+    return diferencias, vigentes == [ids[2]]
+
+
+def tarea_versiones_seguimiento(conn, args):
+    if args.aleatorio:
+        rnd = random.Random(args.semilla)
+        simulada = base_simulada()
+        diferencias, solo_la_ultima = _eliminar_version_intermedia(simulada)
+        if diferencias or not solo_la_ultima:
+            print(f"Al eliminar la versión intermedia de una cadena: diferencias {diferencias}, vigente sólo la última: {solo_la_ultima}")
+            return 1
+        for ronda in range(1, args.aleatorio + 1):
+            _simular_operaciones(simulada, rnd, rnd.randint(1, 20))
+            diferencias = verificar_versiones_seguimiento(simulada)
+            if diferencias:
+                print(f"Ronda {ronda}: versiones distintas de las cadenas de corrección: {diferencias[:20]}")
+                return 1
+        simulada.close()
+        print(f"Versiones consistentes en {args.aleatorio} rondas al azar (semilla {args.semilla}).")
+        return 0
+    diferencias = verificar_versiones_seguimiento(conn, reparar=args.reparar)
+    if not diferencias:
+        print("Las versiones vigentes de Seguimientos están consistentes.")
+        return 0
+    print(f"{len(diferencias)} seguimientos con la versión vigente desactualizada:")
+    for id_seguimiento in diferencias[:20]:
+        print(f"  {id_seguimiento}")
+    if len(diferencias) > 20:
+        print(f"  ... y {len(diferencias) - 20} más.")
+    if args.reparar:
+        print("Versiones recalculadas desde las cadenas de corrección.")
+        return 0
+    print("Ejecuta con --reparar para recalcularlas.")
+    return 1
+
+
+def tarea_periodos_faltantes(conn, args):
+    sin_periodo = conn.execute(SQL_ESTUDIANTES_SIN_PERIODO).fetchall()
+    if not sin_periodo:
+        print("Todos los estudiantes tienen al menos un período de atención.")
+        return 0
+    print(f"{len(sin_periodo)} estudiantes sin períodos de atención:")
+    for rut, fecha_ingreso in sin_periodo[:20]:
+        print(f"  {rut}  {fecha_ingreso or '(sin fecha de ingreso al programa)'}")
+    if len(sin_periodo) > 20:
+        print(f"  ... y {len(sin_periodo) - 20} más.")
+    if not args.reparar:
+        print("Ejecuta con --reparar para crear el primer período de los que tienen fecha de ingreso.")
+        return 1
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        creados = conn.execute(SQL_CREAR_PERIODOS_FALTANTES).rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    verificar_estado_actual(conn, reparar=True)
+    restantes = len(sin_periodo) - creados
+    print(f"Períodos creados: {creados}.")
+    if restantes:
+        print(f"{restantes} estudiantes siguen sin período: completa su fecha de ingreso al programa y vuelve a ejecutar.")
+        return 1
+    return 0
+
+
+
+# Copia de la consulta de alertas anterior a EstadoActualEstudiante.fecha_ultima_sesion,
+# con el umbral de días como parámetro.
+SQL_ALERTAS_ORIGINAL = """
+    SELECT
+        e.rut, e.nombre, e.apellido_paterno, e.apellido_materno,
+        MAX(s.fecha_sesion) as ultima_sesion,
+        CAST(julianday('now') - julianday(MAX(s.fecha_sesion)) AS INTEGER) as dias_sin_seguimiento
+    FROM Estudiantes e
+    JOIN PeriodosAtencion pa ON e.rut = pa.rut_estudiante
+    LEFT JOIN Seguimientos s ON e.rut = s.rut_estudiante
+    WHERE pa.id = (SELECT MAX(id) FROM PeriodosAtencion WHERE rut_estudiante = e.rut)
+    AND pa.estado_periodo LIKE 'Activo%'
+    {filtro}
+    GROUP BY e.rut
+    HAVING dias_sin_seguimiento > ? OR ultima_sesion IS NULL
+"""
+FILTRO_PROFESIONAL = " AND (e.trabajadora_social_asignada = ? OR e.psicologo_asignado = ?)"
+
+PROFESIONALES_SIMULADOS = ["Paula Araya", "Daniela Rojas", "Carla Soto", None]
+ESTADOS_SIMULADOS = ["Activo", "Activo (Reingreso)", "activo", "Alta del programa", "Desertó", "Archivado"]
+CARRERAS_SIMULADAS = ["Psicología", " Psicología ", "Derecho", "Ingeniería Civil", "", None]
+TENTATIVAS_SIMULADAS = ["Ideación", "Tentativa", "No registrado", None]
+PALABRAS_BITACORA_SIMULADAS = ["ansiedad", "Ansiosa", "exámenes", "examen", "familia", "Sueño", "CESFAM", "duelo", "pareja"]
+
+
+def diferencias_alertas(conn, dias, profesional=None):
+    """
+    Compara las alertas de la consulta original con las de SQL_ALERTAS_INACTIVIDAD.
+    Devuelve (filas sólo en la original, filas sólo en la nueva); ambas vacías si coinciden.
+    El orden de la original sólo está definido por dias_sin_seguimiento, así que se
+    compara el conjunto de filas y que el orden nuevo sea el mismo criterio.
+    """
+    filtro, params = ("", [])
+    if profesional:
+        filtro, params = (FILTRO_PROFESIONAL, [profesional, profesional])
+    original = [tuple(f) for f in conn.execute(SQL_ALERTAS_ORIGINAL.format(filtro=filtro), params + [dias])]
+    nueva = [tuple(f) for f in conn.execute(SQL_ALERTAS_INACTIVIDAD + filtro + ORDEN_ALERTAS_INACTIVIDAD,
+                                            [modificador_alertas(dias)] + params)]
+    orden_esperado = sorted(nueva, key=lambda f: (-(f[5] if f[5] is not None else -1), f[0]))
+    if nueva != orden_esperado:
+        return [], [("orden distinto",)]
+    return sorted(set(original) - set(nueva)), sorted(set(nueva) - set(original))
+
+
+def _fecha_al_azar(rnd):
+    return (date.today() - timedelta(days=rnd.randint(0, 120))).isoformat()
+
+
+def _datos_estudiante_al_azar(rnd):
+    """Valores al azar para las columnas de Estudiantes que usan los resúmenes del dashboard."""
+    fecha_ingreso = rnd.choice([(date.today() - timedelta(days=rnd.randint(0, 1500))).isoformat(), None, "sin fecha"])
+    return (rnd.choice(ESTADOS_SIMULADOS + [None]), rnd.choice(CARRERAS_SIMULADAS),
+            rnd.choice(TENTATIVAS_SIMULADAS), fecha_ingreso)
+
+
+def _bitacora_al_azar(rnd):
+    if rnd.random() < 0.1:
+        return None
+    return ' '.join(rnd.choice(PALABRAS_BITACORA_SIMULADAS) for _ in range(rnd.randint(0, 6)))
+
+
+def _simular_operaciones(conn, rnd, operaciones):
+    """
+    Aplica `operaciones` escrituras al azar usando las mismas funciones de mantenimiento
+    que las rutas de app.py (nuevo/editar/eliminar seguimiento, reingreso, cambio de
+    estado, nuevo/editar/eliminar estudiante), cada una en su transacción.
+    """
+    cursor = conn.cursor()
+    for _ in range(operaciones):
+        ruts = [f[0] for f in conn.execute("SELECT rut FROM Estudiantes")]
+        seguimientos = [tuple(f) for f in conn.execute("SELECT id_seguimiento, rut_estudiante FROM Seguimientos")]
+        operacion = rnd.choice(['nuevo_estudiante', 'nuevo_seguimiento', 'nuevo_seguimiento', 'correccion',
+                                'editar_seguimiento', 'eliminar_seguimiento', 'reingreso', 'cambio_estado',
+                                'editar_estudiante', 'eliminar_estudiante'])
+        if operacion == 'nuevo_estudiante' or not ruts:
+            rut = f"{rnd.randint(1000000, 29999999)}-{rnd.randint(0, 9)}"
+            if rut in ruts:
+                continue
+            cursor.execute("""
+                INSERT INTO Estudiantes (rut, nombre, apellido_paterno, apellido_materno, trabajadora_social_asignada, psicologo_asignado,
+                                         estado_en_programa, carrera_programa, tentativa_ideacion, fecha_ingreso_programa)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (rut, "Nombre", "Paterno", "Materno", rnd.choice(PROFESIONALES_SIMULADOS), rnd.choice(PROFESIONALES_SIMULADOS))
+                + _datos_estudiante_al_azar(rnd))
+            cursor.execute("INSERT INTO PeriodosAtencion (rut_estudiante, fecha_ingreso, motivo_ingreso, estado_periodo) VALUES (?, ?, ?, ?)",
+                           (rut, _fecha_al_azar(rnd), rnd.choice(["Ideación", "Tentativa"]), rnd.choice(ESTADOS_SIMULADOS)))
+            actualizar_estado_actual(cursor, rut)
+        elif operacion in ('nuevo_seguimiento', 'correccion'):
+            rut = rnd.choice(ruts)
+            # El formulario sólo corrige originales; la carga CSV también corrige correcciones.
+            solo_originales = " AND (es_correccion = 0 OR es_correccion IS NULL)" if rnd.random() < 0.5 else ""
+            corregibles = [f[0] for f in conn.execute("SELECT id_seguimiento FROM Seguimientos WHERE rut_estudiante = ?" + solo_originales, (rut,))]
+            corrige_id = rnd.choice(corregibles) if operacion == 'correccion' and corregibles else None
+            cursor.execute("INSERT INTO Seguimientos (rut_estudiante, fecha_sesion, tipo_intervencion, bitacora_sesion, es_correccion, corrige_id_seguimiento) VALUES (?, ?, ?, ?, ?, ?)",
+                           (rut, _fecha_al_azar(rnd), "Sesión Online", _bitacora_al_azar(rnd), corrige_id is not None, corrige_id))
+            if corrige_id:
+                registrar_correccion_seguimiento(cursor, cursor.lastrowid, corrige_id)
+            actualizar_ultima_sesion(cursor, rut)
+        elif operacion == 'editar_seguimiento' and seguimientos:
+            id_seguimiento, rut = rnd.choice(seguimientos)
+            if rnd.random() < 0.5:
+                cursor.execute("UPDATE Seguimientos SET fecha_sesion = ? WHERE id_seguimiento = ?", (_fecha_al_azar(rnd), id_seguimiento))
+            else:
+                cursor.execute("UPDATE Seguimientos SET fecha_sesion = ?, bitacora_sesion = ? WHERE id_seguimiento = ?",
+                               (_fecha_al_azar(rnd), _bitacora_al_azar(rnd), id_seguimiento))
+            actualizar_ultima_sesion(cursor, rut)
+        elif operacion == 'eliminar_seguimiento' and seguimientos:
+            id_seguimiento, rut = rnd.choice(seguimientos)
+            retirar_version_seguimiento(cursor, id_seguimiento)
+            cursor.execute("DELETE FROM Seguimientos WHERE id_seguimiento = ?", (id_seguimiento,))
+            actualizar_ultima_sesion(cursor, rut)
+        elif operacion == 'reingreso':
+            rut = rnd.choice(ruts)
+            cursor.execute("INSERT INTO PeriodosAtencion (rut_estudiante, fecha_ingreso, motivo_ingreso, estado_periodo) VALUES (?, ?, ?, 'Activo (Reingreso)')",
+                           (rut, _fecha_al_azar(rnd), rnd.choice(["Ideación", "Tentativa"])))
+            actualizar_estado_actual(cursor, rut)
+        elif operacion == 'cambio_estado':
+            rut = rnd.choice(ruts)
+            cursor.execute("UPDATE PeriodosAtencion SET estado_periodo = ? WHERE id = (SELECT id_periodo_actual FROM EstadoActualEstudiante WHERE rut_estudiante = ?)",
+                           (rnd.choice(ESTADOS_SIMULADOS), rut))
+            actualizar_estado_actual(cursor, rut)
+        elif operacion == 'editar_estudiante':
+            rut = rnd.choice(ruts)
+            estado, carrera, tentativa, fecha_ingreso = _datos_estudiante_al_azar(rnd)
+            # Como editar_estudiante: a veces sólo cambia una parte de los campos.
+            cursor.execute("""
+                UPDATE Estudiantes SET estado_en_programa = ?, carrera_programa = COALESCE(?, carrera_programa),
+                                       tentativa_ideacion = ?, fecha_ingreso_programa = ?
+                WHERE rut = ?
+            """, (estado, carrera if rnd.random() < 0.5 else None, tentativa, fecha_ingreso, rut))
+        elif operacion == 'eliminar_estudiante':
+            rut = rnd.choice(ruts)
+            cursor.execute("DELETE FROM Seguimientos WHERE rut_estudiante = ?", (rut,))
+            cursor.execute("DELETE FROM EstadoActualEstudiante WHERE rut_estudiante = ?", (rut,))
+            cursor.execute("DELETE FROM PeriodosAtencion WHERE rut_estudiante = ?", (rut,))
+            cursor.execute("DELETE FROM Estudiantes WHERE rut = ?", (rut,))
+        conn.commit()
+
+
+def base_simulada():
+    """Base en memoria con el esquema completo (todas las migraciones) y sin datos."""
+    from migraciones import aplicar_migraciones
+    conn = sqlite3.connect(':memory:')
+    aplicar_migraciones(conn, registrar=lambda mensaje: None)
+    return conn
+
+
+def tarea_alertas(conn, args):
+    if args.aleatorio:
+        rnd = random.Random(args.semilla)
+        simulada = base_simulada()
+        for ronda in range(1, args.aleatorio + 1):
+            _simular_operaciones(simulada, rnd, rnd.randint(1, 20))
+            for profesional in (None, rnd.choice(PROFESIONALES_SIMULADOS[:-1])):
+                if not _comparar_alertas(simulada, args.dias, profesional, ronda):
+                    return 1
+        simulada.close()
+        print(f"Alertas equivalentes en {args.aleatorio} rondas al azar (semilla {args.semilla}).")
+        return 0
+    if not _comparar_alertas(conn, args.dias, None, None):
+        return 1
+    print("Las alertas coinciden con la consulta original.")
+    return 0
+
+
+def _comparar_alertas(conn, dias, profesional, ronda):
+    solo_original, solo_nueva = diferencias_alertas(conn, dias, profesional)
+    if not solo_original and not solo_nueva:
+        return True
+    donde = f" (ronda {ronda}, profesional {profesional!r})" if ronda is not None else ""
+    print(f"Las alertas difieren{donde}:")
+    for fila in solo_original[:10]:
+        print(f"  sólo en la original: {fila}")
+    for fila in solo_nueva[:10]:
+        print(f"  sólo en la nueva:    {fila}")
+    return False
+
+
+def tarea_resumenes(conn, args):
+    if args.aleatorio:
+        rnd = random.Random(args.semilla)
+        simulada = base_simulada()
+        for ronda in range(1, args.aleatorio + 1):
+            _simular_operaciones(simulada, rnd, rnd.randint(1, 20))
+            diferencias = verificar_resumenes(simulada)
+            if diferencias:
+                print(f"Ronda {ronda}: resúmenes distintos de la agregación directa: {', '.join(diferencias)}")
+                return 1
+        simulada.close()
+        print(f"Resúmenes consistentes en {args.aleatorio} rondas al azar (semilla {args.semilla}).")
+        return 0
+    diferencias = verificar_resumenes(conn, reparar=args.reparar)
+    if not diferencias:
+        print("Las tablas de resumen del dashboard están consistentes.")
+        return 0
+    print(f"Resúmenes desactualizados: {', '.join(diferencias)}")
+    if args.reparar:
+        print("Resúmenes reconstruidos desde las tablas de origen.")
+        return 0
+    print("Ejecuta con --reparar para reconstruirlos.")
+    return 1
+
+
+def _normalizar(texto):
+    """Minúsculas y sin tildes, como el tokenizador unicode61 con remove_diacritics."""
+    descompuesto = unicodedata.normalize('NFD', texto.lower())
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c))
+
+
+def diferencias_busqueda_bitacoras(conn, texto):
+    """
+    Compara los id_seguimiento que devuelve SeguimientosFTS para `texto` con los que
+    encuentra una búsqueda en Python (cada palabra como prefijo de alguna palabra de
+    la bitácora). Devuelve (sólo en Python, sólo en FTS); ambas vacías si coinciden.
+    """
+    terminos = [_normalizar(p) for p in re.findall(r"\w+", texto)]
+    esperados = {id_seguimiento for id_seguimiento, bitacora in conn.execute("SELECT id_seguimiento, bitacora_sesion FROM Seguimientos")
+                 if bitacora and all(any(palabra.startswith(t) for palabra in re.findall(r"\w+", _normalizar(bitacora)))
+                                     for t in terminos)}
+    encontrados = {fila[0] for fila in conn.execute("SELECT rowid FROM SeguimientosFTS WHERE SeguimientosFTS MATCH ?",
+                                                    (expresion_busqueda_fts(texto),))}
+    return sorted(esperados - encontrados), sorted(encontrados - esperados)
+
+
+def tarea_busqueda(conn, args):
+    if args.aleatorio:
+        rnd = random.Random(args.semilla)
+        simulada = base_simulada()
+        for ronda in range(1, args.aleatorio + 1):
+            _simular_operaciones(simulada, rnd, rnd.randint(1, 20))
+            problemas = verificar_busqueda_estudiantes(simulada) + verificar_busqueda_seguimientos(simulada)
+            texto = ' '.join(rnd.choice(PALABRAS_BITACORA_SIMULADAS)[:rnd.randint(2, 6)] for _ in range(rnd.randint(1, 2)))
+            solo_python, solo_fts = diferencias_busqueda_bitacoras(simulada, texto)
+            if problemas or solo_python or solo_fts:
+                print(f"Ronda {ronda}: índices de búsqueda inconsistentes: {problemas}")
+                print(f"  buscando {texto!r}: sólo en Python {solo_python[:10]}, sólo en FTS {solo_fts[:10]}")
+                return 1
+        simulada.close()
+        print(f"Índices de búsqueda consistentes en {args.aleatorio} rondas al azar (semilla {args.semilla}).")
+        return 0
+
+    codigo = 0
+    diferencias = verificar_busqueda_estudiantes(conn, reparar=args.reparar)
+    if not diferencias:
+        print("El índice de búsqueda EstudiantesFTS está consistente con Estudiantes.")
+    else:
+        print(f"{len(diferencias)} estudiantes con el índice de búsqueda desactualizado:")
+        for rut in diferencias[:20]:
+            print(f"  {rut}")
+        if len(diferencias) > 20:
+            print(f"  ... y {len(diferencias) - 20} más.")
+        if args.reparar:
+            print("Índice reconstruido desde Estudiantes.")
+        else:
+            codigo = 1
+
+    problemas = verificar_busqueda_seguimientos(conn, reparar=args.reparar)
+    if not problemas:
+        print("El índice de bitácoras SeguimientosFTS está consistente con Seguimientos.")
+    else:
+        for problema in problemas:
+            print(problema)
+        if args.reparar:
+            print("Índice de bitácoras reconstruido desde Seguimientos.")
+        else:
+            codigo = 1
+
+    if codigo:
+        print("Ejecuta con --reparar para reconstruir los índices.")
+    return codigo
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tareas de mantenimiento de la base de datos.")
+    subparsers = parser.add_subparsers(dest='tarea', required=True)
+
+    p = subparsers.add_parser('estado-actual', help="Verifica/reconstruye EstadoActualEstudiante.")
+    p.add_argument('--reparar', action='store_true')
+    p.set_defaults(funcion=tarea_estado_actual)
+
+    p = subparsers.add_parser('versiones-seguimiento', help="Verifica/recalcula las versiones vigentes de Seguimientos.")
+    p.add_argument('--reparar', action='store_true')
+    p.add_argument('--aleatorio', type=int, default=0, metavar='RONDAS')
+    p.add_argument('--semilla', type=int, default=0)
+    p.set_defaults(funcion=tarea_versiones_seguimiento)
+
+    p = subparsers.add_parser('periodos-faltantes', help="Lista/crea el primer período de los estudiantes sin períodos.")
+    p.add_argument('--reparar', action='store_true')
+    p.set_defaults(funcion=tarea_periodos_faltantes)
+
+    p = subparsers.add_parser('alertas', help="Compara las alertas de inactividad con la consulta original.")
+    p.add_argument('--dias', type=int, default=30)
+    p.add_argument('--aleatorio', type=int, default=0, metavar='RONDAS')
+    p.add_argument('--semilla', type=int, default=0)
+    p.set_defaults(funcion=tarea_alertas)
+
+    p = subparsers.add_parser('resumenes', help="Verifica/reconstruye las tablas de resumen del dashboard.")
+    p.add_argument('--reparar', action='store_true')
+    p.add_argument('--aleatorio', type=int, default=0, metavar='RONDAS')
+    p.add_argument('--semilla', type=int, default=0)
+    p.set_defaults(funcion=tarea_resumenes)
+
+    p = subparsers.add_parser('busqueda', help="Verifica/reconstruye los índices de búsqueda de estudiantes y bitácoras.")
+    p.add_argument('--reparar', action='store_true')
+    p.add_argument('--aleatorio', type=int, default=0, metavar='RONDAS')
+    p.add_argument('--semilla', type=int, default=0)
+    p.set_defaults(funcion=tarea_busqueda)
+
+    args = parser.parse_args()
+    # Las comprobaciones al azar trabajan sobre su propia base en memoria.
+    conn = None if getattr(args, 'aleatorio', 0) else get_db_connection()
+    try:
+        codigo = args.funcion(conn, args)
+    finally:
+        if conn:
+            conn.close()
+    sys.exit(codigo)
+
+
+if __name__ == '__main__':
+    main()
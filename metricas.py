@@ -0,0 +1,450 @@
+# metricas.py
+"""
+Métricas de SQL por petición: sentencias, tiempo total y máximo, y filas devueltas.
+
+Con SQL_METRICAS activo (por defecto), las conexiones del pool son ConexionMedida: cada
+sentencia ejecutada durante una petición suma a la medición de esa petición su tiempo
+(execute y la lectura de sus filas) y las filas que devolvió. Al terminar la petición,
+la medición se agrega, con el nombre del endpoint, a histogramas en memoria del proceso:
+
+  - segundos de SQL de la petición (todas sus sentencias),
+  - sentencias por petición,
+  - segundos de la sentencia más lenta de la petición,
+  - filas devueltas por petición,
+
+y a una tabla de sentencias (texto normalizado) por endpoint, con su número de
+ejecuciones, tiempo total y máximo, para saber cuál de las consultas de una página es
+la lenta. /admin/metrics muestra ambas cosas y /admin/metrics/prometheus entrega los
+histogramas en el formato de texto de Prometheus.
+
+Además, cada sentencia que tarda más de SQL_LENTA_MS (execute más la lectura de sus
+filas) queda en un log aparte y rotativo (SQL_LENTAS_LOG, una línea JSON por sentencia)
+con su texto normalizado, la forma de sus parámetros (tipos, nunca los valores: son
+datos de salud), la duración, el endpoint y la salida de EXPLAIN QUERY PLAN, que se
+obtiene al terminar la petición. Para resumirlo:
+
+    python metricas.py lentas [--archivo sql_lentas.log] [--top N]
+
+Cada proceso de gunicorn lleva sus propias métricas, desde que arrancó. Con
+SQL_METRICAS=false las conexiones son sqlite3.Connection comunes, sin ningún costo.
+Para medir el costo: python benchmark.py metricas.
+"""
+import argparse
+import bisect
+import glob
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from functools import lru_cache
+from logging.handlers import RotatingFileHandler
+
+from flask import g, request
+
+BUCKETS_SEGUNDOS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+BUCKETS_SENTENCIAS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+BUCKETS_FILAS = (1, 10, 100, 1000, 10000, 100000)
+MAX_CONSULTAS_DISTINTAS = 500
+SIN_ENDPOINT = '(sin endpoint)'
+OTRAS_CONSULTAS = '(otras consultas)'
+SQL_LENTA_MS = 200
+SQL_LENTAS_LOG = 'sql_lentas.log'
+MAX_LENTAS_POR_PETICION = 20
+SENTENCIAS_CON_PLAN = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+# nombre -> (ayuda, límites de los buckets)
+HISTOGRAMAS = {
+    'sql_segundos': ("Segundos de SQL por petición.", BUCKETS_SEGUNDOS),
+    'sql_sentencias': ("Sentencias SQL por petición.", BUCKETS_SENTENCIAS),
+    'sql_sentencia_max_segundos': ("Segundos de la sentencia más lenta de cada petición.", BUCKETS_SEGUNDOS),
+    'sql_filas': ("Filas devueltas por petición.", BUCKETS_FILAS),
+}
+PREFIJO_PROMETHEUS = 'seguimiento_'
+
+_medicion_actual = ContextVar('medicion_sql', default=None)
+registro_lentas = logging.getLogger('sql_lentas')
+registro_lentas.propagate = False
+
+
+@lru_cache(maxsize=2048)
+def normalizar_sql(sql):
+    """`sql` en una línea, con las listas de marcadores (?, ?, ...) resumidas en una."""
+    sql = re.sub(r'\s+', ' ', sql).strip()
+    return re.sub(r'\?(?:\s*,\s*\?)+', '?, …', sql)
+
+
+def _tipo(valor):
+    return 'null' if valor is None else type(valor).__name__
+
+
+def forma_parametros(parametros):
+    """Tipos de los parámetros enlazados, sin sus valores. None si no se conocen (executemany)."""
+    if parametros is None:
+        return None
+    if isinstance(parametros, dict):
+        return {nombre: _tipo(valor) for nombre, valor in parametros.items()}
+    tipos = [_tipo(valor) for valor in parametros]
+    # Las listas largas (IN (?, ?, ...)) se resumen: sólo importa cuántos y de qué tipo.
+    if len(tipos) > 5 and len(set(tipos)) == 1:
+        return f"{len(tipos)} × {tipos[0]}"
+    return tipos
+
+
+def plan_de_consulta(conn, sql, parametros):
+    """Líneas de EXPLAIN QUERY PLAN de `sql`, sangradas según su nivel; None si no se puede obtener."""
+    if not sql.lstrip().upper().startswith(SENTENCIAS_CON_PLAN):
+        return None
+    try:
+        filas = conn.execute("EXPLAIN QUERY PLAN " + sql, () if parametros is None else parametros).fetchall()
+    except (sqlite3.Error, ValueError):
+        return None
+    niveles, lineas = {0: -1}, []
+    for id_nodo, padre, _, detalle in filas:
+        niveles[id_nodo] = niveles.get(padre, -1) + 1
+        lineas.append('  ' * niveles[id_nodo] + detalle)
+    return lineas
+
+
+class MedicionPeticion:
+    """Sentencias, tiempo y filas de SQL de una petición, en total y por sentencia."""
+
+    __slots__ = ('sentencias', 'segundos', 'maximo', 'filas', 'consultas', 'umbral_lenta', 'lentas')
+
+    def __init__(self, umbral_lenta=float('inf')):
+        self.sentencias, self.segundos, self.maximo, self.filas = 0, 0.0, 0.0, 0
+        self.consultas = {}  # sql -> [ejecuciones, segundos, máximo, filas]
+        self.umbral_lenta = umbral_lenta  # segundos
+        self.lentas = []  # [sql, parámetros, conexión, segundos] de las ejecuciones sobre el umbral
+
+    def lenta(self, sql, parametros, conn, segundos):
+        """Anota una ejecución que pasó el umbral; devuelve su registro para seguir sumándole tiempo."""
+        if len(self.lentas) >= MAX_LENTAS_POR_PETICION:
+            return None
+        registro = [sql, parametros, conn, segundos]
+        self.lentas.append(registro)
+        return registro
+
+    def sumar(self, sql, segundos, acumulado, filas, nueva):
+        """Suma `segundos` y `filas` de `sql`; `acumulado` es lo que lleva esa ejecución."""
+        self.segundos += segundos
+        self.filas += filas
+        if acumulado > self.maximo:
+            self.maximo = acumulado
+        consulta = self.consultas.get(sql)
+        if consulta is None:
+            consulta = self.consultas[sql] = [0, 0.0, 0.0, 0]
+        if nueva:
+            self.sentencias += 1
+            consulta[0] += 1
+        consulta[1] += segundos
+        if acumulado > consulta[2]:
+            consulta[2] = acumulado
+        consulta[3] += filas
+
+
+class CursorMedido(sqlite3.Cursor):
+    """Cursor que suma cada sentencia y sus filas a la medición de la petición en curso."""
+
+    _sql = None
+    _parametros = None
+    _acumulado = 0.0
+    _lenta = None
+
+    def _ejecutar(self, ejecutar, sql, parametros, *args):
+        medicion = _medicion_actual.get()
+        if medicion is None:
+            return ejecutar(sql, *args)
+        inicio = time.perf_counter()
+        try:
+            return ejecutar(sql, *args)
+        finally:
+            self._sql, self._parametros, self._lenta = sql, parametros, None
+            self._acumulado = time.perf_counter() - inicio
+            medicion.sumar(sql, self._acumulado, self._acumulado, 0, True)
+            if self._acumulado >= medicion.umbral_lenta:
+                self._lenta = medicion.lenta(sql, parametros, self.connection, self._acumulado)
+
+    def execute(self, sql, parametros=()):
+        return self._ejecutar(super().execute, sql, parametros, parametros)
+
+    def executemany(self, sql, parametros):
+        return self._ejecutar(super().executemany, sql, None, parametros)
+
+    def executescript(self, script):
+        return self._ejecutar(super().executescript, script, None)
+
+    def _leidas(self, inicio, filas):
+        medicion = _medicion_actual.get()
+        if medicion is not None and self._sql is not None:
+            segundos = time.perf_counter() - inicio
+            self._acumulado += segundos
+            medicion.sumar(self._sql, segundos, self._acumulado, filas, False)
+            if self._lenta is not None:
+                self._lenta[3] = self._acumulado
+            elif self._acumulado >= medicion.umbral_lenta:
+                self._lenta = medicion.lenta(self._sql, self._parametros, self.connection, self._acumulado)
+
+    def fetchone(self):
+        inicio = time.perf_counter()
+        fila = super().fetchone()
+        self._leidas(inicio, fila is not None)
+        return fila
+
+    def fetchmany(self, size=None):
+        inicio = time.perf_counter()
+        filas = super().fetchmany(self.arraysize if size is None else size)
+        self._leidas(inicio, len(filas))
+        return filas
+
+    def fetchall(self):
+        inicio = time.perf_counter()
+        filas = super().fetchall()
+        self._leidas(inicio, len(filas))
+        return filas
+
+    def __next__(self):
+        inicio = time.perf_counter()
+        fila = super().__next__()
+        self._leidas(inicio, 1)
+        return fila
+
+
+class ConexionMedida(sqlite3.Connection):
+    """Conexión cuyos cursores (también los de execute) son CursorMedido."""
+
+    def cursor(self, factory=CursorMedido):
+        return super().cursor(factory)
+
+    # sqlite3.Connection.execute no pasa por cursor(): se redefinen.
+    def execute(self, sql, parametros=()):
+        return self.cursor().execute(sql, parametros)
+
+    def executemany(self, sql, parametros):
+        return self.cursor().executemany(sql, parametros)
+
+    def executescript(self, script):
+        return self.cursor().executescript(script)
+
+
+class Histograma:
+    """Cuentas acumulables por bucket (valor <= límite), como un histograma de Prometheus."""
+
+    __slots__ = ('limites', 'cuentas', 'suma', 'total', 'maximo')
+
+    def __init__(self, limites):
+        self.limites = limites
+        self.cuentas = [0] * (len(limites) + 1)
+        self.suma, self.total, self.maximo = 0, 0, 0
+
+    def observar(self, valor):
+        self.cuentas[bisect.bisect_left(self.limites, valor)] += 1
+        self.suma += valor
+        self.total += 1
+        if valor > self.maximo:
+            self.maximo = valor
+
+    def percentil(self, p):
+        """Límite superior del bucket donde cae el percentil `p` (0-100); el máximo si es el último."""
+        objetivo, acumuladas = self.total * p / 100, 0
+        for limite, cuenta in zip(self.limites, self.cuentas):
+            acumuladas += cuenta
+            if acumuladas >= objetivo:
+                return limite
+        return self.maximo
+
+
+class RegistroMetricas:
+    """Histogramas por endpoint y tabla de sentencias por endpoint, compartidos por los hilos del proceso."""
+
+    def __init__(self, max_consultas=MAX_CONSULTAS_DISTINTAS):
+        self.max_consultas = max_consultas
+        self._lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        with self._lock:
+            self.endpoints = {}   # endpoint -> {nombre: Histograma}
+            self.consultas = {}   # (endpoint, sql normalizado) -> [ejecuciones, segundos, máximo, filas]
+            self.desde = time.time()
+
+    def agregar(self, endpoint, medicion):
+        valores = {'sql_segundos': medicion.segundos, 'sql_sentencias': medicion.sentencias,
+                   'sql_sentencia_max_segundos': medicion.maximo, 'sql_filas': medicion.filas}
+        with self._lock:
+            histogramas = self.endpoints.get(endpoint)
+            if histogramas is None:
+                histogramas = self.endpoints[endpoint] = {nombre: Histograma(limites) for nombre, (_, limites) in HISTOGRAMAS.items()}
+            for nombre, valor in valores.items():
+                histogramas[nombre].observar(valor)
+            for sql, (ejecuciones, segundos, maximo, filas) in medicion.consultas.items():
+                clave = (endpoint, normalizar_sql(sql))
+                consulta = self.consultas.get(clave)
+                if consulta is None:
+                    # Acotado: con demasiadas sentencias distintas, el resto se junta en una fila.
+                    if len(self.consultas) >= self.max_consultas:
+                        clave = (endpoint, OTRAS_CONSULTAS)
+                    consulta = self.consultas.setdefault(clave, [0, 0.0, 0.0, 0])
+                consulta[0] += ejecuciones
+                consulta[1] += segundos
+                consulta[2] = max(consulta[2], maximo)
+                consulta[3] += filas
+
+    def resumen(self, consultas_mostradas=25):
+        """(filas por endpoint, sentencias con más tiempo total) para /admin/metrics."""
+        with self._lock:
+            endpoints = []
+            for endpoint, h in sorted(self.endpoints.items(), key=lambda e: -e[1]['sql_segundos'].suma):
+                peticiones = h['sql_segundos'].total
+                endpoints.append({
+                    'endpoint': endpoint, 'peticiones': peticiones,
+                    'sql_ms_promedio': h['sql_segundos'].suma / peticiones * 1000,
+                    'sql_ms_p95': h['sql_segundos'].percentil(95) * 1000,
+                    'sql_ms_maximo': h['sql_segundos'].maximo * 1000,
+                    'sentencias_promedio': h['sql_sentencias'].suma / peticiones,
+                    'sentencias_maximo': h['sql_sentencias'].maximo,
+                    'sentencia_ms_maximo': h['sql_sentencia_max_segundos'].maximo * 1000,
+                    'filas_promedio': h['sql_filas'].suma / peticiones,
+                })
+            consultas = [{'endpoint': endpoint, 'sql': sql, 'ejecuciones': ejecuciones, 'ms_total': segundos * 1000,
+                          'ms_promedio': segundos / ejecuciones * 1000 if ejecuciones else 0.0,
+                          'ms_maximo': maximo * 1000, 'filas': filas}
+                         for (endpoint, sql), (ejecuciones, segundos, maximo, filas) in self.consultas.items()]
+        consultas.sort(key=lambda c: -c['ms_total'])
+        return endpoints, consultas[:consultas_mostradas]
+
+    def prometheus(self):
+        """Los histogramas en el formato de texto de Prometheus (versión 0.0.4)."""
+        lineas = []
+        with self._lock:
+            for nombre, (ayuda, limites) in HISTOGRAMAS.items():
+                metrica = PREFIJO_PROMETHEUS + nombre
+                lineas += [f"# HELP {metrica} {ayuda}", f"# TYPE {metrica} histogram"]
+                for endpoint, histogramas in sorted(self.endpoints.items()):
+                    h = histogramas[nombre]
+                    etiqueta = 'endpoint="' + endpoint.replace('\\', '\\\\').replace('"', '\\"') + '"'
+                    acumuladas = 0
+                    for limite, cuenta in zip(limites + (float('inf'),), h.cuentas):
+                        acumuladas += cuenta
+                        le = '+Inf' if limite == float('inf') else repr(limite)
+                        lineas.append(f'{metrica}_bucket{{{etiqueta},le="{le}"}} {acumuladas}')
+                    lineas.append(f"{metrica}_sum{{{etiqueta}}} {h.suma!r}")
+                    lineas.append(f"{metrica}_count{{{etiqueta}}} {h.total}")
+        return '\n'.join(lineas) + '\n'
+
+
+registro = RegistroMetricas()
+
+
+def registrar_lentas(endpoint, lentas):
+    """Escribe en el log de sentencias lentas las ejecuciones de una petición que pasaron el umbral."""
+    fecha = datetime.now(timezone.utc).isoformat(timespec='seconds')
+    for sql, parametros, conn, segundos in lentas:
+        registro_lentas.warning(json.dumps({
+            'fecha': fecha, 'endpoint': endpoint, 'ms': round(segundos * 1000, 2),
+            'sql': normalizar_sql(sql), 'parametros': forma_parametros(parametros),
+            'plan': plan_de_consulta(conn, sql, parametros),
+        }, ensure_ascii=False))
+
+
+def _configurar_log_lentas(ruta):
+    ruta = os.path.abspath(ruta)
+    if any(getattr(h, 'baseFilename', None) == ruta for h in registro_lentas.handlers):
+        return
+    handler = RotatingFileHandler(ruta, maxBytes=1_000_000, backupCount=5, encoding='utf-8', delay=True)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    registro_lentas.addHandler(handler)
+    registro_lentas.setLevel(logging.WARNING)
+
+
+def init_app(app):
+    """Registra la medición de cada petición y el log de sentencias lentas si SQL_METRICAS está activo."""
+    if not app.config.get('SQL_METRICAS', True):
+        return
+    umbral_ms = app.config.get('SQL_LENTA_MS', SQL_LENTA_MS)
+    umbral = umbral_ms / 1000 if umbral_ms and umbral_ms > 0 else float('inf')
+    if umbral != float('inf'):
+        _configurar_log_lentas(app.config.get('SQL_LENTAS_LOG', SQL_LENTAS_LOG))
+
+    @app.before_request
+    def iniciar_medicion_sql():
+        g._token_medicion_sql = _medicion_actual.set(MedicionPeticion(umbral))
+
+    @app.teardown_request
+    def terminar_medicion_sql(exception=None):
+        token = g.pop('_token_medicion_sql', None)
+        if token is None:
+            return
+        medicion = _medicion_actual.get()
+        try:
+            _medicion_actual.reset(token)
+        except ValueError:
+            # Respuestas en streaming: el token se creó en otro contexto.
+            _medicion_actual.set(None)
+        if medicion is not None:
+            endpoint = request.endpoint or SIN_ENDPOINT
+            registro.agregar(endpoint, medicion)
+            if medicion.lentas:
+                # Fuera de la medición: los EXPLAIN no cuentan como sentencias de la petición.
+                registrar_lentas(endpoint, medicion.lentas)
+
+
+def _advertencia_plan(linea):
+    linea = linea.strip()
+    if linea.startswith('SCAN ') and ' USING ' not in linea:
+        return '  <-- recorre la tabla completa'
+    if 'CORRELATED' in linea:
+        return '  <-- se ejecuta una vez por fila'
+    return ''
+
+
+def resumir_lentas(archivo=SQL_LENTAS_LOG):
+    """Agrupa por sentencia normalizada las entradas de `archivo` y de sus rotaciones (.1, .2...)."""
+    grupos = defaultdict(lambda: {'veces': 0, 'ms_total': 0.0, 'ms_maximo': 0.0, 'endpoints': set(), 'plan': None, 'ultima': ''})
+    for ruta in sorted(glob.glob(glob.escape(archivo) + '.*')) + [archivo]:
+        if not os.path.exists(ruta) or not re.fullmatch(r'(\.\d+)?', ruta[len(archivo):]):
+            continue
+        with open(ruta, encoding='utf-8') as f:
+            for linea in f:
+                try:
+                    entrada = json.loads(linea)
+                except ValueError:
+                    continue
+                grupo = grupos[entrada['sql']]
+                grupo['veces'] += 1
+                grupo['ms_total'] += entrada['ms']
+                grupo['ms_maximo'] = max(grupo['ms_maximo'], entrada['ms'])
+                grupo['endpoints'].add(entrada['endpoint'])
+                if entrada['fecha'] >= grupo['ultima']:
+                    grupo['ultima'], grupo['plan'] = entrada['fecha'], entrada.get('plan')
+    return sorted(({'sql': sql, **grupo} for sql, grupo in grupos.items()), key=lambda g: -g['ms_total'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Métricas de SQL de la aplicación.")
+    subparsers = parser.add_subparsers(dest='accion', required=True)
+    p = subparsers.add_parser('lentas', help="Resume el log de sentencias lentas: las de más tiempo total primero.")
+    p.add_argument('--archivo', default=os.environ.get('SQL_LENTAS_LOG', SQL_LENTAS_LOG))
+    p.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    grupos = resumir_lentas(args.archivo)
+    if not grupos:
+        print(f"No hay sentencias lentas registradas en '{args.archivo}'.")
+        return
+    print(f"{len(grupos)} sentencias distintas, {sum(g['veces'] for g in grupos)} ejecuciones lentas.")
+    for n, grupo in enumerate(grupos[:args.top], 1):
+        print(f"\n{n}. {grupo['veces']} veces, {grupo['ms_total']:.1f} ms en total, máximo {grupo['ms_maximo']:.1f} ms, "
+              f"última {grupo['ultima']} ({', '.join(sorted(grupo['endpoints']))})")
+        print(f"   {grupo['sql'][:500]}")
+        for linea in grupo['plan'] or ['(sin plan)']:
+            print(f"     {linea}{_advertencia_plan(linea)}")
+
+
+if __name__ == '__main__':
+    main()
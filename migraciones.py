@@ -0,0 +1,467 @@
+# migraciones.py
+"""
+Motor de migraciones versionadas del esquema.
+
+Cada migración tiene un número de versión correlativo y se registra en la tabla
+`schema_version` al terminar. Las migraciones normales corren dentro de una sola
+transacción (BEGIN IMMEDIATE), de modo que dos procesos que arranquen a la vez no
+puedan aplicarla dos veces. Las de relleno de datos ("backfill") sobre tablas grandes
+se declaran con `transaccional=False` y avanzan en lotes pequeños por rango de rowid,
+confirmando cada lote por separado, para no bloquear la escritura de la aplicación
+por minutos. Por eso deben ser idempotentes: si se interrumpen, se vuelven a ejecutar
+completas y sólo tocan las filas que aún faltan.
+
+Uso:
+    python migraciones.py              # aplica las migraciones pendientes
+    python migraciones.py estado       # muestra la versión actual y las pendientes
+"""
+import argparse
+import re
+import time
+from collections import namedtuple
+
+from database import (get_db_connection, crear_esquema, crear_tabla_estado_actual,
+                      actualizar_versiones_seguimiento, crear_resumenes_dashboard, reconstruir_resumenes,
+                      crear_busqueda_estudiantes, crear_busqueda_seguimientos, crear_versiones_tablas,
+                      crear_historial_detalle, NOMBRES_CAMPOS_ESTUDIANTE, COLUMNAS_BUSQUEDA_ESTUDIANTES)
+
+TAMANO_LOTE_POR_DEFECTO = 500
+PAUSA_ENTRE_LOTES = 0.02  # segundos; deja pasar a los escritores de la aplicación
+
+Migracion = namedtuple('Migracion', ['version', 'descripcion', 'funcion', 'transaccional'])
+MIGRACIONES = []
+
+
+def migracion(version, descripcion, transaccional=True):
+    """Registra una función `f(conn, opciones)` como la migración número `version`."""
+    def decorador(funcion):
+        MIGRACIONES.append(Migracion(version, descripcion, funcion, transaccional))
+        return funcion
+    return decorador
+
+
+# --- Utilidades para escribir migraciones ---
+
+def columnas_de(conn, tabla):
+    return {fila[1] for fila in conn.execute(f"PRAGMA table_info({tabla})")}
+
+
+def agregar_columna_si_falta(conn, tabla, columna, definicion):
+    """ALTER TABLE ... ADD COLUMN sólo si la columna no existe (bases migradas a mano)."""
+    if columna not in columnas_de(conn, tabla):
+        conn.execute(f"ALTER TABLE {tabla} ADD COLUMN {columna} {definicion}")
+
+
+def rellenar_en_lotes(conn, tabla, sql, opciones, parametros=()):
+    """
+    Ejecuta `sql` por rangos de rowid de `tabla`, una transacción corta por lote.
+
+    `sql` debe terminar con un filtro `rowid BETWEEN ? AND ?` (sobre `tabla`); los
+    límites del rango se agregan al final de `parametros`. Devuelve las filas afectadas.
+    """
+    tamano_lote = opciones.get('tamano_lote', TAMANO_LOTE_POR_DEFECTO)
+    pausa = opciones.get('pausa', PAUSA_ENTRE_LOTES)
+    registrar = opciones.get('registrar', print)
+
+    minimo, maximo = conn.execute(f"SELECT MIN(rowid), MAX(rowid) FROM {tabla}").fetchone()
+    if minimo is None:
+        return 0
+    afectadas = 0
+    for inicio in range(minimo, maximo + 1, tamano_lote):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = conn.execute(sql, tuple(parametros) + (inicio, inicio + tamano_lote - 1))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        afectadas += max(cursor.rowcount, 0)
+        if pausa:
+            time.sleep(pausa)
+    registrar(f"  {tabla}: {afectadas} filas afectadas en lotes de {tamano_lote}.")
+    return afectadas
+
+
+def rellenar_busqueda(conn, indice, tabla, crear, sql_copiar, opciones):
+    """
+    Crea el índice de texto completo `indice` con `crear(conn, en_relleno)` y lo llena
+    desde `tabla` en lotes, una transacción corta por lote. Devuelve las filas copiadas.
+
+    `sql_copiar` copia al índice las filas de `tabla` con `rowid > ? AND rowid <= ?`.
+    Mientras dura el relleno, los triggers sólo mantienen las filas ya copiadas (ver
+    database._cuando_relleno); el avance se guarda en RellenoBusqueda en la misma
+    transacción de cada lote, así que una ejecución interrumpida, o la de otro proceso,
+    sigue donde quedó sin copiar dos veces una fila. El último lote, el que no alcanza
+    `tamano_lote` filas, cambia además los triggers por los definitivos.
+    """
+    tamano_lote = opciones.get('tamano_lote', TAMANO_LOTE_POR_DEFECTO)
+    pausa = opciones.get('pausa', PAUSA_ENTRE_LOTES)
+    registrar = opciones.get('registrar', print)
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("CREATE TABLE IF NOT EXISTS RellenoBusqueda (indice TEXT PRIMARY KEY, hasta INTEGER NOT NULL)")
+        en_curso = conn.execute("SELECT 1 FROM RellenoBusqueda WHERE indice = ?", (indice,)).fetchone()
+        existe = conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (indice,)).fetchone()
+        if not en_curso and not existe:
+            conn.execute("INSERT INTO RellenoBusqueda (indice, hasta) VALUES (?, 0)", (indice,))
+            crear(conn, en_relleno=True)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    if existe and not en_curso:
+        return 0  # ya estaba lleno
+
+    copiadas = 0
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            fila = conn.execute("SELECT hasta FROM RellenoBusqueda WHERE indice = ?", (indice,)).fetchone()
+            if fila is None:  # otro proceso lo terminó
+                conn.commit()
+                break
+            desde = fila[0]
+            hasta = conn.execute(f"SELECT rowid FROM {tabla} WHERE rowid > ? ORDER BY rowid LIMIT 1 OFFSET ?",
+                                 (desde, tamano_lote - 1)).fetchone()
+            if hasta:
+                copiadas += max(conn.execute(sql_copiar, (desde, hasta[0])).rowcount, 0)
+                conn.execute("UPDATE RellenoBusqueda SET hasta = ? WHERE indice = ?", (hasta[0], indice))
+                conn.commit()
+            else:
+                # Último lote, incompleto: se copia y se cambian los triggers en la misma
+                # transacción, así las filas que se inserten mientras tanto no lo alargan.
+                ultima = conn.execute(f"SELECT MAX(rowid) FROM {tabla}").fetchone()[0] or desde
+                if ultima > desde:
+                    copiadas += max(conn.execute(sql_copiar, (desde, ultima)).rowcount, 0)
+                for evento in ('insert', 'delete', 'update'):
+                    conn.execute(f"DROP TRIGGER IF EXISTS trg_{indice.lower()}_{evento}")
+                crear(conn)
+                conn.execute("DELETE FROM RellenoBusqueda WHERE indice = ?", (indice,))
+                conn.commit()
+                break
+        except Exception:
+            conn.rollback()
+            raise
+        if pausa:
+            time.sleep(pausa)
+    registrar(f"  {indice}: {copiadas} filas copiadas en lotes de {tamano_lote}.")
+    return copiadas
+
+
+# --- Migraciones ---
+# Nunca se modifica una migración ya publicada: los cambios van en una nueva versión.
+
+@migracion(1, "Esquema inicial (tablas base)")
+def _m001_esquema_inicial(conn, opciones):
+    crear_esquema(conn)
+
+
+@migracion(2, "Columnas agregadas con los scripts migracion_0X")
+def _m002_columnas_faltantes(conn, opciones):
+    agregar_columna_si_falta(conn, 'Estudiantes', 'sexo', 'TEXT')
+    agregar_columna_si_falta(conn, 'Estudiantes', 'facultad', 'TEXT')
+    agregar_columna_si_falta(conn, 'Estudiantes', 'nota_importante', 'TEXT')
+    agregar_columna_si_falta(conn, 'PeriodosAtencion', 'carrera_periodo', 'TEXT')
+    agregar_columna_si_falta(conn, 'PeriodosAtencion', 'facultad_periodo', 'TEXT')
+    agregar_columna_si_falta(conn, 'PeriodosAtencion', 'estado_academico_periodo', 'TEXT')
+
+
+@migracion(3, "Fotografía académica en períodos que no la tienen", transaccional=False)
+def _m003_fotografia_academica(conn, opciones):
+    # El primer período de cada estudiante se creaba sin carrera/facultad/estado académico,
+    # por lo que la ficha los mostraba vacíos. Se completan con los datos del estudiante.
+    rellenar_en_lotes(conn, 'PeriodosAtencion', """
+        UPDATE PeriodosAtencion SET
+            carrera_periodo = COALESCE(carrera_periodo, (SELECT carrera_programa FROM Estudiantes WHERE rut = rut_estudiante)),
+            facultad_periodo = COALESCE(facultad_periodo, (SELECT facultad FROM Estudiantes WHERE rut = rut_estudiante)),
+            estado_academico_periodo = COALESCE(estado_academico_periodo, (SELECT estado_academico FROM Estudiantes WHERE rut = rut_estudiante))
+        WHERE (carrera_periodo IS NULL OR facultad_periodo IS NULL OR estado_academico_periodo IS NULL)
+        AND rowid BETWEEN ? AND ?
+    """, opciones)
+
+
+@migracion(4, "Índices para las consultas frecuentes")
+def _m004_indices_consultas_frecuentes(conn, opciones):
+    # SQLite no construye índices en línea: CREATE INDEX bloquea la escritura mientras
+    # recorre la tabla (segundos, incluso con años de Seguimientos). Por eso cada índice
+    # se declara una sola vez aquí y 'python verificar_planes.py' comprueba que se usen.
+
+    # Último período por estudiante (MAX(id) correlacionado) y ficha del estudiante.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_periodos_rut_fecha ON PeriodosAtencion (rut_estudiante, fecha_ingreso)")
+    # Rango de fechas de /api/reporte_periodos; cubre la agrupación por motivo de ingreso.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_periodos_fecha_ingreso ON PeriodosAtencion (fecha_ingreso, rut_estudiante, motivo_ingreso)")
+    # Seguimientos de un estudiante ordenados por fecha (ficha, alertas, último seguimiento).
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_seguimientos_rut_fecha ON Seguimientos (rut_estudiante, fecha_sesion)")
+    # Cadenas de corrección; parcial porque la gran mayoría de filas no corrige nada.
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_seguimientos_corrige ON Seguimientos (corrige_id_seguimiento, es_correccion)
+        WHERE corrige_id_seguimiento IS NOT NULL
+    """)
+    # Historial de un registro; también sirve al borrado por id_registro_afectado.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_historial_registro ON HistorialCambios (id_registro_afectado, modelo_afectado, fecha_cambio)")
+    # Visibilidad por profesional asignado (OR entre ambas columnas = MULTI-INDEX OR).
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_estudiantes_trabajadora_social ON Estudiantes (trabajadora_social_asignada)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_estudiantes_psicologo ON Estudiantes (psicologo_asignado)")
+
+
+@migracion(5, "Tabla EstadoActualEstudiante (período vigente de cada estudiante)")
+def _m005_estado_actual_estudiante(conn, opciones):
+    crear_tabla_estado_actual(conn)
+
+
+@migracion(6, "Relleno de EstadoActualEstudiante desde PeriodosAtencion", transaccional=False)
+def _m006_rellenar_estado_actual(conn, opciones):
+    rellenar_en_lotes(conn, 'PeriodosAtencion', """
+        INSERT OR REPLACE INTO EstadoActualEstudiante (rut_estudiante, id_periodo_actual, estado_periodo_actual, fecha_ingreso_periodo)
+        SELECT pa.rut_estudiante, pa.id, pa.estado_periodo, pa.fecha_ingreso
+        FROM PeriodosAtencion pa
+        WHERE pa.id = (SELECT MAX(id) FROM PeriodosAtencion WHERE rut_estudiante = pa.rut_estudiante)
+        AND pa.rowid BETWEEN ? AND ?
+    """, opciones)
+
+
+@migracion(7, "Versión vigente de cada seguimiento (cadenas de corrección)")
+def _m007_versiones_seguimiento(conn, opciones):
+    # Reemplaza los EXISTS anidados sobre corrige_id_seguimiento que calculaban
+    # "fue_corregido" en cada lectura: la cadena se resuelve al registrar la corrección.
+    agregar_columna_si_falta(conn, 'Seguimientos', 'reemplazado_por_id', 'INTEGER')
+    agregar_columna_si_falta(conn, 'Seguimientos', 'es_vigente', 'INTEGER NOT NULL DEFAULT 1')
+    # Relleno único con CTE recursiva; son pocas cadenas, cabe en una transacción.
+    actualizar_versiones_seguimiento(conn)
+    # Gráfico mensual del dashboard (sólo seguimientos vigentes).
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_seguimientos_vigentes_fecha ON Seguimientos (fecha_sesion) WHERE es_vigente = 1")
+    # Versión anterior de un seguimiento (al eliminarlo).
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_seguimientos_reemplazado ON Seguimientos (reemplazado_por_id)
+        WHERE reemplazado_por_id IS NOT NULL
+    """)
+
+
+@migracion(8, "Fecha del último seguimiento en EstadoActualEstudiante")
+def _m008_columna_ultima_sesion(conn, opciones):
+    # Las alertas de inactividad de '/' pasan de MAX(fecha_sesion) por estudiante
+    # (con HAVING) a un rango sobre este índice.
+    agregar_columna_si_falta(conn, 'EstadoActualEstudiante', 'fecha_ultima_sesion', 'TEXT')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_estado_actual_ultima_sesion ON EstadoActualEstudiante (fecha_ultima_sesion)")
+
+
+@migracion(9, "Relleno de la fecha del último seguimiento", transaccional=False)
+def _m009_rellenar_ultima_sesion(conn, opciones):
+    rellenar_en_lotes(conn, 'EstadoActualEstudiante', """
+        UPDATE EstadoActualEstudiante
+        SET fecha_ultima_sesion = (SELECT MAX(fecha_sesion) FROM Seguimientos s WHERE s.rut_estudiante = EstadoActualEstudiante.rut_estudiante)
+        WHERE rowid BETWEEN ? AND ?
+    """, opciones)
+
+
+@migracion(10, "Tablas de resumen del dashboard mantenidas por triggers")
+def _m010_resumenes_dashboard(conn, opciones):
+    # El dashboard hacía cuatro agregaciones sobre Estudiantes y Seguimientos en cada
+    # visita; ahora lee unas decenas de filas. El llenado inicial es una sola agregación
+    # por resumen, dentro de la misma transacción que crea los triggers.
+    crear_resumenes_dashboard(conn)
+    reconstruir_resumenes(conn)
+
+
+@migracion(11, "Índice para la paginación de la lista de estudiantes")
+def _m011_indice_lista_estudiantes(conn, opciones):
+    # Orden y cursor de la paginación por clave de '/' (ver COLUMNAS_ORDEN_ESTUDIANTES).
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_estudiantes_orden_lista ON Estudiantes (apellido_paterno, apellido_materno, nombre, rut)")
+
+
+@migracion(12, "Índice de texto completo EstudiantesFTS para la búsqueda de estudiantes", transaccional=False)
+def _m012_busqueda_estudiantes(conn, opciones):
+    # Reemplaza los LIKE '%...%' sobre cuatro columnas de la lista de '/', que
+    # recorrían la tabla completa y no ignoraban tildes. Se llena en lotes: el índice
+    # resultante es el mismo que con un solo INSERT ... SELECT, sin bloquear la escritura.
+    columnas = ', '.join(COLUMNAS_BUSQUEDA_ESTUDIANTES)
+    rellenar_busqueda(conn, 'EstudiantesFTS', 'Estudiantes', crear_busqueda_estudiantes, f"""
+        INSERT INTO EstudiantesFTS ({columnas}) SELECT {columnas} FROM Estudiantes WHERE rowid > ? AND rowid <= ?
+    """, opciones)
+
+
+@migracion(13, "Índice de texto completo SeguimientosFTS sobre la bitácora de sesiones", transaccional=False)
+def _m013_busqueda_seguimientos(conn, opciones):
+    # En lotes, como la 12: un 'rebuild' de años de bitácoras bloqueaba la escritura.
+    rellenar_busqueda(conn, 'SeguimientosFTS', 'Seguimientos', crear_busqueda_seguimientos, """
+        INSERT INTO SeguimientosFTS (rowid, bitacora_sesion)
+        SELECT id_seguimiento, bitacora_sesion FROM Seguimientos WHERE rowid > ? AND rowid <= ?
+    """, opciones)
+
+
+@migracion(14, "Contadores de cambios por tabla (VersionTablas) para invalidar cachés")
+def _m014_versiones_tablas(conn, opciones):
+    # Tablas explícitas: TABLAS_VERSIONADAS creció después (migraciones 15 y 19).
+    crear_versiones_tablas(conn, ('Estudiantes', 'PeriodosAtencion'))
+
+
+@migracion(15, "Contador de cambios de Profesionales en VersionTablas")
+def _m015_version_profesionales(conn, opciones):
+    crear_versiones_tablas(conn, ('Profesionales',))
+
+
+@migracion(16, "Tabla HistorialCambiosDetalle (campos modificados de cada cambio)")
+def _m016_historial_detalle(conn, opciones):
+    # HistorialCambios.detalles era un solo texto "Cambió X de 'a' a 'b'. | ...": para
+    # saber qué cambió en un campo había que leer y separar todos los textos.
+    crear_historial_detalle(conn)
+
+
+# Formato de HistorialCambios.detalles anterior a la migración 16.
+PATRON_CAMBIO_TEXTO = re.compile(r"Cambió (.+?) de '(.*)' a '(.*)'\.", re.DOTALL)
+
+def detalles_desde_texto(detalles, campos_por_nombre):
+    """
+    [(campo, anterior, nuevo), ...] a partir del texto de `detalles`, o None si alguna
+    parte no tiene el formato esperado o nombra un campo desconocido ('N/A' era vacío).
+    """
+    cambios = []
+    for parte in re.split(r" \| (?=Cambió )", detalles):
+        coincidencia = PATRON_CAMBIO_TEXTO.fullmatch(parte.strip())
+        if not coincidencia or coincidencia.group(1) not in campos_por_nombre:
+            return None
+        anterior, nuevo = (None if v == 'N/A' else v for v in coincidencia.group(2, 3))
+        cambios.append((campos_por_nombre[coincidencia.group(1)], anterior, nuevo))
+    return cambios
+
+
+@migracion(17, "Relleno de HistorialCambiosDetalle desde el texto de los cambios", transaccional=False)
+def _m017_rellenar_historial_detalle(conn, opciones):
+    # No se puede separar el texto en SQL, así que se recorre por lotes de id_cambio en
+    # Python. Los cambios cuyo texto no se puede separar quedan sólo con `detalles`
+    # (la ficha lo muestra tal cual); INSERT OR IGNORE permite reanudar.
+    tamano_lote = opciones.get('tamano_lote', TAMANO_LOTE_POR_DEFECTO)
+    pausa = opciones.get('pausa', PAUSA_ENTRE_LOTES)
+    campos_por_nombre = {nombre: campo for campo, nombre in NOMBRES_CAMPOS_ESTUDIANTE.items()}
+    ultimo, separados, sin_separar = 0, 0, 0
+    while True:
+        filas = conn.execute("""
+            SELECT id_cambio, fecha_cambio, detalles FROM HistorialCambios
+            WHERE id_cambio > ? AND modelo_afectado = 'Estudiante' AND detalles IS NOT NULL
+            ORDER BY id_cambio LIMIT ?
+        """, (ultimo, tamano_lote)).fetchall()
+        if not filas:
+            break
+        ultimo = filas[-1][0]
+        registros = []
+        for id_cambio, fecha_cambio, detalles in filas:
+            cambios = detalles_desde_texto(detalles, campos_por_nombre)
+            if cambios is None:
+                sin_separar += 1
+                continue
+            separados += 1
+            registros.extend((id_cambio, campo, anterior, nuevo, fecha_cambio) for campo, anterior, nuevo in cambios)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("""
+                INSERT OR IGNORE INTO HistorialCambiosDetalle (id_cambio, campo, valor_anterior, valor_nuevo, fecha_cambio)
+                VALUES (?, ?, ?, ?, ?)
+            """, registros)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        if pausa:
+            time.sleep(pausa)
+    opciones.get('registrar', print)(f"  HistorialCambios: {separados} cambios separados por campo, {sin_separar} sin el formato esperado.")
+
+
+@migracion(18, "Índice del historial de cambios por usuario")
+def _m018_indice_historial_usuario(conn, opciones):
+    # Auditoría de seguimientos por usuario (/admin/auditoria); por seguimiento sirve
+    # idx_historial_registro con modelo_afectado = 'Seguimiento'.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_historial_usuario ON HistorialCambios (nombre_usuario, modelo_afectado, fecha_cambio)")
+
+
+@migracion(19, "Contador de cambios de Usuarios en VersionTablas")
+def _m019_version_usuarios(conn, opciones):
+    # La caché de usuarios de la sesión (app.py) lo compara en cada petición: un cambio de
+    # rol o una desactivación rige de inmediato en todos los procesos.
+    crear_versiones_tablas(conn, ('Usuarios',))
+
+
+# --- Ejecución ---
+
+def _asegurar_tabla_version(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        descripcion TEXT NOT NULL,
+        aplicada_en TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        duracion_segundos REAL
+    )''')
+    conn.commit()
+
+
+def versiones_aplicadas(conn):
+    _asegurar_tabla_version(conn)
+    return {fila[0] for fila in conn.execute("SELECT version FROM schema_version")}
+
+
+def migraciones_pendientes(conn):
+    aplicadas = versiones_aplicadas(conn)
+    return [m for m in sorted(MIGRACIONES) if m.version not in aplicadas]
+
+
+def aplicar_migraciones(conn=None, tamano_lote=TAMANO_LOTE_POR_DEFECTO, registrar=print):
+    """Aplica en orden todas las migraciones pendientes. Devuelve las versiones aplicadas."""
+    propia = conn is None
+    if propia:
+        conn = get_db_connection()
+    opciones = {'tamano_lote': tamano_lote, 'registrar': registrar}
+    aplicadas = []
+    try:
+        for m in migraciones_pendientes(conn):
+            registrar(f"Aplicando migración {m.version:03d}: {m.descripcion}")
+            inicio = time.perf_counter()
+            if m.transaccional:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    # Otro proceso pudo aplicarla mientras esperábamos el bloqueo.
+                    if conn.execute("SELECT 1 FROM schema_version WHERE version = ?", (m.version,)).fetchone():
+                        conn.rollback()
+                        continue
+                    m.funcion(conn, opciones)
+                    conn.execute("INSERT INTO schema_version (version, descripcion, duracion_segundos) VALUES (?, ?, ?)",
+                                 (m.version, m.descripcion, time.perf_counter() - inicio))
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+            else:
+                m.funcion(conn, opciones)
+                conn.execute("INSERT OR IGNORE INTO schema_version (version, descripcion, duracion_segundos) VALUES (?, ?, ?)",
+                             (m.version, m.descripcion, time.perf_counter() - inicio))
+                conn.commit()
+            aplicadas.append(m.version)
+        return aplicadas
+    finally:
+        if propia:
+            conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migraciones del esquema de la base de datos.")
+    parser.add_argument('accion', nargs='?', default='aplicar', choices=['aplicar', 'estado'])
+    parser.add_argument('--tamano-lote', type=int, default=TAMANO_LOTE_POR_DEFECTO,
+                        help="Filas por transacción en las migraciones de relleno.")
+    args = parser.parse_args()
+
+    if args.accion == 'estado':
+        conn = get_db_connection()
+        try:
+            aplicadas = versiones_aplicadas(conn)
+            print(f"Versión actual del esquema: {max(aplicadas) if aplicadas else 0}")
+            for m in migraciones_pendientes(conn):
+                print(f"  Pendiente {m.version:03d}: {m.descripcion}")
+        finally:
+            conn.close()
+        return
+
+    aplicadas = aplicar_migraciones(tamano_lote=args.tamano_lote)
+    print(f"{len(aplicadas)} migraciones aplicadas." if aplicadas else "El esquema ya está al día.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+# opciones.py
+"""
+Opciones de los menús desplegables de los formularios.
+
+Las opciones que vienen de las listas LISTA_* de database.py se construyen una sola
+vez al importar el módulo, como tuplas inmutables (compartidas sin riesgo entre
+peticiones e hilos). Cada ruta sólo asigna las de su formulario con asignar_opciones().
+
+Las listas de profesionales salen de la tabla Profesionales y se guardan en
+`directorio_profesionales`, que las vuelve a leer sólo cuando esa tabla cambió
+(contador de VersionTablas, visible para todos los procesos).
+"""
+import threading
+from collections import namedtuple
+from types import MappingProxyType
+
+from database import (
+    versiones_tablas,
+    LISTA_GENERO, LISTA_CARRERAS, LISTA_TRABAJADORAS_SOCIALES,
+    LISTA_PSICOLOGOS, LISTA_CESFAM, LISTA_TENTATIVA_IDEACION, LISTA_ESTADO_PROGRAMA,
+    LISTA_ESTADO_DERIVACION_INICIAL, LISTA_ASISTENCIA_CONTROLES_CESFAM,
+    LISTA_ESTADO_ACADEMICO, LISTA_ESTADO_CIVIL, LISTA_OCUPACION_LABORAL, LISTA_TIENE_HIJOS, LISTA_NACIONALIDADES,
+    LISTA_TIPO_INTERVENCION, LISTA_RESULTADO_CITA, LISTA_FUENTE_DERIVACION, LISTA_SEXO, LISTA_FACULTADES
+)
+
+SELECCIONE = ('', 'Seleccione...')
+MANTENER_ESTADO = ('', 'Mantener estado actual')
+
+
+def opciones(valores, primera=None):
+    """Tupla de pares (valor, etiqueta) con `valores`, precedida de `primera` si se indica."""
+    pares = tuple((valor, valor) for valor in valores)
+    return ((primera,) if primera else ()) + pares
+
+
+def _formulario(**campos):
+    """Opciones de un formulario: {nombre del campo: tupla de opciones}, de sólo lectura."""
+    return MappingProxyType(campos)
+
+
+# Estados con los que se puede registrar a un estudiante nuevo.
+_ESTADOS_INICIALES = [e for e in LISTA_ESTADO_PROGRAMA if e in ["Activo", "No acepta ingresar", "En evaluación inicial"]]
+_CESFAM_SIN_NINGUNO = [c for c in LISTA_CESFAM if c.upper() != "NINGUNO"]
+
+NUEVO_ESTUDIANTE = _formulario(
+    sexo=opciones(LISTA_SEXO, SELECCIONE),
+    genero=opciones(LISTA_GENERO, SELECCIONE),
+    carrera_programa=opciones(LISTA_CARRERAS, SELECCIONE),
+    facultad=opciones(LISTA_FACULTADES, SELECCIONE),
+    nacionalidad=opciones(LISTA_NACIONALIDADES, SELECCIONE),
+    estado_programa=opciones(_ESTADOS_INICIALES),
+    cesfam=opciones(_CESFAM_SIN_NINGUNO, ('', 'Seleccione CESFAM...')),
+    tentativa_ideacion=opciones(LISTA_TENTATIVA_IDEACION, SELECCIONE),
+    estado_academico=opciones(LISTA_ESTADO_ACADEMICO, SELECCIONE),
+    estado_civil=opciones(LISTA_ESTADO_CIVIL, SELECCIONE),
+    tiene_hijos=opciones(LISTA_TIENE_HIJOS, SELECCIONE),
+    ocupacion_laboral=opciones(LISTA_OCUPACION_LABORAL, SELECCIONE),
+    fuente_derivacion=opciones(LISTA_FUENTE_DERIVACION, SELECCIONE),
+)
+
+EDITAR_ESTUDIANTE = _formulario(
+    sexo=opciones(LISTA_SEXO),
+    genero=opciones(LISTA_GENERO),
+    carrera_programa=opciones(LISTA_CARRERAS),
+    facultad=opciones(LISTA_FACULTADES),
+    trabajadora_social=opciones(LISTA_TRABAJADORAS_SOCIALES),
+    psicologo=opciones(LISTA_PSICOLOGOS),
+    estado_programa=opciones(LISTA_ESTADO_PROGRAMA),
+    cesfam=opciones(_CESFAM_SIN_NINGUNO, ("NINGUNO", "NINGUNO")),
+    tentativa_ideacion=opciones(LISTA_TENTATIVA_IDEACION),
+    estado_academico=opciones(LISTA_ESTADO_ACADEMICO, SELECCIONE),
+    estado_civil=opciones(LISTA_ESTADO_CIVIL),
+    tiene_hijos=opciones(LISTA_TIENE_HIJOS),
+    ocupacion_laboral=opciones(LISTA_OCUPACION_LABORAL),
+    nacionalidad=opciones(LISTA_NACIONALIDADES, SELECCIONE),
+    fuente_derivacion=opciones(LISTA_FUENTE_DERIVACION, SELECCIONE),
+)
+
+NUEVO_SEGUIMIENTO = _formulario(
+    tipo_intervencion=opciones(LISTA_TIPO_INTERVENCION, SELECCIONE),
+    resultado_cita=opciones(LISTA_RESULTADO_CITA, SELECCIONE),
+    estado_derivacion_cesfam_actual=opciones(LISTA_ESTADO_DERIVACION_INICIAL, SELECCIONE),
+    confirmacion_gestion_hora_cesfam=opciones(LISTA_ASISTENCIA_CONTROLES_CESFAM, SELECCIONE),
+    nuevo_estado_programa=opciones(LISTA_ESTADO_PROGRAMA, MANTENER_ESTADO),
+    nuevo_estado_academico=opciones(LISTA_ESTADO_ACADEMICO, MANTENER_ESTADO),
+)
+
+EDITAR_SEGUIMIENTO = _formulario(
+    tipo_intervencion=opciones(LISTA_TIPO_INTERVENCION),
+    resultado_cita=opciones(LISTA_RESULTADO_CITA),
+    estado_derivacion_cesfam_actual=opciones(LISTA_ESTADO_DERIVACION_INICIAL, SELECCIONE),
+    confirmacion_gestion_hora_cesfam=opciones(LISTA_ASISTENCIA_CONTROLES_CESFAM, SELECCIONE),
+)
+
+REINGRESO = _formulario(
+    carrera=opciones(LISTA_CARRERAS, SELECCIONE),
+    facultad=opciones(LISTA_FACULTADES, SELECCIONE),
+    estado_academico=opciones(LISTA_ESTADO_ACADEMICO, SELECCIONE),
+)
+
+
+def asignar_opciones(form, opciones_formulario):
+    """Asigna a cada campo de `form` sus opciones precalculadas."""
+    for campo, choices in opciones_formulario.items():
+        getattr(form, campo).choices = choices
+
+
+# --- Profesionales ---
+Profesionales = namedtuple('Profesionales', ['nombres', 'opciones_trabajadora_social', 'opciones_psicologo'])
+
+
+class DirectorioProfesionales:
+    """
+    Listas de profesionales leídas de la tabla Profesionales, por proceso.
+
+    obtener(conn) sólo consulta la versión de la tabla (una búsqueda por clave en
+    VersionTablas) y vuelve a leer los nombres cuando cambió, sea en este proceso o
+    en otro. invalidar() fuerza la relectura en este proceso.
+    """
+
+    def __init__(self):
+        self._version = None
+        self._profesionales = None
+        self._lock = threading.Lock()
+
+    def obtener(self, conn):
+        version = versiones_tablas(conn, ('Profesionales',))[0]
+        with self._lock:
+            if self._profesionales is not None and version is not None and version == self._version:
+                return self._profesionales
+        filas = conn.execute("SELECT nombre_completo, tipo FROM Profesionales ORDER BY nombre_completo").fetchall()
+        profesionales = Profesionales(
+            nombres=tuple(nombre for nombre, _ in filas),
+            opciones_trabajadora_social=opciones([nombre for nombre, tipo in filas if tipo == 'Trabajadora Social'], SELECCIONE),
+            opciones_psicologo=opciones([nombre for nombre, tipo in filas if tipo == 'Psicólogo/a'], SELECCIONE),
+        )
+        with self._lock:
+            self._version, self._profesionales = version, profesionales
+        return profesionales
+
+    def invalidar(self):
+        with self._lock:
+            self._version, self._profesionales = None, None
+
+
+directorio_profesionales = DirectorioProfesionales()
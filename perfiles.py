@@ -0,0 +1,231 @@
+# perfiles.py
+"""
+Perfiles de peticiones a pedido, sólo para administradores.
+
+Un administrador obtiene en /admin/perfiles un token firmado (con SECRET_KEY, válido
+PERFILES_TOKEN_MINUTOS minutos y sólo para su propio usuario) y abre la página lenta
+con '?_perfil=<token>' o con el encabezado 'X-Perfil: <token>'. Esa petición, y sólo
+esa, corre bajo cProfile y bajo un muestreador de pilas (un hilo que lee la pila del
+hilo de la petición cada INTERVALO_MUESTREO segundos). Al terminar se guardan en
+PERFILES_DIR:
+
+  - '<nombre>.pstats': estadísticas de cProfile (python -m pstats, snakeviz...),
+  - '<nombre>.collapsed': pilas muestreadas en formato "colapsado", una línea
+    'f1;f2;f3 muestras' por pila (flamegraph.pl, speedscope, inferno...),
+  - '<nombre>.json': URL, endpoint, usuario, estado HTTP y duración.
+
+Sin el token no se hace nada más que buscarlo en la petición. Con un token inválido,
+vencido, de otro usuario o de alguien que no es administrador, la petición sigue sin
+perfilarse. Se conservan los últimos RETENER_POR_DEFECTO perfiles.
+
+Se perfila una sola petición a la vez en cada proceso: desde Python 3.12 cProfile usa
+sys.monitoring, que es de todo el proceso, así que un segundo perfilador no se puede
+activar y el primero también contaría las llamadas de las otras peticiones. Una petición
+con token que llega mientras otra se perfila se atiende sin perfilar.
+"""
+import cProfile
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, namedtuple
+from datetime import datetime
+from urllib.parse import urlencode
+
+from flask import g, request
+from flask_login import current_user
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+PARAMETRO = '_perfil'
+ENCABEZADO = 'X-Perfil'
+CLAVE_ENTORNO = 'HTTP_X_PERFIL'  # ENCABEZADO en el entorno WSGI
+SAL_TOKEN = 'perfil-peticion'
+TOKEN_MINUTOS_POR_DEFECTO = 15
+INTERVALO_MUESTREO = 0.001  # segundos
+RETENER_POR_DEFECTO = 50
+EXTENSIONES = ('.pstats', '.collapsed', '.json')
+
+# Tomado (sin esperar) por la petición que se perfila, hasta guardar su perfil.
+_perfilando = threading.Lock()
+
+Perfil = namedtuple('Perfil', ['nombre', 'creado', 'url', 'endpoint', 'usuario', 'estado', 'segundos', 'muestras'])
+
+
+def _serializador(secreto):
+    return URLSafeTimedSerializer(secreto, salt=SAL_TOKEN)
+
+
+def generar_token(secreto, id_usuario):
+    """Token firmado que habilita perfilar las peticiones de `id_usuario`."""
+    return _serializador(secreto).dumps({'usuario': id_usuario})
+
+
+def usuario_del_token(secreto, token, max_minutos=TOKEN_MINUTOS_POR_DEFECTO):
+    """ID de usuario de un token válido y vigente; None si no lo es."""
+    try:
+        return _serializador(secreto).loads(token, max_age=max_minutos * 60).get('usuario')
+    except (BadSignature, AttributeError):
+        return None
+
+
+class MuestreadorPilas(threading.Thread):
+    """Cuenta las pilas del hilo `id_hilo`, leídas cada `intervalo` segundos, hasta detener()."""
+
+    def __init__(self, id_hilo, intervalo=INTERVALO_MUESTREO):
+        super().__init__(name='muestreador-perfil', daemon=True)
+        self.id_hilo = id_hilo
+        self.intervalo = intervalo
+        self.muestras = Counter()
+        self._detener = threading.Event()
+
+    def run(self):
+        while not self._detener.wait(self.intervalo):
+            frame = sys._current_frames().get(self.id_hilo)
+            pila = []
+            while frame is not None:
+                codigo = frame.f_code
+                pila.append(f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})")
+                frame = frame.f_back
+            if pila:
+                self.muestras[';'.join(reversed(pila))] += 1
+
+    def detener(self):
+        self._detener.set()
+        self.join()
+
+
+class PerfilPeticion:
+    """cProfile y el muestreador de pilas sobre el hilo actual, entre iniciar() y detener()."""
+
+    def __init__(self, intervalo=INTERVALO_MUESTREO):
+        self.perfilador = cProfile.Profile()
+        self.muestreador = MuestreadorPilas(threading.get_ident(), intervalo)
+        self.estado = None
+        self.segundos = None
+
+    def iniciar(self):
+        """Lanza ValueError si otra herramienta de perfilado ya está activa en el proceso."""
+        self._inicio = time.perf_counter()
+        self.muestreador.start()
+        try:
+            self.perfilador.enable()
+        except ValueError:
+            self.muestreador.detener()
+            raise
+
+    def detener(self):
+        self.perfilador.disable()
+        self.muestreador.detener()
+        self.segundos = round(time.perf_counter() - self._inicio, 4)
+
+
+def _nombre_nuevo(directorio, endpoint):
+    marca = datetime.now().strftime('%Y%m%d-%H%M%S-%f')  # con microsegundos: el orden alfabético es el cronológico
+    base = f"{marca}-{re.sub(r'[^A-Za-z0-9_]', '_', endpoint or 'sin_endpoint')}"
+    nombre, n = base, 1
+    while os.path.exists(os.path.join(directorio, nombre + '.json')):
+        n += 1
+        nombre = f"{base}-{n}"
+    return nombre
+
+
+def guardar_perfil(perfil, directorio, url, endpoint, usuario, retener=RETENER_POR_DEFECTO):
+    """Escribe los tres archivos de `perfil` en `directorio` y aplica la retención. Devuelve el Perfil."""
+    os.makedirs(directorio, exist_ok=True)
+    nombre = _nombre_nuevo(directorio, endpoint)
+    ruta = os.path.join(directorio, nombre)
+    perfil.perfilador.dump_stats(ruta + '.pstats')
+    with open(ruta + '.collapsed', 'w', encoding='utf-8') as archivo:
+        for pila, muestras in sorted(perfil.muestreador.muestras.items()):
+            archivo.write(f"{pila} {muestras}\n")
+    datos = Perfil(nombre, datetime.now().isoformat(timespec='seconds'), url, endpoint, usuario,
+                   perfil.estado, perfil.segundos, sum(perfil.muestreador.muestras.values()))
+    # El .json se escribe al final: un perfil sin él no aparece en la lista.
+    temporal = ruta + '.json.tmp'
+    with open(temporal, 'w', encoding='utf-8') as archivo:
+        json.dump(datos._asdict(), archivo, ensure_ascii=False, indent=2)
+    os.replace(temporal, ruta + '.json')
+    aplicar_retencion(directorio, retener)
+    return datos
+
+
+def listar_perfiles(directorio):
+    """Perfiles guardados en `directorio`, del más reciente al más antiguo."""
+    if not os.path.isdir(directorio):
+        return []
+    perfiles = []
+    for nombre in sorted(os.listdir(directorio), reverse=True):
+        if not nombre.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directorio, nombre), encoding='utf-8') as archivo:
+                perfiles.append(Perfil(**json.load(archivo)))
+        except (OSError, ValueError, TypeError):
+            continue
+    return perfiles
+
+
+def aplicar_retencion(directorio, retener=RETENER_POR_DEFECTO):
+    """Borra los perfiles más antiguos, dejando los `retener` más recientes."""
+    for perfil in listar_perfiles(directorio)[max(retener, 1):]:
+        for extension in EXTENSIONES:
+            ruta = os.path.join(directorio, perfil.nombre + extension)
+            if os.path.exists(ruta):
+                os.remove(ruta)
+
+
+def init_app(app):
+    """Registra los hooks que perfilan las peticiones con un token válido de administrador."""
+
+    @app.before_request
+    def iniciar_perfil():
+        # Lo único que se hace en una petición sin token: dos búsquedas baratas en el entorno WSGI.
+        token = request.environ.get(CLAVE_ENTORNO)
+        if not token and PARAMETRO.encode() in request.query_string:
+            token = request.args.get(PARAMETRO)
+        if not token:
+            return
+        if not (current_user.is_authenticated and current_user.rol == 'admin'):
+            return
+        if usuario_del_token(app.config['SECRET_KEY'], token, app.config.get('PERFILES_TOKEN_MINUTOS', TOKEN_MINUTOS_POR_DEFECTO)) != current_user.id:
+            app.logger.warning(f"Token de perfil inválido o vencido de '{current_user.username}' en {request.path}")
+            return
+        if not _perfilando.acquire(blocking=False):
+            app.logger.warning(f"Perfil de {request.path} omitido: ya se está perfilando otra petición en este proceso")
+            return
+        perfil = PerfilPeticion()
+        try:
+            perfil.iniciar()
+        except ValueError as e:
+            _perfilando.release()
+            app.logger.warning(f"Perfil de {request.path} omitido: {e}")
+            return
+        g._perfil_peticion = perfil
+
+    @app.after_request
+    def estado_perfil(response):
+        perfil = g.get('_perfil_peticion')
+        if perfil is not None:
+            perfil.estado = response.status_code
+        return response
+
+    @app.teardown_request
+    def guardar_perfil_peticion(exception=None):
+        perfil = g.pop('_perfil_peticion', None)
+        if perfil is None:
+            return
+        try:
+            perfil.detener()
+            # La URL se guarda sin el token.
+            argumentos = [(k, v) for k, v in request.args.items(multi=True) if k != PARAMETRO]
+            url = request.path + ('?' + urlencode(argumentos) if argumentos else '')
+            try:
+                datos = guardar_perfil(perfil, app.config['PERFILES_DIR'], url, request.endpoint,
+                                       current_user.username, app.config.get('PERFILES_RETENER', RETENER_POR_DEFECTO))
+                app.logger.info(f"Perfil '{datos.nombre}' de {datos.url} guardado por '{datos.usuario}' ({datos.segundos} s)")
+            except OSError as e:
+                app.logger.error(f"No se pudo guardar el perfil de {request.path}: {e}", exc_info=True)
+        finally:
+            _perfilando.release()
@@ -0,0 +1,255 @@
+# respaldos.py
+"""
+Respaldos de la base de datos en línea, consistentes y sin detener la aplicación.
+
+Copiar 'seguimiento.db' con cp mientras hay escrituras puede dejar un archivo corrupto
+(y en modo WAL los últimos cambios están en 'seguimiento.db-wal'), y las tres descargas
+CSV no son de un mismo instante. crear_respaldo() usa la API de respaldo de SQLite
+(sqlite3.Connection.backup), que copia las páginas de una sola versión de la base:
+
+  - En modo WAL (el de la aplicación) la copia se hace en un solo paso: sólo abre una
+    transacción de lectura, y en WAL los lectores no bloquean a los escritores. En pasos
+    de pocas páginas no se ganaría nada, y la copia se reiniciaría desde cero con cada
+    escritura de otra conexión (con escrituras continuas podría no terminar nunca).
+  - En otros modos cada paso toma un bloqueo compartido que sí detiene los commits, así
+    que se copia de a PAGINAS_POR_PASO páginas con una pausa entre pasos. Si la copia se
+    reinicia más de REINICIOS_MAXIMOS veces, el resto se copia en un solo paso.
+
+La copia se revisa con PRAGMA quick_check, se comprime con gzip (opcional) y queda con
+el nombre '<base>-AAAAMMDD-HHMMSS.db[.gz]' junto a un '.json' con su tamaño, duración y
+SHA-256. Después se borran los respaldos más antiguos, dejando los últimos `retener`.
+
+Uso:
+    python respaldos.py crear [--sin-comprimir] [--retener N] [--directorio DIR]
+    python respaldos.py listar [--directorio DIR]
+    python respaldos.py verificar ARCHIVO     # SHA-256 y quick_check de la copia
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from database import DATABASE_NAME
+
+PAGINAS_POR_PASO = 256
+PAUSA_ENTRE_PASOS = 0.01  # segundos
+REINICIOS_MAXIMOS = 3
+RETENER_POR_DEFECTO = 14
+TAMANO_BLOQUE = 1 << 20
+
+Respaldo = namedtuple('Respaldo', ['archivo', 'creado', 'bytes', 'bytes_base', 'sha256', 'comprimido', 'segundos', 'paginas'])
+
+
+class RespaldoInvalido(Exception):
+    """La copia no pasó PRAGMA quick_check o su SHA-256 no coincide."""
+
+
+def directorio_por_defecto(ruta_bd=DATABASE_NAME):
+    return os.environ.get('RESPALDOS_DIR') or os.path.join(os.path.dirname(os.path.abspath(ruta_bd)), 'respaldos')
+
+
+def _patron_nombres(ruta_bd):
+    base = os.path.splitext(os.path.basename(ruta_bd))[0]
+    return re.compile(rf'{re.escape(base)}-(\d{{8}}-\d{{6}})(?:-(\d+))?\.db(?:\.gz)?')
+
+
+def _nombre_nuevo(ruta_bd, directorio, comprimir):
+    base = os.path.splitext(os.path.basename(ruta_bd))[0]
+    marca = datetime.now().strftime('%Y%m%d-%H%M%S')
+    extension = '.db.gz' if comprimir else '.db'
+    nombre, n = f"{base}-{marca}", 1
+    while any(os.path.exists(os.path.join(directorio, nombre + e)) for e in ('.db', '.db.gz')):
+        n += 1
+        nombre = f"{base}-{marca}-{n}"
+    return nombre + extension
+
+
+def _sha256(ruta):
+    suma = hashlib.sha256()
+    with open(ruta, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(TAMANO_BLOQUE), b''):
+            suma.update(bloque)
+    return suma.hexdigest()
+
+
+def copiar_base(ruta_bd, ruta_copia, paginas_por_paso=PAGINAS_POR_PASO, pausa=PAUSA_ENTRE_PASOS):
+    """Copia consistente de `ruta_bd` en `ruta_copia` (ver el docstring del módulo). Devuelve las páginas copiadas."""
+    origen = sqlite3.connect(f"file:{ruta_bd}?mode=ro", uri=True)
+    destino = sqlite3.connect(ruta_copia)
+    try:
+        if origen.execute("PRAGMA journal_mode").fetchone()[0].lower() == 'wal':
+            origen.backup(destino)
+        else:
+            pendientes_anteriores, reinicios = None, 0
+
+            def progreso(estado, pendientes, total):
+                nonlocal pendientes_anteriores, reinicios
+                if pendientes_anteriores is not None and pendientes > pendientes_anteriores:
+                    reinicios += 1
+                    if reinicios > REINICIOS_MAXIMOS:
+                        raise InterruptedError()
+                pendientes_anteriores = pendientes
+
+            try:
+                origen.backup(destino, pages=paginas_por_paso, progress=progreso, sleep=pausa)
+            except InterruptedError:
+                origen.backup(destino)
+        # La copia hereda el modo WAL del encabezado; se deja en modo normal para que sea un solo archivo.
+        destino.execute("PRAGMA journal_mode = DELETE")
+        paginas = destino.execute("PRAGMA page_count").fetchone()[0]
+        resultado = destino.execute("PRAGMA quick_check").fetchone()[0]
+        if resultado != 'ok':
+            raise RespaldoInvalido(f"La copia no pasó quick_check: {resultado}")
+        return paginas
+    finally:
+        destino.close()
+        origen.close()
+
+
+def _guardar_metadatos(ruta, respaldo):
+    temporal = ruta + '.json.tmp'
+    with open(temporal, 'w', encoding='utf-8') as archivo:
+        json.dump(respaldo._asdict(), archivo, ensure_ascii=False, indent=2)
+    os.replace(temporal, ruta + '.json')
+
+
+def crear_respaldo(ruta_bd=DATABASE_NAME, directorio=None, comprimir=True, retener=RETENER_POR_DEFECTO):
+    """
+    Crea un respaldo de `ruta_bd` en `directorio` y aplica la retención. Devuelve el
+    Respaldo creado. Lanza RespaldoInvalido si la copia no pasa quick_check.
+    """
+    directorio = directorio or directorio_por_defecto(ruta_bd)
+    os.makedirs(directorio, exist_ok=True)
+    inicio = time.perf_counter()
+    creado = datetime.now().isoformat(timespec='seconds')
+    nombre = _nombre_nuevo(ruta_bd, directorio, comprimir)
+    ruta = os.path.join(directorio, nombre)
+
+    # La copia se arma en un temporal del mismo directorio y se renombra al final, así
+    # nunca queda a la vista un respaldo a medias.
+    descriptor, copia = tempfile.mkstemp(prefix='.respaldo-', suffix='.db', dir=directorio)
+    os.close(descriptor)
+    try:
+        paginas = copiar_base(ruta_bd, copia)
+        bytes_base = os.path.getsize(copia)
+        if comprimir:
+            comprimido = copia + '.gz'
+            with open(copia, 'rb') as entrada, gzip.open(comprimido, 'wb', compresslevel=6) as salida:
+                shutil.copyfileobj(entrada, salida, TAMANO_BLOQUE)
+            os.remove(copia)
+            copia = comprimido
+        sha256 = _sha256(copia)
+        os.replace(copia, ruta)
+    except BaseException:
+        for temporal in (copia, copia + '.gz'):
+            if os.path.exists(temporal):
+                os.remove(temporal)
+        raise
+
+    respaldo = Respaldo(nombre, creado, os.path.getsize(ruta), bytes_base, sha256, comprimir,
+                        round(time.perf_counter() - inicio, 3), paginas)
+    _guardar_metadatos(ruta, respaldo)
+    aplicar_retencion(ruta_bd, directorio, retener)
+    return respaldo
+
+
+def listar_respaldos(ruta_bd=DATABASE_NAME, directorio=None):
+    """Respaldos de `directorio` con sus metadatos, del más reciente al más antiguo."""
+    directorio = directorio or directorio_por_defecto(ruta_bd)
+    if not os.path.isdir(directorio):
+        return []
+    patron = _patron_nombres(ruta_bd)
+    encontrados = [(patron.fullmatch(nombre), nombre) for nombre in os.listdir(directorio)]
+    # Por fecha y, dentro del mismo segundo, por el sufijo -2, -3...
+    encontrados = sorted(((c.group(1), int(c.group(2) or 1), nombre) for c, nombre in encontrados if c), reverse=True)
+    respaldos = []
+    for _, _, nombre in encontrados:
+        ruta = os.path.join(directorio, nombre)
+        try:
+            with open(ruta + '.json', encoding='utf-8') as archivo:
+                respaldos.append(Respaldo(**json.load(archivo)))
+        except (OSError, ValueError, TypeError):
+            # Sin metadatos (p. ej. copiado a mano): se muestra con lo que se sabe.
+            respaldos.append(Respaldo(nombre, None, os.path.getsize(ruta), None, None, nombre.endswith('.gz'), None, None))
+    return respaldos
+
+
+def aplicar_retencion(ruta_bd=DATABASE_NAME, directorio=None, retener=RETENER_POR_DEFECTO):
+    """Borra los respaldos más antiguos, dejando los `retener` más recientes. Devuelve los nombres borrados."""
+    directorio = directorio or directorio_por_defecto(ruta_bd)
+    borrados = []
+    for respaldo in listar_respaldos(ruta_bd, directorio)[max(retener, 1):]:
+        ruta = os.path.join(directorio, respaldo.archivo)
+        for archivo in (ruta, ruta + '.json'):
+            if os.path.exists(archivo):
+                os.remove(archivo)
+        borrados.append(respaldo.archivo)
+    return borrados
+
+
+def verificar_respaldo(ruta):
+    """
+    Compara el SHA-256 de `ruta` con el de su '.json' y corre quick_check sobre la base
+    (descomprimida en un temporal si es .gz). Lanza RespaldoInvalido si algo no cuadra.
+    """
+    with open(ruta + '.json', encoding='utf-8') as archivo:
+        esperado = json.load(archivo)['sha256']
+    if _sha256(ruta) != esperado:
+        raise RespaldoInvalido(f"El SHA-256 de '{ruta}' no coincide con el registrado.")
+    with tempfile.TemporaryDirectory() as directorio:
+        base = ruta
+        if ruta.endswith('.gz'):
+            base = os.path.join(directorio, 'respaldo.db')
+            with gzip.open(ruta, 'rb') as entrada, open(base, 'wb') as salida:
+                shutil.copyfileobj(entrada, salida, TAMANO_BLOQUE)
+        conn = sqlite3.connect(f"file:{base}?mode=ro", uri=True)
+        try:
+            resultado = conn.execute("PRAGMA quick_check").fetchone()[0]
+        finally:
+            conn.close()
+    if resultado != 'ok':
+        raise RespaldoInvalido(f"'{ruta}' no pasó quick_check: {resultado}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Respaldos consistentes de la base de datos.")
+    subparsers = parser.add_subparsers(dest='accion', required=True)
+    p = subparsers.add_parser('crear', help="Crea un respaldo y aplica la retención.")
+    p.add_argument('--sin-comprimir', action='store_true')
+    p.add_argument('--retener', type=int, default=int(os.environ.get('RESPALDOS_RETENER', RETENER_POR_DEFECTO)))
+    p.add_argument('--directorio')
+    p = subparsers.add_parser('listar', help="Lista los respaldos existentes.")
+    p.add_argument('--directorio')
+    p = subparsers.add_parser('verificar', help="Verifica el SHA-256 y la integridad de un respaldo.")
+    p.add_argument('archivo')
+    args = parser.parse_args()
+
+    if args.accion == 'crear':
+        respaldo = crear_respaldo(directorio=args.directorio, comprimir=not args.sin_comprimir, retener=args.retener)
+        print(f"Respaldo creado: {respaldo.archivo} ({respaldo.bytes / 2**20:.1f} MB, base de "
+              f"{respaldo.bytes_base / 2**20:.1f} MB) en {respaldo.segundos:.2f} s.")
+        print(f"SHA-256: {respaldo.sha256}")
+    elif args.accion == 'listar':
+        for respaldo in listar_respaldos(directorio=args.directorio):
+            duracion = f"{respaldo.segundos:.2f} s" if respaldo.segundos is not None else "?"
+            print(f"{respaldo.archivo:40s} {respaldo.bytes / 2**20:8.1f} MB  {duracion:>9s}  {respaldo.creado or ''}")
+    else:
+        try:
+            verificar_respaldo(args.archivo)
+        except RespaldoInvalido as e:
+            print(e)
+            sys.exit(1)
+        print(f"'{args.archivo}' está íntegro.")
+
+
+if __name__ == '__main__':
+    main()
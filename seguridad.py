@@ -0,0 +1,130 @@
+# seguridad.py
+"""
+Hash y verificación de contraseñas.
+
+El método y su costo se configuran con un texto en el formato de werkzeug, por ejemplo
+'pbkdf2:sha256:1000000' o 'scrypt:32768:8:1'; por defecto, el PBKDF2-SHA256 de werkzeug
+(el mismo con que se crearon las contraseñas existentes). Cada hash guardado lleva los
+parámetros con que se creó; necesita_rehash() indica si usa otro algoritmo o un costo
+menor que el configurado, y en ese caso el hash se rehace en el siguiente inicio de
+sesión exitoso (el único momento en que se conoce la contraseña). Un hash más costoso
+que el configurado se conserva: bajar el costo nunca debilita contraseñas ya guardadas.
+
+Los cálculos (PBKDF2 o scrypt, lentos a propósito) corren en un grupo acotado de hilos,
+VerificadorContrasenas. hashlib suelta el GIL mientras calcula, así que varios inicios
+de sesión simultáneos usan varios núcleos sin frenar a los hilos que atienden otras
+peticiones, y nunca hay más de `hilos` cálculos a la vez. Si además ya hay
+`max_pendientes` esperando turno, las solicitudes nuevas se rechazan de inmediato con
+VerificacionesSaturadas en lugar de acumularse.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+METODO_HASH_POR_DEFECTO = f'pbkdf2:sha256:{DEFAULT_PBKDF2_ITERATIONS}'
+PENDIENTES_MAX_POR_DEFECTO = 32
+
+
+def normalizar_metodo(metodo):
+    """
+    `metodo` con todos sus parámetros explícitos (los que falten toman los valores por
+    omisión de werkzeug). Lanza ValueError si el método no es válido.
+    """
+    nombre, *parametros = metodo.split(':')
+    try:
+        if nombre == 'pbkdf2' and len(parametros) <= 2:
+            algoritmo = parametros[0] if parametros else 'sha256'
+            iteraciones = int(parametros[1]) if len(parametros) == 2 else DEFAULT_PBKDF2_ITERATIONS
+            return f"pbkdf2:{algoritmo}:{iteraciones}"
+        if nombre == 'scrypt' and len(parametros) in (0, 3):
+            n, r, p = map(int, parametros) if parametros else (2**15, 8, 1)
+            return f"scrypt:{n}:{r}:{p}"
+    except ValueError:
+        pass
+    raise ValueError(f"Método de hash de contraseñas no válido: '{metodo}'")
+
+
+def metodo_de_hash(password_hash):
+    """Método normalizado con que se creó `password_hash`, o None si no se reconoce."""
+    try:
+        return normalizar_metodo(password_hash.split('$', 1)[0])
+    except ValueError:
+        return None
+
+
+def _algoritmo_y_costo(metodo):
+    """('pbkdf2:<hash>' o 'scrypt', costo) de un método normalizado: iteraciones, o N·r·p en scrypt."""
+    nombre, *parametros = metodo.split(':')
+    if nombre == 'pbkdf2':
+        return f"pbkdf2:{parametros[0]}", int(parametros[1])
+    n, r, p = map(int, parametros)
+    return nombre, n * r * p
+
+
+def necesita_rehash(password_hash, metodo):
+    """True si `password_hash` usa otro algoritmo que `metodo`, o el mismo con un costo menor."""
+    actual = metodo_de_hash(password_hash)
+    if actual is None:
+        return True
+    algoritmo, costo = _algoritmo_y_costo(actual)
+    algoritmo_configurado, costo_configurado = _algoritmo_y_costo(normalizar_metodo(metodo))
+    return algoritmo != algoritmo_configurado or costo < costo_configurado
+
+
+class VerificacionesSaturadas(Exception):
+    """Hay demasiados cálculos de hash en curso o esperando turno."""
+
+
+class VerificadorContrasenas:
+    """
+    Grupo acotado de hilos para verificar y generar hashes de contraseñas.
+
+    Uso:
+        verificador = VerificadorContrasenas(metodo='pbkdf2:sha256:1000000', hilos=4)
+        if verificador.verificar(password_hash, password): ...
+        nuevo_hash = verificador.generar_hash(password)
+
+    Los hilos se crean con el primer cálculo, de modo que la instancia se puede crear al
+    importar la aplicación, antes de que gunicorn haga fork de los procesos.
+    """
+
+    def __init__(self, metodo=METODO_HASH_POR_DEFECTO, hilos=None, max_pendientes=PENDIENTES_MAX_POR_DEFECTO):
+        self.metodo = normalizar_metodo(metodo)
+        self.hilos = hilos or os.cpu_count() or 1
+        self.max_pendientes = max_pendientes
+        self._cupos = threading.BoundedSemaphore(self.hilos + max_pendientes)
+        self._ejecutor = None
+        self._lock = threading.Lock()
+
+    def _calcular(self, funcion, *args):
+        if not self._cupos.acquire(blocking=False):
+            raise VerificacionesSaturadas()
+        try:
+            with self._lock:
+                if self._ejecutor is None:
+                    self._ejecutor = ThreadPoolExecutor(max_workers=self.hilos, thread_name_prefix='hash-contrasenas')
+            futuro = self._ejecutor.submit(funcion, *args)
+        except BaseException:
+            self._cupos.release()
+            raise
+        futuro.add_done_callback(lambda _: self._cupos.release())
+        return futuro.result()
+
+    def verificar(self, password_hash, password):
+        """True si `password` corresponde a `password_hash`."""
+        return self._calcular(check_password_hash, password_hash, password)
+
+    def generar_hash(self, password):
+        """Hash de `password` con el método configurado."""
+        return self._calcular(generate_password_hash, password, self.metodo)
+
+    def necesita_rehash(self, password_hash):
+        return necesita_rehash(password_hash, self.metodo)
+
+    def cerrar(self):
+        with self._lock:
+            if self._ejecutor is not None:
+                self._ejecutor.shutdown(wait=True)
+                self._ejecutor = None
@@ -0,0 +1,113 @@
+# verificar_limites.py
+"""
+Verificación de los límites de peticiones con varios procesos (como los de gunicorn).
+
+Crea una base de datos y un archivo de contadores temporales, y lanza PROCESOS procesos
+que compiten a la vez por el mismo límite:
+
+  1. directamente contra AlmacenLimitesSQLite, con las estrategias de ventana fija y
+     de ventana deslizante;
+  2. a través de la app, con peticiones GET a /login (límite "10 per minute") desde
+     la misma IP, con el limitador creado antes del fork como en gunicorn --preload.
+
+En cada caso el total de peticiones aceptadas entre todos los procesos debe ser
+exactamente el límite configurado. Falla (código de salida 1) si no.
+
+Uso:
+    python verificar_limites.py [--procesos N] [--intentos N]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+LIMITE_ALMACEN = 100
+LIMITE_LOGIN = 10  # Debe coincidir con @limiter.limit de la ruta /login.
+
+
+def _esperar_ventana(segundos, margen):
+    """Espera si quedan menos de `margen` segundos de la ventana actual de `segundos`."""
+    restante = segundos - time.time() % segundos
+    if restante < margen:
+        time.sleep(restante + 0.1)
+
+
+def _competir_almacen(uri, estrategia, limite, intentos, barrera, aceptadas):
+    from limits import RateLimitItemPerHour, strategies
+    from limits.storage import storage_from_string
+    import limites  # noqa: F401  (registra el esquema "sqlite")
+
+    limitador = strategies.STRATEGIES[estrategia](storage_from_string(uri))
+    item = RateLimitItemPerHour(limite)
+    barrera.wait()
+    cuenta = sum(1 for _ in range(intentos) if limitador.hit(item, 'verificacion', estrategia))
+    with aceptadas.get_lock():
+        aceptadas.value += cuenta
+
+
+def _competir_login(intentos, barrera, aceptadas):
+    import app as aplicacion
+    cliente = aplicacion.app.test_client()
+    barrera.wait()
+    cuenta = 0
+    for _ in range(intentos):
+        respuesta = cliente.get('/login', base_url='https://localhost')
+        assert respuesta.status_code in (200, 429), respuesta.status_code
+        cuenta += respuesta.status_code == 200
+    with aceptadas.get_lock():
+        aceptadas.value += cuenta
+
+
+def _en_paralelo(contexto, procesos, objetivo, *args):
+    """Ejecuta `objetivo(*args, barrera, aceptadas)` en `procesos` procesos y devuelve el total aceptado."""
+    barrera = contexto.Barrier(procesos)
+    aceptadas = contexto.Value('i', 0)
+    hijos = [contexto.Process(target=objetivo, args=(*args, barrera, aceptadas)) for _ in range(procesos)]
+    for hijo in hijos:
+        hijo.start()
+    for hijo in hijos:
+        hijo.join()
+        if hijo.exitcode != 0:
+            raise RuntimeError(f"Un proceso terminó con código {hijo.exitcode}")
+    return aceptadas.value
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verifica que los límites de peticiones se respeten entre procesos.")
+    parser.add_argument('--procesos', type=int, default=8)
+    parser.add_argument('--intentos', type=int, default=50, help="Intentos por proceso.")
+    args = parser.parse_args()
+
+    directorio = tempfile.mkdtemp()
+    os.chdir(directorio)  # app.log de la app va al directorio temporal
+    uri = 'sqlite:///' + os.path.join(directorio, 'limites.db')
+    os.environ['DATABASE_PATH'] = os.path.join(directorio, 'verificacion.db')
+    os.environ['LIMITES_STORAGE_URI'] = uri
+    os.environ.setdefault('SECRET_KEY', 'clave-solo-para-verificacion')
+    contexto = multiprocessing.get_context('fork')
+
+    resultados = []
+    for estrategia in ('fixed-window', 'sliding-window-counter'):
+        _esperar_ventana(3600, margen=60)
+        total = _en_paralelo(contexto, args.procesos, _competir_almacen, uri, estrategia, LIMITE_ALMACEN, args.intentos)
+        resultados.append((f"almacén, {estrategia}", total, LIMITE_ALMACEN))
+
+    import app  # noqa: F401  (el limitador se crea antes del fork, como con gunicorn --preload)
+    _esperar_ventana(60, margen=30)
+    total = _en_paralelo(contexto, args.procesos, _competir_login, args.intentos)
+    resultados.append(("GET /login", total, LIMITE_LOGIN))
+
+    print(f"{args.procesos} procesos, {args.intentos} intentos cada uno")
+    fallas = 0
+    for nombre, total, esperado in resultados:
+        correcto = total == esperado
+        fallas += not correcto
+        print(f"[{'OK' if correcto else 'FALLA'}] {nombre}: {total} aceptadas (límite {esperado})")
+    if fallas:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
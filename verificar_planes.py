@@ -0,0 +1,196 @@
+# verificar_planes.py
+"""
+Verificación de planes de consulta (EXPLAIN QUERY PLAN) para las consultas frecuentes.
+
+Crea una base de datos en memoria con todas las migraciones aplicadas y revisa el plan
+de cada consulta de CONSULTAS_FRECUENTES. Falla (código de salida 1) si alguna recorre
+una tabla completa ("SCAN ...") en vez de buscar por índice. Pensado para ejecutarse
+antes de cada despliegue y después de tocar una consulta o una migración.
+
+Las consultas de las páginas frecuentes (lista y búsqueda de '/', buscar_seguimientos,
+los historiales, admin_auditoria y el reporte) se arman con las mismas constantes de
+database.py que usa app.py, así un cambio allá se verifica aquí sin tocar este archivo.
+Las demás, sentencias cortas de una línea, son copia de las de app.py y database.py.
+
+Uso:
+    python verificar_planes.py            # verifica todas
+    python verificar_planes.py --detalle  # además imprime cada plan
+"""
+import argparse
+import sqlite3
+import sys
+
+from database import (
+    SQL_ALERTAS_INACTIVIDAD, ORDEN_ALERTAS_INACTIVIDAD, CONDICION_PROFESIONAL, SQL_CONTEO_ACTIVOS_POR_ANIO,
+    COLUMNAS_LISTA_ESTUDIANTES, COLUMNAS_ORDEN_ESTUDIANTES, DESDE_LISTA_ESTUDIANTES, DESDE_BUSQUEDA_ESTUDIANTES,
+    CONDICION_SIN_ESTADO_PERIODO,
+    SQL_BUSCAR_SEGUIMIENTOS, PAGINA_BUSCAR_SEGUIMIENTOS, ORDEN_BUSCAR_SEGUIMIENTOS,
+    SQL_HISTORIAL_ESTUDIANTE, SQL_AUDITORIA_SEGUIMIENTOS, CONDICION_AUDITORIA_SEGUIMIENTO, CONDICION_AUDITORIA_USUARIO,
+    PAGINA_HISTORIAL, ORDEN_HISTORIAL, SQL_CAMPOS_MODIFICADOS, SQL_HISTORIAL_CAMPO, PAGINA_HISTORIAL_CAMPO,
+    ORDEN_HISTORIAL_CAMPO, SQL_REPORTE_PERIODOS,
+)
+from migraciones import aplicar_migraciones
+
+# Como en index(): la página continúa desde la fila anterior en este orden.
+_ORDEN_LISTA = [f"e.{columna}" for columna in COLUMNAS_ORDEN_ESTUDIANTES]
+
+# nombre -> (sql, parámetros de ejemplo)
+CONSULTAS_FRECUENTES = {
+    'index: activos por año de ingreso': (
+        SQL_CONTEO_ACTIVOS_POR_ANIO,
+        ()),
+    'index: alertas de inactividad': (
+        SQL_ALERTAS_INACTIVIDAD + ORDEN_ALERTAS_INACTIVIDAD,
+        ('-30 days',)),
+    'index: alertas de inactividad de un profesional': (
+        SQL_ALERTAS_INACTIVIDAD + " AND " + CONDICION_PROFESIONAL + ORDEN_ALERTAS_INACTIVIDAD,
+        ('-30 days', 'Nombre', 'Nombre')),
+    'index: página de la lista de estudiantes': (
+        COLUMNAS_LISTA_ESTUDIANTES + DESDE_LISTA_ESTUDIANTES + " WHERE " + CONDICION_SIN_ESTADO_PERIODO
+        + f" AND ({', '.join(_ORDEN_LISTA)}) > (?, ?, ?, ?)"
+        + " ORDER BY " + ", ".join(f"{expresion} ASC" for expresion in _ORDEN_LISTA) + " LIMIT ?",
+        ('archivado', 'Muñoz', 'Rojas', 'Ana', '12345678-9', 51)),
+    'index: búsqueda de estudiantes (FTS)': (
+        COLUMNAS_LISTA_ESTUDIANTES + ", c.puntaje" + DESDE_BUSQUEDA_ESTUDIANTES + " WHERE " + CONDICION_SIN_ESTADO_PERIODO
+        + " ORDER BY c.puntaje ASC, e.rut ASC LIMIT ?",
+        ('"munoz"*', 'archivado', 51)),
+    'buscar_seguimientos: bitácoras de un profesional (FTS)': (
+        SQL_BUSCAR_SEGUIMIENTOS + " AND " + CONDICION_PROFESIONAL + PAGINA_BUSCAR_SEGUIMIENTOS + ORDEN_BUSCAR_SEGUIMIENTOS,
+        ('\x02', '\x03', '"ansiedad"*', 'Nombre', 'Nombre', 1000, 21)),
+    'actualizar_ultima_sesion': (
+        """UPDATE EstadoActualEstudiante
+           SET fecha_ultima_sesion = (SELECT MAX(fecha_sesion) FROM Seguimientos WHERE rut_estudiante = ?)
+           WHERE rut_estudiante = ?""",
+        ('12345678-9', '12345678-9')),
+    'actualizar_estado_actual: último período': (
+        "SELECT rut_estudiante, id, estado_periodo, fecha_ingreso FROM PeriodosAtencion WHERE rut_estudiante = ? ORDER BY id DESC LIMIT 1",
+        ('12345678-9',)),
+    'nuevo_seguimiento: período vigente': (
+        "UPDATE PeriodosAtencion SET estado_periodo = ? WHERE id = (SELECT id_periodo_actual FROM EstadoActualEstudiante WHERE rut_estudiante = ?)",
+        ('Activo', '12345678-9')),
+    'index: estudiantes de un profesional': (
+        "SELECT e.rut FROM Estudiantes e WHERE (e.trabajadora_social_asignada = ? OR e.psicologo_asignado = ?)",
+        ('Nombre', 'Nombre')),
+    'detalle_estudiante: último período': (
+        """SELECT * FROM PeriodosAtencion
+           WHERE rut_estudiante = ?
+           ORDER BY fecha_ingreso DESC, id DESC LIMIT 1""",
+        ('12345678-9',)),
+    'detalle_estudiante: seguimiento de alta': (
+        """SELECT * FROM Seguimientos
+           WHERE rut_estudiante = ? AND (alta_mejora_animo = 1 OR alta_disminucion_riesgo = 1 OR alta_redes_apoyo = 1 OR alta_adherencia_tratamiento = 1 OR alta_no_registrado = 1)
+           ORDER BY fecha_sesion DESC, id_seguimiento DESC
+           LIMIT 1""",
+        ('12345678-9',)),
+    'detalle_estudiante: seguimientos con fue_corregido': (
+        """SELECT s.*, NOT s.es_vigente as fue_corregido
+           FROM Seguimientos s
+           WHERE s.rut_estudiante = ?
+           ORDER BY s.fecha_sesion DESC, s.id_seguimiento DESC""",
+        ('12345678-9',)),
+    'historial_estudiante: página del historial de cambios': (
+        SQL_HISTORIAL_ESTUDIANTE + PAGINA_HISTORIAL + ORDEN_HISTORIAL,
+        ('12345678-9', '2024-05-01 10:00:00', 100, 21)),
+    'historial_estudiante: campos modificados de la página': (
+        SQL_CAMPOS_MODIFICADOS.format(marcadores='?, ?, ?'),
+        (1, 2, 3)),
+    'admin_historial: cambios de un campo en un rango de fechas': (
+        SQL_HISTORIAL_CAMPO + PAGINA_HISTORIAL_CAMPO + ORDEN_HISTORIAL_CAMPO,
+        ('estado_academico', '2024-01-01', '2025-01-01', '2024-05-01 10:00:00', 100, 21)),
+    'detalle_estudiante: última extensión': (
+        "SELECT MAX(extension_programa_otorgada) as fecha_extension FROM Seguimientos WHERE rut_estudiante = ?",
+        ('12345678-9',)),
+    'nuevo_seguimiento: último seguimiento': (
+        "SELECT estado_derivacion_cesfam_actual, confirmacion_gestion_hora_cesfam FROM Seguimientos WHERE rut_estudiante = ? ORDER BY fecha_sesion DESC, id_seguimiento DESC LIMIT 1",
+        ('12345678-9',)),
+    'eliminar_seguimiento: versión anterior': (
+        "UPDATE Seguimientos SET reemplazado_por_id = NULL, es_vigente = 1 WHERE reemplazado_por_id = ?",
+        (1,)),
+    'admin_auditoria: ediciones de un seguimiento': (
+        SQL_AUDITORIA_SEGUIMIENTOS + CONDICION_AUDITORIA_SEGUIMIENTO + ORDEN_HISTORIAL,
+        ('123', 21)),
+    'admin_auditoria: ediciones de un usuario': (
+        SQL_AUDITORIA_SEGUIMIENTOS + CONDICION_AUDITORIA_USUARIO + PAGINA_HISTORIAL + ORDEN_HISTORIAL,
+        ('Paula Araya', '2024-05-01 10:00:00', 100, 21)),
+    'eliminar_estudiante: campos del historial': (
+        """DELETE FROM HistorialCambiosDetalle WHERE id_cambio IN (
+               SELECT id_cambio FROM HistorialCambios WHERE id_registro_afectado = ? AND modelo_afectado = 'Estudiante')""",
+        ('12345678-9',)),
+    'eliminar_estudiante: historial': (
+        "DELETE FROM HistorialCambios WHERE id_registro_afectado = ? AND modelo_afectado = 'Estudiante'",
+        ('12345678-9',)),
+    'eliminar_estudiante: seguimientos': (
+        "DELETE FROM Seguimientos WHERE rut_estudiante = ?",
+        ('12345678-9',)),
+    'eliminar_estudiante: estado actual': (
+        "DELETE FROM EstadoActualEstudiante WHERE rut_estudiante = ?",
+        ('12345678-9',)),
+    'eliminar_estudiante: períodos': (
+        "DELETE FROM PeriodosAtencion WHERE rut_estudiante = ?",
+        ('12345678-9',)),
+    'api_reporte_periodos: versiones de tablas': (
+        "SELECT tabla, version FROM VersionTablas WHERE tabla IN (?, ?)",
+        ('Estudiantes', 'PeriodosAtencion')),
+    'api_reporte_periodos: rango de fechas': (
+        SQL_REPORTE_PERIODOS.format(dimension='TRIM(pa.motivo_ingreso)'),
+        ('2024-01-01', '2024-12-31')),
+}
+
+
+def plan_de(conn, sql, parametros=()):
+    """Devuelve las líneas de detalle de EXPLAIN QUERY PLAN para `sql`."""
+    return [fila[3] for fila in conn.execute("EXPLAIN QUERY PLAN " + sql, parametros)]
+
+
+def _es_busqueda_fts(linea):
+    """Un "SCAN ... VIRTUAL TABLE INDEX n:M..." de FTS5 es una búsqueda por MATCH, no un recorrido."""
+    _, _, indice = linea.partition('VIRTUAL TABLE INDEX ')
+    return 'M' in indice.partition(':')[2]
+
+
+def recorridos_completos(plan):
+    """Líneas del plan que recorren una tabla o índice completo."""
+    return [linea for linea in plan
+            if linea.startswith('SCAN ') and linea != 'SCAN CONSTANT ROW' and not _es_busqueda_fts(linea)]
+
+
+def verificar(conn, consultas=CONSULTAS_FRECUENTES):
+    """Devuelve {nombre: (plan, recorridos)} de las consultas que recorren tablas completas."""
+    fallas = {}
+    for nombre, (sql, parametros) in consultas.items():
+        plan = plan_de(conn, sql, parametros)
+        recorridos = recorridos_completos(plan)
+        if recorridos:
+            fallas[nombre] = (plan, recorridos)
+    return fallas
+
+
+def conexion_con_esquema():
+    """Base en memoria con el esquema completo (todas las migraciones)."""
+    conn = sqlite3.connect(':memory:')
+    aplicar_migraciones(conn, registrar=lambda mensaje: None)
+    return conn
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verifica que las consultas frecuentes usen índices.")
+    parser.add_argument('--detalle', action='store_true', help="Imprime el plan de cada consulta.")
+    args = parser.parse_args()
+
+    conn = conexion_con_esquema()
+    fallas = verificar(conn)
+    for nombre, (sql, parametros) in CONSULTAS_FRECUENTES.items():
+        print(f"[{'FALLA' if nombre in fallas else 'OK'}] {nombre}")
+        if args.detalle or nombre in fallas:
+            for linea in plan_de(conn, sql, parametros):
+                print(f"        {linea}")
+    conn.close()
+
+    if fallas:
+        print(f"\n{len(fallas)} consultas recorren tablas completas.")
+        sys.exit(1)
+    print(f"\nLas {len(CONSULTAS_FRECUENTES)} consultas usan índices.")
+
+
+if __name__ == '__main__':
+    main()